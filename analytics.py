@@ -0,0 +1,240 @@
+"""利用状況の集計（分析ダッシュボード用）
+
+イベントを参加者ごとの行に展開し、pandas / NumPy でまとめて次の集計を作る:
+
+- ユーザー×週 の予定時間
+- ユーザー×週×スケジュールラベル / 優先度 の予定時間
+- ユーザー×日 の稼働時間帯（START_H–END_H）内で埋まっている時間（重なりは1回だけ数える）
+
+日付・週（日曜始まり）は表示タイムゾーンの壁時計で決め、wall 秒（timezones 参照）の日番号で持つ。
+集計はイベント一覧のフィンガープリント×タイムゾーン×稼働時間帯ごとの版としてキャッシュし、変更通知では
+変更されたイベントの分だけ差し引き・加算した新しい版を作る。埋まっている時間は加算できないので、
+影響のあったユーザー×日だけ区間を併合し直す。
+
+pandas の読み込みは重いので、app からは分析を開いたときに初めて import する。
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import event_index
+import geometry
+import timezones
+
+ANALYTICS_CACHE_MAX = 4
+SUNDAY_OFFSET = 4          # 1970-01-01（木曜）から直前の日曜までの日数
+WEEKDAYS = (1, 2, 3, 4, 5)  # (日番号 + SUNDAY_OFFSET) % 7 の月〜金
+COLUMNS = ['eid', 'user', 's', 'e', 'hours', 'week', 'schedule_label', 'priority']
+
+
+def week_of(day):
+    """日番号（1970-01-01 からの日数, ndarray 可）→ その週の日曜の日番号"""
+    return day - (day + SUNDAY_OFFSET) % 7
+
+
+def weekday_of(day):
+    """0: 日曜 … 6: 土曜"""
+    return (day + SUNDAY_OFFSET) % 7
+
+
+def day_number(d):
+    return timezones.wall_day(d) // 86400
+
+
+def _explode(events_data, tz):
+    """イベント → 参加者ごとの行（s / e は wall 秒、week は週の日曜の日番号）"""
+    events = [ev for ev in events_data or [] if ev.get('attendees')]
+    if not events:
+        return pd.DataFrame({c: pd.Series(dtype='int64' if c in ('s', 'e', 'week') else
+                                          'float64' if c == 'hours' else 'object') for c in COLUMNS})
+    s = np.array([timezones.iso_epoch(ev['start'], tz) for ev in events], dtype=np.int64)
+    e = np.array([timezones.iso_epoch(ev['end'], tz) for ev in events], dtype=np.int64)
+    table = timezones.OffsetTable(tz, int(s.min()) - 86400, int(e.max()) + 86400)
+    bounds, offsets = np.array(table.bounds, dtype=np.int64), np.array(table.offsets, dtype=np.int64)
+    s_wall = s + offsets[np.maximum(np.searchsorted(bounds, s, side='right') - 1, 0)]
+    e_wall = e + offsets[np.maximum(np.searchsorted(bounds, e, side='right') - 1, 0)]
+    counts = np.array([len(ev['attendees']) for ev in events])
+    rep = lambda a: np.repeat(a, counts)  # noqa: E731
+    return pd.DataFrame({
+        'eid': rep(np.array([ev['id'] for ev in events], dtype=object)),
+        'user': np.array([u for ev in events for u in ev['attendees']], dtype=object),
+        's': rep(s_wall),
+        'e': rep(e_wall),
+        'hours': rep((e - s) / 3600.0),
+        'week': rep(week_of(s_wall // 86400)),
+        'schedule_label': rep(np.array([ev.get('schedule_label', '予定あり') for ev in events], dtype=object)),
+        'priority': rep(np.array([ev.get('priority', '中') for ev in events], dtype=object)),
+    })
+
+
+def _pieces(rows, start_sec, span_sec):
+    """参加者ごとの行 → 稼働時間帯で切り出した区間 (eid, user, day, ps, pe)
+
+    夜勤（終了が翌日）の時間帯は前日の枠に入るので、開始日の前日から終了日までの枠と重ねる。
+    """
+    out = []
+    if len(rows):
+        s_day = rows['s'].to_numpy() // 86400
+        n_days = (rows['e'].to_numpy() - 1) // 86400 - s_day + 2
+        for k in range(int(n_days.max()) + 1):
+            day = s_day - 1 + k
+            ws = day * 86400 + start_sec
+            ps = np.maximum(rows['s'].to_numpy(), ws)
+            pe = np.minimum(rows['e'].to_numpy(), ws + span_sec)
+            keep = pe > ps
+            out.append(pd.DataFrame({'eid': rows['eid'].to_numpy()[keep], 'user': rows['user'].to_numpy()[keep],
+                                     'day': day[keep], 'ps': ps[keep], 'pe': pe[keep]}))
+    if not out:
+        return pd.DataFrame({'eid': pd.Series(dtype=object), 'user': pd.Series(dtype=object),
+                             'day': pd.Series(dtype='int64'), 'ps': pd.Series(dtype='int64'),
+                             'pe': pd.Series(dtype='int64')})
+    return pd.concat(out, ignore_index=True)
+
+
+def _busy(pieces):
+    """区間を ユーザー×日 ごとに併合した長さ（時間）。開始順に並べ、それまでの終了の最大値より後ろだけを数える"""
+    if not len(pieces):
+        return pd.Series(dtype='float64', index=pd.MultiIndex.from_arrays([[], []], names=['user', 'day']))
+    p = pieces.sort_values(['user', 'day', 'ps'], kind='mergesort')
+    keys = [p['user'], p['day']]
+    reach = p['pe'].groupby(keys).cummax().groupby(keys).shift()
+    start = np.maximum(p['ps'].to_numpy(), reach.fillna(np.iinfo(np.int64).min).to_numpy(dtype=np.int64))
+    length = np.clip(p['pe'].to_numpy() - start, 0, None)
+    return pd.Series(length / 3600.0, index=p.index).groupby(keys).sum()
+
+
+def _sum(rows, keys):
+    if not len(rows):
+        return pd.Series(dtype='float64', index=pd.MultiIndex.from_arrays([[]] * len(keys), names=keys))
+    return rows.groupby(keys)['hours'].sum()
+
+
+def _apply(series, before, after, keys):
+    """集計 series から before の分を引き after の分を足した新しい Series（0 になったセルは除く）"""
+    out = series.add(_sum(after, keys), fill_value=0).sub(_sum(before, keys), fill_value=0)
+    return out[out.abs() > 1e-9]
+
+
+class Aggregates:
+    def __init__(self, tz, start_h, end_h, key=None):
+        self.tz = tz
+        self.start_h = start_h
+        self.end_h = end_h
+        self.key = key
+        self.start_sec = start_h * 3600
+        self.span_sec = geometry.span_hours(start_h, end_h) * 3600
+        self.weekly = None      # (user, week) → 時間
+        self.by_label = None    # (user, week, schedule_label) → 時間
+        self.by_priority = None  # (user, week, priority) → 時間
+        self.pieces = None      # 稼働時間帯で切り出した区間
+        self.busy = None        # (user, day) → 稼働時間帯内で埋まっている時間
+
+    @classmethod
+    def build(cls, events_data, tz, start_h, end_h, key=None):
+        agg = cls(tz, start_h, end_h, key)
+        rows = _explode(events_data, tz)
+        agg.weekly = _sum(rows, ['user', 'week'])
+        agg.by_label = _sum(rows, ['user', 'week', 'schedule_label'])
+        agg.by_priority = _sum(rows, ['user', 'week', 'priority'])
+        agg.pieces = _pieces(rows, agg.start_sec, agg.span_sec)
+        agg.busy = _busy(agg.pieces)
+        return agg
+
+    def derive(self, changes, key):
+        """changes {id: (変更前, 変更後)} を反映した新しい版"""
+        agg = Aggregates(self.tz, self.start_h, self.end_h, key)
+        before = _explode([b for b, _ in changes.values() if b is not None], self.tz)
+        after = _explode([a for _, a in changes.values() if a is not None], self.tz)
+        agg.weekly = _apply(self.weekly, before, after, ['user', 'week'])
+        agg.by_label = _apply(self.by_label, before, after, ['user', 'week', 'schedule_label'])
+        agg.by_priority = _apply(self.by_priority, before, after, ['user', 'week', 'priority'])
+        added = _pieces(after, self.start_sec, self.span_sec)
+        changed = self.pieces['eid'].isin(list(changes)).to_numpy()
+        removed, kept = self.pieces[changed], self.pieces[~changed]
+        agg.pieces = pd.concat([kept, added], ignore_index=True) if len(added) else kept
+        # 影響のあった ユーザー×日 だけ併合し直す
+        cells = set(zip(removed['user'], removed['day'])) | set(zip(added['user'], added['day']))
+        if cells:
+            users = {u for u, _ in cells}
+            sub = agg.pieces[agg.pieces['user'].isin(list(users))]
+            sub = sub[[c in cells for c in zip(sub['user'], sub['day'])]]
+            index = pd.MultiIndex.from_tuples(sorted(cells), names=['user', 'day'])
+            agg.busy = pd.concat([self.busy[~self.busy.index.isin(index)], _busy(sub)]).sort_index()
+        else:
+            agg.busy = self.busy
+        return agg
+
+    # --- 参照 ---
+    def weekly_hours(self, users, first_week, weeks):
+        """ユーザー×週 の予定時間（DataFrame, 列は週の日曜の日番号）"""
+        cols = [first_week + 7 * i for i in range(weeks)]
+        if not len(self.weekly):
+            return pd.DataFrame(0.0, index=users, columns=cols)
+        table = self.weekly.unstack('week', fill_value=0.0)
+        return table.reindex(index=users, columns=cols, fill_value=0.0)
+
+    def breakdown(self, users, first_week, weeks, field):
+        """期間内の ラベル / 優先度 → 予定時間"""
+        series = self.by_label if field == 'schedule_label' else self.by_priority
+        if not len(series):
+            return pd.Series(dtype='float64')
+        user_ix = series.index.get_level_values('user')
+        week_ix = series.index.get_level_values('week')
+        mask = user_ix.isin(users) & (week_ix >= first_week) & (week_ix < first_week + 7 * weeks)
+        return series[mask].groupby(level=field).sum().sort_values(ascending=False)
+
+    def utilization(self, users, first_week, weeks):
+        """期間内の平日の稼働時間帯について (埋まっている時間, 稼働可能な時間)"""
+        days = np.arange(first_week, first_week + 7 * weeks)
+        workdays = days[np.isin(weekday_of(days), WEEKDAYS)]
+        capacity = len(users) * len(workdays) * self.span_sec / 3600.0
+        if not len(self.busy) or not users:
+            return 0.0, capacity
+        user_ix = self.busy.index.get_level_values('user')
+        day_ix = self.busy.index.get_level_values('day')
+        return float(self.busy[user_ix.isin(users) & day_ix.isin(workdays)].sum()), capacity
+
+
+_aggregates = OrderedDict()
+_lock = threading.Lock()
+
+
+def _store(key, agg):
+    _aggregates[key] = agg
+    _aggregates.move_to_end(key)
+    while len(_aggregates) > ANALYTICS_CACHE_MAX:
+        _aggregates.popitem(last=False)
+
+
+def aggregates_for(events_data, tz, start_h, end_h, key=None):
+    """イベント一覧・表示タイムゾーン・稼働時間帯に対応する集計（key は event_index のフィンガープリント）"""
+    key = event_index.fingerprint(events_data) if key is None else key
+    cache_key = (key, tz.key, start_h, end_h)
+    with _lock:
+        agg = _aggregates.get(cache_key)
+        if agg is not None:
+            _aggregates.move_to_end(cache_key)
+            return agg
+    agg = Aggregates.build(events_data, tz, start_h, end_h, key)
+    with _lock:
+        _store(cache_key, agg)
+    return agg
+
+
+def _on_change(before_key, after_key, changes):
+    with _lock:
+        sources = [(k, agg) for k, agg in _aggregates.items() if k[0] == before_key]
+    for k, agg in sources:
+        derived = agg.derive(changes, after_key)
+        with _lock:
+            _store((after_key,) + k[1:], derived)
+
+
+def cache_clear():
+    with _lock:
+        _aggregates.clear()
+
+
+event_index.on_change(_on_change)
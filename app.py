@@ -1,27 +1,80 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html, Input, Output, State, ALL
-import pandas as pd
+from dash import dcc, html, callback, Input, Output, State, ALL
+from flask import request, jsonify, has_request_context
 from datetime import datetime, timedelta
-import pytz
 import uuid
 import re
-import copy
+import calendar
 import json
+import os
+import sys
+import heapq
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import bulk_edit
+import config as app_config
+import day_summary
+import event_index
+import event_search
+import freebusy
+import geometry
+import instrumentation
+import journal
+import membership
+import payload_guard
+import reminders
+import rescheduler
+import revisions
+import scheduler
+import serving
+import session_cache
+import timezones
+import user_directory
 
 # --- Config ---
-TZ = pytz.timezone('Asia/Tokyo')
-app = dash.Dash(__name__, 
-                external_stylesheets=[dbc.themes.BOOTSTRAP],
-                assets_folder='static',
-                suppress_callback_exceptions=True)
-
-START_H = 8
-END_H = 20
-TOTAL_MIN = (END_H - START_H) * 60
-PX_PER_MIN = 1
-GRID_CELL_MIN = 15
-HIST_MAX = 50  # Undo履歴の最大数
+# TZ / START_H / END_H / GRID_CELL_MIN / HIST_MAX などは config.load_config()（環境変数・設定ファイル）から読む
+def apply_config(cfg):
+    """設定をモジュール定数へ反映する"""
+    global CONFIG, APP_ENV, PRODUCTION, TZ, START_H, END_H, TOTAL_MIN, PX_PER_MIN, GRID_CELL_MIN, HIST_MAX
+    CONFIG = cfg
+    APP_ENV = cfg['APP_ENV']
+    PRODUCTION = APP_ENV == 'production'
+    TZ = timezones.get_zone(cfg['TZ'])  # 既定の表示タイムゾーン（ユーザーごとの設定がない場合）
+    START_H = cfg['START_H']
+    END_H = cfg['END_H']
+    TOTAL_MIN = geometry.span_hours(START_H, END_H) * 60  # END_H ≦ START_H は翌日まで（夜勤）
+    PX_PER_MIN = cfg['PX_PER_MIN']
+    GRID_CELL_MIN = cfg['GRID_CELL_MIN']
+    HIST_MAX = cfg['HIST_MAX']
+
+apply_config(app_config.load_config())
+SESSIONS = None  # create_app() で生成するサーバー側セッションキャッシュ
+LANE_CACHE_MAX = 512  # レーン割り当てキャッシュ（日×イベント集合）の最大数
+AGENDA_WINDOW_DAYS = 14  # 予定リストで1回に取得する日数
+AGENDA_MAX_DAYS = 92     # 予定リストAPIで1回に要求できる最大日数
+MONTH_CELL_MAX_BADGES = 3  # 月表示の1セルに描画するイベント数の上限（超過分は「+K件」）
+MONTH_MAX_SPAN_LANES = 2   # 月表示の週ごとの複数日バーの最大段数
+MONTH_SPAN_TOP_PX = 40     # 複数日バーの描画開始位置（日付の下）
+MONTH_SPAN_BAR_PX = 22     # 複数日バー1段の高さ
+MONTH_VIEW_CACHE_MAX = 24  # 描画済み月表示（サマリー表の版×年月）のキャッシュ数
+PREFETCH_POOL = None       # 前後の月を先読みするスレッド（初回の月表示で生成）
+ANALYTICS_WEEK_CHOICES = (4, 12, 26, 52)  # 分析の集計期間（週）
+ANALYTICS_OVERBOOKED_H = 40               # 週あたりの予定時間がこれを超えたら強調表示
+SCHEDULER_DURATIONS = (15, 30, 45, 60, 90, 120)  # 会議の自動配置で選べる所要時間（分）
+SCHEDULER_WINDOW_DAYS = 14                       # 自動配置の探索範囲の既定（今日から）
+SCHEDULER_BATCH_MAX = 500                        # 一括配置APIで1回に受け付ける会議数
+FREEBUSY_MAX_AGE = 30  # 空き時間情報APIのレスポンスをクライアントがキャッシュしてよい秒数（以降は ETag で再検証）
+USER_DROPDOWNS = ('event-attendees', 'search-attendees', 'scheduler-attendees', 'scheduler-optional',
+                  'bulk-add-attendees', 'bulk-remove-attendees', 'group-members-input')  # 候補をサーバーから引くユーザー選択
+GROUP_MEMBERS_SHOWN = 5  # グループ一覧に名前を表示するメンバー数（残りは「他N人」）
+AUDIT_MAX_LIMIT = 1000   # 変更履歴APIで1回に返す最大件数
+REVISION_LIST_LIMIT = 50  # 版の履歴モーダルの選択肢に並べる最近の版の数
+REVISION_DIFF_SHOWN = 20  # 版の履歴モーダルに表示する現在との差分の件数（残りは件数のみ）
+REVISION_ACTIONS = {'create': '作成', 'update': '編集', 'delete': '削除', 'move': '移動', 'undo': 'Undo',
+                    'redo': 'Redo', 'reschedule': '優先度で再配置', 'bulk_edit': '一括編集',
+                    'bulk_delete': '一括削除', 'delete_user': 'ユーザー削除'}  # ジャーナルの action の表示名
 
 # 優先度の色設定 (Atlassianデザインシステム準拠)
 PRIORITY_COLORS = {
@@ -59,26 +112,70 @@ groups_init = [
 ]
 
 # --- Helpers ---
-def parse_iso(s: str) -> datetime:
-    return datetime.fromisoformat(s).astimezone(TZ)
-
-def round_to_grid(dt: datetime, up=False) -> datetime:
-    rem = dt.minute % GRID_CELL_MIN
-    dt2 = dt + timedelta(minutes=(GRID_CELL_MIN - rem) % GRID_CELL_MIN) if up else dt - timedelta(minutes=rem)
+def parse_iso(s: str, tz=None) -> datetime:
+    return datetime.fromisoformat(s).astimezone(tz or TZ)
+
+def user_tz(users_data, user_id):
+    """ユーザーの表示タイムゾーン名（未設定・"all" の場合は既定）"""
+    user = next((u for u in users_data or [] if u['id'] == user_id), None)
+    return (user or {}).get('tz') or CONFIG['TZ']
+
+def view_hours(users_data, user_id, full_day=False):
+    """週ビューの表示時間帯とグリッド（ユーザー設定 > アプリ設定）。full_day で24時間表示"""
+    user = next((u for u in users_data or [] if u['id'] == user_id), None) or {}
+    hours = {'start_h': user.get('start_h', START_H), 'end_h': user.get('end_h', END_H),
+             'grid_min': user.get('grid_min', GRID_CELL_MIN)}
+    if full_day:
+        hours.update(start_h=0, end_h=24)
+    return hours
+
+def view_geometry(hours=None):
+    """表示時間帯の設定 → キャッシュ済みのジオメトリ"""
+    hours = hours or {}
+    return geometry.geometry(hours.get('start_h', START_H), hours.get('end_h', END_H),
+                             PX_PER_MIN, hours.get('grid_min', GRID_CELL_MIN))
+
+def wall_to_utc(value, tz, up=None, grid=None):
+    """フォーム/ドラッグの壁時計 'YYYY-MM-DDTHH:MM' → UTC。up を指定するとグリッドに丸める"""
+    naive = datetime.strptime(value, '%Y-%m-%dT%H:%M')
+    if up is not None:
+        naive = round_to_grid(naive, up=up, grid=grid)
+    return timezones.localize(naive, tz).astimezone(timezones.UTC)
+
+def round_to_grid(dt: datetime, up=False, grid=None) -> datetime:
+    grid = grid or GRID_CELL_MIN
+    rem = dt.minute % grid
+    dt2 = dt + timedelta(minutes=(grid - rem) % grid) if up else dt - timedelta(minutes=rem)
     return dt2.replace(second=0, microsecond=0)
 
 def month_range(year, month):
     first_day = datetime(year, month, 1)
-    last_day = first_day + pd.offsets.MonthEnd(1)
+    last_day = datetime(year, month, calendar.monthrange(year, month)[1])
     days_back = (first_day.weekday() + 1) % 7     # Sun start
     start_date = first_day - timedelta(days=days_back)
     days_fwd = (5 - last_day.weekday()) % 7       # Sat end
     end_date = last_day + timedelta(days=days_fwd)
     return start_date, end_date
 
-def generate_month_view(year, month, events_data):
+def month_badge_style(priority):
+    priority_color = PRIORITY_COLORS.get(priority, PRIORITY_COLORS['中'])
+    return {
+        "backgroundColor": priority_color["bg"],
+        "color": priority_color["text"],
+        "fontSize": "11px",
+        "fontWeight": "500",
+        "borderRadius": "6px",
+        "border": "none"
+    }
+
+def generate_month_view(year, month, events_data, tz=None, table=None, today=None):
+    """月表示。セルあたりの描画数は MONTH_CELL_MAX_BADGES 件までに抑え、残りは「+K件」で要約する。
+    複数日イベントは週の行ごとに1本の横断バーとして描画する。
+    描画は日別サマリー表（day_summary）だけを読む。table を渡さない場合は events_data から取得する。"""
+    tz = tz or TZ
+    table = table or day_summary.table_for(events_data, tz)
     start_date, end_date = month_range(year, month)
-    date_range = pd.date_range(start_date, end_date, freq='D')
+    n_days = (end_date - start_date).days + 1
     header_style = {
         "backgroundColor": "#F4F5F7",
         "color": "#172B4D", 
@@ -89,56 +186,77 @@ def generate_month_view(year, month, events_data):
     }
     header = [html.Thead(html.Tr([html.Th(d, className="text-center", style=header_style) for d in
                                   ["日", "月", "火", "水", "木", "金", "土"]]))]
-    weeks, curr = [], []
-    today_d = datetime.now(TZ).date()
-
-    for day in date_range:
-        d_date = day.date()
-        badges = []
-        for ev in events_data:
-            s = parse_iso(ev['start']).date()
-            e = parse_iso(ev['end']).date()
-            if s <= d_date <= e:
-                priority = ev.get('priority', '中')
-                schedule_label = ev.get('schedule_label', '予定あり')
-                priority_color = PRIORITY_COLORS.get(priority, PRIORITY_COLORS['中'])
-                badge_style = {
-                    "backgroundColor": priority_color["bg"],
-                    "color": priority_color["text"],
-                    "fontSize": "11px",
-                    "fontWeight": "500",
-                    "borderRadius": "6px",
-                    "border": "none"
-                }
-                badges.append(html.Span(ev['title'], className="d-block mb-1 text-truncate badge", style=badge_style))
-
-        cell_cls = "p-3"
-        cell_style = {
-            "height": "130px", 
-            "verticalAlign": "top",
-            "backgroundColor": "#FAFBFC" if day.weekday() in [5, 6] else "#ffffff",
-            "border": "1px solid #DFE1E6",
-            "borderRadius": "0"  # テーブルセルなので角丸なし
-        }
-        if day.month != month: 
-            cell_style["backgroundColor"] = "#F4F5F7"
-            cell_style["color"] = "#6B778C"
-        if d_date == today_d:  
-            cell_style["border"] = "2px solid #0052CC"
-            cell_style["backgroundColor"] = "#E6FCFF"
-
-        curr.append(
-            html.Td(
-                html.Div(
-                    [html.Div(f"{day.day}", className="fw-bold"),
-                     html.Div(badges, className="mt-1")],
-                    id={'type': 'date-cell', 'date': day.strftime('%Y-%m-%d')},
-                    className="h-100", style={"cursor": "pointer"}
-                ),
-                className=cell_cls, style=cell_style
+    weeks = []
+    today_d = today or datetime.now(tz).date()
+    spans = [(sp['s_day'], sp['e_day'], sp) for sp in table.spans_between(start_date.date(), end_date.date())]
+
+    for w in range(n_days // 7):
+        week_days = [(start_date + timedelta(days=w * 7 + i)).date() for i in range(7)]
+        week_s, week_e = week_days[0], week_days[-1]
+
+        # 週の行に掛かる複数日イベント → 列区間 [開始列, 終了列+1) でレーン割り当て
+        segs = [{'s': (max(s_day, week_s) - week_s).days, 'e': (min(e_day, week_e) - week_s).days + 1, 'ev': ev}
+                for s_day, e_day, ev in spans if s_day <= week_e and e_day >= week_s]
+        segs, _ = assign_lanes(segs)
+        segs = [sg for sg in segs if sg['lane'] < MONTH_MAX_SPAN_LANES]
+        span_lanes = max([sg['lane'] + 1 for sg in segs] + [0])
+        shown = [0] * 7
+        span_bars = [[] for _ in range(7)]
+        for sg in segs:
+            for c in range(sg['s'], sg['e']): shown[c] += 1
+            ev, n_cols = sg['ev'], sg['e'] - sg['s']
+            span_bars[sg['s']].append(
+                html.Div(ev['title'], className="badge text-truncate month-span-bar month-event",
+                         title=ev['title'], **{"data-id": ev['id']},
+                         style={**month_badge_style(ev.get('priority', '中')),
+                                "position": "absolute", "zIndex": 1, "left": "4px",
+                                "top": f"{MONTH_SPAN_TOP_PX + sg['lane'] * MONTH_SPAN_BAR_PX}px",
+                                "width": f"calc({n_cols * 100}% - 8px)", "textAlign": "left"})
             )
-        )
-        if len(curr) == 7: weeks.append(html.Tr(curr)); curr = []
+
+        curr = []
+        for i, d_date in enumerate(week_days):
+            rec = table.day(d_date)
+            visible = rec.top(MONTH_CELL_MAX_BADGES - shown[i]) if rec else []
+            shown[i] += len(visible)
+            badges = [html.Span(ev['title'], className="d-block mb-1 text-truncate badge month-event",
+                                style=month_badge_style(ev.get('priority', '中')), **{"data-id": ev['id']})
+                      for ev in visible]
+            more = (rec.count if rec else 0) - shown[i]
+            if more > 0:
+                badges.append(html.Span(f"+{more}件", id={'type': 'month-more', 'date': d_date.strftime('%Y-%m-%d')},
+                                        className="d-block small month-more",
+                                        style={"cursor": "pointer", "color": "#0052CC", "fontWeight": "600"}))
+
+            cell_cls = "p-3"
+            cell_style = {
+                "height": "130px", 
+                "verticalAlign": "top",
+                "position": "relative",
+                "backgroundColor": "#FAFBFC" if d_date.weekday() in [5, 6] else "#ffffff",
+                "border": "1px solid #DFE1E6",
+                "borderRadius": "0"  # テーブルセルなので角丸なし
+            }
+            if d_date.month != month: 
+                cell_style["backgroundColor"] = "#F4F5F7"
+                cell_style["color"] = "#6B778C"
+            if d_date == today_d:  
+                cell_style["border"] = "2px solid #0052CC"
+                cell_style["backgroundColor"] = "#E6FCFF"
+
+            curr.append(
+                html.Td(
+                    span_bars[i] + [html.Div(
+                        [html.Div(f"{d_date.day}", className="fw-bold"),
+                         html.Div(badges, className="mt-1",
+                                  style={"marginTop": f"{span_lanes * MONTH_SPAN_BAR_PX}px"} if span_lanes else None)],
+                        id={'type': 'date-cell', 'date': d_date.strftime('%Y-%m-%d')},
+                        className="h-100", style={"cursor": "pointer"}
+                    )],
+                    className=cell_cls, style=cell_style
+                )
+            )
+        weeks.append(html.Tr(curr))
     body = [html.Tbody(weeks)]
     table_style = {
         "borderRadius": "8px",
@@ -151,6 +269,168 @@ def generate_month_view(year, month, events_data):
         style=table_style
     )
 
+@functools.lru_cache(maxsize=MONTH_VIEW_CACHE_MAX)
+def month_view_for(table, year, month, today):
+    """日別サマリー表の版ごとの月表示（表は作成後に書き換えないので、表オブジェクトをキーにできる）"""
+    return generate_month_view(year, month, None, table.tz, table=table, today=today)
+
+def adjacent_months(year, month):
+    prev_m = (year - 1, 12) if month == 1 else (year, month - 1)
+    next_m = (year + 1, 1) if month == 12 else (year, month + 1)
+    return prev_m, next_m
+
+def month_view(year, month, table):
+    """月表示を返し、前後の月をバックグラウンドで先読みしてキャッシュに載せる"""
+    today = datetime.now(table.tz).date()
+    comp = month_view_for(table, year, month, today)
+    global PREFETCH_POOL
+    if PREFETCH_POOL is None:
+        PREFETCH_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='month-prefetch')  # fork後に生成
+    for y, m in adjacent_months(year, month):
+        PREFETCH_POOL.submit(month_view_for, table, y, m, today)
+    return comp
+
+def day_event_list(events_data, date_str, tz=None):
+    """指定日の全イベント（「+K件」クリック時に遅延生成する一覧）"""
+    tz = tz or TZ
+    d = datetime.strptime(date_str, '%Y-%m-%d')
+    day_s = timezones.localize(d, tz)
+    evs = event_index.index_for(events_data, TZ).overlapping(day_s, timezones.localize(d + timedelta(days=1), tz))
+    if not evs:
+        return html.P("予定はありません", className="text-muted")
+    rows = []
+    for ev in evs:
+        s, e = parse_iso(ev['start'], tz), parse_iso(ev['end'], tz)
+        schedule_col = SCHEDULE_LABELS.get(ev.get('schedule_label', '予定あり'), SCHEDULE_LABELS['予定あり'])
+        rows.append(html.Li([
+            html.Span(f"{s.strftime('%m/%d %H:%M')}–{e.strftime('%m/%d %H:%M')}", className="me-2 text-muted small"),
+            html.Span(ev['title'], className="me-2 fw-bold"),
+            html.Span(ev.get('schedule_label', '予定あり'), className="badge me-1",
+                      style={"background": schedule_col["bg"], "color": schedule_col["text"]}),
+            html.Span(f"優先度:{ev.get('priority', '中')}", className="badge",
+                      style=month_badge_style(ev.get('priority', '中'))),
+        ], className="list-group-item"))
+    return html.Ul(rows, className="list-group")
+
+def run_search(idx, query, filters, date_from, date_to, tz, page=0, per_page=event_search.SEARCH_PAGE_SIZE):
+    """インデックス idx（event_index）のイベントを検索する。date_from / date_to（'YYYY-MM-DD', 両端を含む）は tz の日付で開始日を絞る
+
+    戻り値は (総件数, 行)。行の時刻は tz の壁時計。
+    """
+    index = event_search.index_for(idx.events, TZ, idx.key)
+    start_ts = int(timezones.localize(datetime.strptime(date_from, '%Y-%m-%d'), tz).timestamp()) if date_from else None
+    end_ts = (int(timezones.localize(datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1), tz).timestamp())
+              if date_to else None)
+    total, hits = index.search(query, filters, start_ts, end_ts, page, per_page)
+    rows = []
+    for s_ts, e_ts, ev in hits:
+        rows.append({'id': ev['id'], 'title': ev.get('title', ''),
+                     'start': datetime.fromtimestamp(s_ts, tz).strftime('%Y-%m-%dT%H:%M'),
+                     'end': datetime.fromtimestamp(e_ts, tz).strftime('%Y-%m-%dT%H:%M'),
+                     'priority': ev.get('priority', '中'),
+                     'schedule_label': ev.get('schedule_label', '予定あり'),
+                     'visibility': ev.get('visibility', 'public'),
+                     'location': ev.get('location', ''),
+                     'attendees': ev.get('attendees', [])})
+    return total, rows
+
+def scheduler_meeting(req, directory, tz):
+    """会議リクエスト（from / to は tz の日付 'YYYY-MM-DD', 両端を含む）→ scheduler 用の dict
+
+    group_id はメンバーシップインデックスでメンバーに展開して必須参加者に加える。
+    """
+    if req.get('group_id'):
+        req = {**req, 'attendees': list(req.get('attendees') or []) + list(directory.members(req['group_id'])),
+               'group_id': None}
+    d_from = datetime.strptime(req['from'], '%Y-%m-%d')
+    d_to = datetime.strptime(req['to'], '%Y-%m-%d') + timedelta(days=1)
+    start = int(timezones.localize(d_from, tz).timestamp())
+    end = int(timezones.localize(d_to, tz).timestamp())
+    return scheduler.normalize_request({**req, 'start': start, 'end': end, 'tz': tz}, default_tz=tz)
+
+def run_scheduler(idx, requests_data, users_data, groups_data, tz, batch=False, n=scheduler.SCHEDULE_TOP_N):
+    """インデックス idx（event_index）のイベントに対して会議を配置する
+
+    batch=False は先頭の会議の候補をスコア順に n 件、batch=True は全会議の配置（置けなければ None）を返す。
+    枠の時刻は tz の壁時計。
+    """
+    directory = membership.directory_for(users_data, groups_data)
+    meetings = [scheduler_meeting(r, directory, tz) for r in requests_data]
+    avail = scheduler.Availability(idx.events, tz, min(m['start'] for m in meetings), max(m['end'] for m in meetings),
+                                   users_data, START_H, END_H, GRID_CELL_MIN, idx.key)
+
+    def wall(slot):
+        return {**slot, 'start': datetime.fromtimestamp(slot['start'], tz).strftime('%Y-%m-%dT%H:%M'),
+                'end': datetime.fromtimestamp(slot['end'], tz).strftime('%Y-%m-%dT%H:%M')}
+    if batch:
+        return [wall(slot) if slot else None for slot in scheduler.schedule_batch(meetings, avail)]
+    return [wall(slot) for slot in scheduler.find_slots(meetings[0], avail, n)]
+
+def generate_analytics_view(agg, users_data, groups_data, group_id, first_week, weeks):
+    """分析ダッシュボード: ユーザー×週の予定時間、ラベル・優先度の内訳、グループごとの稼働率"""
+    directory = membership.directory_for(users_data, groups_data)
+    names = {uid: u['name'] for uid, u in directory.users.items()}
+    users = list(directory.members(group_id))
+    week_days = [timezones.wall_date((first_week + 7 * i) * 86400) for i in range(weeks)]
+    cell = {"fontSize": "12px", "padding": "4px 6px", "textAlign": "right", "whiteSpace": "nowrap"}
+
+    # ユーザー×週
+    table = agg.weekly_hours(users, first_week, weeks)
+    header = html.Thead(html.Tr([html.Th("ユーザー", style=cell)] +
+                                [html.Th(d.strftime('%m/%d'), style=cell) for d in week_days] +
+                                [html.Th("合計", style=cell)]))
+    rows = []
+    for uid, values in zip(users, table.to_numpy()):
+        tds = [html.Td(names[uid], style={**cell, "textAlign": "left"})]
+        for v in values:
+            over = v > ANALYTICS_OVERBOOKED_H
+            tds.append(html.Td(f"{v:.1f}" if v else "–",
+                               style={**cell, "backgroundColor": "#FFEBE6" if over else None,
+                                      "color": "#DE350B" if over else None, "fontWeight": "600" if over else None}))
+        tds.append(html.Td(f"{values.sum():.1f}", style={**cell, "fontWeight": "600"}))
+        rows.append(html.Tr(tds))
+    weekly = html.Div(dbc.Table([header, html.Tbody(rows)], bordered=True, size="sm", className="mb-0"),
+                      style={"overflowX": "auto", "maxHeight": "360px"})
+
+    def breakdown(field, colors):
+        series = agg.breakdown(users, first_week, weeks, field)
+        total = series.sum() or 1.0
+        return dbc.Table(html.Tbody([
+            html.Tr([html.Td(html.Span(k, className="badge", style={"background": colors.get(k, {}).get("bg", "#DFE1E6"),
+                                                                     "color": colors.get(k, {}).get("text", "#172B4D")})),
+                     html.Td(f"{v:.1f} 時間", style=cell), html.Td(f"{v / total:.0%}", style=cell)])
+            for k, v in series.items()
+        ]) if len(series) else html.Tbody(html.Tr(html.Td("予定はありません", className="text-muted"))),
+            size="sm", className="mb-0")
+
+    # グループごとの稼働率（平日の START_H–END_H）
+    util_rows = []
+    for g in groups_data or []:
+        members = directory.members(g['id'])
+        busy, capacity = agg.utilization(members, first_week, weeks)
+        ratio = busy / capacity if capacity else 0.0
+        util_rows.append(html.Tr([
+            html.Td(g['name'], style={**cell, "textAlign": "left"}),
+            html.Td(f"{len(members)}人", style=cell),
+            html.Td(f"{busy:.1f} / {capacity:.0f} 時間", style=cell),
+            html.Td(dbc.Progress(value=min(ratio * 100, 100), label=f"{ratio:.0%}",
+                                 color="danger" if ratio > 0.8 else "primary"), style={"minWidth": "160px"}),
+        ]))
+    window = f"{geometry.format_minute(agg.start_h * 60)}–{geometry.format_minute(agg.end_h * 60)}"
+    section = {"color": "#172B4D", "fontWeight": "600"}
+    return html.Div([
+        html.H6(f"ユーザー別の予定時間（時間/週, {ANALYTICS_OVERBOOKED_H}時間超を強調）", style=section),
+        weekly,
+        dbc.Row([
+            dbc.Col([html.H6("スケジュールラベル別", className="mt-4", style=section),
+                     breakdown('schedule_label', SCHEDULE_LABELS)], md=6),
+            dbc.Col([html.H6("優先度別", className="mt-4", style=section),
+                     breakdown('priority', PRIORITY_COLORS)], md=6),
+        ]),
+        html.H6(f"グループ別の稼働率（平日 {window} の埋まっている割合）", className="mt-4", style=section),
+        dbc.Table(html.Tbody(util_rows), size="sm", className="mb-0"),
+    ])
+
 def week_range_for_anchor(anchor: datetime):
     days_back = (anchor.weekday() + 1) % 7  # to Sun
     start = (anchor - timedelta(days=days_back)).replace(hour=0, minute=0, second=0, microsecond=0)
@@ -169,18 +449,46 @@ def format_japanese_date(d):
     return f"{weekdays[d.weekday()]}{d.strftime('%m/%d')}"
 
 def assign_lanes(day_items):
-    items = sorted(day_items, key=lambda x: x['s'])
-    lanes = []
+    """重なりクラスタ単位のレーン割り当て（終了時刻の最小ヒープによるスイープ, O(n log n)）
+
+    各アイテムに 'lane'（クラスタ内のレーン番号）と 'lanes'（そのクラスタのレーン数）を付与する。
+    重なりのないバーは全幅のまま描画できる。戻り値は (ソート済みアイテム, 最大レーン数)。
+    """
+    items = sorted(day_items, key=lambda x: (x['s'], x['e']))
+    busy, free = [], []     # busy: (終了時刻, レーン) / free: 再利用可能なレーン番号
+    cluster, width = [], 0
     for it in items:
-        for i, end in enumerate(lanes):
-            if it['s'] >= end:
-                it['lane'] = i
-                lanes[i] = it['e']; break
-        else:
-            it['lane'] = len(lanes); lanes.append(it['e'])
-    return items, max(1, len(lanes))
-
-def generate_week_bars(anchor_dt: datetime, events_data):
+        while busy and busy[0][0] <= it['s']:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if not busy:
+            # 直前のクラスタが閉じた → 幅を確定してレーン番号をリセット
+            for c in cluster: c['lanes'] = width
+            cluster, width, free = [], 0, []
+        it['lane'] = heapq.heappop(free) if free else width
+        width = max(width, it['lane'] + 1)
+        heapq.heappush(busy, (it['e'], it['lane']))
+        cluster.append(it)
+    for c in cluster: c['lanes'] = width
+    return items, max([1] + [it['lanes'] for it in items])
+
+@functools.lru_cache(maxsize=LANE_CACHE_MAX)
+def lane_layout(day_key, spans):
+    """(日付, ((id, 開始分, 終了分), ...)) → ((lane, lanes), ...)  ※入力順に対応
+
+    同じ日に同じイベント集合が再描画される場合（ナビゲーションやUndo/Redo）はキャッシュを再利用する。
+    """
+    items = [{'i': i, 's': s, 'e': e} for i, (_, s, e) in enumerate(spans)]
+    layout = [None] * len(items)
+    for it in assign_lanes(items)[0]:
+        layout[it['i']] = (it['lane'], it['lanes'])
+    return tuple(layout)
+
+def generate_week_bars(anchor_dt: datetime, events_data, tz=None, hours=None):
+    """週表示。イベントは UTC epoch のままウィンドウ検索し、オフセット表で壁時計の分に変換して配置する
+
+    hours（表示時間帯・グリッド）ごとの時間軸やピクセル換算は geometry でキャッシュ済みのものを使う。
+    """
+    geo = view_geometry(hours)
     week_start, _ = week_range_for_anchor(anchor_dt)
     days = [week_start + timedelta(days=i) for i in range(7)]
 
@@ -194,40 +502,47 @@ def generate_week_bars(anchor_dt: datetime, events_data):
         className="mb-2"
     )
 
-    time_labels = [html.Div(f"{h:02d}:00",
-                    style={"position":"absolute","top":f"{(h-START_H)*60*PX_PER_MIN}px",
-                           "right":0,"transform":"translateY(-50%)","fontSize":"12px"})
-                   for h in range(START_H, END_H+1)]
-    time_axis = html.Div(time_labels, style={"position":"relative","height":f"{TOTAL_MIN*PX_PER_MIN}px"})
+    time_axis = geo.time_axis()
+
+    # 週の可視投影：時刻は「週の開始からの壁時計の分」。夏時間の切り替わりはオフセット表が吸収する
+    first = days[0].date()
+    table = timezones.offset_table(tz or TZ, first, 7)
+    week_wall = timezones.wall_day(first)
+    # 各日の表示枠は [日の0:00 + start_min, 日の0:00 + end_min)。夜勤では翌日にはみ出す
+    vis_s, vis_e = geo.start_min, geo.end_min
+    projections = [[] for _ in days]
+    idx_ = event_index.index_for(events_data, TZ)
+    lo_ts = table.utc(week_wall + vis_s * 60)
+    hi_ts = table.utc(week_wall + (6 * 1440 + vis_e) * 60)
+    for s_ts, e_ts, ev in idx_.window(lo_ts, hi_ts):
+        ls = (table.local(s_ts) - week_wall) // 60
+        le = max((table.local(e_ts) - week_wall) // 60, ls + geo.grid_min)  # 時刻が戻る日（夏時間終了）でも最小幅を確保
+        for i in range(max((ls - vis_e) // 1440 + 1, 0), min(-((vis_s - le) // 1440) - 1, 6) + 1):
+            vs = max(ls - i * 1440, vis_s)
+            ve = min(le - i * 1440, vis_e)
+            if vs < ve:
+                projections[i].append({'id': ev['id'], 'title': ev['title'],
+                                       'priority': ev.get('priority','中'),
+                                       'schedule_label': ev.get('schedule_label','予定あり'),
+                                       's': geo.snap_down(vs), 'e': geo.snap_up(ve)})
 
     # 当日の可視投影→レーン割り当て→バー生成
     day_columns = []
     for idx, d in enumerate(days):
-        proj = []
-        for ev in events_data:
-            s, e = parse_iso(ev['start']), parse_iso(ev['end'])
-            if s.date() <= d.date() <= e.date():
-                vs = max(s, d.replace(hour=START_H, minute=0, second=0, microsecond=0))
-                ve = min(e, d.replace(hour=END_H, minute=0, second=0, microsecond=0))
-                if vs < ve:
-                    vs = round_to_grid(vs, up=False)
-                    ve = round_to_grid(ve, up=True)
-                    proj.append({'id': ev['id'], 'title': ev['title'],
-                                 'priority': ev.get('priority','中'),
-                                 'schedule_label': ev.get('schedule_label','予定あり'),
-                                 's': vs, 'e': ve})
-
-        items, lane_count = assign_lanes(proj)
-
-        bg = {"backgroundImage":"repeating-linear-gradient(to bottom, #FAFBFC 0px, #FAFBFC 59px, #DFE1E6 60px)",
-              "backgroundSize":"100% 60px"}
+        proj = projections[idx]
+        day_key = d.strftime('%Y-%m-%d')
+        day_wall = week_wall + idx * 86400
+        spans = tuple((p['id'], p['s'], p['e']) for p in proj)
+        for p, (lane, lanes) in zip(proj, lane_layout(day_key, spans)):
+            p['lane'], p['lanes'] = lane, lanes
+        items = sorted(proj, key=lambda x: (x['s'], x['e']))
 
         bars = []
         for it in items:
-            mins = (it['s'].hour - START_H)*60 + it['s'].minute
-            dur  = int((it['e'] - it['s']).total_seconds()//60)
-            top_px, height_px = mins*PX_PER_MIN, max(dur*PX_PER_MIN, 6)
-            lane_w = 100 / lane_count
+            mins = it['s'] - geo.start_min
+            dur  = it['e'] - it['s']
+            top_px, height_px = mins*geo.px_per_min, max(dur*geo.px_per_min, 6)
+            lane_w = 100 / it['lanes']
             left_pct = it['lane'] * lane_w
             width_calc = f"calc({lane_w:.6f}% - 6px)"
             priority_col = PRIORITY_COLORS.get(it['priority'], PRIORITY_COLORS['中'])
@@ -253,8 +568,10 @@ def generate_week_bars(anchor_dt: datetime, events_data):
                             "data-id": it['id'],
                             "data-day": d.strftime('%Y-%m-%d'),
                             "data-day-index": str(idx),
-                            "data-start": it['s'].isoformat(),
-                            "data-end": it['e'].isoformat(),
+                            "data-start": timezones.wall_iso(day_wall + it['s'] * 60),
+                            "data-end": timezones.wall_iso(day_wall + it['e'] * 60),
+                            "data-lane": str(it['lane']),
+                            "data-lanes": str(it['lanes']),
                         },
                         style={"position":"absolute","left":f"{left_pct:.6f}%","width":width_calc,
                                "top":f"{top_px}px","height":f"{height_px}px",
@@ -262,7 +579,7 @@ def generate_week_bars(anchor_dt: datetime, events_data):
                                "padding":"6px 8px 12px 8px","boxShadow":"0 2px 4px rgba(9, 30, 66, 0.08)",
                                "overflow":"hidden","cursor":"grab","userSelect":"none",
                                "borderLeft":f"4px solid {priority_col['bg']}", "border":"1px solid rgba(9, 30, 66, 0.04)"},
-                        title=f"{it['s'].strftime('%H:%M')}–{it['e'].strftime('%H:%M')} {it['title']} ({it['schedule_label']}, 優先度:{it['priority']})"
+                        title=f"{geometry.format_minute(it['s'])}–{geometry.format_minute(it['e'])} {it['title']} ({it['schedule_label']}, 優先度:{it['priority']})"
                     ),
                     style={"position":"absolute","inset":"0"}
                 )
@@ -273,7 +590,7 @@ def generate_week_bars(anchor_dt: datetime, events_data):
 
         day_columns.append(
             html.Div(
-                [html.Div(style={"position":"relative","height":f"{TOTAL_MIN*PX_PER_MIN}px", **bg},
+                [html.Div(style={"position":"relative","height":f"{geo.total_px}px", **geo.background},
                           children=bars+[plus_btn])],
                 className="day-col",
                 **{"data-day": d.strftime('%Y-%m-%d'), "data-index": str(idx)},
@@ -283,11 +600,30 @@ def generate_week_bars(anchor_dt: datetime, events_data):
             )
         )
 
-    grid = dbc.Row([dbc.Col(time_axis, width=1, style={"position":"relative"}),
-                    dbc.Col(html.Div(day_columns, style={"display":"flex"}), width=11)])
+    grid = html.Div(dbc.Row([dbc.Col(time_axis, width=1, style={"position":"relative"}),
+                             dbc.Col(html.Div(day_columns, style={"display":"flex"}), width=11)]),
+                    className="week-grid", **geo.data_attrs)
 
     return html.Div([header, grid])
 
+def generate_agenda_view(anchor_dt: datetime, events_data, tz_name=None, members=None):
+    """予定リストの枠だけを描画（行はcalendar.jsが/api/agendaからウィンドウ単位で取得・仮想化）
+
+    data-version は表示するイベント一覧（members のグループで絞った後）のインデックスの版。ここで作っておくので、
+    同じワーカーへの取得は版で引ける。data-members は取り直し（POST）で同じ絞り込みをするのに使う。
+    """
+    idx = event_index.index_for(events_data, TZ)
+    return html.Div(
+        html.Div(className="agenda-spacer"),
+        id="agenda-viewport", className="agenda-viewport",
+        **{"data-anchor": anchor_dt.strftime('%Y-%m-%d'),
+           "data-window-days": str(AGENDA_WINDOW_DAYS),
+           "data-api": "/api/agenda",
+           "data-tz": tz_name or CONFIG['TZ'],
+           "data-version": str(idx.key),
+           "data-members": json.dumps(list(members) if members is not None else None)}
+    )
+
 # --- LLM with commitment (簡易) ---
 def find_available_slots(users, events_data, date_start, date_end, duration_minutes=60):
     """指定されたユーザー間の空き時間を検索"""
@@ -295,11 +631,11 @@ def find_available_slots(users, events_data, date_start, date_end, duration_minu
     
     # 各日をチェック
     current_date = date_start.replace(hour=START_H, minute=0, second=0, microsecond=0)
-    end_date = date_end.replace(hour=END_H, minute=0, second=0, microsecond=0)
+    end_date = date_end
     
     while current_date.date() <= end_date.date():
         day_start = current_date.replace(hour=START_H, minute=0)
-        day_end = current_date.replace(hour=END_H, minute=0)
+        day_end = day_start + timedelta(minutes=TOTAL_MIN)
         
         # その日のユーザーの予定を取得
         user_events = []
@@ -342,9 +678,9 @@ def find_available_slots(users, events_data, date_start, date_end, duration_minu
     
     return available_slots
 
-def dummy_llm_api(text):
+def dummy_llm_api(text, tz=None):
     text_l = text.lower()
-    now = datetime.now(TZ)
+    now = datetime.now(tz or TZ)
     title = "New Event"
     start_dt = now.replace(second=0, microsecond=0)
     duration = timedelta(hours=1)
@@ -380,68 +716,116 @@ def dummy_llm_api(text):
     return {"title": title, "start": start_dt.strftime('%Y-%m-%dT%H:%M'),
             "end": end_dt.strftime('%Y-%m-%dT%H:%M'), "priority": priority, "schedule_label": schedule_label}
 
+def timezone_options(extra=None):
+    """ユーザー設定のタイムゾーン選択肢（既定と現在値が一覧になければ加える）"""
+    names = list(timezones.TZ_CHOICES)
+    for name in (CONFIG['TZ'], extra):
+        if name and name not in names:
+            names.insert(0, name)
+    return [{"label": n, "value": n} for n in names]
+
+def format_hours(hours):
+    """表示時間帯の説明（例: '22:00–翌06:00 / 15分'）"""
+    span = geometry.span_hours(hours['start_h'], hours['end_h'])
+    end = f"翌{hours['end_h'] % 24:02d}:00" if hours['start_h'] + span > 24 else f"{hours['end_h']:02d}:00"
+    if span == 24 and hours['start_h'] == 0:
+        end = "24:00"
+    return f"{hours['start_h']:02d}:00–{end} / {hours['grid_min']}分"
+
+def user_hours_inputs(hours):
+    """ユーザーフォームの表示時間帯・グリッド入力（終了≦開始は翌日まで＝夜勤）"""
+    return [
+        dbc.Row([
+            dbc.Col([dbc.Label("表示開始", className="mt-3"),
+                     dcc.Dropdown(id="user-start-h-input", clearable=False, value=hours['start_h'],
+                                  options=[{"label": f"{h:02d}:00", "value": h} for h in range(24)])], md=4),
+            dbc.Col([dbc.Label("表示終了", className="mt-3"),
+                     dcc.Dropdown(id="user-end-h-input", clearable=False, value=hours['end_h'],
+                                  options=[{"label": f"{h:02d}:00", "value": h} for h in range(25)])], md=4),
+            dbc.Col([dbc.Label("グリッド", className="mt-3"),
+                     dcc.Dropdown(id="user-grid-input", clearable=False, value=hours['grid_min'],
+                                  options=[{"label": f"{m}分", "value": m} for m in geometry.GRID_CHOICES])], md=4),
+        ]),
+        html.Small("終了が開始以前の場合は翌日まで表示します（夜勤）", className="text-muted"),
+    ]
+
 # --- Modal ---
+# イベントモーダルの入力欄（コンポーネントID → 新規作成時の値）。event-form ストアはこの形で値を持つ
+EVENT_FORM_DEFAULTS = {
+    'event-title': "", 'event-start-date': "", 'event-end-date': "",
+    'event-priority': "中", 'event-schedule-label': "予定あり", 'event-visibility': "public",
+    'event-location': "", 'event-attendees': [], 'event-notes': "",
+    'event-reminders': list(reminders.REMINDER_DEFAULT), 'allow-double-booking': [],
+}
+
+def create_event_body(form):
+    return [
+        dbc.Alert(id="modal-error", color="danger", is_open=False, className="mb-3"),
+        html.Div(id="conflict-plan-preview"),
+        dbc.Form([
+            dbc.Label("タイトル", style={"fontWeight": "600", "color": "#172B4D", "marginBottom": "8px"}),
+            dbc.Input(type="text", id="event-title", value=form['event-title'], placeholder="イベントタイトルを入力",
+                     style={"borderRadius": "6px", "border": "2px solid #DFE1E6"}),
+            dbc.Row([
+                dbc.Col([dbc.Label("開始時刻", className="mt-3"),
+                         dbc.Input(type="datetime-local", id="event-start-date", value=form['event-start-date'])], md=6),
+                dbc.Col([dbc.Label("終了時刻", className="mt-3"),
+                         dbc.Input(type="datetime-local", id="event-end-date", value=form['event-end-date'])], md=6),
+            ]),
+            dbc.Row([
+                dbc.Col([
+                    dbc.Label("優先度", className="mt-3"),
+                    dcc.Dropdown(id="event-priority",
+                               options=[{"label":"最高","value":"最高"},{"label":"高","value":"高"},{"label":"中","value":"中"},{"label":"低","value":"低"}],
+                               value=form['event-priority'], clearable=False)
+                ], md=4),
+                dbc.Col([
+                    dbc.Label("スケジュールラベル", className="mt-3"),
+                    dcc.Dropdown(id="event-schedule-label",
+                               options=[{"label":k,"value":k} for k in SCHEDULE_LABELS.keys()],
+                               value=form['event-schedule-label'], clearable=False)
+                ], md=4),
+                dbc.Col([
+                    dbc.Label("公開設定", className="mt-3"),
+                    dcc.Dropdown(id="event-visibility",
+                               options=[{"label":"公開","value":"public"},{"label":"非公開","value":"private"}],
+                               value=form['event-visibility'], clearable=False)
+                ], md=4),
+            ]),
+            dbc.Row([
+                dbc.Col([
+                    dbc.Label("場所", className="mt-3"),
+                    dbc.Input(id="event-location", type="text", value=form['event-location'], placeholder="場所を入力")
+                ], md=6),
+                dbc.Col([
+                    dbc.Label("参加者", className="mt-3"),
+                    dcc.Dropdown(id="event-attendees", multi=True, value=form['event-attendees'], placeholder="参加者を選択")
+                ], md=6),
+            ]),
+            dbc.Label("ノート", className="mt-3"),
+            dbc.Textarea(id="event-notes", value=form['event-notes'], placeholder="ノートを入力", style={"height": "80px"}),
+            dbc.Label("リマインダー", className="mt-3"),
+            dcc.Dropdown(id="event-reminders", multi=True, value=form['event-reminders'], placeholder="通知しない",
+                         options=[{"label": reminder_label(m), "value": m}
+                                  for m in reminders.REMINDER_CHOICES]),
+            dbc.Row([
+                dbc.Col([
+                    dbc.Checklist(
+                        id="allow-double-booking",
+                        options=[{"label": "ダブルブッキングを許可", "value": "allow"}],
+                        value=form['allow-double-booking']
+                    )
+                ], className="mt-3")
+            ]),
+        ])
+    ]
+
+# 本文（入力欄）は初回オープン時に EVENT_FORM_DEFAULTS の形の値で生成する（open_event_modal）
 def create_event_modal():
     return dbc.Modal(
         [
             dbc.ModalHeader(dbc.ModalTitle("イベントの作成・編集")),
-            dbc.ModalBody(
-                [
-                    dbc.Alert(id="modal-error", color="danger", is_open=False, className="mb-3"),
-                    dbc.Form([
-                        dbc.Label("タイトル", style={"fontWeight": "600", "color": "#172B4D", "marginBottom": "8px"}),
-                        dbc.Input(type="text", id="event-title", placeholder="イベントタイトルを入力", 
-                                 style={"borderRadius": "6px", "border": "2px solid #DFE1E6"}),
-                        dbc.Row([
-                            dbc.Col([dbc.Label("開始時刻", className="mt-3"),
-                                     dbc.Input(type="datetime-local", id="event-start-date")], md=6),
-                            dbc.Col([dbc.Label("終了時刻", className="mt-3"),
-                                     dbc.Input(type="datetime-local", id="event-end-date")], md=6),
-                        ]),
-                        dbc.Row([
-                            dbc.Col([
-                                dbc.Label("優先度", className="mt-3"),
-                                dcc.Dropdown(id="event-priority",
-                                           options=[{"label":"最高","value":"最高"},{"label":"高","value":"高"},{"label":"中","value":"中"},{"label":"低","value":"低"}],
-                                           value="中", clearable=False)
-                            ], md=4),
-                            dbc.Col([
-                                dbc.Label("スケジュールラベル", className="mt-3"),
-                                dcc.Dropdown(id="event-schedule-label",
-                                           options=[{"label":k,"value":k} for k in SCHEDULE_LABELS.keys()],
-                                           value="予定あり", clearable=False)
-                            ], md=4),
-                            dbc.Col([
-                                dbc.Label("公開設定", className="mt-3"),
-                                dcc.Dropdown(id="event-visibility",
-                                           options=[{"label":"公開","value":"public"},{"label":"非公開","value":"private"}],
-                                           value="public", clearable=False)
-                            ], md=4),
-                        ]),
-                        dbc.Row([
-                            dbc.Col([
-                                dbc.Label("場所", className="mt-3"),
-                                dbc.Input(id="event-location", type="text", placeholder="場所を入力")
-                            ], md=6),
-                            dbc.Col([
-                                dbc.Label("参加者", className="mt-3"),
-                                dcc.Dropdown(id="event-attendees", multi=True, placeholder="参加者を選択")
-                            ], md=6),
-                        ]),
-                        dbc.Label("ノート", className="mt-3"),
-                        dbc.Textarea(id="event-notes", placeholder="ノートを入力", style={"height": "80px"}),
-                        dbc.Row([
-                            dbc.Col([
-                                dbc.Checklist(
-                                    id="allow-double-booking",
-                                    options=[{"label": "ダブルブッキングを許可", "value": "allow"}],
-                                    value=[]
-                                )
-                            ], className="mt-3")
-                        ]),
-                    ])
-                ]
-            ),
+            dbc.ModalBody(id="event-modal-body"),
             dbc.ModalFooter([
                 dbc.Button("削除", id="delete-event-button", color="danger", outline=True, disabled=True, className="me-auto"),
                 dbc.Button("キャンセル", id="cancel-event-button", color="secondary"),
@@ -451,28 +835,27 @@ def create_event_modal():
         style={"boxShadow": "0 8px 16px rgba(9, 30, 66, 0.25)", "border": "none"}
     )
 
-def create_date_picker_modal():
+# モーダルは外枠（開閉ボタンを含む）だけを初期レイアウトに置き、本文は初回オープン時に生成する
+def create_date_picker_body(year, month):
     current_year = datetime.now(TZ).year
-    years = [{"label": str(y), "value": y} for y in range(current_year - 5, current_year + 6)]
+    years = [{"label": str(y), "value": y} for y in range(min(year, current_year - 5), max(year, current_year + 5) + 1)]
     months = [{"label": f"{i}月", "value": i} for i in range(1, 13)]
-    
+    return dbc.Row([
+        dbc.Col([
+            dbc.Label("年", className="mb-2"),
+            dcc.Dropdown(id="year-select", options=years, value=year, clearable=False)
+        ], md=6),
+        dbc.Col([
+            dbc.Label("月", className="mb-2"), 
+            dcc.Dropdown(id="month-select", options=months, value=month, clearable=False)
+        ], md=6),
+    ])
+
+def create_date_picker_modal():
     return dbc.Modal(
         [
             dbc.ModalHeader(dbc.ModalTitle("年月選択")),
-            dbc.ModalBody(
-                [
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Label("年", className="mb-2"),
-                            dcc.Dropdown(id="year-select", options=years, value=current_year, clearable=False)
-                        ], md=6),
-                        dbc.Col([
-                            dbc.Label("月", className="mb-2"), 
-                            dcc.Dropdown(id="month-select", options=months, value=datetime.now(TZ).month, clearable=False)
-                        ], md=6),
-                    ])
-                ]
-            ),
+            dbc.ModalBody(id="date-picker-body"),
             dbc.ModalFooter([
                 dbc.Button("キャンセル", id="cancel-date-button", color="secondary"),
                 dbc.Button("移動", id="jump-date-button", color="primary"),
@@ -480,194 +863,726 @@ def create_date_picker_modal():
         ], id="date-picker-modal", is_open=False
     )
 
+def create_day_events_modal():
+    return dbc.Modal(
+        [
+            dbc.ModalHeader(dbc.ModalTitle(id="day-events-title")),
+            dbc.ModalBody(html.Div(id="day-events-body")),
+            dbc.ModalFooter([
+                dbc.Button("閉じる", id="close-day-events-button", color="secondary"),
+            ]),
+        ], id="day-events-modal", is_open=False, scrollable=True
+    )
+
+def create_user_management_body():
+    return [
+        dbc.Tabs([
+            dbc.Tab(label="ユーザー一覧", tab_id="user-list-tab"),
+            dbc.Tab(label="新規追加", tab_id="user-add-tab"),
+            dbc.Tab(label="編集", tab_id="user-edit-tab"),
+        ], id="user-tabs", active_tab="user-list-tab"),
+        html.Div(id="user-tab-content", className="mt-3")
+    ]
+
 def create_user_management_modal():
     return dbc.Modal(
         [
             dbc.ModalHeader(dbc.ModalTitle("ユーザー管理")),
-            dbc.ModalBody(
-                [
-                    dbc.Tabs([
-                        dbc.Tab(label="ユーザー一覧", tab_id="user-list-tab"),
-                        dbc.Tab(label="新規追加", tab_id="user-add-tab"),
-                        dbc.Tab(label="編集", tab_id="user-edit-tab"),
-                    ], id="user-tabs", active_tab="user-list-tab"),
-                    html.Div(id="user-tab-content", className="mt-3")
-                ]
-            ),
+            dbc.ModalBody(id="user-management-body"),
             dbc.ModalFooter([
                 dbc.Button("閉じる", id="close-user-modal-button", color="secondary"),
             ]),
         ], id="user-management-modal", is_open=False, size="lg"
     )
 
+def create_group_management_body():
+    return [
+        dbc.Tabs([
+            dbc.Tab(label="グループ一覧", tab_id="group-list-tab"),
+            dbc.Tab(label="新規追加", tab_id="group-add-tab"),
+            dbc.Tab(label="編集", tab_id="group-edit-tab"),
+        ], id="group-tabs", active_tab="group-list-tab"),
+        html.Div(id="group-tab-content", className="mt-3")
+    ]
+
 def create_group_management_modal():
     return dbc.Modal(
         [
             dbc.ModalHeader(dbc.ModalTitle("グループ管理")),
-            dbc.ModalBody(
-                [
-                    dbc.Tabs([
-                        dbc.Tab(label="グループ一覧", tab_id="group-list-tab"),
-                        dbc.Tab(label="新規追加", tab_id="group-add-tab"),
-                        dbc.Tab(label="編集", tab_id="group-edit-tab"),
-                    ], id="group-tabs", active_tab="group-list-tab"),
-                    html.Div(id="group-tab-content", className="mt-3")
-                ]
-            ),
+            dbc.ModalBody(id="group-management-body"),
             dbc.ModalFooter([
                 dbc.Button("閉じる", id="close-group-modal-button", color="secondary"),
             ]),
         ], id="group-management-modal", is_open=False, size="lg"
     )
 
+def reminder_label(minutes):
+    if minutes == 0:
+        return "開始時刻"
+    if minutes % 1440 == 0:
+        return f"{minutes // 1440}日前"
+    if minutes % 60 == 0:
+        return f"{minutes // 60}時間前"
+    return f"{minutes}分前"
+
 # --- Layout ---
-today_local = datetime.now(TZ)
-app.layout = dbc.Container(
-    [
-        dcc.Store(id='current-date-store', data={'year': today_local.year,
-                                                 'month': today_local.month,
-                                                 'anchor': today_local.strftime('%Y-%m-%d')}),
-        dcc.Store(id='events-store', data=events_init),
-        dcc.Store(id='users-store', data=users_init),
-        dcc.Store(id='groups-store', data=groups_init),
-        dcc.Store(id='current-group', data="all"),  # "all" または group_id
-        dcc.Store(id='current-user', data="all"),   # "all" または user_id
-        dcc.Store(id='history-store', data=[]),  # Undo stack（各要素が events のスナップショット）
-        dcc.Store(id='future-store', data=[]),   # Redo stack
-        dcc.Store(id='editing-id', data=""),
-        html.Div(id='ui-intent', style={'display':'none'}),
-        html.Div(id='edit-open-store', style={'display':'none'}),
-        html.Div(id='drag-update-store', style={'display':'none'}),
-        dcc.Store(id='editing-user-store', data=None),  # 編集中のユーザー情報
-        dcc.Store(id='editing-group-store', data=None), # 編集中のグループ情報
-
-
-
-        create_event_modal(),
-        create_date_picker_modal(),
-        create_user_management_modal(),
-        create_group_management_modal(),
-
-        # ヘッダーセクション - タイトル、今日ボタン、現在日付、ビュー切替
+def create_search_body():
+    return [
+        dbc.Input(id="search-query", type="search", debounce=True,
+                  placeholder="タイトル・ノート・場所で検索（空白区切りで AND）"),
         dbc.Row([
-            dbc.Col([
-                html.H1("Jules' Calendar", 
-                       className="mb-0", 
-                       style={"color": "#172B4D", "fontWeight": "700", "fontSize": "28px"})
-            ], width="auto"),
-            dbc.Col([
-                dbc.Button("Today", id="today-button", color="primary", size="sm", className="me-3"),
-                html.Span(id="current-month-year", className="h4 mb-0 me-3 align-middle", 
-                         style={"cursor":"pointer", "color": "#172B4D", "fontWeight": "600"})
-            ], width="auto", className="d-flex align-items-center")
-        ], justify="between", align="center", className="mb-4 pb-3", 
-           style={"borderBottom": "1px solid #DFE1E6"}),
-
-        # ナビゲーション・ビューコントロールセクション - ナビゲーション、表示切替
+            dbc.Col(dcc.Dropdown(id="search-priority", multi=True, placeholder="優先度",
+                                 options=[{"label": p, "value": p} for p in PRIORITY_COLORS]), md=3),
+            dbc.Col(dcc.Dropdown(id="search-label", multi=True, placeholder="ラベル",
+                                 options=[{"label": k, "value": k} for k in SCHEDULE_LABELS]), md=3),
+            dbc.Col(dcc.Dropdown(id="search-attendees", multi=True, placeholder="参加者"), md=3),
+            dbc.Col(dcc.Dropdown(id="search-visibility", multi=True, placeholder="公開設定",
+                                 options=[{"label": "公開", "value": "public"}, {"label": "非公開", "value": "private"}]), md=3),
+        ], className="g-2 mt-2"),
         dbc.Row([
-            dbc.Col([
-                dbc.ButtonGroup([
-                    dbc.Button("‹", id="prev-month-button", color="primary", outline=True, size="sm"),
-                    dbc.Button("›", id="next-month-button", color="primary", outline=True, size="sm"),
-                ])
-            ], width="auto", className="me-3"),
-            dbc.Col([
-                dbc.RadioItems(
-                    id="view-switch",
-                    className="btn-group",
-                    inputClassName="btn-check", 
-                    labelClassName="btn btn-outline-primary btn-sm",
-                    labelCheckedClassName="active",
-                    options=[{'label':'月表示','value':'month'},{'label':'週表示','value':'week'}],
-                    value='month'
-                )
-            ], width="auto")
-        ], align="center", className="mb-3"),
+            dbc.Col([dbc.Label("開始日（から）", className="small mb-1"), dbc.Input(id="search-from", type="date")], md=6),
+            dbc.Col([dbc.Label("開始日（まで）", className="small mb-1"), dbc.Input(id="search-to", type="date")], md=6),
+        ], className="g-2 mt-2"),
+        html.Div(id="search-summary", className="small text-muted mt-3 mb-2"),
+        html.Div(id="search-results"),
+        html.Div([
+            dbc.Button("‹ 前へ", id="search-prev", color="secondary", outline=True, size="sm", disabled=True),
+            dbc.Button("次へ ›", id="search-next", color="secondary", outline=True, size="sm", disabled=True,
+                       className="ms-2"),
+        ], className="d-flex justify-content-end mt-2"),
+    ]
+
+def create_search_modal():
+    return dbc.Modal(
+        [
+            dbc.ModalHeader(dbc.ModalTitle("イベント検索")),
+            dbc.ModalBody(id="search-body"),
+            dbc.ModalFooter([
+                dbc.Button("閉じる", id="close-search-modal-button", color="secondary"),
+            ]),
+        ], id="search-modal", is_open=False, size="lg", scrollable=True
+    )
 
-        # フィルターと管理セクション
+def create_analytics_body(groups_data):
+    return [
         dbc.Row([
             dbc.Col([
-                dbc.Row([
-                    dbc.Col([
-                        html.Label("グループ:", className="me-2", 
-                                  style={"fontSize": "14px", "fontWeight": "500", "color": "#6B778C"}),
-                        dcc.Dropdown(id="group-filter", value="all", clearable=False, 
-                                   style={"minWidth": "120px", "fontSize": "14px"})
-                    ], xs=12, sm=6, className="d-flex align-items-center mb-2 mb-sm-0"),
-                    dbc.Col([
-                        html.Label("ユーザー:", className="me-2",
-                                  style={"fontSize": "14px", "fontWeight": "500", "color": "#6B778C"}),
-                        dcc.Dropdown(id="user-filter", value="all", clearable=False,
-                                   style={"minWidth": "120px", "fontSize": "14px"})
-                    ], xs=12, sm=6, className="d-flex align-items-center")
-                ])
-            ], xs=12, md=True, className="mb-2 mb-md-0"),
+                dbc.Label("期間", className="small mb-1"),
+                dcc.Dropdown(id="analytics-weeks", value=ANALYTICS_WEEK_CHOICES[0], clearable=False,
+                             options=[{"label": f"表示中の週までの{w}週間", "value": w} for w in ANALYTICS_WEEK_CHOICES]),
+            ], md=6),
             dbc.Col([
-                dbc.ButtonGroup([
-                    dbc.Button("ユーザー管理", id="open-user-modal-button", color="info", 
-                              outline=True, size="sm"),
-                    dbc.Button("グループ管理", id="open-group-modal-button", color="info", 
-                              outline=True, size="sm")
-                ])
-            ], xs=12, sm="auto", className="d-flex justify-content-center")
-        ], align="center", className="mb-3"),
+                dbc.Label("グループ", className="small mb-1"),
+                dcc.Dropdown(id="analytics-group", value="all", clearable=False,
+                             options=[{"label": "すべて", "value": "all"}] +
+                                     [{"label": g['name'], "value": g['id']} for g in groups_data or []]),
+            ], md=6),
+        ], className="g-2 mb-3"),
+        dcc.Loading(html.Div(id="analytics-output")),
+    ]
+
+def create_analytics_modal():
+    return dbc.Modal(
+        [
+            dbc.ModalHeader(dbc.ModalTitle("分析")),
+            dbc.ModalBody(id="analytics-body"),
+            dbc.ModalFooter([
+                dbc.Button("閉じる", id="close-analytics-modal-button", color="secondary"),
+            ]),
+        ], id="analytics-modal", is_open=False, size="xl", scrollable=True
+    )
 
-        # アクションバー - Undo/Redo（カレンダーコンテンツの直上）
+def create_scheduler_body(groups_data, tz):
+    today = datetime.now(tz).date()
+    return [
+        dbc.Input(id="scheduler-title", value="会議", placeholder="会議名"),
         dbc.Row([
-            dbc.Col([
-                dbc.ButtonGroup([
-                    dbc.Button("Undo", id="undo-button", color="secondary", outline=True, 
-                              disabled=True, size="sm"),
-                    dbc.Button("Redo", id="redo-button", color="secondary", outline=True, 
-                              disabled=True, size="sm")
-                ])
-            ], width="auto")
-        ], justify="end", className="mb-2"),
+            dbc.Col([dbc.Label("必須参加者", className="small mb-1"),
+                     dcc.Dropdown(id="scheduler-attendees", multi=True)], md=4),
+            dbc.Col([dbc.Label("グループ（全員を必須に追加）", className="small mb-1"),
+                     dcc.Dropdown(id="scheduler-group", options=[{"label": g['name'], "value": g['id']}
+                                                                 for g in groups_data or []])], md=4),
+            dbc.Col([dbc.Label("任意参加者", className="small mb-1"),
+                     dcc.Dropdown(id="scheduler-optional", multi=True)], md=4),
+        ], className="g-2 mt-2"),
+        dbc.Row([
+            dbc.Col([dbc.Label("所要時間", className="small mb-1"),
+                     dcc.Dropdown(id="scheduler-duration", value=60, clearable=False,
+                                  options=[{"label": f"{m}分", "value": m} for m in SCHEDULER_DURATIONS])], md=3),
+            dbc.Col([dbc.Label("優先度", className="small mb-1"),
+                     dcc.Dropdown(id="scheduler-priority", value="中", clearable=False,
+                                  options=[{"label": p, "value": p} for p in PRIORITY_COLORS])], md=3),
+            dbc.Col([dbc.Label("探索開始日", className="small mb-1"),
+                     dbc.Input(id="scheduler-from", type="date", value=today.strftime('%Y-%m-%d'))], md=3),
+            dbc.Col([dbc.Label("探索終了日", className="small mb-1"),
+                     dbc.Input(id="scheduler-to", type="date",
+                               value=(today + timedelta(days=SCHEDULER_WINDOW_DAYS - 1)).strftime('%Y-%m-%d'))], md=3),
+        ], className="g-2 mt-2"),
+        dbc.Label("希望時間帯", className="small mb-1 mt-3"),
+        dcc.RangeSlider(id="scheduler-preferred", min=0, max=24, step=1, value=[START_H, END_H],
+                        marks={h: f"{h}:00" for h in range(0, 25, 3)}),
+        dbc.Button("候補を探す", id="scheduler-run", color="primary", size="sm", className="mt-2"),
+        html.Div(id="scheduler-summary", className="small text-muted mt-3 mb-2"),
+        dcc.Loading(html.Div(id="scheduler-results")),
+    ]
+
+def create_scheduler_modal():
+    return dbc.Modal(
+        [
+            dbc.ModalHeader(dbc.ModalTitle("会議の自動配置")),
+            dbc.ModalBody(id="scheduler-body"),
+            dbc.ModalFooter([
+                dbc.Button("閉じる", id="close-scheduler-modal-button", color="secondary"),
+            ]),
+        ], id="scheduler-modal", is_open=False, size="lg", scrollable=True
+    )
 
-        dbc.Row(dbc.Col(html.Div(id="calendar-output"), width=12)),
+def create_bulk_body():
+    return [
+        dbc.Alert(id="bulk-error", color="danger", is_open=False, className="mb-3"),
+        dbc.Label("移動", className="small mb-1"),
+        dbc.InputGroup([
+            dbc.Input(id="bulk-shift", type="number", value=0, step=1),
+            dbc.Select(id="bulk-shift-unit", value="minutes",
+                       options=[{"label": "分", "value": "minutes"}, {"label": "日", "value": "days"}]),
+        ], size="sm"),
+        dbc.Row([
+            dbc.Col([dbc.Label("優先度", className="small mb-1 mt-3"),
+                     dcc.Dropdown(id="bulk-priority", placeholder="変更しない",
+                                  options=[{"label": p, "value": p} for p in PRIORITY_COLORS])], md=6),
+            dbc.Col([dbc.Label("スケジュールラベル", className="small mb-1 mt-3"),
+                     dcc.Dropdown(id="bulk-label", placeholder="変更しない",
+                                  options=[{"label": k, "value": k} for k in SCHEDULE_LABELS])], md=6),
+        ], className="g-2"),
+        dbc.Row([
+            dbc.Col([dbc.Label("参加者を追加", className="small mb-1 mt-3"),
+                     dcc.Dropdown(id="bulk-add-attendees", multi=True)], md=6),
+            dbc.Col([dbc.Label("参加者を削除", className="small mb-1 mt-3"),
+                     dcc.Dropdown(id="bulk-remove-attendees", multi=True)], md=6),
+        ], className="g-2"),
+    ]
+
+def create_bulk_modal():
+    return dbc.Modal(
+        [
+            dbc.ModalHeader(dbc.ModalTitle(id="bulk-modal-title")),
+            dbc.ModalBody(id="bulk-body"),
+            dbc.ModalFooter([
+                dbc.Button("選択したイベントを削除", id="bulk-delete-button", color="danger", outline=True,
+                           className="me-auto"),
+                dbc.Button("キャンセル", id="close-bulk-modal-button", color="secondary"),
+                dbc.Button("適用", id="bulk-apply-button", color="primary"),
+            ]),
+        ], id="bulk-modal", is_open=False
+    )
 
+def create_revision_body(anchor):
+    return [
         dbc.Row([
-            dbc.Col([
-                html.Hr(className="my-4", style={"borderColor": "#DFE1E6"}),
-                html.H6("AIを使ってイベントをクイック作成", 
-                       className="mb-3", 
-                       style={"color": "#6B778C", "fontWeight": "600"}),
-                dbc.InputGroup([
-                    dbc.Input(id="llm-input", 
-                             placeholder="例: '\"デザインミーティング\" 明日の午後3時から45分間'",
-                             style={"borderRadius": "6px 0 0 6px", "border": "2px solid #DFE1E6"}),
-                    dbc.Button("Create", id="llm-submit", color="primary", 
-                              style={"borderRadius": "0 6px 6px 0"})
-                ], className="mb-2"),
-                html.Small(id="llm-output", className="text-muted d-block", 
-                          style={"fontSize": "12px", "color": "#6B778C"})
-            ], width=12)
-        ], className="mt-4 pt-3", style={"borderTop": "1px solid #DFE1E6"}),
-
-        # JavaScriptの初期化
-        html.Script(f"""
-        // カレンダー初期化
-        if (typeof initializeCalendar === 'function') {{
-            initializeCalendar({PX_PER_MIN}, {START_H}, {GRID_CELL_MIN}, {END_H});
-        }}
-        """)
-    ],
-    fluid=True, className="d-flex flex-column vh-100 p-4"
-)
+            dbc.Col([dbc.Label("版", className="small mb-1"),
+                     dcc.Dropdown(id="revision-select", clearable=False, placeholder="版を選択")], md=7),
+            dbc.Col([dbc.Label("日時で選ぶ", className="small mb-1"),
+                     dbc.Input(id="revision-at", type="datetime-local", debounce=True)], md=5),
+        ], className="g-2"),
+        dbc.Row([
+            dbc.Col([dbc.Label("表示する週（開始日）", className="small mb-1 mt-2"),
+                     dbc.Input(id="revision-week", type="date", value=anchor)], md=5),
+        ], className="g-2"),
+        html.Div(id="revision-view", className="mt-3"),
+        html.Div(id="revision-diff", className="mt-3"),
+    ]
+
+def create_revision_modal():
+    return dbc.Modal(
+        [
+            dbc.ModalHeader(dbc.ModalTitle("版の履歴（閲覧のみ）")),
+            dbc.ModalBody(id="revision-body"),
+            dbc.ModalFooter([
+                dbc.Button("閉じる", id="close-revision-modal-button", color="secondary"),
+            ]),
+        ], id="revision-modal", is_open=False, size="lg", scrollable=True
+    )
+
+def build_layout():
+    today_local = datetime.now(TZ)
+    return dbc.Container(
+        [
+            dcc.Store(id='current-date-store', data={'year': today_local.year,
+                                                     'month': today_local.month,
+                                                     'anchor': today_local.strftime('%Y-%m-%d')}),
+            dcc.Store(id='events-store', data=initial_events()),
+            dcc.Store(id='users-store', data=users_init),
+            dcc.Store(id='groups-store', data=groups_init),
+            dcc.Store(id='current-group', data="all"),  # "all" または group_id
+            dcc.Store(id='current-user', data="all"),   # "all" または user_id
+            dcc.Store(id='view-tz', data=CONFIG['TZ']),  # 表示タイムゾーン（選択中ユーザーの設定）
+            dcc.Store(id='view-hours', data=view_hours([], "all")),  # 週ビューの表示時間帯・グリッド
+            dcc.Store(id='session-id', data=uuid.uuid4().hex),        # サーバー側セッション（履歴・描画キャッシュ）のキー
+            dcc.Store(id='conflict-plan', data=None),                 # ダブルブッキング時の優先度による移動案（rescheduler）
+            dcc.Store(id='history-meta', data={'undo': 0, 'redo': 0}),  # Undo/Redo の件数だけをブラウザに置く
+            dcc.Store(id='editing-id', data=""),
+            html.Div(id='ui-intent', style={'display':'none'}),
+            html.Div(id='edit-open-store', style={'display':'none'}),
+            html.Div(id='drag-update-store', style={'display':'none'}),
+            html.Div(id='selection-store', style={'display':'none'}),  # 選択中のイベントID（JSON配列）
+            dcc.Store(id='editing-user-store', data=None),  # 編集中のユーザー情報
+            dcc.Store(id='editing-group-store', data=None), # 編集中のグループ情報
+            dcc.Store(id='built-modals-store', data=[]),    # 本文を生成済みのモーダル
+            dcc.Store(id='event-form', data=None),          # イベントモーダルを開くときの入力欄の値（EVENT_FORM_DEFAULTS の形）
+            dcc.Store(id='search-page', data=0),            # 検索結果の表示ページ
+            dcc.Store(id='directory-version', data=None),   # ユーザー・グループ一覧の版（一覧・候補の再描画のきっかけ）
+            dcc.Store(id='user-list-page', data=0),         # ユーザー一覧の表示ページ
+            dcc.Store(id='group-list-page', data=0),        # グループ一覧の表示ページ
+
+
+
+            create_event_modal(),
+            create_date_picker_modal(),
+            create_day_events_modal(),
+            create_user_management_modal(),
+            create_group_management_modal(),
+            create_search_modal(),
+            create_analytics_modal(),
+            create_scheduler_modal(),
+            create_bulk_modal(),
+            create_revision_modal(),
+
+            # ヘッダーセクション - タイトル、今日ボタン、現在日付、ビュー切替
+            dbc.Row([
+                dbc.Col([
+                    html.H1("Jules' Calendar", 
+                           className="mb-0", 
+                           style={"color": "#172B4D", "fontWeight": "700", "fontSize": "28px"})
+                ], width="auto"),
+                dbc.Col([
+                    dbc.Button("Today", id="today-button", color="primary", size="sm", className="me-3"),
+                    html.Span(id="current-month-year", className="h4 mb-0 me-3 align-middle", 
+                             style={"cursor":"pointer", "color": "#172B4D", "fontWeight": "600"})
+                ], width="auto", className="d-flex align-items-center")
+            ], justify="between", align="center", className="mb-4 pb-3", 
+               style={"borderBottom": "1px solid #DFE1E6"}),
+
+            # ナビゲーション・ビューコントロールセクション - ナビゲーション、表示切替
+            dbc.Row([
+                dbc.Col([
+                    dbc.ButtonGroup([
+                        dbc.Button("‹", id="prev-month-button", color="primary", outline=True, size="sm"),
+                        dbc.Button("›", id="next-month-button", color="primary", outline=True, size="sm"),
+                    ])
+                ], width="auto", className="me-3"),
+                dbc.Col([
+                    dbc.RadioItems(
+                        id="view-switch",
+                        className="btn-group",
+                        inputClassName="btn-check", 
+                        labelClassName="btn btn-outline-primary btn-sm",
+                        labelCheckedClassName="active",
+                        options=[{'label':'月表示','value':'month'},{'label':'週表示','value':'week'},
+                                 {'label':'予定リスト','value':'agenda'}],
+                        value='month'
+                    )
+                ], width="auto"),
+                dbc.Col([
+                    dbc.Checklist(id="full-day-switch", options=[{"label": "24時間表示", "value": "on"}],
+                                  value=[], switch=True, className="small")
+                ], width="auto", className="ms-2")
+            ], align="center", className="mb-3"),
+
+            # フィルターと管理セクション
+            dbc.Row([
+                dbc.Col([
+                    dbc.Row([
+                        dbc.Col([
+                            html.Label("グループ:", className="me-2", 
+                                      style={"fontSize": "14px", "fontWeight": "500", "color": "#6B778C"}),
+                            dcc.Dropdown(id="group-filter", value="all", clearable=False, 
+                                       style={"minWidth": "120px", "fontSize": "14px"})
+                        ], xs=12, sm=6, className="d-flex align-items-center mb-2 mb-sm-0"),
+                        dbc.Col([
+                            html.Label("ユーザー:", className="me-2",
+                                      style={"fontSize": "14px", "fontWeight": "500", "color": "#6B778C"}),
+                            dcc.Dropdown(id="user-filter", value="all", clearable=False,
+                                       style={"minWidth": "120px", "fontSize": "14px"})
+                        ], xs=12, sm=6, className="d-flex align-items-center")
+                    ])
+                ], xs=12, md=True, className="mb-2 mb-md-0"),
+                dbc.Col([
+                    dbc.ButtonGroup([
+                        dbc.Button("ユーザー管理", id="open-user-modal-button", color="info", 
+                                  outline=True, size="sm"),
+                        dbc.Button("グループ管理", id="open-group-modal-button", color="info", 
+                                  outline=True, size="sm"),
+                        dbc.Button("検索", id="open-search-modal-button", color="info",
+                                  outline=True, size="sm"),
+                        dbc.Button("分析", id="open-analytics-modal-button", color="info",
+                                  outline=True, size="sm"),
+                        dbc.Button("会議を配置", id="open-scheduler-modal-button", color="info",
+                                  outline=True, size="sm")
+                    ])
+                ], xs=12, sm="auto", className="d-flex justify-content-center")
+            ], align="center", className="mb-3"),
+
+            # アクションバー - Undo/Redo（カレンダーコンテンツの直上）
+            dbc.Row([
+                dbc.Col([
+                    dbc.ButtonGroup([
+                        dbc.Button("Undo", id="undo-button", color="secondary", outline=True, 
+                                  disabled=True, size="sm"),
+                        dbc.Button("Redo", id="redo-button", color="secondary", outline=True, 
+                                  disabled=True, size="sm"),
+                        dbc.Button("版の履歴", id="open-revision-modal-button", color="secondary", outline=True,
+                                  size="sm")
+                    ])
+                ], width="auto"),
+                # 一括編集（Ctrl/⌘/Shift+クリックで週・月ビューのイベントを複数選択）
+                dbc.Col([
+                    html.Span(id="selection-count", className="small text-muted me-2"),
+                    dbc.ButtonGroup([
+                        dbc.Button("一括編集", id="open-bulk-modal-button", color="primary", outline=True,
+                                  disabled=True, size="sm"),
+                        dbc.Button("選択解除", id="clear-selection-button", color="secondary", outline=True,
+                                  disabled=True, size="sm"),
+                    ])
+                ], width="auto", className="d-flex align-items-center")
+            ], justify="end", className="mb-2"),
+
+            dbc.Row(dbc.Col(html.Div(id="calendar-output"), width=12)),
+
+            dbc.Row([
+                dbc.Col([
+                    html.Hr(className="my-4", style={"borderColor": "#DFE1E6"}),
+                    html.H6("AIを使ってイベントをクイック作成", 
+                           className="mb-3", 
+                           style={"color": "#6B778C", "fontWeight": "600"}),
+                    dbc.InputGroup([
+                        dbc.Input(id="llm-input", 
+                                 placeholder="例: '\"デザインミーティング\" 明日の午後3時から45分間'",
+                                 style={"borderRadius": "6px 0 0 6px", "border": "2px solid #DFE1E6"}),
+                        dbc.Button("Create", id="llm-submit", color="primary", 
+                                  style={"borderRadius": "0 6px 6px 0"})
+                    ], className="mb-2"),
+                    html.Small(id="llm-output", className="text-muted d-block", 
+                              style={"fontSize": "12px", "color": "#6B778C"})
+                ], width=12)
+            ], className="mt-4 pt-3", style={"borderTop": "1px solid #DFE1E6"}),
+
+            # ペイロード診断（開発モードのみ）
+            *([payload_guard.debug_panel()] if CONFIG['PAYLOAD_PANEL'] and not PRODUCTION else []),
+
+            # JavaScriptの初期化
+            html.Script("""
+            // カレンダー初期化（表示時間帯・グリッドは週ビューの .week-grid の data-* から読む）
+            if (typeof initializeCalendar === 'function') {
+                initializeCalendar();
+            }
+            """)
+        ],
+        fluid=True, className="d-flex flex-column vh-100 p-4"
+    )
+
+# --- JSON API ---
+def api_index(version, events=None):
+    """API が対象にするイベント一覧のインデックス
+
+    events（POST 本文のイベント一覧）があればそれを、なければ version（描画時の data-version = イベント一覧の
+    フィンガープリント）で引く。インデックスはワーカーごとなので、このワーカーが持っていない版は None。
+    """
+    if events is not None:
+        if not isinstance(events, list):
+            raise TypeError("events は配列で指定してください")
+        return event_index.index_for(events, TZ)
+    return event_index.lookup(version) if version else None
+
+def index_missing(version):
+    """api_index() が None のときのレスポンス（版が不明なら 409: クライアントは events を付けて POST し直す）"""
+    if not version:
+        return jsonify({"error": "version（表示中のイベント一覧の版）か events（POST）を指定してください"}), 400
+    return jsonify({"error": f"版 {version} のイベント一覧がこのサーバーにありません。events を付けて POST してください",
+                    "version": version}), 409
+
+def api_agenda():
+    """予定リストのページ取得: GET ?start=YYYY-MM-DD&days=N&tz=Area/City&version=版
+
+    version は描画時の data-version。このワーカーが持っていなければ 409 を返すので、同じキーと events
+    （イベント一覧）、グループで絞った表示なら members（ユーザーIDの配列）を JSON で POST して取り直す。
+    """
+    body = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    get = body.get if request.method == 'POST' else request.args.get
+    try:
+        start = datetime.strptime(get('start') or '', '%Y-%m-%d').date()
+        days = max(1, min(int(get('days') or AGENDA_WINDOW_DAYS), AGENDA_MAX_DAYS))
+        tz = timezones.get_zone(get('tz') or CONFIG['TZ'])
+        events = body.get('events')
+        if events is not None and body.get('members') is not None:
+            ids = membership.attendees_for(events).events_for(body['members'])
+            events = [ev for ev in events if ev['id'] in ids]
+        idx = api_index(get('version'), events)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "start は YYYY-MM-DD、days は整数、tz はタイムゾーン名、"
+                                 "events はイベント（id / start / end）、members はユーザーIDの配列で指定してください"}), 400
+    if idx is None:
+        return index_missing(get('version'))
+    rows = idx.agenda_rows(start, days, tz)
+    end = start + timedelta(days=days - 1)
+    return jsonify({"start": start.strftime('%Y-%m-%d'), "end": end.strftime('%Y-%m-%d'), "version": str(idx.key),
+                    "rows": rows})
+
+def api_day_summary():
+    """日別サマリー: GET ?start=YYYY-MM-DD&days=N&tz=Area/City&version=版（予定のない日は含まない）
+
+    version は描画時の data-version。このワーカーが持っていなければ 409 なので、同じキーと events を JSON で POST する。
+    """
+    body = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+    get = body.get if request.method == 'POST' else request.args.get
+    try:
+        start = datetime.strptime(get('start') or '', '%Y-%m-%d').date()
+        days = max(1, min(int(get('days') or AGENDA_WINDOW_DAYS), AGENDA_MAX_DAYS))
+        tz = timezones.get_zone(get('tz') or CONFIG['TZ'])
+        idx = api_index(get('version'), body.get('events'))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "start は YYYY-MM-DD、days は整数、tz はタイムゾーン名、"
+                                 "events はイベント（id / start / end）の配列で指定してください"}), 400
+    if idx is None:
+        return index_missing(get('version'))
+    table = day_summary.table_for(idx.events, tz, idx.key)
+    return jsonify({"start": start.strftime('%Y-%m-%d'), "version": str(idx.key), "days": table.summaries(start, days)})
+
+def api_search():
+    """イベント検索: GET ?q=語&priority=&label=&attendee=&visibility=（複数指定可）&from=&to=YYYY-MM-DD&tz=&page=&per_page=&version=版
+
+    version は描画時の data-version。このワーカーが持っていなければ 409 なので、同じキー（複数指定可のものは配列）と
+    events を JSON で POST する。
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        get, getlist = body.get, lambda key: body.get(key) or []
+    else:
+        body, get, getlist = {}, request.args.get, request.args.getlist
+    try:
+        tz = timezones.get_zone(get('tz') or CONFIG['TZ'])
+        page = max(0, int(get('page') or 0))
+        per_page = max(1, min(int(get('per_page') or event_search.SEARCH_PAGE_SIZE), event_search.SEARCH_PAGE_MAX))
+        filters = {'priority': getlist('priority'), 'schedule_label': getlist('label'),
+                   'attendees': getlist('attendee'), 'visibility': getlist('visibility')}
+        idx = api_index(get('version'), body.get('events'))
+        if idx is None:
+            return index_missing(get('version'))
+        total, rows = run_search(idx, get('q') or '', filters, get('from'), get('to'), tz, page, per_page)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "from / to は YYYY-MM-DD、page / per_page は整数、tz はタイムゾーン名、"
+                                 "events はイベント（id / start / end）の配列で指定してください"}), 400
+    return jsonify({"total": total, "page": page, "per_page": per_page, "version": str(idx.key), "results": rows})
+
+def api_schedule(batch=False):
+    """会議の自動配置（POST, JSON）
+
+    {"meeting": {...}} は候補枠をスコア順に、{"meetings": [...]} は一括配置の結果を返す。会議のキーは
+    title / attendees / group_id / optional / commitments / duration（分）/ from / to（YYYY-MM-DD）/ priority /
+    preferred（[開始時, 終了時]）/ weekends。users / groups（ストアと同じ形式）で勤務時間とグループを、tz で日付の基準を渡す。
+    既存の予定は version（描画時の data-version。このワーカーが持っていなければ 409）か events（イベント一覧）で渡す。
+    """
+    body = request.get_json(silent=True) or {}
+    meetings = body.get('meetings') if batch else [body.get('meeting')]
+    if not meetings or not all(isinstance(m, dict) for m in meetings):
+        return jsonify({"error": "meeting（一括配置は meetings の配列）を指定してください"}), 400
+    if len(meetings) > SCHEDULER_BATCH_MAX:
+        return jsonify({"error": f"一度に配置できる会議は {SCHEDULER_BATCH_MAX} 件までです"}), 400
+    try:
+        tz = timezones.get_zone(body.get('tz') or CONFIG['TZ'])
+        n = max(1, min(int(body.get('n', scheduler.SCHEDULE_TOP_N)), event_search.SEARCH_PAGE_MAX))
+        idx = api_index(body.get('version'), body.get('events'))
+        if idx is None:
+            return index_missing(body.get('version'))
+        result = run_scheduler(idx, meetings, body.get('users'), body.get('groups'), tz, batch, n)
+    except (KeyError, TypeError, ValueError) as exc:
+        return jsonify({"error": f"会議の指定が不正です: {exc}"}), 400
+    if batch:
+        return jsonify({"placements": result, "unplaced": sum(1 for r in result if r is None)})
+    return jsonify({"slots": result})
+
+def api_freebusy():
+    """空き時間情報: ユーザーごとの予定ありの区間（タイトルなどの詳細は含まない）
+
+    GET ?user=ID（複数可）&start=YYYY-MM-DD&days=N&tz=Area/City&granularity=15min|hour|day&version=版。
+    多数のユーザーは POST（JSON で同じキー、user の代わりに users の配列）でまとめて問い合わせる。
+    version は描画時の data-version。このワーカーが持っていなければ 409 なので、events を付けて POST する。
+    レスポンスには ETag を付け、If-None-Match が一致すれば 304 を返す。
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        users, get = body.get('users'), body.get
+    else:
+        body = {}
+        users, get = request.args.getlist('user'), request.args.get
+    try:
+        if not isinstance(users, list) or not users or not all(isinstance(u, str) for u in users):
+            raise ValueError
+        start = datetime.strptime(get('start') or '', '%Y-%m-%d').date()
+        days = max(1, min(int(get('days') or AGENDA_WINDOW_DAYS), AGENDA_MAX_DAYS))
+        tz = timezones.get_zone(get('tz') or CONFIG['TZ'])
+        granularity = get('granularity') or '15min'
+        if granularity not in freebusy.FREEBUSY_GRANULARITIES:
+            raise ValueError
+        idx = api_index(get('version'), body.get('events'))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "user（POST は users の配列）、start は YYYY-MM-DD、days は整数、tz はタイムゾーン名、"
+                                 f"granularity は {' / '.join(freebusy.FREEBUSY_GRANULARITIES)}、"
+                                 "events はイベント（id / start / end）の配列で指定してください"}), 400
+    if len(users) > freebusy.FREEBUSY_MAX_USERS:
+        return jsonify({"error": f"一度に問い合わせできるユーザーは {freebusy.FREEBUSY_MAX_USERS} 人までです"}), 400
+    if idx is None:
+        return index_missing(get('version'))
+    busy = freebusy.index_for(idx.events, TZ, idx.key).query(users, start, days, tz, granularity)
+    end = start + timedelta(days=days - 1)
+    response = jsonify({"start": start.strftime('%Y-%m-%d'), "end": end.strftime('%Y-%m-%d'), "tz": tz.key,
+                        "granularity": granularity, "version": str(idx.key), "users": busy})
+    # 同じイベント集合・同じ問い合わせなら本文も同じなので、本文のハッシュを ETag にする（ワーカー間でも一致）
+    response.add_etag()
+    response.headers['Cache-Control'] = f'private, max-age={FREEBUSY_MAX_AGE}'
+    return response.make_conditional(request)
+
+def api_audit():
+    """イベントの変更履歴（新しい順）: GET ?event=ID&limit=N。誰が（actor）・いつ（ts）・何をしたか（action, before/after）"""
+    current = journal.installed()
+    if current is None:
+        return jsonify({"error": "ジャーナルが無効です（JOURNAL_DIR を設定してください）"}), 404
+    event_id = request.args.get('event')
+    try:
+        if not event_id:
+            raise ValueError
+        limit = max(1, min(int(request.args.get('limit') or journal.AUDIT_LIMIT), AUDIT_MAX_LIMIT))
+    except ValueError:
+        return jsonify({"error": "event はイベントID、limit は整数で指定してください"}), 400
+    return jsonify({"event": event_id, "entries": current.audit(event_id, limit)})
+
+def api_revisions():
+    """版の一覧（新しい順）: GET ?limit=N&before=連番。?at=YYYY-MM-DDTHH:MM&tz= ならその時点の版の連番を返す"""
+    current = journal.installed()
+    if current is None:
+        return jsonify({"error": "ジャーナルが無効です（JOURNAL_DIR を設定してください）"}), 404
+    args = request.args
+    try:
+        if args.get('at'):
+            tz = timezones.get_zone(args.get('tz') or CONFIG['TZ'])
+            return jsonify({"at": args['at'], "tz": tz.key, "revision": current.revision_at(timezones.iso_epoch(args['at'], tz))})
+        limit = max(1, min(int(args.get('limit') or journal.AUDIT_LIMIT), AUDIT_MAX_LIMIT))
+        before = int(args['before']) if args.get('before') else None
+    except ValueError:
+        return jsonify({"error": "limit / before は整数、at は YYYY-MM-DDTHH:MM、tz はタイムゾーン名で指定してください"}), 400
+    return jsonify({"latest": current.latest(), "revisions": current.revisions(limit, before)})
+
+def api_revision(seq):
+    """版 seq の予定リスト（閲覧のみ）: GET ?start=YYYY-MM-DD&days=N&tz=Area/City"""
+    history = revisions.installed()
+    if history is None:
+        return jsonify({"error": "ジャーナルが無効です（JOURNAL_DIR を設定してください）"}), 404
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+        days = max(1, min(int(request.args.get('days', AGENDA_WINDOW_DAYS)), AGENDA_MAX_DAYS))
+        tz = timezones.get_zone(request.args.get('tz') or CONFIG['TZ'])
+        events = history.events_at(seq)
+    except ValueError as exc:
+        return jsonify({"error": f"start は YYYY-MM-DD、days は整数、tz はタイムゾーン名で指定してください（{exc}）"}), 400
+    rows = event_index.index_for(events, TZ).agenda_rows(start, days, tz)
+    end = start + timedelta(days=days - 1)
+    return jsonify({"revision": seq, "start": start.strftime('%Y-%m-%d'), "end": end.strftime('%Y-%m-%d'), "rows": rows})
+
+def api_revision_diff(seq):
+    """版 seq から ?against=連番（省略時は最新）への差分: added / removed / changed（before・after）"""
+    history = revisions.installed()
+    if history is None:
+        return jsonify({"error": "ジャーナルが無効です（JOURNAL_DIR を設定してください）"}), 404
+    try:
+        against = int(request.args['against']) if request.args.get('against') else history.journal.latest()
+        diff = history.diff(seq, against)
+    except ValueError as exc:
+        return jsonify({"error": f"against は版の連番で指定してください（{exc}）"}), 400
+    return jsonify({"from": seq, "to": against, **diff})
+
+def api_session_stats():
+    """サーバー側セッションキャッシュの使用状況（履歴は SESSION_DB を共有する全ワーカー分、描画キャッシュはこのワーカー分）"""
+    return jsonify(SESSIONS.stats() if SESSIONS else {})
+
+def register_api(server):
+    server.add_url_rule('/api/agenda', view_func=api_agenda, methods=['GET', 'POST'])
+    server.add_url_rule('/api/day-summary', view_func=api_day_summary, methods=['GET', 'POST'])
+    server.add_url_rule('/api/search', view_func=api_search, methods=['GET', 'POST'])
+    server.add_url_rule('/api/schedule', view_func=api_schedule, methods=['POST'])
+    server.add_url_rule('/api/schedule/batch', endpoint='api_schedule_batch', methods=['POST'],
+                        view_func=functools.partial(api_schedule, batch=True))
+    server.add_url_rule('/api/freebusy', view_func=api_freebusy, methods=['GET', 'POST'])
+    server.add_url_rule('/api/audit', view_func=api_audit)
+    server.add_url_rule('/api/revisions', view_func=api_revisions)
+    server.add_url_rule('/api/revisions/<int:seq>', view_func=api_revision)
+    server.add_url_rule('/api/revisions/<int:seq>/diff', view_func=api_revision_diff)
+    server.add_url_rule('/api/session-stats', view_func=api_session_stats)
+
+# --- App factory ---
+def create_app(config=None):
+    """Dashアプリを生成する。config は設定の上書き（dict, キーは config.DEFAULTS と同じ）"""
+    global SESSIONS
+    apply_config(app_config.load_config(config))
+    SESSIONS = session_cache.SessionCache(CONFIG['SESSION_MAX'], CONFIG['SESSION_TTL_SEC'],
+                                          CONFIG['SESSION_BUDGET_BYTES'], HIST_MAX, CONFIG['SESSION_VIEW_CACHE'],
+                                          CONFIG['SESSION_DB'])
+    lane_layout.cache_clear()
+    timezones.offset_table.cache_clear()
+    geometry.geometry.cache_clear()
+    day_summary.cache_clear()
+    event_search.cache_clear()
+    freebusy.cache_clear()
+    membership.cache_clear()
+    user_directory.cache_clear()
+    if 'analytics' in sys.modules:
+        sys.modules['analytics'].cache_clear()
+    month_view_for.cache_clear()
+    event_journal = (journal.Journal(CONFIG['JOURNAL_DIR'], CONFIG['JOURNAL_SNAPSHOT_EVERY'], CONFIG['JOURNAL_FSYNC'])
+                     if CONFIG['JOURNAL_DIR'] else None)
+    journal.install(event_journal)
+    reminders.install(reminders.ReminderService(reminders.make_sinks(CONFIG['REMINDER_SINKS']), TZ, event_journal)
+                      if CONFIG['REMINDERS'] else None)  # 予約はジャーナルから作る（config.validate で必須）
+    revisions.install(revisions.History(event_journal) if event_journal is not None else None)
+    dash_app = dash.Dash(__name__,
+                         external_stylesheets=[dbc.themes.BOOTSTRAP],
+                         assets_folder='static',
+                         suppress_callback_exceptions=True)
+    dash_app.layout = build_layout  # セッションごとに評価（today を最新に保つ）
+    register_api(dash_app.server)
+    dash_app.session_cache = SESSIONS
+    if CONFIG['INSTRUMENT']:
+        instrumentation.instrument(dash_app, CONFIG)
+    if PRODUCTION:
+        serving.configure_production(dash_app)
+    if CONFIG['PAYLOAD_ACCOUNTING'] or CONFIG['PAYLOAD_LIMIT_BYTES']:
+        payload_guard.install(dash_app, CONFIG)  # 圧縮前のサイズを測るため配信設定の後に登録
+    return dash_app
+
+def warm_app(dash_app):
+    """fork前の事前計算（gunicorn の preload 時に master で1回だけ実行）
+
+    レイアウト検証・コールバック登録・アセット走査を済ませ、初期イベントのインデックスを構築する。
+    ここで作られたオブジェクトは fork 後のワーカーと copy-on-write で共有される。
+    """
+    event_index.index_for(initial_events(), TZ)
+    client = dash_app.server.test_client()
+    client.get(dash_app.config.requests_pathname_prefix)
+    client.get(dash_app.config.requests_pathname_prefix + '_dash-layout')  # コンポーネントクラスの読み込み
+    return dash_app
 
 # --- Callbacks ---
 
 # ナビゲーション
-@app.callback(
+@callback(
     Output('current-date-store', 'data', allow_duplicate=True),
     Input('prev-month-button','n_clicks'),
     Input('next-month-button','n_clicks'),
     Input('today-button','n_clicks'),
     State('view-switch','value'),
     State('current-date-store','data'),
+    State('view-tz','data'),
     prevent_initial_call=True
 )
-def update_current_date(prev_c, next_c, today_c, view_mode, data):
+def update_current_date(prev_c, next_c, today_c, view_mode, data, tz_name):
     ctx = dash.callback_context
     if not ctx.triggered: raise dash.exceptions.PreventUpdate
     tid = ctx.triggered_id
@@ -676,7 +1591,7 @@ def update_current_date(prev_c, next_c, today_c, view_mode, data):
     anchor = datetime.strptime(data.get('anchor'),'%Y-%m-%d').replace(tzinfo=TZ)
 
     if tid == 'today-button':
-        now = datetime.now(TZ)
+        now = datetime.now(timezones.get_zone(tz_name or CONFIG['TZ']))
         return {'year': now.year, 'month': now.month, 'anchor': now.strftime('%Y-%m-%d')}
 
     if view_mode == 'month':
@@ -687,8 +1602,8 @@ def update_current_date(prev_c, next_c, today_c, view_mode, data):
         elif month == 13: month, year = 1, year+1
         new_anchor = datetime(year, month, 1, tzinfo=TZ)
         return {'year': year, 'month': month, 'anchor': new_anchor.strftime('%Y-%m-%d')}
-    elif view_mode == 'week':
-        # 週表示の場合：週単位で移動
+    elif view_mode in ('week', 'agenda'):
+        # 週表示・予定リストの場合：週単位で移動
         delta = -7 if tid == 'prev-month-button' else (7 if tid == 'next-month-button' else 0)
         new_anchor = anchor + timedelta(days=delta)
         return {'year': new_anchor.year, 'month': new_anchor.month, 'anchor': new_anchor.strftime('%Y-%m-%d')}
@@ -696,7 +1611,7 @@ def update_current_date(prev_c, next_c, today_c, view_mode, data):
     raise dash.exceptions.PreventUpdate
 
 # 月/週ビュー描画
-@app.callback(
+@callback(
     [Output('calendar-output','children'),
      Output('current-month-year','children'),
      Output('undo-button','disabled'),
@@ -704,25 +1619,62 @@ def update_current_date(prev_c, next_c, today_c, view_mode, data):
     [Input('current-date-store','data'),
      Input('view-switch','value'),
      Input('events-store','data'),
-     Input('history-store','data'),
-     Input('future-store','data')]
+     Input('history-meta','data'),
+     Input('view-tz','data'),
+     Input('view-hours','data'),
+     Input('current-group','data'),
+     Input('groups-store','data')],
+    State('session-id','data'),
+    State('users-store','data')
 )
-def update_calendar_view(date_data, view_mode, events_data, hist, fut):
+def update_calendar_view(date_data, view_mode, events_data, hist_meta, tz_name, hours, group_id, groups_data, sid, users_data):
     year, month = date_data.get('year'), date_data.get('month')
-    anchor = datetime.strptime(date_data.get('anchor'),'%Y-%m-%d').replace(tzinfo=TZ)
+    tz_name = tz_name or CONFIG['TZ']
+    tz = timezones.get_zone(tz_name)
+    anchor = datetime.strptime(date_data.get('anchor'),'%Y-%m-%d').replace(tzinfo=tz)
+    idx = event_index.index_for(events_data, TZ)
+    hist_meta = hist_meta or {}
+    undo_disabled = not hist_meta.get('undo')
+    redo_disabled = not hist_meta.get('redo')
+
+    # 同じウィンドウ・同じイベント集合の再描画はセッションの描画キャッシュから返す
+    members = None
+    if group_id and group_id != "all":
+        directory = membership.directory_for(users_data, groups_data)
+        members = tuple(directory.members(group_id)) if group_id in directory.groups else None
+    view_key = (view_mode, year, month, date_data.get('anchor'), tz_name,
+                json.dumps(hours, sort_keys=True), idx.key, str(datetime.now(tz).date()), members)
+    cached = SESSIONS.get_view(sid, view_key) if sid else None
+    if cached is not None:
+        return cached[0], cached[1], undo_disabled, redo_disabled
+
+    if members is not None:
+        # グループのメンバーが参加しているイベントだけ（参加者インデックスで引く）
+        ids = membership.attendees_for(events_data, idx.key).events_for(members)
+        events_data = [ev for ev in events_data if ev['id'] in ids]
     if view_mode == 'month':
-        comp = generate_month_view(year, month, events_data)
+        table_key = idx.key if members is None else None
+        comp = month_view(year, month, day_summary.table_for(events_data, tz, table_key))
         label = format_japanese_month_year(year, month)
+    elif view_mode == 'agenda':
+        comp = generate_agenda_view(anchor, events_data, tz_name, members)
+        label = f"予定リスト: {anchor.strftime('%Y-%m-%d')} 〜"
     else:
-        comp = generate_week_bars(anchor, events_data)
+        comp = generate_week_bars(anchor, events_data, tz, hours)
         s, e = week_range_for_anchor(anchor)
         label = f"{s.strftime('%Y-%m-%d')} – {e.strftime('%Y-%m-%d')}"
-    undo_disabled = not hist
-    redo_disabled = not fut
+    if sid:
+        SESSIONS.put_view(sid, view_key, (comp, label))
     return comp, label, undo_disabled, redo_disabled
 
+# 予定リストの取り直し（/api/agenda が版を持っていないワーカーに当たったとき）に使うイベント一覧を calendar.js に渡す
+dash.clientside_callback(
+    "function(events) { window.plannerEvents = events || []; }",
+    Input('events-store', 'data'),
+)
+
 # 月ビュー → 週へジャンプ（セルクリック）
-@app.callback(
+@callback(
     Output('current-date-store','data', allow_duplicate=True),
     Output('view-switch','value', allow_duplicate=True),
     Input({'type':'date-cell','date': ALL}, 'n_clicks'),
@@ -747,7 +1699,7 @@ def jump_to_week(n_clicks, view_mode):
     # return {'year': d.year, 'month': d.month, 'anchor': date_str}, 'week'
 
 # view-switchによる直接切り替え
-@app.callback(
+@callback(
     Output('current-date-store', 'data', allow_duplicate=True),
     Input('view-switch', 'value'),
     State('current-date-store', 'data'),
@@ -760,8 +1712,8 @@ def handle_view_switch(view_mode, date_data):
     # 現在のアンカー日付を取得
     current_anchor = datetime.strptime(date_data.get('anchor'), '%Y-%m-%d').replace(tzinfo=TZ)
     
-    if view_mode == 'week':
-        # 月表示から週表示に切り替える際は、現在のアンカー日付を維持
+    if view_mode in ('week', 'agenda'):
+        # 月表示から週表示・予定リストに切り替える際は、現在のアンカー日付を維持
         return {'year': current_anchor.year, 'month': current_anchor.month, 'anchor': current_anchor.strftime('%Y-%m-%d')}
     elif view_mode == 'month':
         # 週表示から月表示に切り替える際は、アンカー日付の月の1日を使用
@@ -771,7 +1723,7 @@ def handle_view_switch(view_mode, date_data):
     raise dash.exceptions.PreventUpdate
 
 # Esc / ヘッダ or Ctrl+Z/Y → UI Intent受け
-@app.callback(
+@callback(
     Output('view-switch','value', allow_duplicate=True),
     Output('ui-intent','children', allow_duplicate=True),
     Input('ui-intent','children'),
@@ -788,28 +1740,36 @@ def handle_ui_intent(intent, date_data, view_mode):
         return dash.no_update, ''  # 消費して空に戻す
     raise dash.exceptions.PreventUpdate
 
+# ---- ジャーナル（journal.py） ----
+def initial_events():
+    """新しいセッションの events-store の初期値（ジャーナルが有効なら復元済みの最新のイベント）"""
+    current = journal.installed()
+    return current.current() if current is not None else events_init
+
+def record_change(action, sid, events_after, changed_ids):
+    """変更をジャーナルへ記録する。ログイン機能がないので操作者はセッションIDと接続元で表す"""
+    actor = {'session': sid, 'addr': request.remote_addr if has_request_context() else None}
+    journal.record(action, actor, events_after, changed_ids)
+    reminders.notify()
+
 # ---- Undo/Redo 実装 ----
-def push_history(hist_list, snapshot):
-    hist_list = hist_list or []
-    hist_list = hist_list + [snapshot]
-    if len(hist_list) > HIST_MAX:
-        hist_list = hist_list[-HIST_MAX:]
-    return hist_list
+# 履歴はサーバー側セッション（session_cache）に逆パッチで持ち、ブラウザとは件数（history-meta）だけをやり取りする
+def push_history(sid, events_before, changed_ids):
+    """changed_ids を変更する直前の状態を履歴に積み、新しい history-meta を返す"""
+    return SESSIONS.push(sid, session_cache.make_patch(events_before or [], changed_ids))
 
 # Undo/Redo ボタン or ショートカット
-@app.callback(
+@callback(
     Output('events-store','data', allow_duplicate=True),
-    Output('history-store','data', allow_duplicate=True),
-    Output('future-store','data', allow_duplicate=True),
+    Output('history-meta','data', allow_duplicate=True),
     Input('undo-button','n_clicks'),
     Input('redo-button','n_clicks'),
     Input('ui-intent','children'),  # 'undo' / 'redo' が入る
     State('events-store','data'),
-    State('history-store','data'),
-    State('future-store','data'),
+    State('session-id','data'),
     prevent_initial_call=True
 )
-def do_undo_redo(undo_clicks, redo_clicks, intent, events, hist, fut):
+def do_undo_redo(undo_clicks, redo_clicks, intent, events, sid):
     ctx = dash.callback_context
     if not ctx.triggered: raise dash.exceptions.PreventUpdate
     tid = ctx.triggered_id
@@ -821,101 +1781,134 @@ def do_undo_redo(undo_clicks, redo_clicks, intent, events, hist, fut):
     else:
         raise dash.exceptions.PreventUpdate
 
-    hist = hist or []
-    fut = fut or []
-    events = events or []
-
-    if op == 'undo':
-        if not hist: raise dash.exceptions.PreventUpdate
-        # 現在をfutureへ、history最後を現在に
-        prev = hist[-1]
-        new_hist = hist[:-1]
-        new_fut = [copy.deepcopy(events)] + fut
-        return copy.deepcopy(prev), new_hist, new_fut
-    else:  # redo
-        if not fut: raise dash.exceptions.PreventUpdate
-        next_state = fut[0]
-        new_fut = fut[1:]
-        new_hist = push_history(hist, copy.deepcopy(events))
-        return copy.deepcopy(next_state), new_hist, new_fut
+    # サーバー再起動・退避でセッションが失われていれば履歴なしとして扱う（ボタンが無効に戻る）
+    new_events, meta, changed_ids = SESSIONS.step(sid, events or [], op)
+    if new_events is None:
+        return dash.no_update, meta
+    event_index.apply_changes(events, new_events, changed_ids)
+    record_change(op, sid, new_events, changed_ids)
+    return new_events, meta
+
+# 月ビュー「+K件」→ その日の全イベントを遅延表示
+@callback(
+    Output('day-events-modal','is_open'),
+    Output('day-events-title','children'),
+    Output('day-events-body','children'),
+    Input({'type':'month-more','date': ALL}, 'n_clicks'),
+    Input('close-day-events-button','n_clicks'),
+    State('events-store','data'),
+    State('view-tz','data'),
+    prevent_initial_call=True
+)
+def toggle_day_events(more_clicks, close_clicks, events_data, tz_name):
+    ctx = dash.callback_context
+    if not ctx.triggered: raise dash.exceptions.PreventUpdate
+    if ctx.triggered_id == 'close-day-events-button':
+        return False, dash.no_update, dash.no_update
+    if all(c is None for c in more_clicks): raise dash.exceptions.PreventUpdate
+    date_str = ctx.triggered_id['date']
+    d = datetime.strptime(date_str, '%Y-%m-%d')
+    return True, f"{d.month}月{d.day}日 {format_japanese_date(d)[0]}曜日の予定", day_event_list(events_data or [], date_str, timezones.get_zone(tz_name or CONFIG['TZ']))
+
+# ペイロード診断パネル更新
+@callback(
+    Output('payload-panel-body','children'),
+    Input('payload-panel-interval','n_intervals')
+)
+def refresh_payload_panel(_n):
+    stats = getattr(dash.get_app(), 'payload_stats', None)
+    return payload_guard.render_panel(stats, CONFIG['PAYLOAD_WARN_BYTES'])
+
+def open_event_modal(built, values):
+    """イベントモーダルを開くときの (event-form, 本文, built-modals-store)
+
+    values は EVENT_FORM_DEFAULTS との差分。本文は初回だけ値を入れて生成し、2回目以降は event-form の
+    変更をクライアント側で各入力欄へ写す（本文がまだない入力欄を Output にするとコールバックが動かないため）。
+    """
+    form = {**EVENT_FORM_DEFAULTS, **values}
+    if 'event' in (built or []):
+        return form, dash.no_update, dash.no_update
+    return form, create_event_body(form), (built or []) + ['event']
+
+# event-form → 入力欄（開くたびにエラー表示も消す）
+dash.clientside_callback(
+    "function(form) { if (!form) { throw window.dash_clientside.PreventUpdate; }"
+    f" return [false, ''].concat({json.dumps(list(EVENT_FORM_DEFAULTS))}.map(function(k) {{ return form[k]; }})); }}",
+    Output('modal-error', 'is_open', allow_duplicate=True),
+    Output('modal-error', 'children', allow_duplicate=True),
+    *[Output(field, 'value') for field in EVENT_FORM_DEFAULTS],
+    Input('event-form', 'data'),
+    prevent_initial_call=True
+)
 
 # 週ビューセルクリック → 新規（履歴はまだ積まない：保存時に積む）
-@app.callback(
+@callback(
     Output('editing-id','data', allow_duplicate=True),
     Output('delete-event-button','disabled', allow_duplicate=True),
     Output('event-modal','is_open', allow_duplicate=True),
-    Output('modal-error','is_open', allow_duplicate=True),
-    Output('modal-error','children', allow_duplicate=True),
-    Output('event-title','value', allow_duplicate=True),
-    Output('event-start-date','value', allow_duplicate=True),
-    Output('event-end-date','value', allow_duplicate=True),
-    Output('event-priority','value', allow_duplicate=True),
-    Output('event-schedule-label','value', allow_duplicate=True),
-    Output('event-visibility','value', allow_duplicate=True),
-    Output('event-location','value', allow_duplicate=True),
-    Output('event-attendees','value', allow_duplicate=True),
-    Output('event-notes','value', allow_duplicate=True),
-    Output('allow-double-booking','value', allow_duplicate=True),
+    Output('event-form','data', allow_duplicate=True),
+    Output('event-modal-body','children', allow_duplicate=True),
+    Output('built-modals-store','data', allow_duplicate=True),
     Input({'type':'date-cell','date': ALL}, 'n_clicks'),
     State('view-switch','value'),
+    State('view-tz','data'),
+    State('view-hours','data'),
+    State('built-modals-store','data'),
     prevent_initial_call=True
 )
-def open_modal_from_week(n_clicks, view_mode):
+def open_modal_from_week(n_clicks, view_mode, tz_name, hours, built):
     ctx = dash.callback_context
     if not ctx.triggered or all(c is None for c in n_clicks): raise dash.exceptions.PreventUpdate
     if view_mode != 'week': raise dash.exceptions.PreventUpdate
     date_str = ctx.triggered_id['date']
-    now = datetime.now(TZ)
-    s = TZ.localize(datetime.strptime(date_str, '%Y-%m-%d')).replace(hour=now.hour, minute=now.minute, second=0, microsecond=0)
-    s = round_to_grid(s, up=True); e = round_to_grid(s + timedelta(hours=1), up=True)
-    return "", True, True, False, "", "", s.strftime('%Y-%m-%dT%H:%M'), e.strftime('%Y-%m-%dT%H:%M'), "中", "予定あり", "public", "", [], "", []
+    now = datetime.now(timezones.get_zone(tz_name or CONFIG['TZ']))
+    s = datetime.strptime(date_str, '%Y-%m-%d').replace(hour=now.hour, minute=now.minute)  # 表示タイムゾーンの壁時計
+    grid = view_geometry(hours).grid_min
+    s = round_to_grid(s, up=True, grid=grid); e = round_to_grid(s + timedelta(hours=1), up=True, grid=grid)
+    return ("", True, True) + open_event_modal(built, {'event-start-date': s.strftime('%Y-%m-%dT%H:%M'),
+                                                       'event-end-date': e.strftime('%Y-%m-%dT%H:%M')})
 
 # JS→編集オープン
-@app.callback(
+@callback(
     Output('editing-id','data', allow_duplicate=True),
     Output('delete-event-button','disabled', allow_duplicate=True),
     Output('event-modal','is_open', allow_duplicate=True),
-    Output('modal-error','is_open', allow_duplicate=True),
-    Output('modal-error','children', allow_duplicate=True),
-    Output('event-title','value', allow_duplicate=True),
-    Output('event-start-date','value', allow_duplicate=True),
-    Output('event-end-date','value', allow_duplicate=True),
-    Output('event-priority','value', allow_duplicate=True),
-    Output('event-schedule-label','value', allow_duplicate=True),
-    Output('event-visibility','value', allow_duplicate=True),
-    Output('event-location','value', allow_duplicate=True),
-    Output('event-attendees','value', allow_duplicate=True),
-    Output('event-notes','value', allow_duplicate=True),
-    Output('allow-double-booking','value', allow_duplicate=True),
+    Output('event-form','data', allow_duplicate=True),
+    Output('event-modal-body','children', allow_duplicate=True),
+    Output('built-modals-store','data', allow_duplicate=True),
     Input('edit-open-store','children'),
     State('events-store','data'),
+    State('view-tz','data'),
+    State('built-modals-store','data'),
     prevent_initial_call=True
 )
-def open_modal_for_edit(edit_id, ev_data):
+def open_modal_for_edit(edit_id, ev_data, tz_name, built):
     if not edit_id: raise dash.exceptions.PreventUpdate
     target = next((e for e in ev_data if e['id'] == edit_id), None)
     if not target: raise dash.exceptions.PreventUpdate
-    return (edit_id, False, True, False, "",
-            target.get('title',''),
-            parse_iso(target['start']).strftime('%Y-%m-%dT%H:%M'),
-            parse_iso(target['end']).strftime('%Y-%m-%dT%H:%M'),
-            target.get('priority','中'),
-            target.get('schedule_label','予定あり'),
-            target.get('visibility','public'),
-            target.get('location',''),
-            target.get('attendees',[]),
-            target.get('notes',''),
-            ["allow"] if target.get('allow_double_booking', False) else [])
+    tz = timezones.get_zone(tz_name or CONFIG['TZ'])
+    return (edit_id, False, True) + open_event_modal(built, {
+        'event-title': target.get('title',''),
+        'event-start-date': parse_iso(target['start'], tz).strftime('%Y-%m-%dT%H:%M'),
+        'event-end-date': parse_iso(target['end'], tz).strftime('%Y-%m-%dT%H:%M'),
+        'event-priority': target.get('priority','中'),
+        'event-schedule-label': target.get('schedule_label','予定あり'),
+        'event-visibility': target.get('visibility','public'),
+        'event-location': target.get('location',''),
+        'event-attendees': target.get('attendees',[]),
+        'event-notes': target.get('notes',''),
+        'event-reminders': target.get('reminders', []),
+        'allow-double-booking': ["allow"] if target.get('allow_double_booking', False) else []})
 
 # Save / Cancel / Delete（履歴に積むのは Save / Delete の直前状態）
-@app.callback(
+@callback(
     Output('event-modal','is_open', allow_duplicate=True),
     Output('modal-error','is_open', allow_duplicate=True),
     Output('modal-error','children', allow_duplicate=True),
     Output('events-store','data', allow_duplicate=True),
-    Output('history-store','data', allow_duplicate=True),
-    Output('future-store','data', allow_duplicate=True),
+    Output('history-meta','data', allow_duplicate=True),
     Output('editing-id','data', allow_duplicate=True),
+    Output('conflict-plan','data', allow_duplicate=True),
     Input('cancel-event-button','n_clicks'),
     Input('save-event-button','n_clicks'),
     Input('delete-event-button','n_clicks'),
@@ -928,45 +1921,73 @@ def open_modal_for_edit(edit_id, ev_data):
     State('event-location','value'),
     State('event-attendees','value'),
     State('event-notes','value'),
+    State('event-reminders','value'),
     State('allow-double-booking','value'),
     State('events-store','data'),
-    State('history-store','data'),
+    State('session-id','data'),
     State('editing-id','data'),
+    State('view-tz','data'),
+    State('view-hours','data'),
+    State('users-store','data'),
     prevent_initial_call=True
 )
-def close_save_delete(cancel_c, save_c, delete_c, title, start_val, end_val, priority, schedule_label, visibility, location, attendees, notes, allow_double_booking, ev_data, hist, editing_id):
+def close_save_delete(cancel_c, save_c, delete_c, title, start_val, end_val, priority, schedule_label, visibility, location, attendees, notes, reminder_minutes, allow_double_booking, ev_data, sid, editing_id, tz_name, hours, users_data):
     ctx = dash.callback_context
     if not ctx.triggered: raise dash.exceptions.PreventUpdate
     tid = ctx.triggered_id
     ev_data = ev_data or []
-    hist = hist or []
 
     # Delete
     if tid == 'delete-event-button':
-        if not editing_id: return False, False, "", dash.no_update, dash.no_update, dash.no_update, ""
-        # 履歴に現状態をPush、Redoはクリア
-        new_hist = push_history(hist, copy.deepcopy(ev_data))
-        new_fut = []
+        if not editing_id or not any(ev['id'] == editing_id for ev in ev_data):
+            return False, False, "", dash.no_update, dash.no_update, "", None
+        # 履歴に変更前の状態をPush、Redoはクリア
+        meta = push_history(sid, ev_data, [editing_id])
         new_list = [e for e in ev_data if e['id'] != editing_id]
-        return False, False, "", new_list, new_hist, new_fut, ""
+        event_index.apply_changes(ev_data, new_list, [editing_id])
+        record_change('delete', sid, new_list, [editing_id])
+        return False, False, "", new_list, meta, "", None
 
     # Save
     if tid == 'save-event-button':
         if not start_val or not end_val:
-            return True, True, "Start/End は必須です。", dash.no_update, dash.no_update, dash.no_update, editing_id
+            return True, True, "Start/End は必須です。", dash.no_update, dash.no_update, editing_id, None
+        # 入力は表示タイムゾーンの壁時計。長さの検証・保存は UTC で行う（夏時間の切り替わりを跨いでも正しい）
+        tz = timezones.get_zone(tz_name or CONFIG['TZ'])
         try:
-            s = TZ.localize(datetime.strptime(start_val, '%Y-%m-%dT%H:%M'))
-            e = TZ.localize(datetime.strptime(end_val,   '%Y-%m-%dT%H:%M'))
+            s = wall_to_utc(start_val, tz)
+            e = wall_to_utc(end_val, tz)
         except Exception:
-            return True, True, "日付の形式が不正です。", dash.no_update, dash.no_update, dash.no_update, editing_id
+            return True, True, "日付の形式が不正です。", dash.no_update, dash.no_update, editing_id, None
         if e < s:
-            return True, True, "終了は開始以上である必要があります。", dash.no_update, dash.no_update, dash.no_update, editing_id
+            return True, True, "終了は開始以上である必要があります。", dash.no_update, dash.no_update, editing_id, None
         if (e - s) > timedelta(hours=24):
-            return True, True, "最長24時間までです。", dash.no_update, dash.no_update, dash.no_update, editing_id
-        s = round_to_grid(s, up=False); e = round_to_grid(e, up=True)
-        
+            return True, True, "最長24時間までです。", dash.no_update, dash.no_update, editing_id, None
+        grid = view_geometry(hours).grid_min
+        s = wall_to_utc(start_val, tz, up=False, grid=grid); e = wall_to_utc(end_val, tz, up=True, grid=grid)
+
+        new_id = editing_id or str(uuid.uuid4())
+        fields = {'title': (title or "新しいイベント").strip(),
+                  'start': timezones.to_utc_iso(s), 'end': timezones.to_utc_iso(e),
+                  'priority': priority or "中",
+                  'schedule_label': schedule_label or "予定あり",
+                  'visibility': visibility or "public",
+                  'location': location or "",
+                  'attendees': attendees or [],
+                  'notes': notes or "",
+                  'reminders': sorted(reminder_minutes or []),
+                  'allow_double_booking': "allow" in (allow_double_booking or [])}
+        current = next((ev for ev in ev_data if ev['id'] == editing_id), None) if editing_id else None
+        if editing_id:
+            if current is None:  # 編集中に別の操作（Undo・一括削除など）で消えた予定は保存しない
+                return True, True, "この予定は削除されています。", dash.no_update, dash.no_update, editing_id, None
+            saved = {**current, **fields}
+        else:
+            saved = {'id': new_id, **fields, 'created_by': 'user_a',  # 登録者
+                     'attendees': (attendees or []) + ['user_a']}     # 登録者も参加者に含める
+
         # ダブルブッキング検証（許可されていない場合）
-        if not ("allow" in (allow_double_booking or [])):
+        if not fields['allow_double_booking']:
             all_attendees = (attendees or []) + (['user_a'] if not editing_id else [])
             conflicts = check_double_booking(s, e, all_attendees, ev_data, editing_id)
             if conflicts:
@@ -975,116 +1996,173 @@ def close_save_delete(cancel_c, save_c, delete_c, title, start_val, end_val, pri
                     event_title = conflict['event']['title']
                     common_users = conflict['common_attendees']
                     conflict_msgs.append(f"「{event_title}」と参加者が重複: {', '.join(common_users)}")
-                return True, True, f"ダブルブッキングが検出されました:\n" + "\n".join(conflict_msgs), dash.no_update, dash.no_update, dash.no_update, editing_id
-        
-        # 履歴に現状態をPush、Redoはクリア
-        new_hist = push_history(hist, copy.deepcopy(ev_data))
-        new_fut = []
+                plan = conflict_plan({**fields, 'id': new_id, 'attendees': all_attendees}, ev_data, tz, users_data, hours)
+                plan['event'] = saved
+                return True, True, f"ダブルブッキングが検出されました:\n" + "\n".join(conflict_msgs), dash.no_update, dash.no_update, editing_id, plan
 
-        new_list = copy.deepcopy(ev_data)
+        new_list = list(ev_data)
+        # 履歴に変更前の状態をPush、Redoはクリア
+        meta = push_history(sid, ev_data, [new_id])
         if editing_id:
             for i, ev in enumerate(new_list):
                 if ev['id'] == editing_id:
-                    new_list[i] = {**ev, 'title': (title or "新しいイベント").strip(),
-                                   'start': s.isoformat(), 'end': e.isoformat(),
-                                   'priority': priority or "中",
-                                   'schedule_label': schedule_label or "予定あり",
-                                   'visibility': visibility or "public",
-                                   'location': location or "",
-                                   'attendees': attendees or [],
-                                   'notes': notes or "",
-                                   'allow_double_booking': "allow" in (allow_double_booking or [])}
+                    new_list[i] = saved
                     break
         else:
-            new_list.append({'id': str(uuid.uuid4()),
-                             'title': (title or "新しいイベント").strip(),
-                             'start': s.isoformat(), 'end': e.isoformat(),
-                             'created_by': 'user_a',  # 登録者
-                             'priority': priority or "中",
-                             'schedule_label': schedule_label or "予定あり",
-                             'visibility': visibility or "public",
-                             'location': location or "",
-                             'attendees': (attendees or []) + ['user_a'],  # 登録者も参加者に含める
-                             'notes': notes or "",
-                             'allow_double_booking': "allow" in (allow_double_booking or [])})
-        return False, False, "", new_list, new_hist, new_fut, ""
+            new_list.append(saved)
+        event_index.apply_changes(ev_data, new_list, [new_id])
+        record_change('update' if editing_id else 'create', sid, new_list, [new_id])
+        return False, False, "", new_list, meta, "", None
 
     # Cancel
-    return False, False, "", dash.no_update, dash.no_update, dash.no_update, editing_id
+    return False, False, "", dash.no_update, dash.no_update, editing_id, None
+
+def conflict_plan(target, ev_data, tz, users_data, hours):
+    """保存しようとした予定の枠を空けるための移動案（conflict-plan ストアの形式）
+
+    移動案は保存時点のイベント一覧（key）に対して有効。時刻は表示用に tz の壁時計、適用用に epoch 秒で持つ。
+    """
+    key = event_index.fingerprint(ev_data)
+    hours = hours or {}
+    plan = rescheduler.propose(target, ev_data, tz, users_data, hours.get('start_h', START_H), hours.get('end_h', END_H),
+                               view_geometry(hours).grid_min, key)
+    wall = lambda ts: datetime.fromtimestamp(ts, tz).strftime('%Y-%m-%dT%H:%M')  # noqa: E731
+    return {'key': str(key), 'priority': target['priority'],  # JSON の数値では桁が落ちるので文字列で持つ
+            'moves': [{**m, 'from_wall': [wall(t) for t in m['from']], 'to_wall': [wall(t) for t in m['to']]}
+                      for m in plan['moves']],
+            'tolerated': [ev.get('title', '') for ev in plan['tolerated']],
+            'blockers': [ev.get('title', '') for ev in plan['blockers']],
+            'unplaced': [ev.get('title', '') for ev in plan['unplaced']]}
+
+# 衝突の解消案のプレビュー（エラー表示中のみ）
+@callback(
+    Output('conflict-plan-preview', 'children'),
+    Input('conflict-plan', 'data'),
+    Input('modal-error', 'is_open'),
+    State('users-store', 'data'),
+)
+def render_conflict_plan(plan, error_open, users_data):
+    if not plan or not error_open or not (plan['moves'] or plan['blockers']):
+        return []
+    if plan['blockers'] or plan['unplaced']:
+        reason = (f"同じか高い優先度の予定と重なっています: {'、'.join(plan['blockers'])}" if plan['blockers'] else
+                  f"移動先が見つからない予定があります: {'、'.join(plan['unplaced'])}")
+        return dbc.Alert(f"優先度による自動調整はできません。{reason}", color="secondary", className="small mb-3")
+    names = {u['id']: u['name'] for u in users_data or []}
+    rows = [html.Li([
+        html.Span(m['title'], className="fw-bold me-2"),
+        html.Span(f"優先度:{m['priority']}", className="badge me-2", style=month_badge_style(m['priority'])),
+        html.Span(f"{m['from_wall'][0][5:10].replace('-', '/')} {m['from_wall'][0][11:]}–{m['from_wall'][1][11:]} → "
+                  f"{m['to_wall'][0][5:10].replace('-', '/')} {m['to_wall'][0][11:]}–{m['to_wall'][1][11:]}",
+                  className="me-2"),
+        html.Span(", ".join(names.get(a, a) for a in m['attendees']), className="small text-muted"),
+    ], className="list-group-item") for m in plan['moves']]
+    note = f"（ダブルブッキング許可の予定はそのまま: {'、'.join(plan['tolerated'])}）" if plan['tolerated'] else ""
+    return dbc.Alert([
+        html.Div(f"優先度「{plan['priority']}」の予定を優先し、次の予定を移動できます{note}", className="small mb-2"),
+        html.Ul(rows, className="list-group mb-2"),
+        dbc.Button("移動して保存", id="apply-conflict-plan-button", color="warning", size="sm"),
+    ], color="warning", className="mb-3")
+
+# 解消案の適用（保存と移動を1回の Undo で戻せる1操作として履歴に積む）
+@callback(
+    Output('event-modal','is_open', allow_duplicate=True),
+    Output('modal-error','is_open', allow_duplicate=True),
+    Output('modal-error','children', allow_duplicate=True),
+    Output('events-store','data', allow_duplicate=True),
+    Output('history-meta','data', allow_duplicate=True),
+    Output('editing-id','data', allow_duplicate=True),
+    Output('conflict-plan','data', allow_duplicate=True),
+    Input('apply-conflict-plan-button', 'n_clicks'),
+    State('conflict-plan', 'data'),
+    State('events-store','data'),
+    State('session-id','data'),
+    State('editing-id','data'),
+    prevent_initial_call=True
+)
+def apply_conflict_plan(n_clicks, plan, ev_data, sid, editing_id):
+    if not n_clicks or not plan or not plan.get('event'): raise dash.exceptions.PreventUpdate
+    ev_data = ev_data or []
+    if plan['key'] != str(event_index.fingerprint(ev_data)):
+        return (True, True, "保存後に予定が更新されました。もう一度保存してください。", dash.no_update, dash.no_update,
+                editing_id, None)
+    saved = plan['event']
+    new_list = [saved if ev['id'] == saved['id'] else ev for ev in ev_data]
+    if not any(ev['id'] == saved['id'] for ev in ev_data):
+        new_list.append(saved)
+    new_list = rescheduler.apply_moves(new_list, plan['moves'])
+    changed = [saved['id']] + [m['id'] for m in plan['moves']]
+    meta = push_history(sid, ev_data, changed)
+    event_index.apply_changes(ev_data, new_list, changed)
+    record_change('reschedule', sid, new_list, changed)
+    return False, False, "", new_list, meta, "", None
 
 # ダブルブッキング検証関数
 def check_double_booking(new_start, new_end, new_attendees, existing_events, exclude_id=None):
-    """ダブルブッキングをチェックする関数"""
+    """ダブルブッキングをチェックする関数（時間の重なりはイベント一覧の区間インデックスで引く）"""
+    wanted = set(new_attendees)
+    if not wanted:
+        return []
+    lo, hi = int(new_start.timestamp()), int(new_end.timestamp())
     conflicts = []
-    for event in existing_events:
-        if exclude_id and event['id'] == exclude_id:
+    for _, event_end, event in event_index.index_for(existing_events, TZ).window(lo, hi):
+        if event_end <= lo or (exclude_id and event['id'] == exclude_id):
             continue
-        
-        event_start = parse_iso(event['start'])
-        event_end = parse_iso(event['end'])
-        
-        # 時間の重複チェック
-        if not (new_end <= event_start or new_start >= event_end):
-            # 参加者の重複チェック
-            event_attendees = event.get('attendees', [])
-            common_attendees = set(new_attendees) & set(event_attendees)
-            if common_attendees:
-                conflicts.append({
-                    'event': event,
-                    'common_attendees': list(common_attendees)
-                })
-    
+        # 参加者の重複チェック
+        common_attendees = wanted.intersection(event.get('attendees') or [])
+        if common_attendees:
+            conflicts.append({
+                'event': event,
+                'common_attendees': list(common_attendees)
+            })
+
     return conflicts
 
 # LLM → 新規作成プリセット（履歴は保存時に積む）
-@app.callback(
+@callback(
     Output('editing-id','data', allow_duplicate=True),
     Output('delete-event-button','disabled', allow_duplicate=True),
     Output('event-modal','is_open', allow_duplicate=True),
-    Output('modal-error','is_open', allow_duplicate=True),
-    Output('modal-error','children', allow_duplicate=True),
-    Output('event-title','value', allow_duplicate=True),
-    Output('event-start-date','value', allow_duplicate=True),
-    Output('event-end-date','value', allow_duplicate=True),
-    Output('event-priority','value', allow_duplicate=True),
-    Output('event-schedule-label','value', allow_duplicate=True),
-    Output('event-visibility','value', allow_duplicate=True),
-    Output('event-location','value', allow_duplicate=True),
-    Output('event-attendees','value', allow_duplicate=True),
-    Output('event-notes','value', allow_duplicate=True),
-    Output('allow-double-booking','value', allow_duplicate=True),
+    Output('event-form','data', allow_duplicate=True),
+    Output('event-modal-body','children', allow_duplicate=True),
+    Output('built-modals-store','data', allow_duplicate=True),
     Output('llm-output','children'),
     Input('llm-submit','n_clicks'),
     State('llm-input','value'),
+    State('view-tz','data'),
+    State('built-modals-store','data'),
     prevent_initial_call=True
 )
-def llm_preset_modal(n_clicks, text):
+def llm_preset_modal(n_clicks, text, tz_name, built):
     if not text: raise dash.exceptions.PreventUpdate
-    parsed = dummy_llm_api(text)
+    parsed = dummy_llm_api(text, timezones.get_zone(tz_name or CONFIG['TZ']))
     
     # 空き時間検索の場合
     if parsed.get('type') == 'available_slots':
         # 仮のイベントデータを取得（実際のコールバックでは events_data を State として取得）
         # ここでは簡略化してメッセージのみ返す
         msg = f"空き時間検索: {parsed['message']}\n期間: {parsed['start_date']} ～ {parsed['end_date']}\n対象: {', '.join([f'ユーザー{u[-1].upper()}' for u in parsed['users']])}"
-        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, msg
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, msg
     
     # 通常のイベント作成
     msg = f"LLM解析結果 → タイトル: {parsed['title']}, 開始: {parsed['start']}, 終了: {parsed['end']}, 優先度: {parsed['priority']}, ラベル: {parsed['schedule_label']}"
-    return "", True, True, False, "", parsed['title'], parsed['start'], parsed['end'], parsed['priority'], parsed['schedule_label'], "public", "", [], "", [], msg
+    form = {'event-title': parsed['title'], 'event-start-date': parsed['start'], 'event-end-date': parsed['end'],
+            'event-priority': parsed['priority'], 'event-schedule-label': parsed['schedule_label']}
+    return ("", True, True) + open_event_modal(built, form) + (msg,)
 
 # JSドラッグ更新（適用直前に履歴へ積む）
-@app.callback(
+@callback(
     Output('events-store','data', allow_duplicate=True),
-    Output('history-store','data', allow_duplicate=True),
-    Output('future-store','data', allow_duplicate=True),
+    Output('history-meta','data', allow_duplicate=True),
     Input('drag-update-store','children'),
     State('drag-update-store','children'),
     State('events-store','data'),
-    State('history-store','data'),
+    State('session-id','data'),
+    State('view-tz','data'),
+    State('view-hours','data'),
     prevent_initial_call=True
 )
-def apply_drag_update(_evt, raw, ev_data, hist):
+def apply_drag_update(_evt, raw, ev_data, sid, tz_name, hours):
     if not raw: raise dash.exceptions.PreventUpdate
     try:
         payload = json.loads(raw)
@@ -1093,40 +2171,45 @@ def apply_drag_update(_evt, raw, ev_data, hist):
     eid, start_s, end_s = payload.get("id"), payload.get("start"), payload.get("end")
     if not (eid and start_s and end_s): raise dash.exceptions.PreventUpdate
 
-    s = TZ.localize(datetime.strptime(start_s, '%Y-%m-%dT%H:%M'))
-    e = TZ.localize(datetime.strptime(end_s,   '%Y-%m-%dT%H:%M'))
+    # JS は表示タイムゾーンの壁時計で送ってくる
+    tz = timezones.get_zone(tz_name or CONFIG['TZ'])
+    grid = view_geometry(hours).grid_min
+    try:
+        s = wall_to_utc(start_s, tz, up=False, grid=grid)
+        e = wall_to_utc(end_s, tz, up=True, grid=grid)
+    except ValueError:
+        raise dash.exceptions.PreventUpdate
     if e < s: raise dash.exceptions.PreventUpdate
     if (e - s) > timedelta(hours=24): e = s + timedelta(hours=24)
-    s = round_to_grid(s, up=False); e = round_to_grid(e, up=True)
 
-    # 履歴に現状態をPush、Redoはクリア
-    new_hist = push_history(hist or [], copy.deepcopy(ev_data or []))
-    new_fut = []
+    # 履歴に変更前の状態をPush、Redoはクリア
+    meta = push_history(sid, ev_data, [eid])
 
     new_list = []
     for ev in (ev_data or []):
         if ev['id'] == eid:
-            upd = ev.copy(); upd['start'] = s.isoformat(); upd['end'] = e.isoformat()
+            upd = ev.copy(); upd['start'] = timezones.to_utc_iso(s); upd['end'] = timezones.to_utc_iso(e)
             new_list.append(upd)
         else:
             new_list.append(ev)
-    return new_list, new_hist, new_fut
+    event_index.apply_changes(ev_data, new_list, [eid])
+    record_change('move', sid, new_list, [eid])
+    return new_list, meta
 
 # 年月選択モーダル開くコールバック
-@app.callback(
+@callback(
     Output('date-picker-modal', 'is_open', allow_duplicate=True),
-    Output('year-select', 'value', allow_duplicate=True),
-    Output('month-select', 'value', allow_duplicate=True),
+    Output('date-picker-body', 'children'),
     Input('current-month-year', 'n_clicks'),
     State('current-date-store', 'data'),
     prevent_initial_call=True
 )
 def open_date_picker(n_clicks, date_data):
     if not n_clicks: raise dash.exceptions.PreventUpdate
-    return True, date_data.get('year'), date_data.get('month')
+    return True, create_date_picker_body(date_data.get('year'), date_data.get('month'))
 
 # 年月選択・移動・キャンセル
-@app.callback(
+@callback(
     Output('date-picker-modal', 'is_open', allow_duplicate=True),
     Output('current-date-store', 'data', allow_duplicate=True),
     Input('cancel-date-button', 'n_clicks'),
@@ -1148,7 +2231,7 @@ def date_picker_actions(cancel_clicks, jump_clicks, selected_year, selected_mont
     raise dash.exceptions.PreventUpdate
 
 # グループフィルタのオプション更新
-@app.callback(
+@callback(
     Output('group-filter', 'options'),
     Input('groups-store', 'data')
 )
@@ -1158,19 +2241,28 @@ def update_group_filter_options(groups_data):
         options.append({"label": group['name'], "value": group['id']})
     return options
 
-# ユーザーフィルターのオプション更新
-@app.callback(
+# 現在のグループ（カレンダーはメンバーが参加するイベントだけ表示）
+@callback(
+    Output('current-group', 'data'),
+    Input('group-filter', 'value'),
+    prevent_initial_call=False
+)
+def update_current_group(selected_group):
+    return selected_group or "all"
+
+# ユーザーフィルターの候補
+@callback(
     Output('user-filter', 'options'),
-    Input('users-store', 'data')
+    Input('user-filter', 'search_value'),
+    Input('user-filter', 'value'),
+    Input('directory-version', 'data'),
+    State('users-store', 'data')
 )
-def update_user_filter_options(users_data):
-    options = [{"label": "すべて", "value": "all"}]
-    for user in users_data:
-        options.append({"label": user['name'], "value": user['id']})
-    return options
+def update_user_filter_options(search_value, value, version, users_data):
+    return [{"label": "すべて", "value": "all"}] + user_directory.users(users_data).options(search_value, value)
 
 # 現在のユーザー状態を管理
-@app.callback(
+@callback(
     Output('current-user', 'data'),
     Input('user-filter', 'value'),
     prevent_initial_call=False
@@ -1178,72 +2270,634 @@ def update_user_filter_options(users_data):
 def update_current_user(selected_user):
     return selected_user or "all"
 
-# 参加者選択のオプション更新
-@app.callback(
-    Output('event-attendees', 'options'),
-    Input('users-store', 'data')
+# 表示タイムゾーン・表示時間帯 = 選択中ユーザーの設定（「すべて」は既定）
+@callback(
+    Output('view-tz', 'data'),
+    Output('view-hours', 'data'),
+    Input('current-user', 'data'),
+    Input('users-store', 'data'),
+    Input('full-day-switch', 'value')
+)
+def update_view_settings(current_user, users_data, full_day):
+    return user_tz(users_data, current_user), view_hours(users_data, current_user, bool(full_day))
+
+# ユーザー・グループ一覧の版（変わったら一覧・候補を描き直す）
+@callback(
+    Output('directory-version', 'data'),
+    Input('users-store', 'data'),
+    Input('groups-store', 'data')
+)
+def update_directory_version(users_data, groups_data):
+    reminders.remember_users(users_data)  # リマインダーの宛先（セッションのユーザー一覧を集める）
+    return user_directory.version(users_data, groups_data)
+
+# 参加者選択の候補（入力に前方一致する上位だけ + 選択中のユーザー）
+def user_dropdown_options(search_value, value, version, users_data):
+    return user_directory.users(users_data).options(search_value, value)
+
+for dropdown_id in USER_DROPDOWNS:
+    callback(
+        Output(dropdown_id, 'options'),
+        Input(dropdown_id, 'search_value'),
+        Input(dropdown_id, 'value'),
+        Input('directory-version', 'data'),
+        State('users-store', 'data'),
+    )(user_dropdown_options)
+
+# 検索モーダル開閉（本文は初回オープン時に生成）
+@callback(
+    Output('search-modal', 'is_open'),
+    Output('search-body', 'children'),
+    Output('built-modals-store', 'data', allow_duplicate=True),
+    Input('open-search-modal-button', 'n_clicks'),
+    Input('close-search-modal-button', 'n_clicks'),
+    State('built-modals-store', 'data'),
+    prevent_initial_call=True
+)
+def toggle_search_modal(open_clicks, close_clicks, built):
+    ctx = dash.callback_context
+    if not ctx.triggered: raise dash.exceptions.PreventUpdate
+    is_open = ctx.triggered_id == 'open-search-modal-button'
+    if is_open and 'search' not in (built or []):
+        return True, create_search_body(), (built or []) + ['search']
+    return is_open, dash.no_update, dash.no_update
+
+# 検索の実行とページ送り（条件が変わったら先頭ページへ）
+@callback(
+    Output('search-results', 'children'),
+    Output('search-summary', 'children'),
+    Output('search-page', 'data'),
+    Output('search-prev', 'disabled'),
+    Output('search-next', 'disabled'),
+    Input('search-query', 'value'),
+    Input('search-priority', 'value'),
+    Input('search-label', 'value'),
+    Input('search-attendees', 'value'),
+    Input('search-visibility', 'value'),
+    Input('search-from', 'value'),
+    Input('search-to', 'value'),
+    Input('search-prev', 'n_clicks'),
+    Input('search-next', 'n_clicks'),
+    State('search-page', 'data'),
+    State('view-tz', 'data'),
+    State('users-store', 'data'),
+    State('events-store', 'data'),
+)
+def update_search_results(query, priorities, labels, attendees, visibility, date_from, date_to,
+                          prev_c, next_c, page, tz_name, users_data, events_data):
+    filters = {'priority': priorities, 'schedule_label': labels, 'attendees': attendees, 'visibility': visibility}
+    if not (query or '').strip() and not any(filters.values()) and not (date_from or date_to):
+        return [], "キーワードまたは条件を入力してください", 0, True, True
+    tid = dash.callback_context.triggered_id
+    page = page or 0
+    page = max(0, page - 1) if tid == 'search-prev' else (page + 1 if tid == 'search-next' else 0)
+    tz = timezones.get_zone(tz_name or CONFIG['TZ'])
+    per_page = event_search.SEARCH_PAGE_SIZE
+    try:
+        total, rows = run_search(event_index.index_for(events_data, TZ), query, filters, date_from, date_to, tz,
+                                 page, per_page)
+    except ValueError:
+        return [], "日付の形式が不正です。", 0, True, True
+    names = {u['id']: u['name'] for u in users_data or []}
+    items = []
+    for r in rows:
+        items.append(html.Li([
+            html.Span(f"{r['start'][:10]} {r['start'][11:]}–{r['end'][11:]}", className="me-2 text-muted small"),
+            html.Span(r['title'], className="me-2 fw-bold"),
+            html.Span(f"優先度:{r['priority']}", className="badge me-1", style=month_badge_style(r['priority'])),
+            html.Span(r['schedule_label'], className="badge me-1",
+                      style={"background": SCHEDULE_LABELS.get(r['schedule_label'], SCHEDULE_LABELS['予定あり'])["bg"],
+                             "color": "#172B4D"}),
+            html.Span(", ".join(names.get(a, a) for a in r['attendees']), className="small text-muted"),
+        ], id={'type': 'search-result', 'date': r['start'][:10], 'id': r['id']},
+            className="list-group-item list-group-item-action", style={"cursor": "pointer"}))
+    first = page * per_page + 1 if rows else 0
+    summary = f"{total}件中 {first}–{page * per_page + len(rows)}件"
+    return (html.Ul(items, className="list-group") if items else html.P("該当する予定はありません", className="text-muted"),
+            summary, page, page == 0, (page + 1) * per_page >= total)
+
+# 検索結果 → その週へ移動
+@callback(
+    Output('current-date-store', 'data', allow_duplicate=True),
+    Output('view-switch', 'value', allow_duplicate=True),
+    Output('search-modal', 'is_open', allow_duplicate=True),
+    Input({'type': 'search-result', 'date': ALL, 'id': ALL}, 'n_clicks'),
+    prevent_initial_call=True
+)
+def jump_to_search_result(n_clicks):
+    ctx = dash.callback_context
+    if not ctx.triggered or all(c is None for c in n_clicks): raise dash.exceptions.PreventUpdate
+    date_str = ctx.triggered_id['date']
+    d = datetime.strptime(date_str, '%Y-%m-%d')
+    return {'year': d.year, 'month': d.month, 'anchor': date_str}, 'week', False
+
+# 分析モーダル開閉（本文は初回オープン時に生成）
+@callback(
+    Output('analytics-modal', 'is_open'),
+    Output('analytics-body', 'children'),
+    Output('built-modals-store', 'data', allow_duplicate=True),
+    Input('open-analytics-modal-button', 'n_clicks'),
+    Input('close-analytics-modal-button', 'n_clicks'),
+    State('built-modals-store', 'data'),
+    State('groups-store', 'data'),
+    prevent_initial_call=True
+)
+def toggle_analytics_modal(open_clicks, close_clicks, built, groups_data):
+    ctx = dash.callback_context
+    if not ctx.triggered: raise dash.exceptions.PreventUpdate
+    is_open = ctx.triggered_id == 'open-analytics-modal-button'
+    if is_open and 'analytics' not in (built or []):
+        return True, create_analytics_body(groups_data), (built or []) + ['analytics']
+    return is_open, dash.no_update, dash.no_update
+
+# 分析ダッシュボード描画（集計は版ごとにキャッシュされ、変更は差分で反映される）
+@callback(
+    Output('analytics-output', 'children'),
+    Input('analytics-weeks', 'value'),
+    Input('analytics-group', 'value'),
+    Input('analytics-modal', 'is_open'),
+    State('current-date-store', 'data'),
+    State('view-tz', 'data'),
+    State('users-store', 'data'),
+    State('groups-store', 'data'),
+    State('events-store', 'data'),
+)
+def update_analytics(weeks, group_id, is_open, date_data, tz_name, users_data, groups_data, events_data):
+    if not is_open: raise dash.exceptions.PreventUpdate
+    import analytics  # pandas / NumPy は分析を開いたときに初めて読み込む
+    tz = timezones.get_zone(tz_name or CONFIG['TZ'])
+    idx = event_index.index_for(events_data, TZ)
+    agg = analytics.aggregates_for(idx.events, tz, START_H, END_H, idx.key)
+    anchor = datetime.strptime(date_data['anchor'], '%Y-%m-%d').date()
+    weeks = weeks or ANALYTICS_WEEK_CHOICES[0]
+    first_week = analytics.week_of(analytics.day_number(anchor)) - 7 * (weeks - 1)
+    return generate_analytics_view(agg, users_data, groups_data, group_id, first_week, weeks)
+
+# 複数選択 → ツールバーの件数・ボタン
+@callback(
+    Output('selection-count', 'children'),
+    Output('open-bulk-modal-button', 'disabled'),
+    Output('clear-selection-button', 'disabled'),
+    Input('selection-store', 'children'),
+)
+def update_selection_toolbar(raw):
+    ids = parse_selection(raw)
+    return (f"{len(ids)}件選択中" if ids else ""), not ids, not ids
+
+def parse_selection(raw):
+    try:
+        ids = json.loads(raw) if raw else []
+    except ValueError:
+        return []
+    return [i for i in ids if isinstance(i, str)] if isinstance(ids, list) else []
+
+@callback(
+    Output('selection-store', 'children', allow_duplicate=True),
+    Input('clear-selection-button', 'n_clicks'),
+    prevent_initial_call=True
+)
+def clear_selection(n_clicks):
+    return "[]"
+
+# 一括編集モーダル開閉（本文は初回オープン時に生成）
+@callback(
+    Output('bulk-modal', 'is_open'),
+    Output('bulk-body', 'children'),
+    Output('bulk-modal-title', 'children'),
+    Output('built-modals-store', 'data', allow_duplicate=True),
+    Input('open-bulk-modal-button', 'n_clicks'),
+    Input('close-bulk-modal-button', 'n_clicks'),
+    State('selection-store', 'children'),
+    State('built-modals-store', 'data'),
+    prevent_initial_call=True
+)
+def toggle_bulk_modal(open_clicks, close_clicks, raw, built):
+    ctx = dash.callback_context
+    if not ctx.triggered: raise dash.exceptions.PreventUpdate
+    is_open = ctx.triggered_id == 'open-bulk-modal-button'
+    title = f"{len(parse_selection(raw))}件のイベントを一括編集"
+    if is_open and 'bulk' not in (built or []):
+        return True, create_bulk_body(), title, (built or []) + ['bulk']
+    return is_open, dash.no_update, title, dash.no_update
+
+# 一括編集の適用（1回の走査で反映し、履歴は変更のあったイベントだけの1エントリ）
+@callback(
+    Output('events-store', 'data', allow_duplicate=True),
+    Output('history-meta', 'data', allow_duplicate=True),
+    Output('bulk-modal', 'is_open', allow_duplicate=True),
+    Output('bulk-error', 'is_open'),
+    Output('bulk-error', 'children'),
+    Output('selection-store', 'children', allow_duplicate=True),
+    Input('bulk-apply-button', 'n_clicks'),
+    Input('bulk-delete-button', 'n_clicks'),
+    State('selection-store', 'children'),
+    State('bulk-shift', 'value'),
+    State('bulk-shift-unit', 'value'),
+    State('bulk-priority', 'value'),
+    State('bulk-label', 'value'),
+    State('bulk-add-attendees', 'value'),
+    State('bulk-remove-attendees', 'value'),
+    State('events-store', 'data'),
+    State('session-id', 'data'),
+    State('view-tz', 'data'),
+    prevent_initial_call=True
+)
+def apply_bulk_edit(apply_c, delete_c, raw, shift, unit, priority, label, add, remove, ev_data, sid, tz_name):
+    ctx = dash.callback_context
+    if not ctx.triggered: raise dash.exceptions.PreventUpdate
+    ids = parse_selection(raw)
+    if not ids:
+        return dash.no_update, dash.no_update, False, False, "", "[]"
+    ops = {'shift': shift, 'unit': unit, 'priority': priority, 'schedule_label': label,
+           'add_attendees': add, 'remove_attendees': remove, 'delete': ctx.triggered_id == 'bulk-delete-button'}
+    try:
+        new_list, changed = bulk_edit.apply(ev_data, ids, ops, timezones.get_zone(tz_name or CONFIG['TZ']))
+    except (TypeError, ValueError) as exc:
+        return dash.no_update, dash.no_update, True, True, f"指定が不正です: {exc}", dash.no_update
+    if not changed:
+        return dash.no_update, dash.no_update, False, False, "", dash.no_update
+    meta = push_history(sid, ev_data, changed)
+    event_index.apply_changes(ev_data, new_list, changed)
+    record_change('bulk_delete' if ops['delete'] else 'bulk_edit', sid, new_list, changed)
+    return new_list, meta, False, False, "", "[]"
+
+# 版の履歴モーダル開閉（本文は初回オープン時に生成）
+@callback(
+    Output('revision-modal', 'is_open'),
+    Output('revision-body', 'children'),
+    Output('built-modals-store', 'data', allow_duplicate=True),
+    Input('open-revision-modal-button', 'n_clicks'),
+    Input('close-revision-modal-button', 'n_clicks'),
+    State('built-modals-store', 'data'),
+    State('current-date-store', 'data'),
+    prevent_initial_call=True
+)
+def toggle_revision_modal(open_clicks, close_clicks, built, date_data):
+    ctx = dash.callback_context
+    if not ctx.triggered: raise dash.exceptions.PreventUpdate
+    is_open = ctx.triggered_id == 'open-revision-modal-button'
+    if is_open and 'revision' not in (built or []):
+        return True, create_revision_body((date_data or {}).get('anchor')), (built or []) + ['revision']
+    return is_open, dash.no_update, dash.no_update
+
+def revision_label(rev, tz):
+    when = datetime.fromtimestamp(rev['ts'], tz).strftime('%Y-%m-%d %H:%M:%S')
+    return f"#{rev['seq']} {when} {REVISION_ACTIONS.get(rev['action'], rev['action'])}（{rev['changed']}件）"
+
+# 版の選択肢（開くたびに最近の版を読み直す。日時を入れたらその時点の版を選ぶ）
+@callback(
+    Output('revision-select', 'options'),
+    Output('revision-select', 'value'),
+    Input('revision-modal', 'is_open'),
+    Input('revision-at', 'value'),
+    State('view-tz', 'data'),
+)
+def update_revision_options(is_open, at_value, tz_name):
+    current = journal.installed()
+    if not is_open or current is None:
+        return [], None
+    tz = timezones.get_zone(tz_name or CONFIG['TZ'])
+    recent = current.revisions(REVISION_LIST_LIMIT)
+    value = recent[0]['seq'] if recent else 0
+    if dash.callback_context.triggered_id == 'revision-at' and at_value:
+        try:
+            value = current.revision_at(timezones.iso_epoch(at_value, tz))
+        except ValueError:
+            raise dash.exceptions.PreventUpdate
+        if value and all(r['seq'] != value for r in recent):
+            recent = current.revisions(1, value + 1) + recent
+    options = [{'label': revision_label(r, tz), 'value': r['seq']} for r in recent]
+    return options + [{'label': "#0 ジャーナル開始前", 'value': 0}], value
+
+def revision_change_item(before, after, tz):
+    """現在との差分の1行（過去の版 → 現在）"""
+    ev = after or before
+
+    def when(e):
+        return datetime.fromtimestamp(timezones.iso_epoch(e['start'], TZ), tz).strftime('%Y-%m-%d %H:%M')
+    if before is None:
+        kind, detail = "追加", when(after)
+    elif after is None:
+        kind, detail = "削除", when(before)
+    else:
+        kind = "変更"
+        detail = f"{when(before)} → {when(after)}" if before['start'] != after['start'] else when(after)
+    return html.Li([html.Span(kind, className="badge bg-secondary me-2"),
+                    html.Span(ev.get('title', ''), className="me-2 fw-bold"),
+                    html.Span(detail, className="small text-muted")], className="list-group-item")
+
+# 選んだ版の週の予定（閲覧のみ）と現在との差分
+@callback(
+    Output('revision-view', 'children'),
+    Output('revision-diff', 'children'),
+    Input('revision-select', 'value'),
+    Input('revision-week', 'value'),
+    State('view-tz', 'data'),
+)
+def render_revision(seq, week, tz_name):
+    history = revisions.installed()
+    if history is None:
+        return dbc.Alert("ジャーナルが無効なため版の履歴はありません（JOURNAL_DIR を設定してください）",
+                         color="secondary"), []
+    if seq is None or not week:
+        raise dash.exceptions.PreventUpdate
+    tz = timezones.get_zone(tz_name or CONFIG['TZ'])
+    try:
+        start = datetime.strptime(week, '%Y-%m-%d').date()
+        events = history.events_at(seq)
+        latest = history.journal.latest()
+        diff = history.diff(seq, latest)
+    except ValueError as exc:
+        return dbc.Alert(str(exc), color="warning"), []
+    rows = event_index.index_for(events, TZ).agenda_rows(start, 7, tz)
+    items = []
+    for r in rows:
+        if r['type'] == 'day':
+            items.append(html.Li(r['date'], className="list-group-item list-group-item-secondary small fw-bold"))
+        else:
+            items.append(html.Li([
+                html.Span(f"{r['start'][11:]}–{r['end'][11:]}", className="me-2 text-muted small"),
+                html.Span(r['title'], className="me-2 fw-bold"),
+                html.Span(r['location'], className="small text-muted"),
+            ], className="list-group-item"))
+    view = [html.H6(f"版 #{seq} の {start.strftime('%Y-%m-%d')} からの1週間"),
+            html.Ul(items, className="list-group") if items else html.P("予定はありません", className="text-muted")]
+    changes = ([(None, ev) for ev in diff['added']] + [(ev, None) for ev in diff['removed']] +
+               [(c['before'], c['after']) for c in diff['changed']])
+    total = len(changes)
+    if seq == latest or not total:
+        return view, html.P("現在の版と同じです", className="small text-muted")
+    shown = [revision_change_item(b, a, tz) for b, a in changes[:REVISION_DIFF_SHOWN]]
+    summary = (f"現在（#{latest}）との差分: 追加 {len(diff['added'])}件・削除 {len(diff['removed'])}件・"
+               f"変更 {len(diff['changed'])}件" + (f"（先頭 {REVISION_DIFF_SHOWN}件を表示）" if total > REVISION_DIFF_SHOWN else ""))
+    return view, [html.H6(summary), html.Ul(shown, className="list-group")]
+
+# 会議の自動配置モーダル開閉（本文は初回オープン時に生成）
+@callback(
+    Output('scheduler-modal', 'is_open'),
+    Output('scheduler-body', 'children'),
+    Output('built-modals-store', 'data', allow_duplicate=True),
+    Input('open-scheduler-modal-button', 'n_clicks'),
+    Input('close-scheduler-modal-button', 'n_clicks'),
+    State('built-modals-store', 'data'),
+    State('groups-store', 'data'),
+    State('view-tz', 'data'),
+    prevent_initial_call=True
+)
+def toggle_scheduler_modal(open_clicks, close_clicks, built, groups_data, tz_name):
+    ctx = dash.callback_context
+    if not ctx.triggered: raise dash.exceptions.PreventUpdate
+    is_open = ctx.triggered_id == 'open-scheduler-modal-button'
+    if is_open and 'scheduler' not in (built or []):
+        body = create_scheduler_body(groups_data, timezones.get_zone(tz_name or CONFIG['TZ']))
+        return True, body, (built or []) + ['scheduler']
+    return is_open, dash.no_update, dash.no_update
+
+@callback(
+    Output('scheduler-group', 'options'),
+    Input('groups-store', 'data')
+)
+def update_scheduler_group_options(groups_data):
+    return [{"label": g['name'], "value": g['id']} for g in groups_data]
+
+# 候補枠の検索（必須参加者が空いている枠をスコア順に）
+@callback(
+    Output('scheduler-results', 'children'),
+    Output('scheduler-summary', 'children'),
+    Input('scheduler-run', 'n_clicks'),
+    State('scheduler-title', 'value'),
+    State('scheduler-attendees', 'value'),
+    State('scheduler-group', 'value'),
+    State('scheduler-optional', 'value'),
+    State('scheduler-duration', 'value'),
+    State('scheduler-priority', 'value'),
+    State('scheduler-from', 'value'),
+    State('scheduler-to', 'value'),
+    State('scheduler-preferred', 'value'),
+    State('view-tz', 'data'),
+    State('users-store', 'data'),
+    State('groups-store', 'data'),
+    State('events-store', 'data'),
+    prevent_initial_call=True
+)
+def update_scheduler_results(n_clicks, title, attendees, group_id, optional, duration, priority, date_from, date_to,
+                             preferred, tz_name, users_data, groups_data, events_data):
+    tz = timezones.get_zone(tz_name or CONFIG['TZ'])
+    req = {'title': title, 'attendees': attendees, 'group_id': group_id, 'optional': optional, 'duration': duration,
+           'priority': priority, 'from': date_from, 'to': date_to, 'preferred': preferred}
+    try:
+        slots = run_scheduler(event_index.index_for(events_data, TZ), [req], users_data, groups_data, tz)
+    except (TypeError, ValueError) as exc:
+        return [], f"条件を確認してください: {exc}"
+    if not slots:
+        return html.P("必須参加者全員が空いている枠はありません", className="text-muted"), ""
+    names = {u['id']: u['name'] for u in users_data or []}
+    items = []
+    for slot in slots:
+        conflicts = ", ".join(names.get(u, u) for u in slot['conflicts'])
+        items.append(html.Li([
+            html.Span(f"{slot['start'][:10]} {slot['start'][11:]}–{slot['end'][11:]}", className="me-2 fw-bold"),
+            html.Span(f"スコア {slot['score']:.1f}", className="badge bg-light text-dark me-2"),
+            html.Span(f"重なり: {conflicts}" if conflicts else "全員空き", className="small text-muted"),
+        ], id={'type': 'scheduler-slot', 'start': slot['start'], 'end': slot['end']},
+            className="list-group-item list-group-item-action", style={"cursor": "pointer"}))
+    return html.Ul(items, className="list-group"), "クリックするとその枠でイベント作成画面を開きます"
+
+# 候補枠 → イベント作成モーダル（保存時のダブルブッキング検証は通常どおり）
+@callback(
+    Output('editing-id','data', allow_duplicate=True),
+    Output('delete-event-button','disabled', allow_duplicate=True),
+    Output('event-modal','is_open', allow_duplicate=True),
+    Output('event-form','data', allow_duplicate=True),
+    Output('event-modal-body','children', allow_duplicate=True),
+    Output('built-modals-store','data', allow_duplicate=True),
+    Output('scheduler-modal', 'is_open', allow_duplicate=True),
+    Input({'type': 'scheduler-slot', 'start': ALL, 'end': ALL}, 'n_clicks'),
+    State('scheduler-title', 'value'),
+    State('scheduler-attendees', 'value'),
+    State('scheduler-group', 'value'),
+    State('scheduler-optional', 'value'),
+    State('scheduler-priority', 'value'),
+    State('users-store', 'data'),
+    State('groups-store', 'data'),
+    State('built-modals-store', 'data'),
+    prevent_initial_call=True
 )
-def update_attendee_options(users_data):
-    return [{"label": user['name'], "value": user['id']} for user in users_data]
+def open_modal_from_slot(n_clicks, title, attendees, group_id, optional, priority, users_data, groups_data, built):
+    ctx = dash.callback_context
+    if not ctx.triggered or all(c is None for c in n_clicks): raise dash.exceptions.PreventUpdate
+    slot = ctx.triggered_id
+    group_members = membership.directory_for(users_data, groups_data).members(group_id) if group_id else []
+    members = list(dict.fromkeys((attendees or []) + list(group_members) + (optional or [])))
+    form = {'event-title': title or "会議", 'event-start-date': slot['start'], 'event-end-date': slot['end'],
+            'event-priority': priority or "中", 'event-schedule-label': "会議", 'event-attendees': members}
+    return ("", True, True) + open_event_modal(built, form) + (False,)
 
 # ユーザー管理モーダル開閉
-@app.callback(
+@callback(
     Output('user-management-modal', 'is_open'),
+    Output('user-management-body', 'children'),
+    Output('built-modals-store', 'data', allow_duplicate=True),
     Input('open-user-modal-button', 'n_clicks'),
     Input('close-user-modal-button', 'n_clicks'),
+    State('built-modals-store', 'data'),
     prevent_initial_call=True
 )
-def toggle_user_modal(open_clicks, close_clicks):
+def toggle_user_modal(open_clicks, close_clicks, built):
     ctx = dash.callback_context
     if not ctx.triggered: raise dash.exceptions.PreventUpdate
-    return ctx.triggered_id == 'open-user-modal-button'
+    is_open = ctx.triggered_id == 'open-user-modal-button'
+    if is_open and 'user' not in (built or []):
+        return True, create_user_management_body(), (built or []) + ['user']
+    return is_open, dash.no_update, dash.no_update
 
 # グループ管理モーダル開閉
-@app.callback(
+@callback(
     Output('group-management-modal', 'is_open'),
+    Output('group-management-body', 'children'),
+    Output('built-modals-store', 'data', allow_duplicate=True),
     Input('open-group-modal-button', 'n_clicks'),
     Input('close-group-modal-button', 'n_clicks'),
+    State('built-modals-store', 'data'),
     prevent_initial_call=True
 )
-def toggle_group_modal(open_clicks, close_clicks):
+def toggle_group_modal(open_clicks, close_clicks, built):
     ctx = dash.callback_context
     if not ctx.triggered: raise dash.exceptions.PreventUpdate
-    return ctx.triggered_id == 'open-group-modal-button'
+    is_open = ctx.triggered_id == 'open-group-modal-button'
+    if is_open and 'group' not in (built or []):
+        return True, create_group_management_body(), (built or []) + ['group']
+    return is_open, dash.no_update, dash.no_update
+
+def directory_list_shell(kind, placeholder):
+    """管理モーダルの一覧タブ: 検索欄・件数・行・ページ送り（id は '{kind}-list-…'）"""
+    return html.Div([
+        dbc.Input(id=f"{kind}-list-query", type="search", placeholder=placeholder),
+        html.Div(id=f"{kind}-list-summary", className="small text-muted mt-2 mb-2"),
+        html.Div(id=f"{kind}-list-rows"),
+        html.Div([
+            dbc.Button("‹ 前へ", id=f"{kind}-list-prev", color="secondary", outline=True, size="sm", disabled=True),
+            dbc.Button("次へ ›", id=f"{kind}-list-next", color="secondary", outline=True, size="sm", disabled=True,
+                       className="ms-2"),
+        ], className="d-flex justify-content-end mt-2"),
+    ])
+
+def directory_page(index, query, tid, kind, page):
+    """一覧の検索・ページ送り → (一致件数, ページ番号, 行のレコード)
+
+    検索条件が変わったら先頭ページへ。一覧の更新（追加・削除）では同じページを表示する。
+    """
+    page = page or 0
+    if tid == f'{kind}-list-prev':
+        page = max(0, page - 1)
+    elif tid == f'{kind}-list-next':
+        page += 1
+    elif tid != 'directory-version':
+        page = 0
+    return index.page(query, page, user_directory.DIRECTORY_PAGE_SIZE)
+
+def directory_summary(total, page, query, empty):
+    if not total:
+        return "一致する項目がありません" if (query or '').strip() else empty
+    per_page = user_directory.DIRECTORY_PAGE_SIZE
+    return f"{total}件中 {page * per_page + 1}–{min(total, (page + 1) * per_page)}件"
+
+@callback(
+    Output('user-list-rows', 'children'),
+    Output('user-list-summary', 'children'),
+    Output('user-list-page', 'data'),
+    Output('user-list-prev', 'disabled'),
+    Output('user-list-next', 'disabled'),
+    Input('user-list-query', 'value'),
+    Input('user-list-prev', 'n_clicks'),
+    Input('user-list-next', 'n_clicks'),
+    Input('directory-version', 'data'),
+    State('user-list-page', 'data'),
+    State('users-store', 'data'),
+)
+def update_user_list_page(query, prev_c, next_c, version, page, users_data):
+    total, page, users = directory_page(user_directory.users(users_data), query,
+                                        dash.callback_context.triggered_id, 'user', page)
+    rows = [
+        html.Tr([
+            html.Td(user['name']),
+            html.Td(user['email']),
+            html.Td(user.get('tz') or CONFIG['TZ']),
+            html.Td(format_hours(view_hours([user], user['id']))),
+            html.Td([
+                dbc.Button("編集", id={'type': 'edit-user', 'id': user['id']},
+                           size="sm", color="primary", className="me-2"),
+                dbc.Button("削除", id={'type': 'delete-user', 'id': user['id']},
+                           size="sm", color="danger")
+            ])
+        ])
+        for user in users
+    ]
+    table = dbc.Table([
+        html.Thead(html.Tr([
+            html.Th("名前"), html.Th("メール"), html.Th("タイムゾーン"), html.Th("表示時間帯"), html.Th("操作")
+        ])),
+        html.Tbody(rows)
+    ], striped=True, bordered=True, hover=True) if rows else None
+    last = (page + 1) * user_directory.DIRECTORY_PAGE_SIZE >= total
+    return table, directory_summary(total, page, query, "ユーザーがありません"), page, page == 0, last
+
+@callback(
+    Output('group-list-rows', 'children'),
+    Output('group-list-summary', 'children'),
+    Output('group-list-page', 'data'),
+    Output('group-list-prev', 'disabled'),
+    Output('group-list-next', 'disabled'),
+    Input('group-list-query', 'value'),
+    Input('group-list-prev', 'n_clicks'),
+    Input('group-list-next', 'n_clicks'),
+    Input('directory-version', 'data'),
+    State('group-list-page', 'data'),
+    State('users-store', 'data'),
+    State('groups-store', 'data'),
+)
+def update_group_list_page(query, prev_c, next_c, version, page, users_data, groups_data):
+    total, page, groups = directory_page(user_directory.groups(groups_data), query,
+                                         dash.callback_context.triggered_id, 'group', page)
+    users = user_directory.users(users_data).by_id
+    rows = []
+    for group in groups:
+        names = [users[uid]['name'] for uid in dict.fromkeys(group.get('user_ids') or []) if uid in users]
+        shown = ", ".join(names[:GROUP_MEMBERS_SHOWN])
+        if len(names) > GROUP_MEMBERS_SHOWN:
+            shown += f" 他{len(names) - GROUP_MEMBERS_SHOWN}人"
+        rows.append(
+            html.Tr([
+                html.Td(group['name']),
+                html.Td(shown),
+                html.Td([
+                    dbc.Button("編集", id={'type': 'edit-group', 'id': group['id']},
+                               size="sm", color="primary", className="me-2"),
+                    dbc.Button("削除", id={'type': 'delete-group', 'id': group['id']},
+                               size="sm", color="danger")
+                ])
+            ])
+        )
+    table = dbc.Table([
+        html.Thead(html.Tr([
+            html.Th("グループ名"), html.Th("メンバー"), html.Th("操作")
+        ])),
+        html.Tbody(rows)
+    ], striped=True, bordered=True, hover=True) if rows else None
+    last = (page + 1) * user_directory.DIRECTORY_PAGE_SIZE >= total
+    return table, directory_summary(total, page, query, "グループがありません"), page, page == 0, last
 
 # ユーザー管理タブコンテンツ
-@app.callback(
+@callback(
     Output('user-tab-content', 'children'),
     Input('user-tabs', 'active_tab'),
-    Input('users-store', 'data'),
     Input('editing-user-store', 'data'),
     prevent_initial_call=False
 )
-def update_user_tab_content(active_tab, users_data, editing_user):
+def update_user_tab_content(active_tab, editing_user):
     if active_tab == "user-list-tab":
-        if not users_data:
-            return html.P("ユーザーがありません")
-        
-        user_rows = []
-        for user in users_data:
-            user_rows.append(
-                html.Tr([
-                    html.Td(user['name']),
-                    html.Td(user['email']),
-                    html.Td([
-                        dbc.Button("編集", id={'type': 'edit-user', 'id': user['id']}, 
-                                 size="sm", color="primary", className="me-2"),
-                        dbc.Button("削除", id={'type': 'delete-user', 'id': user['id']}, 
-                                 size="sm", color="danger")
-                    ])
-                ])
-            )
-        
-        return dbc.Table([
-            html.Thead(html.Tr([
-                html.Th("名前"), html.Th("メール"), html.Th("操作")
-            ])),
-            html.Tbody(user_rows)
-        ], striped=True, bordered=True, hover=True)
+        # 行は update_user_list_page がサーバー側の一覧から1ページ分ずつ描画する
+        return directory_list_shell('user', "名前・メールで検索（前方一致）")
     
     elif active_tab == "user-add-tab":
         # 新規追加タブ - 常に空のフォーム
@@ -1253,6 +2907,9 @@ def update_user_tab_content(active_tab, users_data, editing_user):
                 dbc.Input(id="user-name-input", type="text", placeholder="ユーザー名を入力"),
                 dbc.Label("メール", className="mt-3"),
                 dbc.Input(id="user-email-input", type="email", placeholder="メール@example.com"),
+                dbc.Label("タイムゾーン", className="mt-3"),
+                dcc.Dropdown(id="user-tz-input", options=timezone_options(), value=CONFIG['TZ'], clearable=False),
+                *user_hours_inputs(view_hours([], None)),
                 dbc.Button("追加", id="save-user-button", color="primary", className="mt-3")
             ]),
             html.Div(id="user-save-result", className="mt-3")
@@ -1270,6 +2927,10 @@ def update_user_tab_content(active_tab, users_data, editing_user):
                     dbc.Input(id="user-name-input", type="text", placeholder="ユーザー名を入力", value=name_value),
                     dbc.Label("メール", className="mt-3"),
                     dbc.Input(id="user-email-input", type="email", placeholder="メール@example.com", value=email_value),
+                    dbc.Label("タイムゾーン", className="mt-3"),
+                    dcc.Dropdown(id="user-tz-input", options=timezone_options(editing_user.get('tz')),
+                                 value=editing_user.get('tz') or CONFIG['TZ'], clearable=False),
+                    *user_hours_inputs(view_hours([editing_user], editing_user.get('id'))),
                     dbc.Button("更新", id="save-user-button", color="primary", className="mt-3")
                 ]),
                 html.Div(id="user-save-result", className="mt-3")
@@ -1280,53 +2941,26 @@ def update_user_tab_content(active_tab, users_data, editing_user):
     return html.Div()
 
 # グループ管理タブコンテンツ
-@app.callback(
+@callback(
     Output('group-tab-content', 'children'),
     Input('group-tabs', 'active_tab'),
-    Input('groups-store', 'data'),
-    Input('users-store', 'data'),
     Input('editing-group-store', 'data'),
     prevent_initial_call=False
 )
-def update_group_tab_content(active_tab, groups_data, users_data, editing_group):
+def update_group_tab_content(active_tab, editing_group):
     if active_tab == "group-list-tab":
-        if not groups_data:
-            return html.P("グループがありません")
-        
-        group_rows = []
-        for group in groups_data:
-            user_names = [u['name'] for u in users_data if u['id'] in group['user_ids']]
-            group_rows.append(
-                html.Tr([
-                    html.Td(group['name']),
-                    html.Td(", ".join(user_names)),
-                    html.Td([
-                        dbc.Button("編集", id={'type': 'edit-group', 'id': group['id']}, 
-                                 size="sm", color="primary", className="me-2"),
-                        dbc.Button("削除", id={'type': 'delete-group', 'id': group['id']}, 
-                                 size="sm", color="danger")
-                    ])
-                ])
-            )
-        
-        return dbc.Table([
-            html.Thead(html.Tr([
-                html.Th("グループ名"), html.Th("メンバー"), html.Th("操作")
-            ])),
-            html.Tbody(group_rows)
-        ], striped=True, bordered=True, hover=True)
+        # 行は update_group_list_page がサーバー側の一覧から1ページ分ずつ描画する
+        return directory_list_shell('group', "グループ名で検索（前方一致）")
     
     elif active_tab == "group-add-tab":
-        # 新規追加タブ - 常に空のフォーム
-        user_options = [{"label": u['name'], "value": u['id']} for u in users_data]
-        
+        # 新規追加タブ - 常に空のフォーム（メンバーの候補は入力に応じてサーバーから引く）
         return html.Div([
             dbc.Form([
                 dbc.Label("グループ名"),
                 dbc.Input(id="group-name-input", type="text", placeholder="グループ名を入力"),
                 dbc.Label("メンバー", className="mt-3"),
-                dcc.Dropdown(id="group-members-input", options=user_options, multi=True,
-                           placeholder="メンバーを選択"),
+                dcc.Dropdown(id="group-members-input", multi=True,
+                           placeholder="メンバーを選択（名前・メールで検索）"),
                 dbc.Button("追加", id="save-group-button", color="primary", className="mt-3")
             ]),
             html.Div(id="group-save-result", className="mt-3")
@@ -1334,8 +2968,6 @@ def update_group_tab_content(active_tab, groups_data, users_data, editing_group)
     
     elif active_tab == "group-edit-tab":
         # 編集タブ - 編集中のグループ情報があれば事前入力する
-        user_options = [{"label": u['name'], "value": u['id']} for u in users_data]
-        
         if editing_group:
             name_value = editing_group.get('name', '')
             members_value = editing_group.get('user_ids', [])
@@ -1345,8 +2977,8 @@ def update_group_tab_content(active_tab, groups_data, users_data, editing_group)
                     dbc.Label("グループ名"),
                     dbc.Input(id="group-name-input", type="text", placeholder="グループ名を入力", value=name_value),
                     dbc.Label("メンバー", className="mt-3"),
-                    dcc.Dropdown(id="group-members-input", options=user_options, multi=True,
-                               placeholder="メンバーを選択", value=members_value),
+                    dcc.Dropdown(id="group-members-input", multi=True,
+                               placeholder="メンバーを選択（名前・メールで検索）", value=members_value),
                     dbc.Button("更新", id="save-group-button", color="primary", className="mt-3")
                 ]),
                 html.Div(id="group-save-result", className="mt-3")
@@ -1357,60 +2989,84 @@ def update_group_tab_content(active_tab, groups_data, users_data, editing_group)
     return html.Div()
 
 # ユーザー保存
-@app.callback(
+@callback(
     Output('users-store', 'data', allow_duplicate=True),
     Output('user-save-result', 'children', allow_duplicate=True),
     Output('editing-user-store', 'data', allow_duplicate=True),
     Input('save-user-button', 'n_clicks'),
     State('user-name-input', 'value'),
     State('user-email-input', 'value'),
+    State('user-tz-input', 'value'),
+    State('user-start-h-input', 'value'),
+    State('user-end-h-input', 'value'),
+    State('user-grid-input', 'value'),
     State('users-store', 'data'),
     State('editing-user-store', 'data'),
     prevent_initial_call=True
 )
-def save_user(n_clicks, name, email, users_data, editing_user):
+def save_user(n_clicks, name, email, tz_name, start_h, end_h, grid_min, users_data, editing_user):
     if not n_clicks or not name or not email:
         raise dash.exceptions.PreventUpdate
+    hours = {'start_h': START_H if start_h is None else start_h, 'end_h': END_H if end_h is None else end_h,
+             'grid_min': grid_min or GRID_CELL_MIN}
+    try:
+        geometry.validate_hours(hours['start_h'], hours['end_h'], hours['grid_min'])
+    except ValueError as e:
+        return dash.no_update, dbc.Alert(str(e), color="danger", dismissable=True), dash.no_update
     
     updated_users = users_data.copy()
     
     if editing_user:  # 編集モード
         for i, user in enumerate(updated_users):
             if user['id'] == editing_user['id']:
-                updated_users[i] = {**user, 'name': name, 'email': email}
+                updated_users[i] = {**user, 'name': name, 'email': email, 'tz': tz_name or CONFIG['TZ'], **hours}
                 break
         message = "ユーザーを更新しました"
     else:  # 新規追加モード
         new_user = {
             'id': f"user_{len(users_data) + 1}",
             'name': name,
-            'email': email
+            'email': email,
+            'tz': tz_name or CONFIG['TZ'],
+            **hours
         }
         updated_users = users_data + [new_user]
         message = "ユーザーを追加しました"
     
     return updated_users, dbc.Alert(message, color="success", dismissable=True), None
 
-# ユーザー削除
-@app.callback(
+# ユーザー削除（グループのメンバーとイベントの参加者からも取り除く）
+@callback(
     Output('users-store', 'data', allow_duplicate=True),
+    Output('groups-store', 'data', allow_duplicate=True),
+    Output('events-store', 'data', allow_duplicate=True),
+    Output('history-meta', 'data', allow_duplicate=True),
     Input({'type': 'delete-user', 'id': ALL}, 'n_clicks'),
     State('users-store', 'data'),
+    State('groups-store', 'data'),
+    State('events-store', 'data'),
+    State('session-id', 'data'),
     prevent_initial_call=True
 )
-def delete_user(n_clicks, users_data):
+def delete_user(n_clicks, users_data, groups_data, events_data, sid):
     ctx = dash.callback_context
     if not ctx.triggered or all(c is None for c in n_clicks):
         raise dash.exceptions.PreventUpdate
     
     user_id = ctx.triggered_id['id']
-    updated_users = [u for u in users_data if u['id'] != user_id]
-    return updated_users
+    users, groups, events, changed = membership.delete_user(user_id, users_data, groups_data, events_data)
+    if not changed:
+        return users, groups, dash.no_update, dash.no_update
+    # 参加者から外したイベントは元に戻せるよう、保存・削除と同じく履歴に積む
+    meta = push_history(sid, events_data, changed)
+    event_index.apply_changes(events_data, events, changed)
+    record_change('delete_user', sid, events, changed)
+    return users, groups, events, meta
 
 
 
 # グループ保存
-@app.callback(
+@callback(
     Output('groups-store', 'data', allow_duplicate=True),
     Output('group-save-result', 'children', allow_duplicate=True),
     Output('editing-group-store', 'data', allow_duplicate=True),
@@ -1445,7 +3101,7 @@ def save_group(n_clicks, name, member_ids, groups_data, editing_group):
     return updated_groups, dbc.Alert(message, color="success", dismissable=True), None
 
 # グループ削除
-@app.callback(
+@callback(
     Output('groups-store', 'data', allow_duplicate=True),
     Input({'type': 'delete-group', 'id': ALL}, 'n_clicks'),
     State('groups-store', 'data'),
@@ -1462,7 +3118,7 @@ def delete_group(n_clicks, groups_data):
 
 # 編集ボタンでタブ切り替え（ユーザー）
 # 編集ボタンでタブ切り替え（ユーザー）
-@app.callback(
+@callback(
     Output('user-tabs', 'active_tab'),
     Output('editing-user-store', 'data'),
     Input({'type': 'edit-user', 'id': ALL}, 'n_clicks'),
@@ -1475,13 +3131,13 @@ def switch_to_user_edit_tab(n_clicks, users_data):
         raise dash.exceptions.PreventUpdate
     
     user_id = ctx.triggered_id['id']
-    user = next((u for u in users_data if u['id'] == user_id), None)
+    user = user_directory.users(users_data).by_id.get(user_id)
     
     return "user-edit-tab", user
 
 # 編集ボタンでタブ切り替え（グループ）
 # 編集ボタンでタブ切り替え（グループ）
-@app.callback(
+@callback(
     Output('group-tabs', 'active_tab'),
     Output('editing-group-store', 'data'),
     Input({'type': 'edit-group', 'id': ALL}, 'n_clicks'),
@@ -1494,12 +3150,12 @@ def switch_to_group_edit_tab(n_clicks, groups_data):
         raise dash.exceptions.PreventUpdate
     
     group_id = ctx.triggered_id['id']
-    group = next((g for g in groups_data if g['id'] == group_id), None)
+    group = user_directory.groups(groups_data).by_id.get(group_id)
     
     return "group-edit-tab", group
 
 # タブ切り替え時の編集情報リセット（ユーザー）
-@app.callback(
+@callback(
     Output('editing-user-store', 'data', allow_duplicate=True),
     Input('user-tabs', 'active_tab'),
     prevent_initial_call=True
@@ -1511,7 +3167,7 @@ def reset_user_editing_on_tab_change(active_tab):
     raise dash.exceptions.PreventUpdate
 
 # タブ切り替え時の編集情報リセット（グループ）
-@app.callback(
+@callback(
     Output('editing-group-store', 'data', allow_duplicate=True),
     Input('group-tabs', 'active_tab'),
     prevent_initial_call=True
@@ -1524,5 +3180,10 @@ def reset_group_editing_on_tab_change(active_tab):
 
 
 
+app = create_app()
+server = app.server  # gunicorn app:server
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # 本番プロファイルでは debug / dev tools を無効化
+    app.run(host=CONFIG['HOST'], port=CONFIG['PORT'],
+            debug=not PRODUCTION, dev_tools_ui=not PRODUCTION, dev_tools_props_check=not PRODUCTION)
@@ -0,0 +1,27 @@
+"""pytest-benchmark によるベンチマーク
+
+    pytest benchmarks/bench_calendar.py --benchmark-autosave
+    pytest benchmarks/bench_calendar.py --benchmark-compare   # 直前の保存結果と比較
+
+規模は環境変数で変更できる（既定: BENCH_EVENTS=1000,10000 BENCH_USERS=10,500）。
+100k件を含める場合は BENCH_EVENTS=1000,10000,100000。
+"""
+import pytest
+
+from cases import CASES, env_ints, make_calendar
+
+EVENTS = env_ints('BENCH_EVENTS', '1000,10000')
+USERS = env_ints('BENCH_USERS', '10,500')
+
+
+@pytest.mark.parametrize('overlap_heavy', [False, True], ids=['spread', 'overlap'])
+@pytest.mark.parametrize('n_users', USERS, ids=lambda n: f'u{n}')
+@pytest.mark.parametrize('n_events', EVENTS, ids=lambda n: f'e{n}')
+@pytest.mark.parametrize('case', list(CASES))
+def test_calendar(benchmark, case, n_events, n_users, overlap_heavy):
+    if case == 'dummy_llm_api' and (n_events, n_users, overlap_heavy) != (EVENTS[0], USERS[0], False):
+        pytest.skip('dummy_llm_api はカレンダー規模に依存しない')
+    cal = make_calendar(n_events, n_users, overlap_heavy)
+    benchmark.group = case
+    benchmark.extra_info.update(events=n_events, users=n_users, overlap_heavy=overlap_heavy)
+    benchmark(CASES[case](cal))
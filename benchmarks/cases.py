@@ -0,0 +1,407 @@
+"""ベンチマーク対象の定義（pytest-benchmark と scaling.py で共有）
+
+各ケースは setup(calendar) → 引数なしの呼び出し可能オブジェクト を返す。
+calendar は make_calendar() の戻り値で、規模ごとに1回だけ生成してキャッシュする。
+"""
+import functools
+import os
+import sys
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('LLM_PLANNER_JOURNAL_DIR', '')  # ベンチマークの変更をジャーナルに残さない
+
+import app as calendar_app  # noqa: E402
+from dash_client import DashClient  # noqa: E402
+from synthetic import make_events, make_users  # noqa: E402
+
+TZ = calendar_app.TZ
+CALENDAR_START = datetime(2025, 1, 1, tzinfo=TZ)
+CALENDAR_DAYS = 365
+JOURNAL_HISTORY = 50000  # journal_recover / journal_audit / revision_* の前に積む変更の件数
+
+LLM_TEXTS = [
+    '"Design sync" tomorrow 3pm for 45 minutes, secondary',
+    '"定例会議" 明日 10:00 から 1時間 高',
+    '"研修" 9am for 2 hours 低',
+    '"出張" 明日 8:00 8時間 緊急',
+    '"1on1" 4:30pm for 30 minutes 仮',
+]
+
+
+@functools.lru_cache(maxsize=None)
+def make_calendar(n_events, n_users, overlap_heavy=False):
+    users = make_users(n_users)
+    events = make_events(n_events, TZ, users=users, start=CALENDAR_START, days=CALENDAR_DAYS,
+                         overlap_heavy=overlap_heavy)
+    busiest = Counter(calendar_app.parse_iso(e['start']).date() for e in events).most_common(1)[0][0]
+    return {'events': events, 'users': users, 'busiest_day': busiest}
+
+
+def _anchor(cal):
+    d = cal['busiest_day']
+    return datetime(d.year, d.month, d.day, tzinfo=TZ)
+
+
+def setup_month_view(cal):
+    d = cal['busiest_day']
+    return lambda: calendar_app.generate_month_view(d.year, d.month, cal['events'])
+
+
+def setup_month_view_cold(cal):
+    d = cal['busiest_day']
+
+    def run():
+        calendar_app.day_summary.cache_clear()  # 日別サマリー表の構築を含む（初回描画）の時間を測る
+        return calendar_app.generate_month_view(d.year, d.month, cal['events'])
+    return run
+
+
+def setup_month_paging(cal):
+    """前月 → 次月のページング（先読み済みの月表示キャッシュに当たる経路）"""
+    d = cal['busiest_day']
+    table = calendar_app.day_summary.table_for(cal['events'], TZ)
+    calendar_app.month_view(d.year, d.month, table)
+    calendar_app.PREFETCH_POOL.submit(lambda: None).result()  # 先読みの完了を待つ
+    months = calendar_app.adjacent_months(d.year, d.month)
+
+    def run():
+        for y, m in months:
+            calendar_app.month_view(y, m, calendar_app.day_summary.table_for(cal['events'], TZ))
+    return run
+
+
+def setup_week_view(cal):
+    anchor = _anchor(cal)
+
+    def run():
+        calendar_app.lane_layout.cache_clear()  # レーンキャッシュなし（初回描画）の時間を測る
+        return calendar_app.generate_week_bars(anchor, cal['events'])
+    return run
+
+
+def setup_week_view_cached(cal):
+    anchor = _anchor(cal)
+    calendar_app.generate_week_bars(anchor, cal['events'])
+    return lambda: calendar_app.generate_week_bars(anchor, cal['events'])
+
+
+def setup_assign_lanes(cal):
+    day = _anchor(cal)
+    items = []
+    for ev in calendar_app.event_index.index_for(cal['events'], TZ).overlapping(day, day + timedelta(days=1)):
+        items.append({'id': ev['id'], 's': calendar_app.parse_iso(ev['start']), 'e': calendar_app.parse_iso(ev['end'])})
+    return lambda: calendar_app.assign_lanes([dict(it) for it in items])
+
+
+def setup_find_available_slots(cal):
+    start = _anchor(cal)
+    users = [u['id'] for u in cal['users'][:10]]
+    return lambda: calendar_app.find_available_slots(users, cal['events'], start, start + timedelta(days=6), 60)
+
+
+def setup_check_double_booking(cal):
+    s = _anchor(cal).replace(hour=10)
+    attendees = [u['id'] for u in cal['users'][:5]]
+    return lambda: calendar_app.check_double_booking(s, s + timedelta(hours=1), attendees, cal['events'])
+
+
+def setup_dummy_llm_api(cal):
+    return lambda: [calendar_app.dummy_llm_api(t) for t in LLM_TEXTS]
+
+
+SEARCH_QUERIES = [('研修', {}), ('本社 会議室', {'priority': ['最高', '高']}), ('', {'schedule_label': ['出張']}),
+                  ('design', {'visibility': ['private']})]
+
+
+def setup_search(cal):
+    """検索インデックス構築済みの状態で代表的なクエリを1ページずつ"""
+    index = calendar_app.event_search.SearchIndex.build(cal['events'], TZ)
+    attendee = cal['users'][1]['id']
+    queries = SEARCH_QUERIES + [('定例', {'attendees': [attendee]})]
+    return lambda: [index.search(q, f) for q, f in queries]
+
+
+def setup_search_build(cal):
+    return lambda: calendar_app.event_search.SearchIndex.build(cal['events'], TZ)
+
+
+def setup_analytics_build(cal):
+    import analytics  # pandas の読み込み時間はケースに含めない
+    return lambda: analytics.Aggregates.build(cal['events'], TZ, calendar_app.START_H, calendar_app.END_H)
+
+
+def setup_analytics_query(cal):
+    """集計済みの状態で 12週間分のダッシュボードを描画"""
+    import analytics
+    agg = analytics.Aggregates.build(cal['events'], TZ, calendar_app.START_H, calendar_app.END_H)
+    first_week = analytics.week_of(analytics.day_number(cal['busiest_day'])) - 7 * 11
+    groups = [{'id': 'g1', 'name': 'g1', 'user_ids': [u['id'] for u in cal['users'][:10]]}]
+    return lambda: calendar_app.generate_analytics_view(agg, cal['users'], groups, 'all', first_week, 12)
+
+
+def schedule_requests(cal, n):
+    """参加者2〜5人・所要時間30〜90分の会議リクエストを2週間の範囲で n 件（決定的）"""
+    ids = [u['id'] for u in cal['users']]
+    start = cal['busiest_day'] - timedelta(days=cal['busiest_day'].weekday())
+    out = []
+    for i in range(n):
+        k = 2 + i % 4
+        out.append({'title': f'会議{i}', 'attendees': [ids[(i * 7 + j * 3) % len(ids)] for j in range(k)],
+                    'optional': [ids[(i * 11 + 1) % len(ids)]], 'duration': (30, 60, 90)[i % 3],
+                    'priority': ('低', '中', '高', '最高')[i % 4], 'preferred': [10, 17] if i % 2 else None,
+                    'from': start.strftime('%Y-%m-%d'), 'to': (start + timedelta(days=13)).strftime('%Y-%m-%d')})
+    return out
+
+
+def setup_schedule_meeting(cal):
+    idx = calendar_app.event_index.index_for(cal['events'], TZ)
+    req = schedule_requests(cal, 1)
+    return lambda: calendar_app.run_scheduler(idx, req, cal['users'], [], TZ)
+
+
+def setup_schedule_batch(cal):
+    """100件の会議をまとめて配置"""
+    idx = calendar_app.event_index.index_for(cal['events'], TZ)
+    reqs = schedule_requests(cal, 100)
+    return lambda: calendar_app.run_scheduler(idx, reqs, cal['users'], [], TZ, batch=True)
+
+
+def setup_resolve_conflicts(cal):
+    """最繁忙日の10時に参加者5人の「最高」の予定を置く場合の移動案"""
+    s = _anchor(cal).replace(hour=10)
+    target = {'id': 'bench-target', 'priority': '最高', 'attendees': [u['id'] for u in cal['users'][:5]],
+              'start': s.isoformat(), 'end': (s + timedelta(hours=2)).isoformat()}
+    return lambda: calendar_app.rescheduler.propose(target, cal['events'], TZ, cal['users'], calendar_app.START_H,
+                                                    calendar_app.END_H, calendar_app.GRID_CELL_MIN)
+
+
+def setup_bulk_edit(cal):
+    """500件を1日後ろへずらし、優先度を変更"""
+    ids = [ev['id'] for ev in cal['events'][:500]]
+    ops = {'shift': 1, 'unit': 'days', 'priority': '高'}
+    return lambda: calendar_app.bulk_edit.apply(cal['events'], ids, ops, TZ)
+
+
+def setup_group_filter(cal):
+    """10人のグループのメンバーが参加するイベントに絞った週ビュー（参加者インデックスは作成済み）"""
+    groups = [{'id': 'g1', 'name': 'g1', 'user_ids': [u['id'] for u in cal['users'][:10]]}]
+    idx = calendar_app.event_index.index_for(cal['events'], TZ)
+    calendar_app.membership.attendees_for(cal['events'], idx.key)
+    anchor = _anchor(cal)
+
+    def run():
+        members = calendar_app.membership.directory_for(cal['users'], groups).members('g1')
+        ids = calendar_app.membership.attendees_for(cal['events'], idx.key).events_for(members)
+        return calendar_app.generate_week_bars(anchor, [ev for ev in cal['events'] if ev['id'] in ids])
+    return run
+
+
+def setup_delete_user(cal):
+    """参加者の多いユーザーを削除（グループ・イベントからの除去を含む）"""
+    groups = [{'id': f'g{i}', 'name': f'g{i}', 'user_ids': [u['id'] for u in cal['users'][i::3]]} for i in range(3)]
+    user_id = Counter(a for ev in cal['events'] for a in ev['attendees']).most_common(1)[0][0]
+    idx = calendar_app.event_index.index_for(cal['events'], TZ)
+    calendar_app.membership.attendees_for(cal['events'], idx.key)
+    return lambda: calendar_app.membership.delete_user(user_id, cal['users'], groups, cal['events'], idx.key)
+
+
+def setup_directory_typeahead(cal):
+    """参加者ドロップダウンの候補（1文字ずつ入力）とユーザー一覧の1ページ目"""
+    index = calendar_app.user_directory.index_for(cal['users'], calendar_app.user_directory.user_keys)
+    name = cal['users'][len(cal['users']) // 2]['name']
+
+    def run():
+        for i in range(1, len(name) + 1):
+            index.options(name[:i], [cal['users'][0]['id']])
+        return index.page('', 0)
+    return run
+
+
+def setup_freebusy(cal):
+    """全ユーザーの2週間分の空き時間情報（1時間単位）を /api/freebusy に POST（粗いビューは作成済み）"""
+    idx = calendar_app.event_index.index_for(cal['events'], TZ)
+    client = calendar_app.app.server.test_client()
+    body = {'users': [u['id'] for u in cal['users']], 'start': cal['busiest_day'].strftime('%Y-%m-%d'),
+            'days': 14, 'granularity': 'hour', 'version': str(idx.key)}
+    client.post('/api/freebusy', json=body)
+
+    def run():
+        resp = client.post('/api/freebusy', json=body)
+        assert resp.status_code == 200
+    return run
+
+
+def _reminder_service(cal):
+    """全イベントに 10分前・1時間前のリマインダーを付けたジャーナルから予約したサービス（時計はカレンダーの開始時刻に固定）"""
+    events = [{**ev, 'reminders': [10, 60]} for ev in cal['events']]
+    tmp = tempfile.TemporaryDirectory()
+    jr = calendar_app.journal.Journal(tmp.name, fsync=False)
+    jr.record('create', {'session': 'bench'}, events, [ev['id'] for ev in events])
+    svc = calendar_app.reminders.ReminderService([], TZ, jr, clock=lambda: CALENDAR_START.timestamp())
+    svc.sync()  # 配信スレッドは起動しない
+    return svc, events, jr, tmp
+
+
+def setup_reminder_reschedule(cal):
+    """予約済みのキュー（イベント数×2件）で 1000件の取り消し＋再予約（1件あたり O(log n) を確認する）"""
+    queue = _reminder_service(cal)[0].queue
+    keys = list(queue.live)[::max(1, len(queue.live) // 1000)][:1000]
+    state = {'shift': 0}
+
+    def run():
+        state['shift'] += 60
+        for key in keys:
+            fire_ts, _, payload = queue.live[key]
+            queue.cancel(key)
+            queue.push(key, fire_ts + state['shift'], payload)
+    return run
+
+
+def setup_reminder_drag(cal):
+    """イベント1件のドラッグ（ジャーナルへの追記 → 配信側が読み進めてそのイベントのリマインダーだけ再予約）"""
+    svc, events, jr, tmp = _reminder_service(cal)
+    ev = events[len(events) // 2]
+    moved = [{**ev, 'start': (datetime.fromisoformat(ev['start']) + timedelta(minutes=m)).isoformat()}
+             for m in (30, 0)]
+    state = {'i': 0}
+
+    def run():
+        after = moved[state['i'] % 2]
+        state['i'] += 1
+        jr.record('move', {'session': 'bench'}, [after], [ev['id']])
+        svc.sync()
+    run.tmp = tmp
+    return run
+
+
+def _journal_with_history(cal, n=JOURNAL_HISTORY):
+    """イベントごとの作成 + n件のドラッグを積んだジャーナル（スナップショットは既定の間隔, fsync なし）"""
+    tmp = tempfile.TemporaryDirectory()
+    jr = calendar_app.journal.Journal(tmp.name, fsync=False)
+    events = list(cal['events'])
+    for ev in events:
+        jr.record('create', {'session': 'bench'}, [ev], [ev['id']])
+    for i in range(n):
+        ev = events[(i * 7919) % len(events)]
+        moved = {**ev, 'start': (datetime.fromisoformat(ev['start']) + timedelta(minutes=15 * (i % 7 + 1))).isoformat()}
+        jr.record('move', {'session': 'bench'}, [moved], [ev['id']])
+    return tmp, jr
+
+
+def setup_journal_append(cal):
+    """ドラッグ1件の追記（fsync なし。スナップショットの書き出しも償却で含む）"""
+    tmp = tempfile.TemporaryDirectory()
+    jr = calendar_app.journal.Journal(tmp.name, fsync=False)
+    events = cal['events']
+    jr.record('create', {'session': 'bench'}, events, [ev['id'] for ev in events])
+    state = {'i': 0, 'tmp': tmp}
+
+    def run():
+        ev = events[state['i'] % len(events)]
+        state['i'] += 1
+        jr.record('move', {'session': 'bench'}, [ev], [ev['id']])
+    return run
+
+
+def setup_journal_recover(cal):
+    """起動時の復元（最新のスナップショット + 末尾の再生。履歴の総数には比例しない）"""
+    tmp, jr = _journal_with_history(cal)
+
+    def run():
+        return calendar_app.journal.Journal(tmp.name, fsync=False)
+    run.tmp = tmp
+    return run
+
+
+def setup_journal_audit(cal):
+    """イベント1件の変更履歴（索引は作成済み。以降の追記分だけを索引に足す）"""
+    tmp, jr = _journal_with_history(cal)
+    eid = cal['events'][0]['id']
+    jr.audit(eid)
+
+    def run():
+        return jr.audit(eid)
+    run.tmp = tmp
+    return run
+
+
+def setup_revision_load(cal):
+    """過去の版の初回参照（起点のスナップショット + ジャーナルファイル1つ分の再生で区間を作る）"""
+    tmp, jr = _journal_with_history(cal)
+    seq = jr.seq - jr.snapshot_every // 2
+
+    def run():
+        return calendar_app.revisions.History(jr).at(seq)
+    run.tmp = tmp
+    return run
+
+
+def setup_revision_diff(cal):
+    """1000版離れた版どうしの差分（区間は作成済み。共有している部分木は比較しない）"""
+    tmp, jr = _journal_with_history(cal)
+    history = calendar_app.revisions.History(jr)
+    seq = jr.seq - 1000
+    history.diff(seq, jr.seq)
+
+    def run():
+        return history.diff(seq, jr.seq)
+    run.tmp = tmp
+    return run
+
+
+def setup_undo_redo(cal):
+    """Undo → Redo を `_dash-update-component` 経由で往復（履歴はサーバー側セッション）"""
+    dc = DashClient(calendar_app.app)
+    key = dc.find('events-store.data', trigger='undo-button.n_clicks')
+    events = cal['events']
+    prev = events[:-1]
+    sid = 'bench-undo-redo'
+    calendar_app.push_history(sid, prev, [events[-1]['id']])  # 最後のイベントを追加した操作
+
+    def run():
+        undo = dc.call(key, {'undo-button.n_clicks': 1, 'events-store.data': events,
+                             'session-id.data': sid}, 'undo-button.n_clicks')
+        redo = dc.call(key, {'redo-button.n_clicks': 1, 'events-store.data': prev,
+                             'session-id.data': sid}, 'redo-button.n_clicks')
+        assert undo.status == 200 and redo.status == 200
+    return run
+
+
+CASES = {
+    'generate_month_view': setup_month_view,
+    'generate_month_view_cold': setup_month_view_cold,
+    'month_paging': setup_month_paging,
+    'generate_week_bars': setup_week_view,
+    'generate_week_bars_cached': setup_week_view_cached,
+    'assign_lanes': setup_assign_lanes,
+    'find_available_slots': setup_find_available_slots,
+    'check_double_booking': setup_check_double_booking,
+    'dummy_llm_api': setup_dummy_llm_api,
+    'search': setup_search,
+    'search_build': setup_search_build,
+    'analytics_build': setup_analytics_build,
+    'analytics_query': setup_analytics_query,
+    'schedule_meeting': setup_schedule_meeting,
+    'schedule_batch': setup_schedule_batch,
+    'resolve_conflicts': setup_resolve_conflicts,
+    'bulk_edit': setup_bulk_edit,
+    'group_filter': setup_group_filter,
+    'delete_user': setup_delete_user,
+    'directory_typeahead': setup_directory_typeahead,
+    'freebusy': setup_freebusy,
+    'reminder_reschedule': setup_reminder_reschedule,
+    'reminder_drag': setup_reminder_drag,
+    'journal_append': setup_journal_append,
+    'journal_recover': setup_journal_recover,
+    'journal_audit': setup_journal_audit,
+    'revision_load': setup_revision_load,
+    'revision_diff': setup_revision_diff,
+    'undo_redo': setup_undo_redo,
+}
+
+
+def env_ints(name, default):
+    return [int(x) for x in os.environ.get(name, default).split(',') if x.strip()]
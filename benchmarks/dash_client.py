@@ -0,0 +1,121 @@
+"""Dash コールバックを HTTP 経由（`_dash-update-component`）で呼び出すヘルパー
+
+ブラウザ（dash-renderer）と同じ形のリクエストを組み立てるので、JSON のシリアライズ・
+デシリアライズを含めたサーバー側の処理時間と転送量を測れる。DashClient はプロセス内の
+Flask テストクライアント、RemoteDashClient は起動中のサーバー（負荷試験用）へ送る。
+"""
+import gzip
+import http.client
+import json
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+CallResult = namedtuple('CallResult', 'status data request_bytes response_bytes encoding')
+
+
+def parse_outputs(key):
+    """callback_map のキー（'..a.b...c.d..' / 'a.b@hash'）を outputs 指定に変換（出力なしのコールバックのキーはハッシュだけ）"""
+    if '.' not in key:
+        return []
+    parts = key[2:-2].split('...') if key.startswith('..') else [key]
+    outputs = []
+    for part in parts:
+        cid, prop = part.split('.', 1)
+        outputs.append({'id': cid, 'property': prop.split('@')[0]})
+    return outputs
+
+
+class DashClient:
+    def __init__(self, dash_app, client=None):
+        self.app = dash_app
+        self.client = client or dash_app.server.test_client()
+        self.client.get(dash_app.config.requests_pathname_prefix)  # コールバック登録（初回リクエスト時）
+        self.callback_map = dash_app.callback_map
+
+    def find(self, output, trigger=None):
+        """出力 'id.prop' を含み、trigger 'id.prop' を Input に持つコールバックのキー"""
+        for key, cb in self.callback_map.items():
+            if output not in [f"{o['id']}.{o['property']}" for o in parse_outputs(key)]:
+                continue
+            if trigger and trigger not in [f"{i['id']}.{i['property']}" for i in cb['inputs']]:
+                continue
+            return key
+        raise KeyError(f"callback not found: {output} (trigger={trigger})")
+
+    def build(self, key, values, trigger):
+        """values: {'id.prop': value} から Input/State を埋めたリクエストボディ"""
+        cb = self.callback_map[key]
+
+        def fill(specs):
+            return [{**s, 'value': values.get(f"{s['id']}.{s['property']}")} for s in specs]
+
+        return {
+            'output': key,
+            'outputs': parse_outputs(key) if key.startswith('..') else parse_outputs(key)[0],
+            'inputs': fill(cb['inputs']),
+            'state': fill(cb.get('state', [])),
+            'changedPropIds': [trigger],
+        }
+
+    def call(self, key, values, trigger, headers=None):
+        """コールバックを呼び出して CallResult を返す（data は非圧縮レスポンスのみ）"""
+        raw = json.dumps(self.build(key, values, trigger))
+        resp = self.client.post('/_dash-update-component', data=raw, content_type='application/json',
+                                headers=headers or {})
+        body = resp.get_data()
+        encoding = resp.headers.get('Content-Encoding', 'identity')
+        data = json.loads(body) if resp.status_code == 200 and encoding == 'identity' else None
+        return CallResult(resp.status_code, data, len(raw.encode()), len(body), encoding)
+
+
+def _decode(body, encoding):
+    return gzip.decompress(body) if encoding == 'gzip' else body
+
+
+class RemoteDashClient(DashClient):
+    """起動中のサーバーへ http.client で送る（接続は keep-alive で使い回す。スレッドごとに1つ作る）
+
+    コールバックの定義はサーバーの /_dash-dependencies から読む（callback_map を渡せば共有する）。
+    レスポンスはブラウザと同じく gzip を受け付け、展開してから解釈する。
+    """
+
+    def __init__(self, base_url, callback_map=None, timeout=120):
+        url = urlsplit(base_url)
+        self.host, self.port, self.timeout = url.hostname, url.port or 80, timeout
+        self.prefix = url.path.rstrip('/')
+        self.conn = None
+        if callback_map is None:
+            status, body, encoding = self.request('GET', '/_dash-dependencies')
+            if status != 200:
+                raise RuntimeError(f"/_dash-dependencies: HTTP {status}")
+            callback_map = {cb['output']: cb for cb in json.loads(_decode(body, encoding))}
+        self.callback_map = callback_map
+
+    def request(self, method, path, body=None, headers=None):
+        """(ステータス, 本文（圧縮されたまま）, Content-Encoding)。切れた keep-alive 接続は1回だけ張り直す"""
+        headers = {'Accept-Encoding': 'gzip', **(headers or {})}
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, self.prefix + path, body=body, headers=headers)
+                resp = self.conn.getresponse()
+                data = resp.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        return resp.status, data, resp.getheader('Content-Encoding', 'identity')
+
+    def call(self, key, values, trigger, headers=None):
+        raw = json.dumps(self.build(key, values, trigger))
+        status, body, encoding = self.request('POST', '/_dash-update-component', raw.encode(),
+                                              {'Content-Type': 'application/json', **(headers or {})})
+        data = json.loads(_decode(body, encoding)) if status == 200 else None
+        return CallResult(status, data, len(raw.encode()), len(body), encoding)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
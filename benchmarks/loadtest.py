@@ -0,0 +1,337 @@
+"""多数の同時利用者を模した負荷試験（起動中のサーバーの `_dash-update-component` を HTTP で呼ぶ）
+
+    python benchmarks/loadtest.py --url http://127.0.0.1:8050 --users 20 --duration 60
+    python benchmarks/loadtest.py --spawn --workers 4 --threads 2 --users 50 --events 1000
+    python benchmarks/loadtest.py --spawn --users 10 --iterations 5 --save results/load.json
+
+仮想利用者ごとにセッション（session-id とブラウザ側の Store の内容）を持ち、シナリオ
+（月の移動 → 週表示 → ドラッグ → モーダルからの保存 → Undo/Redo → LLM 入力からの作成 → 月表示）を繰り返す。
+各操作のあとはブラウザと同じく描画コールバック（update_calendar_view）も呼び、events-store は
+ブラウザと同じくリクエストに毎回載せる（--events がそのままリクエストの大きさになる）。
+保存はダブルブッキングの確認で止まらないよう allow-double-booking を付ける。
+
+--spawn は run.py（gunicorn, 本番プロファイル）を空いているポートで起動し、終了時に止める。
+ジャーナルは一時ディレクトリに書き、リマインダーは無効にする。
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dash_client import RemoteDashClient  # noqa: E402
+from synthetic import make_events, make_users  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPAWN_TIMEOUT = 60   # --spawn でサーバーの起動を待つ秒数
+# コールバック名（app.py の関数名）→ (出力 'id.prop', 起点の Input 'id.prop')
+CALLBACKS = {
+    'update_current_date': ('current-date-store.data', 'next-month-button.n_clicks'),
+    'update_calendar_view': ('calendar-output.children', 'current-date-store.data'),
+    'apply_drag_update': ('events-store.data', 'drag-update-store.children'),
+    'close_save_delete': ('events-store.data', 'save-event-button.n_clicks'),
+    'do_undo_redo': ('events-store.data', 'undo-button.n_clicks'),
+    'llm_preset_modal': ('event-form.data', 'llm-submit.n_clicks'),
+}
+LLM_TEXTS = [
+    '"Design sync" tomorrow 3pm for 45 minutes',
+    '"1on1" tomorrow 10am for 30 minutes',
+    '明日 14時から1時間 "レビュー"',
+    '"Planning" 4pm for 2 hours',
+]
+
+
+class Stats:
+    """コールバックごとのレイテンシ（秒）・エラー数・レスポンスの転送量"""
+
+    def __init__(self):
+        self.latency = {}
+        self.errors = {}
+        self.bytes = {}
+
+    def add(self, name, seconds, ok, nbytes):
+        self.latency.setdefault(name, []).append(seconds)
+        self.errors[name] = self.errors.get(name, 0) + (not ok)
+        self.bytes[name] = self.bytes.get(name, 0) + nbytes
+
+    def merge(self, other):
+        for name, values in other.latency.items():
+            self.latency.setdefault(name, []).extend(values)
+            self.errors[name] = self.errors.get(name, 0) + other.errors[name]
+            self.bytes[name] = self.bytes.get(name, 0) + other.bytes[name]
+
+
+def percentile(sorted_values, q):
+    """最近傍順位法のパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def wall(iso, tz):
+    """保存形式の時刻 → フォーム/ドラッグが送る表示タイムゾーンの壁時計 'YYYY-MM-DDTHH:MM'"""
+    return datetime.fromisoformat(iso).astimezone(tz).strftime('%Y-%m-%dT%H:%M')
+
+
+class Session:
+    """1人の仮想利用者（ブラウザ1タブ分の Store を持つ）"""
+
+    def __init__(self, client, keys, events, users, start, tz, seed):
+        self.client = client
+        self.keys = keys
+        self.events = list(events)
+        self.users = users
+        self.tz = tz
+        self.rng = random.Random(seed)
+        self.sid = uuid.uuid4().hex
+        self.date = {'year': start.year, 'month': start.month, 'anchor': start.strftime('%Y-%m-%d')}
+        self.view = 'month'
+        self.meta = {'undo': 0, 'redo': 0}
+        self.forward = True
+        self.stats = Stats()
+
+    def call(self, name, values, trigger):
+        t0 = time.perf_counter()
+        try:
+            r = self.client.call(self.keys[name], values, trigger)
+        except OSError:
+            self.stats.add(name, time.perf_counter() - t0, False, 0)
+            return {}
+        # 204 は PreventUpdate（更新なし）
+        self.stats.add(name, time.perf_counter() - t0, r.status in (200, 204), r.response_bytes)
+        return r.data['response'] if r.status == 200 else {}
+
+    def _store(self, resp):
+        if 'events-store' in resp:
+            self.events = resp['events-store']['data']
+        if 'history-meta' in resp:
+            self.meta = resp['history-meta']['data']
+
+    def render(self, trigger):
+        self.call('update_calendar_view', {
+            'current-date-store.data': self.date, 'view-switch.value': self.view, 'events-store.data': self.events,
+            'history-meta.data': self.meta, 'view-tz.data': self.tz.key, 'view-hours.data': None,
+            'current-group.data': 'all', 'groups-store.data': [], 'session-id.data': self.sid,
+            'users-store.data': self.users,
+        }, trigger)
+
+    def navigate(self):
+        trigger = 'next-month-button.n_clicks' if self.forward else 'prev-month-button.n_clicks'
+        self.forward = not self.forward
+        resp = self.call('update_current_date', {trigger: 1, 'view-switch.value': self.view,
+                                                 'current-date-store.data': self.date, 'view-tz.data': self.tz.key},
+                         trigger)
+        if 'current-date-store' in resp:
+            self.date = resp['current-date-store']['data']
+        self.render('current-date-store.data')
+
+    def switch_view(self, view):
+        self.view = view
+        self.render('view-switch.value')
+
+    def drag(self):
+        ev = self.rng.choice(self.events)
+        shift = timedelta(minutes=self.rng.choice((-60, -30, 30, 60)))
+        raw = json.dumps({'id': ev['id'],
+                          'start': wall((datetime.fromisoformat(ev['start']) + shift).isoformat(), self.tz),
+                          'end': wall((datetime.fromisoformat(ev['end']) + shift).isoformat(), self.tz)})
+        self._store(self.call('apply_drag_update', {
+            'drag-update-store.children': raw, 'events-store.data': self.events, 'session-id.data': self.sid,
+            'view-tz.data': self.tz.key, 'view-hours.data': None}, 'drag-update-store.children'))
+        self.render('events-store.data')
+
+    def save(self, fields, editing_id):
+        self._store(self.call('close_save_delete', {
+            'save-event-button.n_clicks': 1, **{f'event-{k}.value': v for k, v in fields.items()},
+            'allow-double-booking.value': ['allow'], 'events-store.data': self.events, 'session-id.data': self.sid,
+            'editing-id.data': editing_id, 'view-tz.data': self.tz.key, 'view-hours.data': None,
+            'users-store.data': self.users}, 'save-event-button.n_clicks'))
+        self.render('events-store.data')
+
+    def edit(self):
+        ev = self.rng.choice(self.events)
+        self.save({'title': ev.get('title', '') + '*', 'start-date': wall(ev['start'], self.tz),
+                   'end-date': wall(ev['end'], self.tz), 'priority': ev.get('priority'),
+                   'schedule-label': ev.get('schedule_label'), 'visibility': ev.get('visibility'),
+                   'location': ev.get('location'), 'attendees': ev.get('attendees'), 'notes': ev.get('notes'),
+                   'reminders': ev.get('reminders', [])}, ev['id'])
+
+    def undo_redo(self, op):
+        trigger = f'{op}-button.n_clicks'
+        self._store(self.call('do_undo_redo', {trigger: 1, 'events-store.data': self.events,
+                                               'session-id.data': self.sid}, trigger))
+        self.render('events-store.data')
+
+    def llm_create(self):
+        resp = self.call('llm_preset_modal', {'llm-submit.n_clicks': 1, 'llm-input.value': self.rng.choice(LLM_TEXTS),
+                                              'view-tz.data': self.tz.key, 'built-modals-store.data': ['event']},
+                         'llm-submit.n_clicks')
+        form = resp['event-form']['data'] if 'event-form' in resp else {}
+        fields = {k[len('event-'):]: v for k, v in form.items() if k.startswith('event-')}
+        if fields:
+            self.save(fields, "")
+
+    def iteration(self):
+        self.navigate()
+        self.switch_view('week')
+        self.drag()
+        self.edit()
+        self.undo_redo('undo')
+        self.undo_redo('redo')
+        self.llm_create()
+        self.switch_view('month')
+
+
+def run_sessions(args, url):
+    tz = ZoneInfo(args.tz)
+    start = datetime.now(tz).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    users = make_users(args.calendar_users)
+    events = make_events(args.events, tz, users=users, start=start, days=args.days)
+    bootstrap = RemoteDashClient(url)
+    keys = {name: bootstrap.find(output, trigger) for name, (output, trigger) in CALLBACKS.items()}
+    bootstrap.close()
+
+    total = Stats()
+    lock = threading.Lock()
+    deadline = {'t': None}
+
+    def worker(i):
+        time.sleep(args.ramp * i / max(1, args.users))
+        client = RemoteDashClient(url, bootstrap.callback_map)
+        session = Session(client, keys, events, users, start, tz, seed=args.seed + i)
+        try:
+            for _ in range(args.warmup):
+                session.iteration()
+            session.stats = Stats()  # ウォームアップ（初回の描画キャッシュ作成など）は集計しない
+            n = 0
+            while (args.iterations and n < args.iterations) or (not args.iterations and time.time() < deadline['t']):
+                session.iteration()
+                if args.think:
+                    time.sleep(session.rng.uniform(0, 2 * args.think))
+                n += 1
+        finally:
+            client.close()
+            with lock:
+                total.merge(session.stats)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.users)]
+    t0 = time.time()
+    deadline['t'] = t0 + args.ramp + args.duration
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return total, time.time() - t0
+
+
+def summarize(stats, elapsed):
+    rows = []
+    for name, values in sorted(stats.latency.items()):
+        values = sorted(values)
+        rows.append({'callback': name, 'calls': len(values), 'errors': stats.errors[name],
+                     'rps': len(values) / elapsed, 'p50_ms': percentile(values, 50) * 1000,
+                     'p95_ms': percentile(values, 95) * 1000, 'p99_ms': percentile(values, 99) * 1000,
+                     'max_ms': values[-1] * 1000, 'avg_kb': stats.bytes[name] / len(values) / 1024})
+    return rows
+
+
+def print_table(rows, elapsed):
+    print(f"{'callback':<24}{'calls':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'max ms':>10}{'avg KB':>9}")
+    for r in rows:
+        print(f"{r['callback']:<24}{r['calls']:>8}{r['errors']:>8}{r['rps']:>9.1f}{r['p50_ms']:>10.1f}"
+              f"{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}{r['avg_kb']:>9.1f}")
+    calls = sum(r['calls'] for r in rows)
+    print(f"{'total':<24}{calls:>8}{sum(r['errors'] for r in rows):>8}{calls / elapsed:>9.1f}"
+          f"   ({elapsed:.1f} s)")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(args):
+    """run.py（本番プロファイル）を起動し、(プロセス, URL, 一時ディレクトリ) を返す"""
+    port = free_port()
+    journal_dir = tempfile.TemporaryDirectory()
+    env = {**os.environ, 'LLM_PLANNER_JOURNAL_DIR': journal_dir.name, 'LLM_PLANNER_REMINDERS': 'false'}
+    cmd = [sys.executable, os.path.join(ROOT, 'run.py'), '--env', 'production', '--host', '127.0.0.1',
+           '--port', str(port), '--workers', str(args.workers), '--threads', str(args.threads)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    t0 = time.time()
+    while time.time() - t0 < SPAWN_TIMEOUT:
+        if proc.poll() is not None:
+            raise RuntimeError(f"サーバーが起動しませんでした（終了コード {proc.returncode}）: {' '.join(cmd)}")
+        try:
+            status = RemoteDashClient(url, callback_map={}, timeout=5).request('GET', '/')[0]
+            if status == 200:
+                return proc, url, journal_dir
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"サーバーが {SPAWN_TIMEOUT} 秒以内に応答しませんでした")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--url', default='http://127.0.0.1:8050', help='試験するサーバー（--spawn 指定時は無視）')
+    ap.add_argument('--spawn', action='store_true', help='run.py でサーバーを起動して試験する')
+    ap.add_argument('--workers', type=int, default=0, help='--spawn のワーカー数（0: 自動）')
+    ap.add_argument('--threads', type=int, default=0, help='--spawn のワーカーあたりのスレッド数（0: 自動）')
+    ap.add_argument('--users', type=int, default=10, help='同時に操作する仮想利用者の数')
+    ap.add_argument('--duration', type=float, default=30, help='試験時間（秒, --iterations 指定時は無視）')
+    ap.add_argument('--iterations', type=int, default=0, help='仮想利用者ごとのシナリオの繰り返し回数')
+    ap.add_argument('--warmup', type=int, default=1, help='集計しない最初の繰り返し回数')
+    ap.add_argument('--ramp', type=float, default=0, help='仮想利用者の開始をこの秒数に分散する')
+    ap.add_argument('--think', type=float, default=0, help='繰り返しの間の平均待ち時間（秒）')
+    ap.add_argument('--events', type=int, default=1000, help='カレンダーのイベント数（仮想利用者ごとの events-store）')
+    ap.add_argument('--calendar-users', type=int, default=50, help='カレンダーのユーザー数')
+    ap.add_argument('--days', type=int, default=90, help='イベントをばらまく日数（今月1日から）')
+    ap.add_argument('--tz', default='Asia/Tokyo')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--save', help='結果JSONの保存先')
+    args = ap.parse_args(argv)
+
+    proc = journal_dir = None
+    url = args.url
+    if args.spawn:
+        proc, url, journal_dir = spawn_server(args)
+    try:
+        print(f"{url}: users={args.users} events={args.events} "
+              + (f"iterations={args.iterations}" if args.iterations else f"duration={args.duration}s"),
+              file=sys.stderr)
+        stats, elapsed = run_sessions(args, url)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+            journal_dir.cleanup()
+    rows = summarize(stats, elapsed)
+    print_table(rows, elapsed)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'date': datetime.now().isoformat(timespec='seconds'), 'url': url,
+                       'args': {k: v for k, v in vars(args).items() if k != 'save'},
+                       'elapsed_sec': elapsed, 'results': rows}, f, ensure_ascii=False, indent=2)
+        print(f"saved: {args.save}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""スケーリング表の表示と、コミット間比較用の JSON 保存
+
+    python benchmarks/scaling.py                                # 1k / 10k 件
+    python benchmarks/scaling.py --events 1000,10000,100000 --users 10,100,500
+    python benchmarks/scaling.py --save                         # benchmarks/results/<commit>.json に保存
+    python benchmarks/scaling.py --compare benchmarks/results/<commit>.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cases import CASES, make_calendar  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+MIN_TIME = 0.2   # 1ケースあたりの最低計測時間(秒)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(RESULTS_DIR)).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def time_call(fn, repeat=3):
+    """最低 MIN_TIME 秒ぶん繰り返し、1回あたりの最小時間（秒）を返す"""
+    fn()  # ウォームアップ（インデックス構築など）
+    best = float('inf')
+    for _ in range(repeat):
+        n, t0 = 0, time.perf_counter()
+        while True:
+            fn()
+            n += 1
+            elapsed = time.perf_counter() - t0
+            if elapsed >= MIN_TIME / repeat:
+                break
+        best = min(best, elapsed / n)
+    return best
+
+
+def run(cases, events, users, overlap):
+    results = []
+    for n_events in events:
+        for n_users in users:
+            for heavy in overlap:
+                cal = make_calendar(n_events, n_users, heavy)
+                for case in cases:
+                    sec = time_call(CASES[case](cal))
+                    results.append({'case': case, 'events': n_events, 'users': n_users,
+                                    'overlap_heavy': heavy, 'seconds': sec})
+                    print(f"  {case:<28} e={n_events:<7} u={n_users:<4} {'overlap' if heavy else 'spread':<8}"
+                          f"{sec * 1000:>10.3f} ms", file=sys.stderr)
+    return results
+
+
+def _key(r):
+    return (r['case'], r['events'], r['users'], r['overlap_heavy'])
+
+
+def print_table(results, baseline=None):
+    base = {_key(r): r['seconds'] for r in (baseline or [])}
+    print(f"{'case':<28}{'events':>8}{'users':>7}{'layout':>9}{'ms':>12}{'vs base':>10}")
+    for r in sorted(results, key=_key):
+        ratio = ''
+        if _key(r) in base:
+            ratio = f"{r['seconds'] / base[_key(r)]:.2f}x"
+        print(f"{r['case']:<28}{r['events']:>8}{r['users']:>7}{'overlap' if r['overlap_heavy'] else 'spread':>9}"
+              f"{r['seconds'] * 1000:>12.3f}{ratio:>10}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--events', default='1000,10000')
+    ap.add_argument('--users', default='50')
+    ap.add_argument('--overlap', choices=['spread', 'overlap', 'both'], default='both')
+    ap.add_argument('--cases', default=','.join(CASES))
+    ap.add_argument('--save', nargs='?', const='', help='結果JSONの保存先（省略時は results/<commit>.json）')
+    ap.add_argument('--compare', help='比較対象の結果JSON')
+    args = ap.parse_args(argv)
+
+    cases = [c for c in args.cases.split(',') if c]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        ap.error(f"unknown case: {', '.join(sorted(unknown))}")
+    overlap = {'spread': [False], 'overlap': [True], 'both': [False, True]}[args.overlap]
+    results = run(cases, [int(x) for x in args.events.split(',')], [int(x) for x in args.users.split(',')], overlap)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+    print_table(results, baseline)
+
+    if args.save is not None:
+        commit = git_commit()
+        path = args.save or os.path.join(RESULTS_DIR, f"{commit}.json")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'commit': commit, 'date': datetime.now().isoformat(timespec='seconds'),
+                       'python': platform.python_version(), 'machine': platform.machine(),
+                       'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"saved: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""コールドスタート計測
+
+    python benchmarks/startup.py            # 5回の中央値
+    python benchmarks/startup.py --runs 10 --importtime
+
+毎回新しいプロセスで `import app`（モジュール読み込み＋create_app）、初回のレイアウト生成
+（/_dash-layout）、初回ページ（コールバック登録を含む）を計測する。--importtime では
+`python -X importtime` の結果から累積時間の大きいモジュールを表示する。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+client = app.server.test_client()
+client.get('/_dash-layout')
+t2 = time.perf_counter()
+client.get('/')
+t3 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'layout_ms': (t2 - t1) * 1000, 'first_page_ms': (t3 - t2) * 1000}))
+"""
+
+
+def run_once():
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(n=15):
+    """-X importtime の累積時間（µs）上位"""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                         cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = [p.strip() for p in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--runs', type=int, default=5)
+    ap.add_argument('--importtime', action='store_true', help='import 時間の大きいモジュールを表示')
+    args = ap.parse_args(argv)
+
+    samples = [run_once() for _ in range(args.runs)]
+    for key in ('import_ms', 'layout_ms', 'first_page_ms'):
+        values = [s[key] for s in samples]
+        print(f"{key:<14} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms")
+    if args.importtime:
+        print()
+        for cumulative, name in top_imports():
+            print(f"{cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
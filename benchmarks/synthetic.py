@@ -0,0 +1,51 @@
+"""ベンチマーク用の合成カレンダー生成"""
+import random
+import uuid
+from datetime import datetime, timedelta
+
+PRIORITIES = ["最高", "高", "中", "低"]
+LABELS = ["予定あり", "会議", "研修", "出張", "外出中", "仮予定", "休み"]
+TITLES = ["定例会議", "研修", "1on1", "設計レビュー", "顧客訪問", "出張", "採用面接", "週次報告", "勉強会", "Design sync"]
+LOCATIONS = ["", "", "本社 3F 会議室A", "大阪支社", "オンライン", "渋谷オフィス"]
+NOTES = ["", "", "資料は事前に共有", "議事録担当: 持ち回り", "Zoom のリンクは招待に記載", "予算の確認"]
+
+
+def make_users(n):
+    return [{"id": f"user_{i}", "name": f"ユーザー{i}", "email": f"user{i}@example.com"} for i in range(n)]
+
+
+def make_events(n, tz, users=None, start=None, days=90, overlap_heavy=False, seed=0):
+    """n件のイベントを start から days 日間にばらまく
+
+    overlap_heavy=True の場合は営業時間帯の少数の枠に集中させ、重なりの多い日を作る。
+    """
+    rnd = random.Random(seed)
+    text_rnd = random.Random(seed + 1)  # 文字列は別系列（時刻・参加者の分布を変えない）
+    users = users or make_users(10)
+    start = start or datetime(2025, 1, 1, tzinfo=tz)
+    events = []
+    for _ in range(n):
+        day = start + timedelta(days=rnd.randrange(days))
+        if overlap_heavy:
+            s = day.replace(hour=rnd.choice([9, 10, 13, 14]), minute=rnd.choice([0, 15, 30]))
+        else:
+            s = day.replace(hour=rnd.randrange(8, 19), minute=rnd.choice([0, 15, 30, 45]))
+        dur = timedelta(minutes=rnd.choice([15, 30, 45, 60, 90, 120]))
+        if rnd.random() < 0.02:
+            dur = timedelta(hours=rnd.choice([20, 24]))  # 出張などの日跨ぎ
+        attendees = [u["id"] for u in rnd.sample(users, k=min(len(users), rnd.randint(1, 4)))]
+        events.append({
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "title": text_rnd.choice(TITLES),
+            "start": s.isoformat(),
+            "end": (s + dur).isoformat(),
+            "created_by": attendees[0],
+            "priority": rnd.choice(PRIORITIES),
+            "schedule_label": rnd.choice(LABELS),
+            "visibility": "private" if rnd.random() < 0.1 else "public",
+            "location": text_rnd.choice(LOCATIONS),
+            "attendees": attendees,
+            "notes": text_rnd.choice(NOTES),
+            "allow_double_booking": False,
+        })
+    return events
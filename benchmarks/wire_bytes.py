@@ -0,0 +1,62 @@
+"""月・週ナビゲーション時の転送量（bytes on the wire）を計測する
+
+    APP_ENV=production python benchmarks/wire_bytes.py --events 1000
+
+update_calendar_view への `_dash-update-component` リクエストを Flask のテストクライアントで送り、
+Accept-Encoding ごとのリクエスト/レスポンスサイズと、静的アセットのサイズ・キャッシュヘッダを表示する。
+"""
+import argparse
+import os
+import sys
+
+os.environ.setdefault('APP_ENV', 'production')
+os.environ.setdefault('LLM_PLANNER_JOURNAL_DIR', '')  # ベンチマークの変更をジャーナルに残さない
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as calendar_app  # noqa: E402
+from dash_client import DashClient  # noqa: E402
+from synthetic import make_events  # noqa: E402
+
+ENCODINGS = ['identity', 'gzip', 'br']
+
+
+def view_values(view_mode, date_data, events):
+    return {'current-date-store.data': date_data, 'view-switch.value': view_mode,
+            'events-store.data': events, 'history-meta.data': {'undo': 0, 'redo': 0}}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--events', type=int, default=1000)
+    args = ap.parse_args(argv)
+
+    tz = calendar_app.TZ
+    events = make_events(args.events, tz, days=31)
+    dc = DashClient(calendar_app.app)
+    client = dc.client
+    key = dc.find('calendar-output.children')
+    navs = [
+        ('month', {'year': 2025, 'month': 1, 'anchor': '2025-01-01'}),
+        ('week', {'year': 2025, 'month': 1, 'anchor': '2025-01-15'}),
+    ]
+    print(f"APP_ENV={calendar_app.APP_ENV} events={args.events}")
+    print(f"{'view':<8}{'accept':<10}{'encoding':<10}{'request':>12}{'response':>12}")
+    for view_mode, date_data in navs:
+        values = view_values(view_mode, date_data, events)
+        for enc in ENCODINGS:
+            res = dc.call(key, values, 'current-date-store.data', headers={'Accept-Encoding': enc})
+            assert res.status == 200, res.status
+            print(f"{view_mode:<8}{enc:<10}{res.encoding:<10}{res.request_bytes:>12,}{res.response_bytes:>12,}")
+
+    print()
+    print(f"{'asset':<16}{'accept':<10}{'bytes':>10}  cache-control")
+    for name in ['calendar.js', 'style.css']:
+        path = calendar_app.app.get_asset_url(name)
+        mtime = int(os.path.getmtime(os.path.join(calendar_app.app.config.assets_folder, name)))
+        for enc in ENCODINGS:
+            resp = client.get(f"{path}?m={mtime}", headers={'Accept-Encoding': enc})
+            print(f"{name:<16}{enc:<10}{len(resp.get_data()):>10,}  {resp.headers.get('Cache-Control')}")
+
+
+if __name__ == '__main__':
+    main()
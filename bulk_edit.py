@@ -0,0 +1,58 @@
+"""複数イベントの一括編集
+
+週・月ビューで選択したイベントに、移動（分・日単位）・優先度・ラベルの変更・参加者の追加/削除・削除を
+まとめて適用する。イベント一覧は1回だけ走査し、変更のあったイベントの id を返すので、呼び出し側は
+それを1つの履歴パッチ（session_cache.make_patch）と1回の変更通知（event_index.apply_changes）にできる。
+"""
+from datetime import datetime, timedelta
+
+import timezones
+
+BULK_SHIFT_UNITS = {'minutes': 1, 'days': 24 * 60}  # 移動量の単位 → 分
+
+
+def validate(ops):
+    """ops: {'shift': 量, 'unit': 'minutes' | 'days', 'priority', 'schedule_label', 'add_attendees',
+    'remove_attendees', 'delete'}。不正な指定は ValueError"""
+    if ops.get('unit', 'minutes') not in BULK_SHIFT_UNITS:
+        raise ValueError(f"移動量の単位が不正です: {ops.get('unit')}")
+    int(ops.get('shift') or 0)
+    if set(ops.get('add_attendees') or []) & set(ops.get('remove_attendees') or []):
+        raise ValueError("同じ参加者を追加と削除の両方に指定しています")
+
+
+def _shift(iso, delta, tz):
+    """壁時計で delta ずらす（日単位の移動で夏時間を跨いでも同じ時刻のまま）"""
+    wall = datetime.fromisoformat(iso)
+    wall = (wall.astimezone(tz) if wall.tzinfo else timezones.localize(wall, tz)).replace(tzinfo=None)
+    return timezones.to_utc_iso(timezones.localize(wall + delta, tz))
+
+
+def apply(events_data, ids, ops, tz):
+    """ids のイベントに ops を適用した新しい一覧と、実際に変わったイベントの id を返す"""
+    validate(ops)
+    ids = set(ids or [])
+    delta = timedelta(minutes=int(ops.get('shift') or 0) * BULK_SHIFT_UNITS[ops.get('unit', 'minutes')])
+    fields = {f: ops[f] for f in ('priority', 'schedule_label') if ops.get(f)}
+    add = list(dict.fromkeys(ops.get('add_attendees') or []))
+    remove = set(ops.get('remove_attendees') or [])
+    out, changed = [], []
+    for ev in events_data or []:
+        if ev['id'] not in ids:
+            out.append(ev)
+            continue
+        if ops.get('delete'):
+            changed.append(ev['id'])
+            continue
+        upd = {**ev, **fields}
+        if delta:
+            upd['start'], upd['end'] = _shift(ev['start'], delta, tz), _shift(ev['end'], delta, tz)
+        if add or remove:
+            attendees = [a for a in ev.get('attendees') or [] if a not in remove]
+            upd['attendees'] = attendees + [a for a in add if a not in attendees]
+        if upd != ev:
+            changed.append(ev['id'])
+            out.append(upd)
+        else:
+            out.append(ev)
+    return out, changed
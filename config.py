@@ -0,0 +1,124 @@
+"""アプリ設定の読み込み
+
+優先順位: create_app(config) の引数 > 環境変数 LLM_PLANNER_<KEY> > 設定ファイル(JSON) > 既定値
+設定ファイルのパスは環境変数 LLM_PLANNER_CONFIG で指定する。
+"""
+import json
+import os
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+ENV_PREFIX = 'LLM_PLANNER_'
+
+DEFAULTS = {
+    'APP_ENV': 'development',   # 'production' で本番配信プロファイル
+    'TZ': 'Asia/Tokyo',
+    'START_H': 8,               # 週ビューの表示時間帯（ユーザーごとに上書き可）
+    'END_H': 20,
+    'PX_PER_MIN': 1,
+    'GRID_CELL_MIN': 15,
+    'HIST_MAX': 50,             # Undo履歴の最大数
+    'HOST': '127.0.0.1',
+    'PORT': 8050,
+    'WORKERS': 0,               # 0: CPU数から自動決定
+    'THREADS': 0,               # 0: 自動決定
+    'TIMEOUT': 60,
+    'INSTRUMENT': True,         # コールバック計測（instrumentation.py。DEVELOPMENT_ONLY）
+    'METRICS': True,            # /metrics（Prometheus形式）を公開
+    'CALLBACK_LOG': False,      # コールバックごとの構造化ログ（JSON）
+    'PROFILE': 'off',           # 'off' / 'cprofile' / 'pyinstrument'
+    'PROFILE_SAMPLE': 0.05,     # プロファイルするリクエストの割合
+    'PROFILE_DIR': 'profiles',
+    'PROFILE_KEEP': 10,         # 遅い順に残すプロファイル数
+    'PAYLOAD_ACCOUNTING': True,         # Input/State/Output ごとのサイズ集計（payload_guard.py。DEVELOPMENT_ONLY）
+    'PAYLOAD_WARN_BYTES': 1000000,      # これを超えるプロパティはログに警告
+    'PAYLOAD_LIMIT_BYTES': 20000000,    # これを超えるリクエスト/レスポンスは 413（0で無効）
+    'PAYLOAD_PANEL': True,              # 開発モードでペイロード診断パネルを表示
+    'SESSION_MAX': 1000,                # サーバー側セッションキャッシュ（session_cache.py）の最大セッション数
+    'SESSION_TTL_SEC': 8 * 3600,        # 最終アクセスからこの秒数でセッションを破棄
+    'SESSION_BUDGET_BYTES': 256 * 1024 * 1024,  # 全セッションの推定メモリ上限
+    'SESSION_VIEW_CACHE': 4,            # セッションごとに保持する描画済みビュー数
+    'SESSION_DB': '',                   # Undo/Redo 履歴の SQLite ファイル（全ワーカーで共有。空ならプロセス内のメモリ。run.py が複数ワーカーで自動設定）
+    'REMINDERS': False,                 # イベントのリマインダーを配信する（reminders.py。JOURNAL_DIR が必要。複数ワーカーでは1ワーカーのみ）
+    'REMINDER_SINKS': 'log',            # 送信先（カンマ区切り）: log / smtp://localhost:1025 / http://localhost:PORT/PATH
+    'JOURNAL_DIR': '',                  # イベントの変更ジャーナルとスナップショットの保存先（journal.py。空で無効）
+    'JOURNAL_SNAPSHOT_EVERY': 5000,     # この件数の変更ごとにスナップショットを書く（起動時に再生する上限）
+    'JOURNAL_FSYNC': False,             # 追記のたびに fsync する（電源断でも失わない代わりに保存ごとに待つ）
+}
+# 既定値の True は開発環境（APP_ENV=development）だけ。本番などでは明示的に指定しない限り無効にする
+# （リクエストごとに計測・本文の再シリアライズをするため）
+DEVELOPMENT_ONLY = ('INSTRUMENT', 'PAYLOAD_ACCOUNTING')
+
+
+def _coerce(key, value):
+    """環境変数（文字列）を既定値と同じ型に変換"""
+    default = DEFAULTS[key]
+    if isinstance(default, bool):
+        return str(value).lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return str(value)
+
+
+def load_config(overrides=None, environ=None):
+    """既定値・設定ファイル・環境変数・引数をマージした設定 dict を返す"""
+    environ = os.environ if environ is None else environ
+    cfg = dict(DEFAULTS)
+
+    explicit = set()
+    path = environ.get(ENV_PREFIX + 'CONFIG')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            file_cfg = {k.upper(): v for k, v in json.load(f).items()}
+        cfg.update(file_cfg)
+        explicit.update(file_cfg)
+
+    # 旧来の APP_ENV も受け付ける
+    if 'APP_ENV' in environ:
+        cfg['APP_ENV'] = environ['APP_ENV']
+    for key in DEFAULTS:
+        if ENV_PREFIX + key in environ:
+            cfg[key] = _coerce(key, environ[ENV_PREFIX + key])
+            explicit.add(key)
+
+    overrides = {k.upper(): v for k, v in (overrides or {}).items()}
+    cfg.update(overrides)
+    explicit.update(overrides)
+    if cfg['APP_ENV'] != 'development':
+        cfg.update({key: False for key in DEVELOPMENT_ONLY if key not in explicit})
+    validate_config(cfg)
+    return cfg
+
+
+def validate_config(cfg):
+    # END_H ≦ START_H は翌日の END_H まで（夜勤）、0→24 や同じ値は24時間表示
+    if not (0 <= cfg['START_H'] < 24 and 0 <= cfg['END_H'] <= 24):
+        raise ValueError(f"START_H/END_H が不正です: {cfg['START_H']}–{cfg['END_H']}")
+    if cfg['GRID_CELL_MIN'] <= 0 or 60 % cfg['GRID_CELL_MIN'] != 0:
+        raise ValueError(f"GRID_CELL_MIN は60の約数で指定してください: {cfg['GRID_CELL_MIN']}")
+    if cfg['PROFILE'] not in ('off', 'cprofile', 'pyinstrument'):
+        raise ValueError(f"PROFILE は off / cprofile / pyinstrument のいずれかです: {cfg['PROFILE']}")
+    try:
+        ZoneInfo(cfg['TZ'])
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"TZ が不明なタイムゾーンです: {cfg['TZ']}")
+    if cfg['SESSION_MAX'] < 1 or cfg['SESSION_TTL_SEC'] <= 0 or cfg['SESSION_BUDGET_BYTES'] <= 0:
+        raise ValueError("SESSION_MAX / SESSION_TTL_SEC / SESSION_BUDGET_BYTES は正の値で指定してください")
+    if cfg['HIST_MAX'] < 1:
+        raise ValueError(f"HIST_MAX は1以上で指定してください: {cfg['HIST_MAX']}")
+    if cfg['JOURNAL_SNAPSHOT_EVERY'] < 1:
+        raise ValueError(f"JOURNAL_SNAPSHOT_EVERY は1以上で指定してください: {cfg['JOURNAL_SNAPSHOT_EVERY']}")
+    if cfg['REMINDERS'] and not cfg['JOURNAL_DIR']:
+        raise ValueError("REMINDERS にはリマインダーを予約するジャーナル（JOURNAL_DIR）の指定が必要です")
+
+
+def default_workers(cpu_count=None):
+    """CPUバウンドな描画が中心なので 2×CPU+1 を上限付きで使う"""
+    cpu = cpu_count or os.cpu_count() or 1
+    return min(2 * cpu + 1, 12)
+
+
+def default_threads():
+    """1ワーカー内で I/O 待ち（大きなStoreの送受信）を重ねる程度のスレッド数"""
+    return 2
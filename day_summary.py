@@ -0,0 +1,225 @@
+"""日別サマリー表（月表示用のマテリアライズドビュー）
+
+表示タイムゾーンの日付ごとに 件数・先頭N件のタイトル・最高優先度・含まれるスケジュールラベル を持ち、
+月表示はこの表だけを読んで描画する。複数日に跨るイベントは別に持ち、週の行ごとの横断バーに使う。
+
+表はイベント一覧のフィンガープリント×タイムゾーン単位でキャッシュし、保存・削除・ドラッグ・Undo/Redo
+では event_index.apply_changes() の通知を受けて、変更のあった日のレコードだけを差し替えた新しい表を作る
+（変更のない日のレコードは変更前の表と共有する）。作成済みの表は書き換えない。
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import event_index
+import timezones
+
+SUMMARY_CACHE_MAX = 8   # 保持する表（イベント集合×タイムゾーン）の最大数
+SUMMARY_TOP_N = 3       # summary() で返すタイトルの件数
+PRIORITY_ORDER = ('低', '中', '高', '最高')
+
+
+def _item_key(item):
+    return (item['s'], item['e'], item['seq'])  # 同時刻は events-store での並び順
+
+
+class DaySummary:
+    """1日分のレコード。count / priorities / labels は複数日イベントも含む"""
+    __slots__ = ('count', 'singles', 'priorities', 'labels')
+
+    def __init__(self):
+        self.count = 0
+        self.singles = {}      # id → その日で完結するイベントの表示用項目
+        self.priorities = {}   # 優先度 → 件数
+        self.labels = {}       # スケジュールラベル → 件数
+
+    def copy(self):
+        rec = DaySummary()
+        rec.count = self.count
+        rec.singles = dict(self.singles)
+        rec.priorities = dict(self.priorities)
+        rec.labels = dict(self.labels)
+        return rec
+
+    def top(self, n):
+        """その日で完結するイベントを開始時刻順に先頭 n 件"""
+        if n <= 0:
+            return []
+        return sorted(self.singles.values(), key=_item_key)[:n]
+
+    def max_priority(self):
+        return max(self.priorities, key=lambda p: PRIORITY_ORDER.index(p) if p in PRIORITY_ORDER else 1, default=None)
+
+    def summary(self, n=SUMMARY_TOP_N):
+        return {'count': self.count, 'titles': [it['title'] for it in self.top(n)],
+                'max_priority': self.max_priority(), 'labels': sorted(self.labels)}
+
+
+def _bump(counter, key, delta):
+    n = counter.get(key, 0) + delta
+    if n:
+        counter[key] = n
+    else:
+        counter.pop(key, None)
+
+
+class DaySummaryTable:
+    """日付 → DaySummary と、複数日イベント id → 表示用項目"""
+
+    def __init__(self, tz, key=None, days=None, spans=None):
+        self.tz = tz
+        self.key = key
+        self.days = days if days is not None else {}
+        self.spans = spans if spans is not None else {}
+        self.next_seq = 0
+        self._owned = None  # 差分適用中にコピー済みの日付（None: すべて自分のレコード）
+
+    @classmethod
+    def build(cls, events_data, tz, key=None):
+        table = cls(tz, key)
+        rows = [(timezones.iso_epoch(ev['start'], tz), timezones.iso_epoch(ev['end'], tz), ev)
+                for ev in events_data or []]
+        if rows:
+            offsets = timezones.OffsetTable(tz, min(r[0] for r in rows) - 86400, max(r[1] for r in rows) + 86400)
+            for s_ts, e_ts, ev in rows:
+                table._add(ev, table._next(), s_ts, e_ts, offsets.local)
+        return table
+
+    def derive(self, changes, key):
+        """changes {id: (変更前, 変更後)} を反映した新しい表（変更のない日は共有）"""
+        table = DaySummaryTable(self.tz, key, dict(self.days), dict(self.spans))
+        table.next_seq = self.next_seq
+        table._owned = set()
+        for before, after in changes.values():
+            seq = table._remove(before) if before is not None else None
+            if after is not None:
+                # 編集は一覧内の位置が変わらないので元の順番を引き継ぎ、新規は末尾
+                table._add(after, table._next() if seq is None else seq)
+        table._owned = None
+        return table
+
+    # --- 更新 ---
+    def _next(self):
+        self.next_seq += 1
+        return self.next_seq
+
+    def _local(self, ts):
+        return ts + int(datetime.fromtimestamp(ts, self.tz).utcoffset().total_seconds())
+
+    def _place(self, ev, seq=None, s_ts=None, e_ts=None, local=None):
+        if s_ts is None:
+            s_ts, e_ts = timezones.iso_epoch(ev['start'], self.tz), timezones.iso_epoch(ev['end'], self.tz)
+        local = local or self._local
+        s_wall, e_wall = local(s_ts), local(e_ts)
+        s_day = timezones.wall_date(s_wall)
+        e_day = timezones.wall_date(e_wall - 1) if e_wall > s_wall else timezones.wall_date(e_wall)  # 0:00終了は前日まで
+        item = {'id': ev['id'], 'seq': seq, 's': s_ts, 'e': e_ts, 'title': ev.get('title', ''),
+                'priority': ev.get('priority', '中'), 'schedule_label': ev.get('schedule_label', '予定あり')}
+        return s_day, e_day, item
+
+    def _day(self, d):
+        rec = self.days.get(d)
+        if self._owned is not None and d not in self._owned:
+            rec = rec.copy() if rec is not None else None
+            self._owned.add(d)
+        if rec is None:
+            rec = DaySummary()
+        self.days[d] = rec
+        return rec
+
+    def _add(self, ev, seq, s_ts=None, e_ts=None, local=None):
+        s_day, e_day, item = self._place(ev, seq, s_ts, e_ts, local)
+        d = s_day
+        while d <= e_day:
+            rec = self._day(d)
+            rec.count += 1
+            _bump(rec.priorities, item['priority'], 1)
+            _bump(rec.labels, item['schedule_label'], 1)
+            d += timedelta(days=1)
+        if s_day == e_day:
+            self.days[s_day].singles[item['id']] = item
+        else:
+            self.spans[item['id']] = {**item, 's_day': s_day, 'e_day': e_day}
+
+    def _remove(self, ev):
+        """ev の分を取り除き、その順番を返す（表に無ければ None）"""
+        s_day, e_day, item = self._place(ev)
+        found = self.spans.get(item['id']) or (self.days[s_day].singles.get(item['id']) if s_day in self.days else None)
+        if found is None:
+            return None
+        d = s_day
+        while d <= e_day:
+            if d in self.days:
+                rec = self._day(d)
+                rec.count -= 1
+                _bump(rec.priorities, item['priority'], -1)
+                _bump(rec.labels, item['schedule_label'], -1)
+                rec.singles.pop(item['id'], None)
+                if rec.count <= 0:
+                    del self.days[d]
+            d += timedelta(days=1)
+        self.spans.pop(item['id'], None)
+        return found['seq']
+
+    # --- 参照 ---
+    def day(self, d):
+        return self.days.get(d)
+
+    def spans_between(self, first, last):
+        """[first, last] に掛かる複数日イベントを開始時刻順に"""
+        return sorted((sp for sp in self.spans.values() if sp['s_day'] <= last and sp['e_day'] >= first),
+                      key=_item_key)
+
+    def summaries(self, start_date, days, n=SUMMARY_TOP_N):
+        """start_date から days 日分の {'date', 'count', 'titles', 'max_priority', 'labels'}（予定のない日は除く）"""
+        out = []
+        for i in range(days):
+            d = start_date + timedelta(days=i)
+            rec = self.days.get(d)
+            if rec is not None:
+                out.append({'date': d.strftime('%Y-%m-%d'), **rec.summary(n)})
+        return out
+
+
+_tables = OrderedDict()
+_lock = threading.Lock()
+
+
+def _store(key, table):
+    _tables[key] = table
+    _tables.move_to_end(key)
+    while len(_tables) > SUMMARY_CACHE_MAX:
+        _tables.popitem(last=False)
+
+
+def table_for(events_data, tz, key=None):
+    """イベント一覧と表示タイムゾーンに対応する表（key は event_index のフィンガープリント。省略時は計算する）"""
+    key = event_index.fingerprint(events_data) if key is None else key
+    cache_key = (key, tz.key)
+    with _lock:
+        table = _tables.get(cache_key)
+        if table is not None:
+            _tables.move_to_end(cache_key)
+            return table
+    table = DaySummaryTable.build(events_data, tz, key)
+    with _lock:
+        _store(cache_key, table)
+    return table
+
+
+def _on_change(before_key, after_key, changes):
+    """変更前のイベント集合の表があれば、差分を反映した表を変更後のキーで登録する"""
+    with _lock:
+        sources = [t for (k, _), t in _tables.items() if k == before_key]
+    for table in sources:
+        derived = table.derive(changes, after_key)
+        with _lock:
+            _store((after_key, table.tz.key), derived)
+
+
+def cache_clear():
+    with _lock:
+        _tables.clear()
+
+
+event_index.on_change(_on_change)
@@ -0,0 +1,149 @@
+"""イベントのサーバー側インデックス
+
+events-store（ブラウザ側）の内容を開始時刻順の配列に展開し、日付ウィンドウ単位の
+範囲検索を bisect で行えるようにする。同じイベント集合に対する再構築を避けるため、
+インデックスはイベント一覧のフィンガープリント単位でキャッシュする。
+
+保存・削除・ドラッグ・Undo/Redo による変更は apply_changes() で通知し、日別サマリーなどの派生データは
+on_change() で登録したリスナーが差分だけを反映する。
+"""
+import bisect
+import hashlib
+import io
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import timezones
+
+INDEX_CACHE_MAX = 8  # 保持するインデックス（イベント集合）の最大数
+
+
+def fingerprint(events_data):
+    """イベント一覧の同一性判定用ハッシュ
+
+    memo なし（fast モード）の pickle は値と順序だけで決まり、JSON 化より数倍速い。
+    hash() はプロセスごとに乱数化されるので、ワーカー間・再起動後も一致する BLAKE2b の64ビットを使う
+    （描画時の data-version として API でも使う）。
+    """
+    buf = io.BytesIO()
+    pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+    pickler.fast = True
+    pickler.dump(events_data or [])
+    return int.from_bytes(hashlib.blake2b(buf.getvalue(), digest_size=8).digest(), 'big')
+
+
+class EventIndex:
+    """開始時刻(UTC epoch秒)でソートしたイベント配列と、窓検索用の最大イベント長
+
+    tz はオフセットなしの旧形式の時刻を解釈するための既定タイムゾーン。
+    """
+
+    def __init__(self, events_data, tz):
+        self.tz = tz
+        rows = []
+        for ev in events_data or []:
+            s = timezones.iso_epoch(ev['start'], tz)
+            e = timezones.iso_epoch(ev['end'], tz)
+            rows.append((s, e, ev))
+        rows.sort(key=lambda r: (r[0], r[1]))
+        self.starts = [r[0] for r in rows]
+        self.ends = [r[1] for r in rows]
+        self.events = [r[2] for r in rows]
+        # イベントは最長24時間だが、保存済みデータの例外に備えて実測値を使う
+        self.max_len = max([e - s for s, e, _ in rows] + [0])
+        self.key = None  # index_for() がフィンガープリントを設定する
+
+    def __len__(self):
+        return len(self.events)
+
+    def window(self, lo_ts, hi_ts):
+        """[lo_ts, hi_ts) と重なるイベントの (開始epoch, 終了epoch, イベント) を開始時刻順に返す"""
+        lo = bisect.bisect_left(self.starts, lo_ts - self.max_len)
+        hi = bisect.bisect_left(self.starts, hi_ts)
+        return [(self.starts[i], self.ends[i], self.events[i]) for i in range(lo, hi)
+                if self.ends[i] > lo_ts or self.starts[i] >= lo_ts]
+
+    def overlapping(self, start_dt, end_dt):
+        """[start_dt, end_dt) と重なるイベントを開始時刻順に返す"""
+        return [ev for _, _, ev in self.window(int(start_dt.timestamp()), int(end_dt.timestamp()))]
+
+    def agenda_rows(self, start_date, days, tz=None):
+        """予定リスト用の行（日付見出し行 + イベント行）を start_date から days 日分生成
+
+        日付の区切りと行の時刻は tz（省略時は既定タイムゾーン）の壁時計で表す。
+        """
+        table = timezones.offset_table(tz or self.tz, start_date, days)
+        rows = []
+        for i in range(days):
+            d = start_date + timedelta(days=i)
+            evs = self.window(table.day_start(d), table.day_start(d + timedelta(days=1)))
+            if not evs:
+                continue
+            rows.append({'type': 'day', 'date': d.strftime('%Y-%m-%d')})
+            for s, e, ev in evs:
+                rows.append({'type': 'event', 'date': d.strftime('%Y-%m-%d'),
+                             'id': ev['id'], 'title': ev.get('title', ''),
+                             'start': timezones.wall_iso(table.local(s)),
+                             'end': timezones.wall_iso(table.local(e)),
+                             'priority': ev.get('priority', '中'),
+                             'schedule_label': ev.get('schedule_label', '予定あり'),
+                             'location': ev.get('location', '')})
+        return rows
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_listeners = []
+
+
+def index_for(events_data, tz, key=None):
+    """イベント一覧に対応するインデックス（キャッシュ済みなら再利用。key は計算済みのフィンガープリント）"""
+    key = fingerprint(events_data) if key is None else key
+    with _lock:
+        idx = _cache.get(key)
+        if idx is not None:
+            _cache.move_to_end(key)
+            return idx
+    idx = EventIndex(events_data, tz)
+    idx.key = key
+    with _lock:
+        _cache[key] = idx
+        _cache.move_to_end(key)
+        while len(_cache) > INDEX_CACHE_MAX:
+            _cache.popitem(last=False)
+    return idx
+
+
+def lookup(key):
+    """フィンガープリント（data-version の文字列も可）のインデックス。このプロセスが持っていなければ None"""
+    try:
+        key = int(key)
+    except (TypeError, ValueError):
+        return None
+    with _lock:
+        idx = _cache.get(key)
+        if idx is not None:
+            _cache.move_to_end(key)
+        return idx
+
+
+def on_change(listener):
+    """変更通知のリスナーを登録する: listener(変更前のキー, 変更後のキー, {id: (変更前, 変更後)})"""
+    _listeners.append(listener)
+
+
+def apply_changes(events_before, events_after, changed_ids):
+    """changed_ids の変更を派生データへ通知し、変更後のフィンガープリントを返す
+
+    変更前・変更後は None（新規・削除）になり得る。
+    """
+    ids = set(changed_ids)
+    before = {ev['id']: ev for ev in events_before or [] if ev['id'] in ids}
+    after = {ev['id']: ev for ev in events_after or [] if ev['id'] in ids}
+    changes = {eid: (before.get(eid), after.get(eid)) for eid in ids}
+    before_key, after_key = fingerprint(events_before), fingerprint(events_after)
+    for listener in _listeners:
+        listener(before_key, after_key, changes)
+    return after_key
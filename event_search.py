@@ -0,0 +1,245 @@
+"""イベントの全文・属性検索（転置インデックス）
+
+タイトル・ノート・場所を NFKC 正規化・小文字化した文字列から、文字 unigram と bigram の転置インデックスを作る。
+日本語は分かち書きせずに n-gram で候補を引き、最後に元の文字列への部分一致で確かめる（n-gram の偽陽性を除く）。
+属性（優先度・スケジュールラベル・公開設定・参加者）は 値 → イベント集合 の索引、日付範囲は開始時刻順の
+配列を bisect して絞り込む。結果は開始時刻順で、ページ単位に返す。
+
+day_summary と同じく、インデックスはイベント一覧のフィンガープリント単位の版として持ち、保存・削除・
+ドラッグ・Undo/Redo では event_index.apply_changes() の通知を受けて、変更のあった posting・属性だけを
+差し替えた新しい版を作る。作成済みの版は書き換えない。
+"""
+import bisect
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import event_index
+import timezones
+
+SEARCH_CACHE_MAX = 4     # 保持するインデックス（イベント集合）の最大数
+SEARCH_PAGE_SIZE = 50
+SEARCH_PAGE_MAX = 200    # 1ページに返せる最大件数
+SEQ_BITS = 24            # 並び順キー = 開始epoch << SEQ_BITS | 連番（同時刻は追加順）
+ATTR_FIELDS = ('priority', 'schedule_label', 'visibility', 'attendees')
+ATTR_DEFAULTS = {'priority': '中', 'schedule_label': '予定あり', 'visibility': 'public'}
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def grams(text):
+    """文字 unigram + bigram（空白・改行を含むものは除く）"""
+    out = set()
+    for word in text.split():
+        out.update(word)
+        out.update(map(str.__add__, word, word[1:]))
+    return out
+
+
+def query_grams(term):
+    """検索語の候補を引くための n-gram（2文字以上は bigram だけで十分）"""
+    if len(term) == 1:
+        return {term}
+    return {term[i:i + 2] for i in range(len(term) - 1)}
+
+
+def attr_values(ev, field):
+    if field == 'attendees':
+        return set(ev.get('attendees') or [])
+    return {ev.get(field) or ATTR_DEFAULTS[field]}
+
+
+
+class SearchIndex:
+    """posting・属性索引は「並び順キー」（開始時刻と連番を1つの整数にしたもの）の集合で持つ
+
+    整数のまま並べ替え・範囲の切り出しができるので、大きな候補集合でもイベントを引くのはページ分だけで済む。
+    """
+
+    def __init__(self, tz, key=None):
+        self.tz = tz
+        self.key = key
+        self.keys = {}       # id → 並び順キー
+        self.docs = {}       # 並び順キー → (終了epoch, 正規化済みテキスト, イベント)
+        self.order = []      # 並び順キーの昇順
+        self.postings = {}   # n-gram → 並び順キーの集合
+        self.attrs = {f: {} for f in ATTR_FIELDS}  # 属性 → 値 → 並び順キーの集合
+        self.next_seq = 0
+        self._owned = None   # 差分適用中にコピー済みの集合（None: すべて自分のもの）
+
+    @classmethod
+    def build(cls, events_data, tz, key=None):
+        index = cls(tz, key)
+        by_text = {}
+        for ev in events_data or []:
+            k, text = index._place(ev, sort=False)
+            by_text.setdefault(text, []).append(k)
+            for f in ATTR_FIELDS:
+                table = index.attrs[f]
+                for v in attr_values(ev, f):
+                    table.setdefault(v, set()).add(k)
+        # 同じ文字列（定例会議など）の n-gram は1回だけ求めてまとめて登録する
+        postings = index.postings
+        for text, ks in by_text.items():
+            for g in grams(text):
+                ids = postings.get(g)
+                if ids is None:
+                    postings[g] = set(ks)
+                else:
+                    ids.update(ks)
+        index.order.sort()
+        return index
+
+    def derive(self, changes, key):
+        """changes {id: (変更前, 変更後)} を反映した新しい版（変更のない posting・属性は共有）"""
+        index = SearchIndex(self.tz, key)
+        index.keys = dict(self.keys)
+        index.docs = dict(self.docs)
+        index.order = list(self.order)
+        index.postings = dict(self.postings)
+        index.attrs = {f: dict(values) for f, values in self.attrs.items()}
+        index.next_seq = self.next_seq
+        index._owned = set()
+        for eid, (before, after) in changes.items():
+            if eid in index.keys:
+                index._remove(eid)
+            if after is not None:
+                index._add(after)
+        index._owned = None
+        return index
+
+    # --- 更新 ---
+    def _set(self, table, name, key):
+        ids = table.get(key)
+        if self._owned is not None and (name, key) not in self._owned:
+            ids = set(ids) if ids is not None else None
+            self._owned.add((name, key))
+        if ids is None:
+            ids = set()
+        table[key] = ids
+        return ids
+
+    def _entries(self, ev, text):
+        """(索引の名前, 索引, 値) の一覧"""
+        out = [('', self.postings, g) for g in grams(text)]
+        for f in ATTR_FIELDS:
+            out.extend((f, self.attrs[f], v) for v in attr_values(ev, f))
+        return out
+
+    def _place(self, ev, sort=True):
+        """並び順キーを振って keys / docs / order に登録し、(キー, 正規化済みテキスト) を返す"""
+        eid = ev['id']
+        s = timezones.iso_epoch(ev['start'], self.tz)
+        e = timezones.iso_epoch(ev['end'], self.tz)
+        self.next_seq += 1
+        k = (s << SEQ_BITS) | (self.next_seq & ((1 << SEQ_BITS) - 1))
+        text = '\n'.join(normalize(ev.get(f)) for f in ('title', 'notes', 'location'))
+        self.keys[eid] = k
+        self.docs[k] = (e, text, ev)
+        if sort:
+            bisect.insort(self.order, k)
+        else:
+            self.order.append(k)
+        return k, text
+
+    def _add(self, ev):
+        k, text = self._place(ev)
+        for name, table, v in self._entries(ev, text):
+            self._set(table, name, v).add(k)
+
+    def _remove(self, eid):
+        k = self.keys.pop(eid)
+        _, text, ev = self.docs.pop(k)
+        del self.order[bisect.bisect_left(self.order, k)]
+        for name, table, v in self._entries(ev, text):
+            ids = self._set(table, name, v)
+            ids.discard(k)
+            if not ids:
+                del table[v]
+
+    # --- 検索 ---
+    def _text_keys(self, term):
+        sets = [self.postings.get(g) for g in query_grams(term)]
+        if any(ids is None for ids in sets):
+            return set()
+        sets.sort(key=len)
+        ids = sets[0]
+        for other in sets[1:]:
+            ids = ids & other
+            if not ids:
+                break
+        if len(term) > 2:  # bigram の共起だけでは連続していない場合があるので部分一致で確かめる
+            docs = self.docs
+            ids = {k for k in ids if term in docs[k][1]}
+        return ids
+
+    def search(self, query='', filters=None, start_ts=None, end_ts=None, page=0, per_page=SEARCH_PAGE_SIZE):
+        """query（空白区切りの AND）と属性フィルター、開始時刻の範囲 [start_ts, end_ts) で検索する
+
+        filters は {属性: [値, ...]}（同じ属性の値は OR）。戻り値は (総件数, そのページの (開始, 終了, イベント))。
+        """
+        candidates = [self._text_keys(term) for term in normalize(query).split()]
+        for f, values in (filters or {}).items():
+            if values:
+                table = self.attrs[f]
+                hits = [table[v] for v in values if v in table]
+                candidates.append(hits[0] if len(hits) == 1 else set().union(*hits))
+        lo_k = None if start_ts is None else start_ts << SEQ_BITS
+        hi_k = None if end_ts is None else end_ts << SEQ_BITS
+
+        if candidates:
+            candidates.sort(key=len)
+            ids = candidates[0]
+            for other in candidates[1:]:
+                ids = ids & other
+            keys = sorted(ids)  # 整数の並べ替えなので数万件でも数ミリ秒
+        else:
+            keys = self.order
+        lo = 0 if lo_k is None else bisect.bisect_left(keys, lo_k)
+        hi = len(keys) if hi_k is None else max(lo, bisect.bisect_left(keys, hi_k))
+        page_keys = keys[lo + page * per_page:min(hi, lo + (page + 1) * per_page)]
+        return hi - lo, [(k >> SEQ_BITS, self.docs[k][0], self.docs[k][2]) for k in page_keys]
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def _store(key, index):
+    _indexes[key] = index
+    _indexes.move_to_end(key)
+    while len(_indexes) > SEARCH_CACHE_MAX:
+        _indexes.popitem(last=False)
+
+
+def index_for(events_data, tz, key=None):
+    """イベント一覧に対応する検索インデックス（key は event_index のフィンガープリント）"""
+    key = event_index.fingerprint(events_data) if key is None else key
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = SearchIndex.build(events_data, tz, key)
+    with _lock:
+        _store(key, index)
+    return index
+
+
+def _on_change(before_key, after_key, changes):
+    with _lock:
+        source = _indexes.get(before_key)
+    if source is not None:
+        derived = source.derive(changes, after_key)
+        with _lock:
+            _store(after_key, derived)
+
+
+def cache_clear():
+    with _lock:
+        _indexes.clear()
+
+
+event_index.on_change(_on_change)
@@ -0,0 +1,214 @@
+"""空き時間情報（free/busy）
+
+ユーザーごとの予定区間を併合した「予定あり」の区間列を持ち、/api/freebusy から 15分・1時間・1日の
+粒度で返す。インデックスには時刻と状態（busy / tentative）だけを持ち、タイトルなどの詳細は
+保持しないので、非公開（visibility == 'private'）の予定も内容を出さずに予定ありとして返せる。
+
+- 「空き時間」ラベルは予定に数えず、「仮予定」は tentative（busy と重なる部分は busy）とする
+- インデックスはイベント一覧のフィンガープリント単位の版として持ち、event_index.apply_changes() の
+  通知では変更のあったイベントの参加者の区間だけを差し替える
+- 粒度で丸めた区間列（粗いビュー）はユーザー×タイムゾーン×粒度ごとに初回の問い合わせで作り、
+  参加しているイベントが変わらないユーザーの分は次の版へ引き継ぐ
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+import event_index
+import timezones
+from scheduler import FREE_LABELS, SOFT_LABELS
+
+FREEBUSY_GRANULARITIES = {'15min': 15 * 60, 'hour': 3600, 'day': 86400}  # 粒度 → 秒（壁時計で丸める）
+FREEBUSY_CACHE_MAX = 4      # 保持するインデックス（イベント集合）の最大数
+FREEBUSY_MAX_USERS = 1000   # 1回の問い合わせで指定できるユーザー数
+BUSY, TENTATIVE = 'busy', 'tentative'
+
+
+def _merge(intervals):
+    out = []
+    for s, e in sorted(intervals):
+        if out and s <= out[-1][1]:
+            if e > out[-1][1]:
+                out[-1] = (out[-1][0], e)
+        else:
+            out.append((s, e))
+    return out
+
+
+def _subtract(a, b):
+    """整列済み・重なりなしの区間列 a から b を除いた部分"""
+    out, j = [], 0
+    for s, e in a:
+        while j < len(b) and b[j][1] <= s:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] < e:
+            if b[k][0] > s:
+                out.append((s, b[k][0]))
+            s = max(s, b[k][1])
+            k += 1
+        if s < e:
+            out.append((s, e))
+    return out
+
+
+class BusyView:
+    """1ユーザーの重なりのない区間 (開始epoch, 終了epoch, 状態) を開始時刻順に持つ"""
+    __slots__ = ('starts', 'rows')
+
+    def __init__(self, busy, tentative):
+        self.rows = sorted([(s, e, BUSY) for s, e in busy] +
+                           [(s, e, TENTATIVE) for s, e in _subtract(tentative, busy)])
+        self.starts = [r[0] for r in self.rows]
+
+    def window(self, lo, hi):
+        """[lo, hi) と重なる区間（ウィンドウで切り詰める）"""
+        i = max(bisect.bisect_right(self.starts, lo) - 1, 0)
+        j = bisect.bisect_left(self.starts, hi)
+        return [(max(s, lo), min(e, hi), st) for s, e, st in self.rows[i:j] if e > lo]
+
+
+def _coarsen(intervals, table, step):
+    """区間を壁時計の step 秒の境界へ外側に丸めて併合する"""
+    out = []
+    for s, e in intervals:
+        ws, we = table.local(s), table.local(e)
+        out.append((table.utc(ws - ws % step), table.utc(-(-we // step) * step)))
+    return _merge(out)
+
+
+class BusyIndex:
+    def __init__(self, tz, key=None):
+        self.tz = tz            # オフセットなしの旧形式の時刻を解釈するための既定タイムゾーン
+        self.key = key
+        self.user_rows = {}     # ユーザーID → {イベントID: (開始epoch, 終了epoch, 状態)}
+        self.views = {}         # (ユーザーID, タイムゾーン名, 粒度秒) → BusyView
+        self.span = None        # 全区間を含む (最小epoch, 最大epoch)。丸め用のオフセット表の範囲
+        self.tables = {}        # タイムゾーン名 → span を覆うオフセット表
+
+    def _rows_of(self, ev):
+        label = ev.get('schedule_label', '予定あり')
+        if label in FREE_LABELS:
+            return None
+        return (timezones.iso_epoch(ev['start'], self.tz), timezones.iso_epoch(ev['end'], self.tz),
+                TENTATIVE if label in SOFT_LABELS else BUSY)
+
+    @classmethod
+    def build(cls, events_data, tz, key=None):
+        index = cls(tz, key)
+        for ev in events_data or []:
+            row = index._rows_of(ev)
+            if row is None:
+                continue
+            for uid in ev.get('attendees') or []:
+                index.user_rows.setdefault(uid, {})[ev['id']] = row
+            index._extend(row)
+        return index
+
+    def _extend(self, row):
+        if self.span is None:
+            self.span = (row[0], row[1])
+        elif row[0] < self.span[0] or row[1] > self.span[1]:
+            self.span = (min(self.span[0], row[0]), max(self.span[1], row[1]))
+
+    def derive(self, changes, key):
+        """changes {id: (変更前, 変更後)} を反映した新しい版（影響のないユーザーの区間・ビューは共有）"""
+        index = BusyIndex(self.tz, key)
+        index.user_rows = dict(self.user_rows)
+        index.span = self.span
+        touched = set()
+        for eid, (before, after) in changes.items():
+            for uid in (before or {}).get('attendees') or []:
+                if uid not in touched:
+                    index.user_rows[uid] = dict(index.user_rows.get(uid, {}))
+                    touched.add(uid)
+                index.user_rows[uid].pop(eid, None)
+            row = index._rows_of(after) if after is not None else None
+            if row is None:
+                continue
+            for uid in after.get('attendees') or []:
+                if uid not in touched:
+                    index.user_rows[uid] = dict(index.user_rows.get(uid, {}))
+                    touched.add(uid)
+                index.user_rows[uid][eid] = row
+            index._extend(row)
+        if index.span == self.span:
+            index.tables = self.tables
+        for uid in touched:
+            if not index.user_rows[uid]:
+                del index.user_rows[uid]
+        index.views = {k: v for k, v in list(self.views.items()) if k[0] not in touched}
+        return index
+
+    def view(self, uid, tz, step):
+        """ユーザーの粗いビュー（step 秒の壁時計の境界に丸めて併合。初回だけ作る）"""
+        cache_key = (uid, tz.key, step)
+        view = self.views.get(cache_key)
+        if view is None:
+            rows = list(self.user_rows.get(uid, {}).values())
+            busy = _merge([(s, e) for s, e, st in rows if st == BUSY])
+            tentative = _merge([(s, e) for s, e, st in rows if st == TENTATIVE])
+            if rows:
+                table = self._table(tz)
+                busy, tentative = _coarsen(busy, table, step), _coarsen(tentative, table, step)
+            view = self.views[cache_key] = BusyView(busy, tentative)
+        return view
+
+    def _table(self, tz):
+        table = self.tables.get(tz.key)
+        if table is None:
+            table = self.tables[tz.key] = timezones.OffsetTable(tz, self.span[0] - 86400, self.span[1] + 86400)
+        return table
+
+    def query(self, user_ids, start_date, days, tz, granularity='15min'):
+        """ユーザーごとの [{'start', 'end'（tz の壁時計 'YYYY-MM-DDTHH:MM'）, 'status'}]"""
+        step = FREEBUSY_GRANULARITIES[granularity]
+        table = timezones.offset_table(tz, start_date, days)
+        lo = table.day_start(start_date)
+        hi = table.utc(timezones.wall_day(start_date) + days * 86400)
+        return {uid: [{'start': timezones.wall_iso(table.local(s)), 'end': timezones.wall_iso(table.local(e)),
+                       'status': st}
+                      for s, e, st in self.view(uid, tz, step).window(lo, hi)]
+                for uid in dict.fromkeys(user_ids)}
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def _store(key, index):
+    _indexes[key] = index
+    _indexes.move_to_end(key)
+    while len(_indexes) > FREEBUSY_CACHE_MAX:
+        _indexes.popitem(last=False)
+
+
+def index_for(events_data, tz, key=None):
+    """イベント一覧に対応するインデックス（key は event_index のフィンガープリント）"""
+    key = event_index.fingerprint(events_data) if key is None else key
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = BusyIndex.build(events_data, tz, key)
+    with _lock:
+        _store(key, index)
+    return index
+
+
+def _on_change(before_key, after_key, changes):
+    with _lock:
+        source = _indexes.get(before_key)
+    if source is not None:
+        derived = source.derive(changes, after_key)
+        with _lock:
+            _store(after_key, derived)
+
+
+def cache_clear():
+    with _lock:
+        _indexes.clear()
+
+
+event_index.on_change(_on_change)
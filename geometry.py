@@ -0,0 +1,82 @@
+"""週ビューのジオメトリ（時間軸・ピクセル位置・グリッドスナップ）
+
+表示時間帯・1分あたりのピクセル数・グリッドの刻みの組み合わせごとに1回だけ計算してキャッシュする。
+時刻は「その日の 0:00 からの分」で表し、終了時刻が開始時刻以前の場合は翌日とみなす
+（例: 22→6 は 22:00〜翌6:00 の夜勤、0→24 や 8→8 は24時間表示）。
+"""
+import functools
+
+from dash import html
+
+GEOMETRY_CACHE_MAX = 32
+GRID_CHOICES = (5, 10, 15, 30, 60)  # ユーザー設定で選べるグリッドの刻み（分）
+HOUR_LINE_COLOR = '#DFE1E6'
+CELL_COLOR = '#FAFBFC'
+
+
+def span_hours(start_h, end_h):
+    """表示時間帯の長さ（時間）。終了≦開始は翌日まで、同じ値は24時間"""
+    return (end_h - start_h) % 24 or 24
+
+
+def validate_hours(start_h, end_h, grid_min):
+    if not (0 <= start_h < 24 and 0 <= end_h <= 24):
+        raise ValueError(f"表示時間帯が不正です: {start_h}–{end_h}")
+    if grid_min <= 0 or 60 % grid_min != 0:
+        raise ValueError(f"グリッドの刻みは60の約数で指定してください: {grid_min}")
+
+
+def format_minute(m):
+    """その日の 0:00 からの分 → 'HH:MM'（翌日分は 24 を引いて表示）"""
+    return f"{(m // 60) % 24:02d}:{m % 60:02d}"
+
+
+class Geometry:
+    def __init__(self, start_h, end_h, px_per_min, grid_min):
+        validate_hours(start_h, end_h, grid_min)
+        self.start_h = start_h
+        self.end_h = end_h
+        self.px_per_min = px_per_min
+        self.grid_min = grid_min
+        self.start_min = start_h * 60
+        self.total_min = span_hours(start_h, end_h) * 60
+        self.end_min = self.start_min + self.total_min   # 1440 を超える場合は翌日
+        self.total_px = self.total_min * px_per_min
+        self.hour_px = 60 * px_per_min
+        # 時間軸ラベル: (表示, top px)
+        self.labels = [(format_minute(self.start_min + i * 60), i * self.hour_px)
+                       for i in range(self.total_min // 60 + 1)]
+        self.background = {
+            "backgroundImage": f"repeating-linear-gradient(to bottom, {CELL_COLOR} 0px, {CELL_COLOR} {self.hour_px - 1}px, "
+                               f"{HOUR_LINE_COLOR} {self.hour_px}px)",
+            "backgroundSize": f"100% {self.hour_px}px",
+        }
+        # calendar.js がドラッグ・リサイズの換算に使う
+        self.data_attrs = {
+            "data-start-h": str(start_h),
+            "data-px-per-min": str(px_per_min),
+            "data-grid-min": str(grid_min),
+            "data-total-px": str(self.total_px),
+        }
+        self._time_axis = None
+
+    def snap_down(self, m):
+        return m - m % self.grid_min
+
+    def snap_up(self, m):
+        return m + (-m) % self.grid_min
+
+    def time_axis(self):
+        """時間軸の列（同じジオメトリでは同じコンポーネントを再利用する）"""
+        if self._time_axis is None:
+            self._time_axis = html.Div(
+                [html.Div(text, style={"position": "absolute", "top": f"{top}px", "right": 0,
+                                       "transform": "translateY(-50%)", "fontSize": "12px"})
+                 for text, top in self.labels],
+                style={"position": "relative", "height": f"{self.total_px}px"})
+        return self._time_axis
+
+
+@functools.lru_cache(maxsize=GEOMETRY_CACHE_MAX)
+def geometry(start_h, end_h, px_per_min, grid_min):
+    return Geometry(start_h, end_h, px_per_min, grid_min)
@@ -0,0 +1,209 @@
+"""コールバック単位の計測
+
+`_dash-update-component` への全リクエストを Flask のフックで計測する（@callback 側の変更は不要）。
+
+- 実行時間・リクエスト/レスポンスのサイズ・どの Input が発火させたか（changedPropIds）
+- Prometheus テキスト形式の `/metrics`
+- 構造化ログ（1リクエスト1行のJSON, logger 'llm_planner.callbacks'）
+- サンプリングプロファイル（cProfile / pyinstrument）: 遅いリクエストの上位 N 件をファイルに保存
+
+メトリクスはワーカープロセス単位で集計される。
+"""
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, request
+
+logger = logging.getLogger('llm_planner.callbacks')
+
+# 秒。Dash のコールバックは数ms〜数秒なのでその範囲を細かめに取る
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def trigger_label(changed_prop_ids):
+    """changedPropIds → ラベル。パターンマッチIDは type だけ残してラベル数を抑える"""
+    if not changed_prop_ids:
+        return 'initial'
+    prop_id = changed_prop_ids[0]
+    cid, _, prop = prop_id.rpartition('.')
+    if cid.startswith('{'):
+        try:
+            cid = '{type:%s}' % json.loads(cid).get('type', '?')
+        except ValueError:
+            pass
+    return f"{cid}.{prop}"
+
+
+class CallbackMetrics:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.count = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.duration_sum = defaultdict(float)
+        self.duration_buckets = defaultdict(lambda: [0] * len(self.buckets))
+        self.request_bytes = defaultdict(int)
+        self.response_bytes = defaultdict(int)
+
+    def observe(self, callback, trigger, seconds, req_bytes, resp_bytes, status):
+        key = (callback, trigger)
+        with self.lock:
+            self.count[key] += 1
+            if status >= 400:
+                self.errors[key] += 1
+            self.duration_sum[key] += seconds
+            counts = self.duration_buckets[key]
+            for i, le in enumerate(self.buckets):
+                if seconds <= le:
+                    counts[i] += 1
+            self.request_bytes[key] += req_bytes
+            self.response_bytes[key] += resp_bytes
+
+    def render_prometheus(self):
+        def labels(key, **extra):
+            pairs = {'callback': key[0], 'trigger': key[1], **extra}
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + '}'
+
+        lines = []
+        with self.lock:
+            keys = sorted(self.count)
+            lines += ['# HELP dash_callback_duration_seconds Dash callback wall time.',
+                      '# TYPE dash_callback_duration_seconds histogram']
+            for key in keys:
+                for le, n in zip(self.buckets, self.duration_buckets[key]):
+                    lines.append(f'dash_callback_duration_seconds_bucket{labels(key, le=le)} {n}')
+                lines.append(f'dash_callback_duration_seconds_bucket{labels(key, le="+Inf")} {self.count[key]}')
+                lines.append(f'dash_callback_duration_seconds_sum{labels(key)} {self.duration_sum[key]:.6f}')
+                lines.append(f'dash_callback_duration_seconds_count{labels(key)} {self.count[key]}')
+            for name, help_text, series in (
+                ('dash_callback_request_bytes_total', 'Request payload bytes (Inputs/State).', self.request_bytes),
+                ('dash_callback_response_bytes_total', 'Response payload bytes (Outputs, on the wire).', self.response_bytes),
+                ('dash_callback_errors_total', 'Callback responses with status >= 400.', self.errors),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                lines += [f'{name}{labels(key)} {series[key]}' for key in keys]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class SlowestProfiles:
+    """サンプリングしたリクエストのうち遅い上位 keep 件だけプロファイルを残す"""
+
+    def __init__(self, mode, directory, keep):
+        self.mode = mode
+        self.directory = directory
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.heap = []   # (秒, パス) の最小ヒープ
+
+    def start(self):
+        if self.mode == 'pyinstrument':
+            from pyinstrument import Profiler
+            prof = Profiler(async_mode='disabled')
+        else:
+            import cProfile
+            prof = cProfile.Profile()
+        if self.mode == 'cprofile':
+            prof.enable()
+        else:
+            prof.start()
+        return prof
+
+    def stop(self, prof, seconds, callback):
+        if self.mode == 'cprofile':
+            prof.disable()
+        else:
+            prof.stop()
+        with self.lock:
+            if len(self.heap) >= self.keep and seconds <= self.heap[0][0]:
+                return None
+            os.makedirs(self.directory, exist_ok=True)
+            stem = f"{int(seconds * 1000):06d}ms_{callback}_{int(time.time() * 1000)}_{os.getpid()}"
+            path = os.path.join(self.directory, stem + ('.speedscope.json' if self.mode == 'pyinstrument' else '.prof'))
+            if self.mode == 'pyinstrument':
+                from pyinstrument.renderers import SpeedscopeRenderer
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(prof.output(renderer=SpeedscopeRenderer()))
+            else:
+                prof.dump_stats(path)   # snakeviz / flameprof で可視化
+            heapq.heappush(self.heap, (seconds, path))
+            if len(self.heap) > self.keep:
+                _, old = heapq.heappop(self.heap)
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+            return path
+
+
+def instrument(dash_app, cfg):
+    """Dash アプリの `_dash-update-component` に計測フックを取り付ける"""
+    server = dash_app.server
+    metrics = CallbackMetrics()
+    profiles = None
+    if cfg['PROFILE'] in ('cprofile', 'pyinstrument'):
+        profiles = SlowestProfiles(cfg['PROFILE'], cfg['PROFILE_DIR'], cfg['PROFILE_KEEP'])
+    sample_rate = cfg['PROFILE_SAMPLE']
+    log_enabled = cfg['CALLBACK_LOG']
+    if log_enabled and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    endpoint = dash_app.config.requests_pathname_prefix + '_dash-update-component'
+
+    def callback_name(output_key):
+        cb = dash_app.callback_map.get(output_key) or {}
+        fn = cb.get('callback')
+        return getattr(fn, '__name__', output_key)
+
+    @server.before_request
+    def _start_timer():
+        if request.path != endpoint:
+            return
+        g.cb_t0 = time.perf_counter()
+        g.cb_profiler = profiles.start() if profiles and random.random() < sample_rate else None
+
+    @server.after_request
+    def _record(response):
+        t0 = g.pop('cb_t0', None)
+        if t0 is None:
+            return response
+        seconds = time.perf_counter() - t0
+        body = request.get_json(silent=True) or {}
+        name = callback_name(body.get('output', ''))
+        trigger = trigger_label(body.get('changedPropIds'))
+        req_bytes = request.content_length or 0
+        resp_bytes = 0 if response.is_streamed else len(response.get_data())
+        metrics.observe(name, trigger, seconds, req_bytes, resp_bytes, response.status_code)
+
+        profile_path = None
+        prof = g.pop('cb_profiler', None)
+        if prof is not None:
+            profile_path = profiles.stop(prof, seconds, name)
+        if log_enabled:
+            logger.info(json.dumps({
+                'event': 'dash_callback', 'callback': name, 'trigger': trigger,
+                'duration_ms': round(seconds * 1000, 3), 'request_bytes': req_bytes,
+                'response_bytes': resp_bytes, 'status': response.status_code,
+                'pid': os.getpid(), **({'profile': profile_path} if profile_path else {}),
+            }, ensure_ascii=False))
+        return response
+
+    def metrics_view():
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    if cfg['METRICS']:
+        server.add_url_rule('/metrics', 'metrics', metrics_view)
+    dash_app.callback_metrics = metrics
+    return metrics
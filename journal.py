@@ -0,0 +1,331 @@
+"""イベントの追記専用ジャーナルとスナップショット
+
+イベントはブラウザの events-store にしかないので、タブを閉じると編集が失われる。保存・削除・ドラッグ・
+Undo/Redo・一括編集などの変更のたびに、変更のあったイベントの変更後の状態を1行の JSON として追記し、
+JOURNAL_SNAPSHOT_EVERY 件ごとに全イベントのスナップショットを書き出す。
+
+- journal-<開始連番>.jsonl: {"seq", "ts", "actor", "action", "changes": {イベントID: 変更後 | null（削除）}}
+  スナップショットのたびに次のファイルへ切り替え（旧ファイルの末尾に {"next": ファイル名} を書く）、
+  旧ファイルは監査用に残す
+- snapshot-<連番>.json: その連番までを反映したイベント一覧。一時ファイルに書いて os.replace で置き換える。
+  古いスナップショットも版の履歴（revisions.py）を復元する起点として残す
+- 起動時は最新のスナップショットを読み、その後のジャーナル（最大 JOURNAL_SNAPSHOT_EVERY 件）だけを再生する。
+  異常終了で書きかけになった末尾の行は次の追記の前に切り捨てる
+- 複数ワーカーの追記はロックファイル（fcntl.flock）で直列化し、追記の前に他のプロセスが書いた分を読み進める
+- audit(イベントID) / revisions(): イベントごとの変更履歴（誰が・いつ・何をしたか）と版の一覧。
+  ジャーナルの各行の位置をイベントID・連番で引ける索引（index.sqlite3）を問い合わせのたびに
+  差分だけ更新して引くので、履歴が数百万件あっても全ファイルを読み直さない
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows（開発用の単一プロセス実行）
+    fcntl = None
+
+AUDIT_LIMIT = 100           # audit() / revisions() が返す既定の件数
+LOCK_NAME = 'journal.lock'
+INDEX_DB = 'index.sqlite3'
+
+logger = logging.getLogger('llm_planner.journal')
+
+
+def _name_seq(name):
+    """'journal-000000000123.jsonl' → 123"""
+    return int(name.split('-', 1)[1].split('.', 1)[0])
+
+
+class Journal:
+    """path 以下のジャーナルとスナップショット。events は復元済みの最新のイベント（ID → イベント）"""
+
+    def __init__(self, path, snapshot_every=5000, fsync=False, clock=time.time):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.clock = clock
+        self.events = {}            # イベントID → イベント（挿入順 = events-store の並び）
+        self.seq = 0                # 反映済みの最後の連番
+        self.snapshot_seq = 0       # 最後に切り替えた（スナップショットを書いた）連番
+        self.segment = None         # 読み進めている（追記先の）ジャーナルファイル名
+        self.offset = 0             # segment の読み終えた位置（バイト）
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        with self._locked():
+            self._recover()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _files(self, prefix, suffix):
+        """[(連番, ファイル名)] を連番順に"""
+        return sorted((_name_seq(n), n) for n in os.listdir(self.path) if n.startswith(prefix) and n.endswith(suffix))
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(self._file(LOCK_NAME), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)   # ファイルを閉じると解放される
+            yield
+
+    # --- 復元・読み進め ---
+    def _recover(self):
+        for seq, name in reversed(self._files('snapshot-', '.json')):
+            try:
+                with open(self._file(name), encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("壊れたスナップショットを読み飛ばします: %s", name)
+                continue
+            self.events = {ev['id']: ev for ev in data['events']}
+            self.seq = data['seq']
+            break
+        self.snapshot_seq = self.seq
+        # スナップショットの次の連番を含むファイルから再生する（以降は {"next"} をたどる）
+        segments = [n for first, n in self._files('journal-', '.jsonl') if first <= self.seq + 1]
+        if segments:
+            self.segment = segments[-1]
+        else:
+            self.segment = self.segment_name(self.seq + 1)
+            open(self._file(self.segment), 'ab').close()
+        self.offset = 0
+        self._catch_up()
+
+    def segment_name(self, first):
+        return f'journal-{first:012d}.jsonl'
+
+    def segment_starts(self):
+        """ジャーナルファイルの開始連番（昇順）"""
+        return [first for first, _ in self._files('journal-', '.jsonl')]
+
+    def load_snapshot(self, seq):
+        """連番 seq のスナップショットのイベント一覧（なければ・壊れていれば None）"""
+        try:
+            with open(self._file(f'snapshot-{seq:012d}.json'), encoding='utf-8') as f:
+                return json.load(f)['events']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def scan(self, segment, offset):
+        """segment の offset 以降の完結した行 → ([(行の位置, 記録)], 読み終えた位置, 次のファイル名 | None)"""
+        with open(self._file(segment), 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        records, pos = [], 0
+        end = data.rfind(b'\n') + 1   # 改行で終わっていない末尾は書きかけ
+        while pos < end:
+            nl = data.index(b'\n', pos)
+            try:
+                rec = json.loads(data[pos:nl])
+            except ValueError:
+                logger.warning("壊れたジャーナルの行を読み飛ばします: %s@%d", segment, offset + pos)
+                rec = None
+            if rec is not None and 'next' in rec:
+                return records, offset + nl + 1, rec['next']
+            if rec is not None:
+                records.append((offset + pos, rec))
+            pos = nl + 1
+        return records, offset + end, None
+
+    def _apply(self, rec):
+        for eid, ev in rec['changes'].items():
+            if ev is None:
+                self.events.pop(eid, None)
+            else:
+                self.events[eid] = ev
+        self.seq = rec['seq']
+
+    def _catch_up(self):
+        """他のプロセスが追記・切り替えた分を含めて、ジャーナルの末尾まで反映する"""
+        while True:
+            records, self.offset, nxt = self.scan(self.segment, self.offset)
+            for _, rec in records:
+                if rec['seq'] > self.seq:
+                    self._apply(rec)
+            if nxt is None:
+                return
+            self.segment, self.offset, self.snapshot_seq = nxt, 0, self.seq
+
+    # --- 追記・スナップショット ---
+    def _write(self, line):
+        data = (json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with open(self._file(self.segment), 'ab') as f:
+            if f.tell() > self.offset:
+                f.truncate(self.offset)     # 前回の異常終了で書きかけになった行
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.offset += len(data)
+
+    def record(self, action, actor, events_after, changed_ids):
+        """changed_ids の変更後の状態（events_after にないものは削除）を追記し、連番を返す"""
+        ids = list(dict.fromkeys(changed_ids))
+        if not ids:
+            return None
+        after = {ev['id']: ev for ev in events_after or [] if ev['id'] in ids}
+        with self._locked():
+            self._catch_up()
+            rec = {'seq': self.seq + 1, 'ts': round(self.clock(), 3), 'actor': actor, 'action': action,
+                   'changes': {eid: after.get(eid) for eid in ids}}
+            self._write(rec)
+            self._apply(rec)
+            if self.seq - self.snapshot_seq >= self.snapshot_every:
+                self._snapshot()
+        return rec['seq']
+
+    def _snapshot(self):
+        name = f'snapshot-{self.seq:012d}.json'
+        tmp = self._file(name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'seq': self.seq, 'ts': round(self.clock(), 3), 'events': list(self.events.values())},
+                      f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, self._file(name))
+        nxt = self.segment_name(self.seq + 1)
+        open(self._file(nxt), 'ab').close()
+        self._write({'next': nxt})
+        self.segment, self.offset, self.snapshot_seq = nxt, 0, self.seq
+
+    def snapshot(self):
+        """今の状態のスナップショットを書き、次のファイルへ切り替える（停止前などに）"""
+        with self._locked():
+            self._catch_up()
+            if self.seq > self.snapshot_seq:
+                self._snapshot()
+
+    def current(self):
+        """最新のイベント一覧（他のプロセスの追記も反映する）"""
+        with self._locked():
+            self._catch_up()
+            return list(self.events.values())
+
+    def latest(self):
+        """最新の版の連番（他のプロセスの追記も反映する）"""
+        with self._locked():
+            self._catch_up()
+            return self.seq
+
+    def checkpoint(self):
+        """(最新のイベント一覧, 読み終えた位置)。位置を read_since() に渡すと、以降の記録だけを読める"""
+        with self._locked():
+            self._catch_up()
+            return list(self.events.values()), (self.segment, self.offset)
+
+    def read_since(self, cursor):
+        """cursor（checkpoint() / read_since() が返した位置）以降の記録 → ([記録], 読み終えた位置)
+
+        他のプロセスの追記や切り替えも {"next"} をたどって読む。この Journal の events は変えない。
+        """
+        segment, offset = cursor
+        out = []
+        with self._locked():
+            while True:
+                records, offset, nxt = self.scan(segment, offset)
+                out.extend(rec for _, rec in records)
+                if nxt is None:
+                    return out, (segment, offset)
+                segment, offset = nxt, 0
+
+    # --- 監査・版の一覧 ---
+    def _index_db(self):
+        db = sqlite3.connect(self._file(INDEX_DB))
+        db.execute("CREATE TABLE IF NOT EXISTS entries (event_id TEXT, seq INTEGER, segment TEXT, pos INTEGER)")
+        db.execute("CREATE INDEX IF NOT EXISTS entries_event ON entries (event_id, seq)")
+        db.execute("CREATE TABLE IF NOT EXISTS revisions (seq INTEGER PRIMARY KEY, ts REAL, action TEXT, actor TEXT, "
+                   "changed INTEGER)")
+        db.execute("CREATE INDEX IF NOT EXISTS revisions_ts ON revisions (ts)")
+        db.execute("CREATE TABLE IF NOT EXISTS progress (id INTEGER PRIMARY KEY CHECK (id = 0), segment TEXT, pos INTEGER)")
+        return db
+
+    def _update_index(self, db):
+        """索引を前回の位置からジャーナルの末尾まで進める"""
+        row = db.execute("SELECT segment, pos FROM progress WHERE id = 0").fetchone()
+        if row is None:
+            segments = self._files('journal-', '.jsonl')
+            if not segments:
+                return
+            row = (segments[0][1], 0)
+        segment, pos = row
+        while True:
+            records, end, nxt = self.scan(segment, pos)
+            db.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)",
+                           [(eid, rec['seq'], segment, p) for p, rec in records for eid in rec['changes']])
+            db.executemany("INSERT OR REPLACE INTO revisions VALUES (?, ?, ?, ?, ?)",
+                           [(rec['seq'], rec['ts'], rec['action'], json.dumps(rec['actor'], ensure_ascii=False),
+                             len(rec['changes'])) for _, rec in records])
+            segment, pos = (nxt, 0) if nxt is not None else (segment, end)
+            if nxt is None:
+                break
+        db.execute("INSERT OR REPLACE INTO progress VALUES (0, ?, ?)", (segment, pos))
+        db.commit()
+
+    def _read_at(self, segment, pos):
+        with open(self._file(segment), 'rb') as f:
+            f.seek(pos)
+            return json.loads(f.readline())
+
+    def _query(self, sql, params):
+        """索引を末尾まで進めてから問い合わせる"""
+        with self._locked():
+            db = self._index_db()
+            try:
+                self._update_index(db)
+                return db.execute(sql, params).fetchall()
+            finally:
+                db.close()
+
+    def revisions(self, limit=AUDIT_LIMIT, before=None):
+        """版の一覧（新しい順, before を指定するとその連番より前）: [{'seq', 'ts', 'actor', 'action', 'changed'}]"""
+        rows = self._query("SELECT seq, ts, action, actor, changed FROM revisions WHERE seq < ? ORDER BY seq DESC LIMIT ?",
+                           (before if before is not None else 2 ** 62, limit))
+        return [{'seq': seq, 'ts': ts, 'action': action, 'actor': json.loads(actor), 'changed': changed}
+                for seq, ts, action, actor, changed in rows]
+
+    def revision_at(self, ts):
+        """時刻 ts（epoch）の時点で最新だった版の連番（それより前に記録がなければ 0）"""
+        rows = self._query("SELECT MAX(seq) FROM revisions WHERE ts <= ?", (ts,))
+        return rows[0][0] or 0
+
+    def audit(self, event_id, limit=AUDIT_LIMIT):
+        """イベントの変更履歴（新しい順）: [{'seq', 'ts', 'actor', 'action', 'before', 'after'}]
+
+        before / after はその変更の前後のイベント（作成なら before、削除なら after が None）。
+        """
+        rows = self._query("SELECT segment, pos FROM entries WHERE event_id = ? ORDER BY seq DESC LIMIT ?",
+                           (event_id, limit + 1))
+        recs = [self._read_at(segment, pos) for segment, pos in reversed(rows)]  # 索引済みの行は書き換わらない
+        entries = []
+        for i, rec in enumerate(recs):
+            if i == 0 and len(recs) > limit:
+                continue    # 最も古い1件は before を求めるためだけに読む
+            entries.append({'seq': rec['seq'], 'ts': rec['ts'], 'actor': rec['actor'], 'action': rec['action'],
+                            'before': recs[i - 1]['changes'][event_id] if i > 0 else None,
+                            'after': rec['changes'][event_id]})
+        return entries[::-1]
+
+
+_journal = {'current': None}
+
+
+def install(journal):
+    """記録先のジャーナルを登録する（create_app から。None で無効化）"""
+    _journal['current'] = journal
+
+
+def installed():
+    return _journal['current']
+
+
+def record(action, actor, events_after, changed_ids):
+    """登録済みのジャーナルへ変更を記録する（未登録なら何もしない）"""
+    if _journal['current'] is not None:
+        return _journal['current'].record(action, actor, events_after, changed_ids)
+    return None
@@ -0,0 +1,163 @@
+"""ユーザー・グループ・イベント参加者の双方向インデックス
+
+- Directory: ユーザー → 所属グループ、グループ → メンバー、ユーザーID → ユーザー。users-store / groups-store の
+  組み合わせ（フィンガープリント）ごとにキャッシュする。存在しないユーザーはメンバーから除く（ユーザー一覧が
+  空のとき＝ユーザーを渡さない API 呼び出しでは、グループの user_ids をそのまま使う）。
+- AttendeeIndex: ユーザー → 参加しているイベントID の集合。イベント一覧のフィンガープリント単位の版として持ち、
+  event_index.apply_changes() の通知を受けて、変更のあったイベントの参加者の集合だけを差し替えた新しい版を作る。
+
+ユーザーの削除は delete_user() で、グループのメンバーとイベントの参加者から、インデックスで引いた該当分だけを
+1回で取り除く。名前の変更はIDで参照しているので波及先の書き換えは不要（Directory が新しい名前で作り直される）。
+"""
+import threading
+from collections import OrderedDict
+
+import event_index
+
+MEMBERSHIP_CACHE_MAX = 8  # 保持するインデックス（ユーザー・グループ／イベント集合）の最大数
+
+
+class Directory:
+    def __init__(self, users_data, groups_data):
+        self.users = {u['id']: u for u in users_data or []}
+        self.groups = {g['id']: g for g in groups_data or []}
+        self.group_users = {}   # グループID → メンバーのユーザーID（登録順、存在するユーザーのみ）
+        self.user_groups = {}   # ユーザーID → 所属グループID
+        for g in groups_data or []:
+            members = [uid for uid in dict.fromkeys(g.get('user_ids') or []) if uid in self.users or not self.users]
+            self.group_users[g['id']] = members
+            for uid in members:
+                self.user_groups.setdefault(uid, []).append(g['id'])
+
+    def name(self, uid):
+        user = self.users.get(uid)
+        return user['name'] if user else uid
+
+    def members(self, group_id):
+        """グループのメンバー（"all" や不明なグループは全ユーザー）"""
+        if group_id in self.group_users:
+            return self.group_users[group_id]
+        return list(self.users)
+
+    def member_names(self, group_id):
+        return [self.name(uid) for uid in self.group_users.get(group_id, [])]
+
+    def groups_of(self, uid):
+        return self.user_groups.get(uid, [])
+
+
+class AttendeeIndex:
+    def __init__(self, key=None):
+        self.key = key
+        self.user_events = {}  # ユーザーID → イベントID の frozenset
+
+    @classmethod
+    def build(cls, events_data, key=None):
+        index = cls(key)
+        acc = {}
+        for ev in events_data or []:
+            for uid in ev.get('attendees') or []:
+                acc.setdefault(uid, set()).add(ev['id'])
+        index.user_events = {uid: frozenset(ids) for uid, ids in acc.items()}
+        return index
+
+    def derive(self, changes, key):
+        """changes {id: (変更前, 変更後)} を反映した新しい版（参加者の変わらないユーザーの集合は共有）"""
+        index = AttendeeIndex(key)
+        index.user_events = dict(self.user_events)
+        delta = {}
+        for eid, (before, after) in changes.items():
+            for uid in (before or {}).get('attendees') or []:
+                delta.setdefault(uid, [set(), set()])[1].add(eid)
+            for uid in (after or {}).get('attendees') or []:
+                delta.setdefault(uid, [set(), set()])[0].add(eid)
+        for uid, (added, removed) in delta.items():
+            ids = (index.user_events.get(uid, frozenset()) - (removed - added)) | added
+            if ids:
+                index.user_events[uid] = frozenset(ids)
+            else:
+                index.user_events.pop(uid, None)
+        return index
+
+    def events_of(self, uid):
+        return self.user_events.get(uid, frozenset())
+
+    def events_for(self, user_ids):
+        """user_ids のいずれかが参加しているイベントID"""
+        sets = [self.user_events[uid] for uid in user_ids if uid in self.user_events]
+        return frozenset().union(*sets) if sets else frozenset()
+
+
+_directories = OrderedDict()
+_attendees = OrderedDict()
+_lock = threading.Lock()
+
+
+def _store(cache, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > MEMBERSHIP_CACHE_MAX:
+        cache.popitem(last=False)
+
+
+def directory_for(users_data, groups_data):
+    key = (event_index.fingerprint(users_data), event_index.fingerprint(groups_data))
+    with _lock:
+        directory = _directories.get(key)
+        if directory is not None:
+            _directories.move_to_end(key)
+            return directory
+    directory = Directory(users_data, groups_data)
+    with _lock:
+        _store(_directories, key, directory)
+    return directory
+
+
+def attendees_for(events_data, key=None):
+    """イベント一覧に対応する参加者インデックス（key は event_index のフィンガープリント）"""
+    key = event_index.fingerprint(events_data) if key is None else key
+    with _lock:
+        index = _attendees.get(key)
+        if index is not None:
+            _attendees.move_to_end(key)
+            return index
+    index = AttendeeIndex.build(events_data, key)
+    with _lock:
+        _store(_attendees, key, index)
+    return index
+
+
+def delete_user(user_id, users_data, groups_data, events_data, key=None):
+    """ユーザーを削除し、グループのメンバーとイベントの参加者からも取り除く
+
+    戻り値は (users, groups, events, 変更したイベントID)。変更のないグループ・イベントはそのまま共有する。
+    """
+    directory = directory_for(users_data, groups_data)
+    touched_groups = set(directory.groups_of(user_id))
+    touched_events = attendees_for(events_data, key).events_of(user_id)
+    users = [u for u in users_data or [] if u['id'] != user_id]
+    groups = [{**g, 'user_ids': [uid for uid in g['user_ids'] if uid != user_id]} if g['id'] in touched_groups else g
+              for g in groups_data or []]
+    if not touched_events:
+        return users, groups, events_data, []
+    events = [{**ev, 'attendees': [uid for uid in ev['attendees'] if uid != user_id]} if ev['id'] in touched_events
+              else ev for ev in events_data or []]
+    return users, groups, events, sorted(touched_events)
+
+
+def _on_change(before_key, after_key, changes):
+    with _lock:
+        source = _attendees.get(before_key)
+    if source is not None:
+        derived = source.derive(changes, after_key)
+        with _lock:
+            _store(_attendees, after_key, derived)
+
+
+def cache_clear():
+    with _lock:
+        _directories.clear()
+        _attendees.clear()
+
+
+event_index.on_change(_on_change)
@@ -0,0 +1,170 @@
+"""dcc.Store 往復のペイロード計測とサイズ制限
+
+`_dash-update-component` の Input / State / Output ごとにシリアライズ後のサイズを集計し、
+- 警告しきい値（PAYLOAD_WARN_BYTES）を超えたプロパティをログに出す
+- 上限（PAYLOAD_LIMIT_BYTES, 0で無効）を超えたリクエスト/レスポンスを 413 で拒否する
+集計結果はデバッグパネル（debug_panel / render_panel）で表示する。
+
+集計はリクエストごとに本文をデコード・再エンコードするので PAYLOAD_ACCOUNTING（既定は開発環境のみ）で有効にする。
+上限のチェックは Content-Length とレスポンス長だけを見るので、集計なしでも有効。
+
+圧縮より前のサイズを測るため、install() は serving.configure_production() の後に呼ぶ
+（Flask の after_request は登録と逆順に実行される）。
+"""
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from dash import dcc, html
+import dash_bootstrap_components as dbc
+from flask import g, jsonify, request
+
+logger = logging.getLogger('llm_planner.payload')
+
+PANEL_TOP_N = 10          # パネルに表示するプロパティ数
+PANEL_REFRESH_MS = 5000   # パネルの更新間隔
+
+
+def value_size(value):
+    return len(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode())
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024 or unit == 'MB':
+            return f"{n:,.0f} {unit}" if unit == 'B' else f"{n:,.1f} {unit}"
+        n /= 1024
+
+
+class PayloadStats:
+    """(プロパティ, コールバック, 方向) 単位のサイズ集計"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key: ('events-store.data', 'update_calendar_view', 'in'|'out') → [回数, 合計, 最大]
+        self.moves = defaultdict(lambda: [0, 0, 0])
+        self.rejected = 0
+
+    def add(self, prop, callback, direction, size):
+        with self.lock:
+            m = self.moves[(prop, callback, direction)]
+            m[0] += 1
+            m[1] += size
+            m[2] = max(m[2], size)
+
+    def heaviest(self, n=PANEL_TOP_N):
+        """最大サイズの大きい順に [(prop, 最大, [(callback, 方向, 回数, 平均, 最大), ...])]"""
+        with self.lock:
+            by_prop = defaultdict(list)
+            for (prop, cb, direction), (count, total, peak) in self.moves.items():
+                by_prop[prop].append((cb, direction, count, total // max(count, 1), peak))
+        rows = [(prop, max(m[4] for m in moves), sorted(moves, key=lambda m: -m[4]))
+                for prop, moves in by_prop.items()]
+        return sorted(rows, key=lambda r: -r[1])[:n]
+
+
+def _prop_values(specs):
+    """inputs/state の要素（パターンマッチの場合はリスト）を (id.prop, value) に展開"""
+    for spec in specs or []:
+        items = spec if isinstance(spec, list) else [spec]
+        for it in items:
+            cid = it.get('id')
+            if isinstance(cid, dict):
+                cid = '{type:%s}' % cid.get('type', '?')
+            yield f"{cid}.{it.get('property')}", it.get('value')
+
+
+def install(dash_app, cfg):
+    """サイズ上限のチェックと（PAYLOAD_ACCOUNTING なら）集計を登録する。戻り値は集計（無効なら None）"""
+    server = dash_app.server
+    accounting = cfg['PAYLOAD_ACCOUNTING']
+    stats = PayloadStats() if accounting else None
+    warn, limit = cfg['PAYLOAD_WARN_BYTES'], cfg['PAYLOAD_LIMIT_BYTES']
+    endpoint = dash_app.config.requests_pathname_prefix + '_dash-update-component'
+
+    def callback_name(output_key):
+        fn = (dash_app.callback_map.get(output_key) or {}).get('callback')
+        return getattr(fn, '__name__', output_key)
+
+    def too_large(direction, size, name):
+        if stats is not None:
+            with stats.lock:
+                stats.rejected += 1
+        logger.error("payload limit exceeded: %s %s %d bytes (limit %d)", name, direction, size, limit)
+        return jsonify({'error': 'payload too large', 'callback': name, 'direction': direction,
+                        'bytes': size, 'limit': limit}), 413
+
+    @server.before_request
+    def _check_request():
+        if request.path != endpoint:
+            return None
+        g.payload_checked = True
+        if limit and (request.content_length or 0) > limit:
+            # 上限を超えた本文はデコードしない（コールバック名は出力キーのまま）
+            return too_large('in', request.content_length, '_dash-update-component')
+        if not accounting:
+            return None
+        body = request.get_json(silent=True) or {}
+        name = callback_name(body.get('output', ''))
+        g.payload_callback = name
+        for prop, value in _prop_values(body.get('inputs', []) + body.get('state', [])):
+            size = value_size(value)
+            stats.add(prop, name, 'in', size)
+            if size > warn:
+                logger.warning("large payload: %s ← %s %d bytes", name, prop, size)
+        return None
+
+    @server.after_request
+    def _check_response(response):
+        if not g.pop('payload_checked', False) or response.status_code != 200 or response.is_streamed:
+            return response
+        name = g.pop('payload_callback', None)
+        data = response.get_data()
+        if accounting:
+            try:
+                outputs = json.loads(data).get('response', {})
+            except ValueError:
+                outputs = {}
+            for cid, props in outputs.items():
+                for prop, value in props.items():
+                    size = value_size(value)
+                    stats.add(f"{cid}.{prop}", name, 'out', size)
+                    if size > warn:
+                        logger.warning("large payload: %s → %s.%s %d bytes", name, cid, prop, size)
+        if limit and len(data) > limit:
+            resp, status = too_large('out', len(data), name or '_dash-update-component')
+            resp.status_code = status
+            return resp
+        return response
+
+    dash_app.payload_stats = stats
+    return stats
+
+
+def debug_panel():
+    """レイアウトに置くデバッグパネル（開発用）"""
+    return dbc.Card([
+        dbc.CardHeader(html.Small("ペイロード診断（重いStoreと、それを送受信するコールバック）", className="fw-bold")),
+        dbc.CardBody(html.Div(id="payload-panel-body", className="small")),
+        dcc.Interval(id="payload-panel-interval", interval=PANEL_REFRESH_MS),
+    ], className="mt-3", style={"fontSize": "12px"})
+
+
+def render_panel(stats, warn):
+    if stats is None:
+        return html.P("ペイロード計測は無効です", className="text-muted mb-0")
+    rows = []
+    for prop, peak, moves in stats.heaviest():
+        color = "#DE350B" if peak > warn else "#172B4D"
+        moves_text = " / ".join(f"{cb} {'←' if d == 'in' else '→'} ×{count} 平均{format_bytes(avg)}"
+                                for cb, d, count, avg, _ in moves)
+        rows.append(html.Tr([html.Td(prop), html.Td(format_bytes(peak), style={"color": color}),
+                             html.Td(moves_text)]))
+    if not rows:
+        return html.P("まだ計測データがありません", className="text-muted mb-0")
+    return html.Div([
+        dbc.Table([html.Thead(html.Tr([html.Th("プロパティ"), html.Th("最大"), html.Th("コールバック（←受信 / →送信）")])),
+                   html.Tbody(rows)], size="sm", bordered=True, className="mb-1"),
+        html.Small(f"警告しきい値: {format_bytes(warn)}　拒否: {stats.rejected}件", className="text-muted"),
+    ])
@@ -0,0 +1,307 @@
+"""イベントのリマインダー
+
+イベントの reminders（開始の何分前か, 例: [10, 60]）ごとに通知を予約し、時刻になったら登録済みの
+送信先（sink）へ配信する。
+
+- ReminderQueue: (発火epoch, 連番, キー) の二分ヒープ。予約は O(log n)、取り消しはエントリ表から外すだけの
+  遅延削除で O(1)（ヒープに残った取り消し済みの要素が半分を超えたら作り直すので、償却でも O(log n) 以下）。
+  10万件規模の予約でも、変更のたびにヒープ全体を作り直さない。
+- ReminderService: 共有のジャーナル（journal.py）を唯一の情報源にする。起動時に最新のイベント一覧から予約を
+  作り、以降はジャーナルの追記（どのワーカー・セッションの保存・ドラッグ・一括編集・Undo も）を読み進めて、
+  変更のあったイベントの予約だけを取り消し・再予約する。配信はデーモンスレッドが次の発火時刻まで
+  （長くても REMINDER_POLL_SEC ごとにジャーナルを読みに行きながら）待って行う。
+- 送信先: log（logging）/ smtp://localhost:1025（ローカルの SMTP サーバー。開発用の代替）/
+  http://localhost:PORT/PATH（JSON を POST する webhook）。SMTP と webhook は外部へ送らないよう localhost に限る。
+
+配信済みのリマインダーは (イベントID, 何分前か, 開始epoch) で猶予の間だけ覚えておき、保存や一括の作り直しで
+猶予内の予約が作り直されても二重に送らない。どのプロセスも同じジャーナルを読むので、複数ワーカーでは
+run.py が1ワーカーだけで配信する（他のワーカーは install(None)）。
+"""
+import heapq
+import itertools
+import json
+import logging
+import smtplib
+import threading
+import time
+import urllib.request
+from email.message import EmailMessage
+from urllib.parse import urlsplit
+
+import timezones
+
+REMINDER_CHOICES = (0, 5, 10, 15, 30, 60, 1440)   # イベントのモーダルで選べるリマインダー（開始の何分前か）
+REMINDER_DEFAULT = (10,)                           # 新規イベントの既定
+REMINDER_GRACE_SEC = 300      # 予約時に発火時刻を過ぎていても送る猶予（再起動直後の取りこぼし防止）
+REMINDER_COMPACT_MIN = 1024   # 取り消し済みの要素の掃除を検討するヒープの最小サイズ
+REMINDER_POLL_SEC = 5         # 他のワーカーが追記したジャーナルを読みに行く間隔
+SINK_TIMEOUT_SEC = 5
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+logger = logging.getLogger('llm_planner.reminders')
+
+
+def reminder_offsets(ev):
+    """イベントのリマインダー（分, 重複なし・負の値は除く）"""
+    return sorted({int(m) for m in ev.get('reminders') or [] if int(m) >= 0})
+
+
+class ReminderQueue:
+    """キー → (発火epoch, 内容) の予約を発火時刻順に取り出すヒープ"""
+
+    def __init__(self):
+        self.heap = []      # (発火epoch, 連番, キー)。取り消し・再予約された要素も残る
+        self.live = {}      # キー → (発火epoch, 連番, 内容)
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.live)
+
+    def push(self, key, fire_ts, payload):
+        """予約（同じキーの予約があれば置き換える）"""
+        seq = next(self._seq)
+        self.live[key] = (fire_ts, seq, payload)
+        heapq.heappush(self.heap, (fire_ts, seq, key))
+
+    def cancel(self, key):
+        if self.live.pop(key, None) is not None:
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if len(self.heap) > REMINDER_COMPACT_MIN and len(self.heap) > 2 * len(self.live):
+            self.heap = [(f, s, k) for k, (f, s, _) in self.live.items()]
+            heapq.heapify(self.heap)
+
+    def _stale(self, entry):
+        live = self.live.get(entry[2])
+        return live is None or live[1] != entry[1]
+
+    def next_fire(self):
+        """次の発火時刻（予約がなければ None）"""
+        while self.heap and self._stale(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        """now までに発火する予約 [(キー, 発火epoch, 内容)] を取り出す"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_ts, seq, key = heapq.heappop(self.heap)
+            live = self.live.get(key)
+            if live is not None and live[1] == seq:
+                del self.live[key]
+                due.append((key, fire_ts, live[2]))
+        return due
+
+    @classmethod
+    def load(cls, items):
+        """[(キー, 発火epoch, 内容)] から一括で作る（heapify で O(n)）"""
+        queue = cls()
+        for key, fire_ts, payload in items:
+            queue.live[key] = (fire_ts, next(queue._seq), payload)
+        queue.heap = [(f, s, k) for k, (f, s, _) in queue.live.items()]
+        heapq.heapify(queue.heap)
+        return queue
+
+
+# --- 送信先 ---
+class LogSink:
+    def send(self, reminder):
+        logger.info(json.dumps(reminder, ensure_ascii=False))
+
+
+class SmtpSink:
+    """ローカルの SMTP サーバー（例: python -m aiosmtpd -n -l localhost:1025）へ参加者宛てに送る"""
+
+    def __init__(self, host, port, sender='planner@localhost'):
+        self.host, self.port, self.sender = host, port, sender
+
+    def send(self, reminder):
+        if not reminder['emails']:
+            return
+        msg = EmailMessage()
+        msg['Subject'] = f"リマインダー: {reminder['title']}（{reminder['minutes_before']}分前）"
+        msg['From'] = self.sender
+        msg['To'] = ', '.join(reminder['emails'])
+        msg.set_content(f"{reminder['title']}\n開始: {reminder['start']}\n場所: {reminder['location'] or '-'}")
+        with smtplib.SMTP(self.host, self.port, timeout=SINK_TIMEOUT_SEC) as smtp:
+            smtp.send_message(msg)
+
+
+class WebhookSink:
+    def __init__(self, url):
+        self.url = url
+
+    def send(self, reminder):
+        req = urllib.request.Request(self.url, data=json.dumps(reminder, ensure_ascii=False).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(req, timeout=SINK_TIMEOUT_SEC) as resp:
+            resp.read()
+
+
+def make_sinks(spec):
+    """'log,smtp://localhost:1025,http://localhost:9000/hook' → 送信先のリスト。不正な指定は ValueError"""
+    sinks = []
+    for item in (s.strip() for s in (spec or '').split(',')):
+        if not item:
+            continue
+        if item == 'log':
+            sinks.append(LogSink())
+            continue
+        url = urlsplit(item)
+        if url.hostname not in LOCAL_HOSTS:
+            raise ValueError(f"リマインダーの送信先は localhost に限ります: {item}")
+        if url.scheme == 'smtp':
+            sinks.append(SmtpSink(url.hostname, url.port or 25))
+        elif url.scheme in ('http', 'https'):
+            sinks.append(WebhookSink(item))
+        else:
+            raise ValueError(f"リマインダーの送信先は log / smtp:// / http:// で指定してください: {item}")
+    return sinks
+
+
+class ReminderService:
+    """共有のジャーナル（journal.Journal）にあるイベントのリマインダーを予約し、時刻になったら送信先へ配信する
+
+    最初に checkpoint() の最新のイベント一覧から予約を作り、以降は read_since() でジャーナルの追記を
+    読み進めて、変更のあったイベントの予約だけを取り消し・再予約する。どのワーカーで保存しても同じ
+    ジャーナルに記録されるので、配信するプロセスが1つでも全ワーカー・全セッションの変更が反映される。
+    宛先は remember_users() で集めたユーザー（ID ごとに上書き）のメールアドレス。tz は通知に書く開始時刻のタイムゾーン。
+    """
+
+    def __init__(self, sinks, tz, source, clock=time.time, poll_sec=REMINDER_POLL_SEC):
+        self.sinks = sinks
+        self.tz = tz
+        self.source = source
+        self.clock = clock
+        self.poll_sec = poll_sec
+        self.queue = ReminderQueue()
+        self.cursor = None      # ジャーナルを読み終えた位置（None: まだ予約を作っていない）
+        self.offsets = {}       # イベントID → 予約したリマインダー（何分前か）
+        self.users = {}         # ユーザーID → ユーザー（remember_users() で集めたもの）
+        self.delivered = {}     # (イベントID, 何分前か, 開始epoch) → 発火epoch。猶予を過ぎたら忘れる
+        self.pending = False    # notify() されたが、まだ読み進めていない
+        self.cond = threading.Condition()
+        self.thread = None
+        self.stopped = False
+
+    def _entries(self, ev, now):
+        start = timezones.iso_epoch(ev['start'], self.tz)
+        for minutes in reminder_offsets(ev):
+            fire_ts = start - minutes * 60
+            if fire_ts >= now - REMINDER_GRACE_SEC and (ev['id'], minutes, start) not in self.delivered:
+                payload = {'event_id': ev['id'], 'title': ev.get('title', ''), 'minutes_before': minutes,
+                           'start_ts': start, 'location': ev.get('location', ''),
+                           'attendees': list(ev.get('attendees') or [])}
+                yield (ev['id'], minutes), fire_ts, payload
+
+    def sync(self):
+        """ジャーナルの追記を予約へ反映する（初回は最新のイベント一覧から一括で作る）"""
+        if self.cursor is None:
+            events, cursor = self.source.checkpoint()
+            with self.cond:
+                now = self.clock()
+                self.queue = ReminderQueue.load(item for ev in events for item in self._entries(ev, now))
+                self.offsets = {ev['id']: reminder_offsets(ev) for ev in events}
+                self.cursor = cursor
+            return
+        records, cursor = self.source.read_since(self.cursor)
+        with self.cond:
+            now = self.clock()
+            for rec in records:
+                for eid, ev in rec['changes'].items():
+                    for minutes in self.offsets.pop(eid, ()):
+                        self.queue.cancel((eid, minutes))
+                    if ev is not None:
+                        self.offsets[eid] = reminder_offsets(ev)
+                        for key, fire_ts, payload in self._entries(ev, now):
+                            self.queue.push(key, fire_ts, payload)
+            self.cursor = cursor
+
+    def notify(self):
+        """ジャーナルに追記した直後に呼ぶ（次の定期の読み進めを待たずに反映する）"""
+        with self.cond:
+            self.pending = True
+            self.cond.notify()
+
+    def remember_users(self, users_data):
+        """宛先を引くユーザーを ID ごとに更新する（他のセッションのユーザーは残す）"""
+        with self.cond:
+            self.users.update((u['id'], u) for u in users_data or [])
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='reminders', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except (OSError, ValueError, KeyError):
+                logger.exception("ジャーナルの読み込みに失敗しました")
+            with self.cond:
+                nxt = self.queue.next_fire()
+                now = self.clock()
+                if not (self.stopped or self.pending or (nxt is not None and nxt <= now)):
+                    self.cond.wait(self.poll_sec if nxt is None else min(self.poll_sec, nxt - now))
+                if self.stopped:
+                    return
+                self.pending = False
+                now = self.clock()
+                due = self.queue.pop_due(now)
+                self.delivered = {k: f for k, f in self.delivered.items() if f >= now - REMINDER_GRACE_SEC}
+                for _, fire_ts, payload in due:
+                    self.delivered[(payload['event_id'], payload['minutes_before'], payload['start_ts'])] = fire_ts
+                users = self.users
+            for _, _, payload in due:
+                self.deliver(payload, users)
+
+    def deliver(self, payload, users=None):
+        """送信先ごとに配信（失敗はログに残して他の送信先へ続ける）"""
+        users = self.users if users is None else users
+        table = timezones.OffsetTable(self.tz, payload['start_ts'] - 86400, payload['start_ts'] + 86400)
+        reminder = {**payload, 'start': timezones.wall_iso(table.local(payload['start_ts'])), 'tz': self.tz.key,
+                    'emails': [users[uid]['email'] for uid in payload['attendees']
+                               if uid in users and users[uid].get('email')]}
+        for sink in self.sinks:
+            try:
+                sink.send(reminder)
+            except Exception:
+                logger.exception("リマインダーの送信に失敗しました: %s", type(sink).__name__)
+
+
+_service = {'current': None}
+
+
+def install(service):
+    """配信に使うサービスを登録する（create_app から。None で無効化）"""
+    previous = _service['current']
+    if previous is not None:
+        previous.stop()
+    _service['current'] = service
+
+
+def start():
+    """登録済みのサービスの配信スレッドを起動する（fork 後のワーカーで。起動済みなら何もしない）"""
+    if _service['current'] is not None:
+        _service['current'].start()
+
+
+def notify():
+    """ジャーナルへの記録を登録済みのサービスへ知らせる（配信スレッドが未起動なら起動する）"""
+    if _service['current'] is not None:
+        _service['current'].notify()
+        _service['current'].start()
+
+
+def remember_users(users_data):
+    """セッションのユーザー一覧を宛先として登録済みのサービスへ渡す（配信スレッドが未起動なら起動する）"""
+    if _service['current'] is not None:
+        _service['current'].remember_users(users_data)
+        _service['current'].start()
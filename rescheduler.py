@@ -0,0 +1,95 @@
+"""優先度に基づく衝突の解消（優先度の低い予定の自動移動）
+
+保存しようとした予定（対象）と参加者・時間が重なる予定を次の3つに分ける:
+
+- 動かす: 対象より優先度が低く、ダブルブッキングを許可していない予定
+- そのまま: ダブルブッキングを許可している予定（重なったままでよい）
+- 動かせない: 対象と同じか高い優先度の予定（1件でもあれば解消案は出さない）
+
+動かす予定だけを、参加者全員が勤務時間内で空いている枠（scheduler.Availability, strict）へ、元の開始時刻に
+近い順で置き直す。対象の枠と、先に置き直した予定の枠は埋まっているものとして扱うので、移動先どうしも
+重ならない。移動は衝突している予定に限るので、動かす予定の数は対象の枠を空けるのに必要な最小限になる。
+"""
+from datetime import datetime
+
+import event_index
+import scheduler
+import timezones
+
+RESCHEDULE_WINDOW_DAYS = 5  # 元の日から何日先までを移動先として探すか
+
+
+def classify(target, s, e, events_data, tz, key=None):
+    """target（保存する予定）と参加者が重なる予定を (動かす, そのまま, 動かせない) に分ける
+
+    s / e は target の epoch 秒。target['id'] の予定（編集前の自分）は除く。
+    """
+    rank = scheduler.PRIORITY_RANK.get(target.get('priority', '中'), 1)
+    attendees = set(target.get('attendees') or [])
+    movable, tolerated, blockers = [], [], []
+    for _, _, ev in event_index.index_for(events_data, tz, key).window(s, e):
+        if ev['id'] == target['id'] or not attendees & set(ev.get('attendees') or []):
+            continue
+        if ev.get('allow_double_booking'):
+            tolerated.append(ev)
+        elif scheduler.PRIORITY_RANK.get(ev.get('priority', '中'), 1) < rank:
+            movable.append(ev)
+        else:
+            blockers.append(ev)
+    return movable, tolerated, blockers
+
+
+def propose(target, events_data, tz, users_data=None, start_h=9, end_h=18, grid_min=15, key=None):
+    """target の枠を空けるための移動案
+
+    戻り値は {'moves': [{'id', 'title', 'priority', 'attendees', 'from': (開始, 終了), 'to': (開始, 終了)}],
+    'tolerated': [予定], 'blockers': [予定], 'unplaced': [予定]}（時刻は epoch 秒）。blockers または unplaced が
+    空でなければ解消できない。
+    """
+    s, e = timezones.iso_epoch(target['start'], tz), timezones.iso_epoch(target['end'], tz)
+    movable, tolerated, blockers = classify(target, s, e, events_data, tz, key)
+    plan = {'moves': [], 'tolerated': tolerated, 'blockers': blockers, 'unplaced': []}
+    if blockers or not movable:
+        return plan
+    rows = [(timezones.iso_epoch(ev['start'], tz), timezones.iso_epoch(ev['end'], tz), ev) for ev in movable]
+    table = timezones.OffsetTable(tz, min(r[0] for r in rows) - 86400, max(r[1] for r in rows) + 86400)
+    windows = []
+    for ev_s, ev_e, ev in rows:
+        lo = table.day_start(timezones.wall_date(table.local(ev_s)))
+        windows.append((lo, lo + (RESCHEDULE_WINDOW_DAYS + 1) * 86400))
+    avail = scheduler.Availability(events_data, tz, min(w[0] for w in windows), max(w[1] for w in windows) + 86400,
+                                   users_data, start_h, end_h, grid_min, key, strict=True)
+    avail.reserve(target.get('attendees') or [], s, e, 'target')
+    ignore = {ev['id'] for ev in movable} | {target['id']}
+    # 優先度の高い予定から、元の時刻に近い枠を選ぶ
+    order = sorted(range(len(rows)), key=lambda i: (-scheduler.PRIORITY_RANK.get(rows[i][2].get('priority', '中'), 1),
+                                                    rows[i][0]))
+    for i in order:
+        ev_s, ev_e, ev = rows[i]
+        meeting = scheduler.normalize_request({
+            'title': ev.get('title'), 'attendees': ev.get('attendees'), 'priority': ev.get('priority', '中'),
+            'duration': max(1, (ev_e - ev_s) // 60), 'start': windows[i][0], 'end': windows[i][1],
+            'anchor': ev_s, 'tz': tz}, default_tz=tz)
+        cands = avail.candidates(meeting, ignore=ignore)
+        if not cands:
+            plan['unplaced'].append(ev)
+            continue
+        _, new_s, new_e, _ = cands[0]
+        avail.reserve(meeting['required'], new_s, new_e, ('moved', ev['id']))
+        plan['moves'].append({'id': ev['id'], 'title': ev.get('title', ''), 'priority': ev.get('priority', '中'),
+                              'attendees': ev.get('attendees') or [], 'from': (ev_s, ev_e), 'to': (new_s, new_e)})
+    return plan
+
+
+def apply_moves(events_data, moves):
+    """moves を反映した新しいイベント一覧（移動先は UTC の ISO 文字列で保存）"""
+    to = {m['id']: m['to'] for m in moves}
+    out = []
+    for ev in events_data or []:
+        if ev['id'] in to:
+            new_s, new_e = to[ev['id']]
+            ev = {**ev, 'start': timezones.to_utc_iso(datetime.fromtimestamp(new_s, timezones.UTC)),
+                  'end': timezones.to_utc_iso(datetime.fromtimestamp(new_e, timezones.UTC))}
+        out.append(ev)
+    return out
+
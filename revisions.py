@@ -0,0 +1,246 @@
+"""カレンダーの版の履歴（過去の任意の版の閲覧と差分）
+
+ジャーナル（journal.py）の連番を版番号とし、各版のイベント集合を永続的なハッシュトライ（PersistentMap）で持つ。
+変更は根から葉までの経路だけを複製するので、連続する版は変更のなかった部分木をすべて共有し、
+数千版を保持してもメモリは変更の件数に比例する（カレンダーの大きさ × 版の数にはならない）。
+差分も共有している部分木を飛ばすので、近い版どうしなら変更の件数に比例する。
+
+版はジャーナルファイル（スナップショットの間隔）単位の区間にまとめて、初めて参照したときに
+区間の起点（直前の区間の最後の版、なければ起点のスナップショット）から記録を再生して作る。
+区間は REVISION_CHUNKS_MAX 個まで保持し、末尾の区間は参照のたびに追記分だけ延ばす。
+"""
+import threading
+import zlib
+from collections import OrderedDict
+
+REVISION_BITS = 5           # 節の分岐数 2^5 = 32
+REVISION_DEPTH = 3          # 節の段数（葉は 32^3 = 32768 個。葉はイベントID → イベントの小さな dict）
+REVISION_CHUNKS_MAX = 4     # 保持する区間（ジャーナルファイル1つ分の版の列）の数
+_FANOUT = 1 << REVISION_BITS
+_MASK = _FANOUT - 1
+
+
+def _path(key):
+    h = zlib.crc32(str(key).encode('utf-8'))
+    return [(h >> (REVISION_BITS * level)) & _MASK for level in range(REVISION_DEPTH)]
+
+
+def _assoc(node, path, level, key, value):
+    """node の複製に key を設定したもの → (新しい節, 件数の増分)"""
+    if level == REVISION_DEPTH:
+        leaf = dict(node or {})
+        grew = key not in leaf
+        leaf[key] = value
+        return leaf, int(grew)
+    children = list(node) if node is not None else [None] * _FANOUT
+    children[path[level]], grew = _assoc(children[path[level]], path, level + 1, key, value)
+    return tuple(children), grew
+
+
+def _dissoc(node, path, level, key):
+    """node の複製から key を除いたもの（空になった節は None）"""
+    if level == REVISION_DEPTH:
+        leaf = dict(node)
+        del leaf[key]
+        return leaf or None
+    children = list(node)
+    children[path[level]] = _dissoc(children[path[level]], path, level + 1, key)
+    return tuple(children) if any(c is not None for c in children) else None
+
+
+def _freeze(node, level):
+    """構築中の入れ子の dict（添字 → 子）を節のタプルにする"""
+    if level == REVISION_DEPTH:
+        return node
+    return tuple(_freeze(node[i], level + 1) if i in node else None for i in range(_FANOUT))
+
+
+def _walk(node, level):
+    if node is None:
+        return
+    if level == REVISION_DEPTH:
+        yield from node.items()
+        return
+    for child in node:
+        yield from _walk(child, level + 1)
+
+
+def _diff(a, b, level):
+    if a is b:
+        return
+    if level == REVISION_DEPTH:
+        a, b = a or {}, b or {}
+        for key, va in a.items():
+            vb = b.get(key)
+            if vb is not va and vb != va:
+                yield key, va, vb
+        for key, vb in b.items():
+            if key not in a:
+                yield key, None, vb
+        return
+    for i in range(_FANOUT):
+        yield from _diff(a[i] if a is not None else None, b[i] if b is not None else None, level + 1)
+
+
+class PersistentMap:
+    """変更のたびに新しい版を返す（元の版は変わらない）イベントID → イベントの対応"""
+    __slots__ = ('root', 'size')
+
+    def __init__(self, root=None, size=0):
+        self.root = root
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def get(self, key, default=None):
+        node = self.root
+        for i in _path(key):
+            if node is None:
+                return default
+            node = node[i]
+        return default if node is None else node.get(key, default)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def assoc(self, key, value):
+        root, grew = _assoc(self.root, _path(key), 0, key, value)
+        return PersistentMap(root, self.size + grew)
+
+    def dissoc(self, key):
+        if key not in self:
+            return self
+        return PersistentMap(_dissoc(self.root, _path(key), 0, key), self.size - 1)
+
+    def items(self):
+        return _walk(self.root, 0)
+
+    def values(self):
+        return (v for _, v in self.items())
+
+    def diff(self, other):
+        """self → other で変わったもの [(キー, self の値 | None, other の値 | None)]"""
+        return list(_diff(self.root, other.root, 0))
+
+    def apply(self, changes):
+        """{キー: 値 | None（削除）} を反映した新しい版"""
+        result = self
+        for key, value in changes.items():
+            result = result.dissoc(key) if value is None else result.assoc(key, value)
+        return result
+
+    @classmethod
+    def from_items(cls, items):
+        """(キー, 値) の列から一括で作る（経路の複製をせずに1回で組み立てる）"""
+        tree, size = {}, 0
+        for key, value in items:
+            path = _path(key)
+            node = tree
+            for i in path[:-1]:
+                node = node.setdefault(i, {})
+            leaf = node.setdefault(path[-1], {})
+            size += key not in leaf
+            leaf[key] = value
+        return cls(_freeze(tree, 0) if size else None, size)
+
+
+class _Chunk:
+    """ジャーナルファイル1つ分の版の列: versions[i] は連番 base + i の版"""
+    __slots__ = ('base', 'segment', 'offset', 'versions', 'closed')
+
+    def __init__(self, base, segment, start):
+        self.base = base
+        self.segment = segment
+        self.offset = 0
+        self.versions = [start]
+        self.closed = False     # 次のファイルへ切り替え済み（これ以上延びない）
+
+
+class History:
+    """ジャーナルの版を連番で引く"""
+
+    def __init__(self, journal, chunks_max=REVISION_CHUNKS_MAX):
+        self.journal = journal
+        self.chunks_max = chunks_max
+        self._chunks = OrderedDict()    # 区間の起点の連番 → _Chunk
+        self._lock = threading.Lock()
+
+    def _extend(self, chunk):
+        if chunk.closed:
+            return
+        records, chunk.offset, nxt = self.journal.scan(chunk.segment, chunk.offset)
+        for _, rec in records:
+            if rec['seq'] == chunk.base + len(chunk.versions):
+                chunk.versions.append(chunk.versions[-1].apply(rec['changes']))
+        chunk.closed = nxt is not None
+
+    def _start_of(self, first, starts):
+        """ファイル（開始連番 first）の起点の版: 直前の区間の最後の版（部分木を共有する）かスナップショット"""
+        prev = self._chunks.get(starts[starts.index(first) - 1] - 1) if starts.index(first) > 0 else None
+        if prev is not None and prev.closed and prev.base + len(prev.versions) == first:
+            return prev.versions[-1]
+        events = self.journal.load_snapshot(first - 1)
+        if events is not None:
+            return PersistentMap.from_items((ev['id'], ev) for ev in events)
+        if first == 1 or starts.index(first) == 0:
+            return PersistentMap()
+        chunk = self._chunk(starts[starts.index(first) - 1], starts)
+        return chunk.versions[-1]
+
+    def _chunk(self, first, starts):
+        chunk = self._chunks.get(first - 1)
+        if chunk is None:
+            chunk = _Chunk(first - 1, self.journal.segment_name(first), self._start_of(first, starts))
+            self._chunks[first - 1] = chunk
+            while len(self._chunks) > self.chunks_max:
+                self._chunks.popitem(last=False)
+        self._chunks.move_to_end(first - 1)
+        self._extend(chunk)
+        return chunk
+
+    def at(self, seq):
+        """連番 seq の版（PersistentMap）。範囲外は ValueError"""
+        latest = self.journal.latest()
+        if not 0 <= seq <= latest:
+            raise ValueError(f"版 {seq} はありません（0〜{latest}）")
+        with self._lock:
+            starts = self.journal.segment_starts()
+            first = max((f for f in starts if f - 1 <= seq), default=None)
+            if first is None:
+                raise ValueError(f"版 {seq} を含むジャーナルがありません")
+            chunk = self._chunk(first, starts)
+            if seq - chunk.base >= len(chunk.versions):
+                raise ValueError(f"版 {seq} はまだ読み込めません")
+            return chunk.versions[seq - chunk.base]
+
+    def events_at(self, seq):
+        return list(self.at(seq).values())
+
+    def diff(self, seq_from, seq_to):
+        """seq_from → seq_to の差分: {'added': [イベント], 'removed': [イベント], 'changed': [{'before', 'after'}]}"""
+        result = {'added': [], 'removed': [], 'changed': []}
+        for _, before, after in self.at(seq_from).diff(self.at(seq_to)):
+            if before is None:
+                result['added'].append(after)
+            elif after is None:
+                result['removed'].append(before)
+            else:
+                result['changed'].append({'before': before, 'after': after})
+        return result
+
+    def cache_clear(self):
+        with self._lock:
+            self._chunks.clear()
+
+
+_history = {'current': None}
+
+
+def install(history):
+    """参照に使う履歴を登録する（create_app から。None で無効化）"""
+    _history['current'] = history
+
+
+def installed():
+    return _history['current']
@@ -0,0 +1,126 @@
+"""本番用エントリポイント
+
+    python run.py --env production --workers 4 --threads 2 --port 8050
+    python run.py --config settings.json
+    python run.py --journal-dir /var/lib/llm-planner/journal
+
+gunicorn を preload_app で起動する。master で app を import・ウォームアップ（レイアウト検証、
+コールバック登録、イベントインデックス構築）してから gc.freeze() し、fork したワーカーと
+事前計算済みのテーブルを copy-on-write で共有する。未指定の項目は config.load_config() の値を使う。
+
+複数ワーカーでは Undo/Redo 履歴をワーカー間で共有する SQLite ファイルが要るので、SESSION_DB が
+未指定ならこの起動限りの一時ファイルを用意する。リマインダー（REMINDERS）の配信は、fork のたびに
+master が生きているワーカーのうち1つだけに割り当て、他のワーカーでは無効にする（同じ通知を
+ワーカー数だけ送らないため。割り当てたワーカーが落ちたら次に fork するワーカーが引き継ぐ）。
+予約は共有のジャーナル（JOURNAL_DIR）から作るので、配信するワーカーにもどのワーカーでの変更も届く。
+"""
+import argparse
+import gc
+import os
+import shutil
+import tempfile
+
+import config as app_config
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Jules' Calendar server")
+    ap.add_argument('--env', choices=['development', 'production'], help='APP_ENV')
+    ap.add_argument('--config', help='設定ファイル(JSON)のパス')
+    ap.add_argument('--host')
+    ap.add_argument('--port', type=int)
+    ap.add_argument('--workers', type=int, help='ワーカープロセス数（0: 自動）')
+    ap.add_argument('--threads', type=int, help='ワーカーあたりのスレッド数（0: 自動）')
+    ap.add_argument('--timeout', type=int)
+    ap.add_argument('--journal-dir', help='変更ジャーナルの保存先（JOURNAL_DIR。省略時は設定の値、既定は無効）')
+    ap.add_argument('--dev', action='store_true', help='gunicornを使わず開発サーバーで起動')
+    return ap.parse_args(argv)
+
+
+def resolve_config(args):
+    if args.config:
+        os.environ[app_config.ENV_PREFIX + 'CONFIG'] = args.config
+    overrides = {k: v for k, v in {
+        'APP_ENV': args.env, 'HOST': args.host, 'PORT': args.port,
+        'WORKERS': args.workers, 'THREADS': args.threads, 'TIMEOUT': args.timeout,
+        'JOURNAL_DIR': args.journal_dir,
+    }.items() if v is not None}
+    cfg = app_config.load_config(overrides)
+    cfg['WORKERS'] = cfg['WORKERS'] or app_config.default_workers()
+    cfg['THREADS'] = cfg['THREADS'] or app_config.default_threads()
+    # app.py は import 時に環境変数から設定を読むので、CLI 指定もそこへ渡す
+    for key, value in overrides.items():
+        os.environ[app_config.ENV_PREFIX + key] = str(value)
+    return cfg
+
+
+def load_app():
+    """preload: master で1回だけ import・ウォームアップし、以降の割り当てを GC 追跡対象外にする"""
+    import app as calendar_app
+    calendar_app.warm_app(calendar_app.app)
+    gc.collect()
+    gc.freeze()  # fork 後に GC が共有ページへ書き込んで CoW が崩れるのを防ぐ
+    return calendar_app.server
+
+
+def pre_fork(server, worker):
+    """master で fork の直前に呼ばれる: 配信を受け持つワーカーがいなければこのワーカーに割り当てる"""
+    worker.reminders = not any(getattr(w, 'reminders', False) for w in server.WORKERS.values())
+
+
+def post_fork(server, worker):
+    """ワーカーで fork の直後に呼ばれる: 割り当てたワーカーは配信を始め、他のワーカーはリマインダーを無効にする"""
+    import reminders
+    if worker.reminders:
+        reminders.start()   # 予約は共有のジャーナルから作るので、他のワーカーでの変更も届く
+    else:
+        reminders.install(None)
+
+
+def serve(cfg):
+    from gunicorn.app.base import BaseApplication
+
+    class CalendarApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f"{cfg['HOST']}:{cfg['PORT']}",
+                'workers': cfg['WORKERS'],
+                'threads': cfg['THREADS'],
+                'worker_class': 'gthread' if cfg['THREADS'] > 1 else 'sync',
+                'timeout': cfg['TIMEOUT'],
+                'preload_app': True,
+                'pre_fork': pre_fork,
+                'post_fork': post_fork,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    CalendarApplication.application = load_app()
+    CalendarApplication().run()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cfg = resolve_config(args)
+    if args.dev:
+        import app as calendar_app
+        production = cfg['APP_ENV'] == 'production'
+        calendar_app.app.run(host=cfg['HOST'], port=cfg['PORT'], debug=not production)
+        return
+    session_dir = None
+    if cfg['WORKERS'] > 1 and not cfg['SESSION_DB']:
+        session_dir = tempfile.mkdtemp(prefix='llm-planner-')
+        cfg['SESSION_DB'] = os.path.join(session_dir, 'sessions.sqlite3')
+        os.environ[app_config.ENV_PREFIX + 'SESSION_DB'] = cfg['SESSION_DB']
+    try:
+        serve(cfg)
+    finally:
+        if session_dir is not None:
+            shutil.rmtree(session_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""会議の自動配置（制約つきの空き枠探索とスコアリング）
+
+会議リクエスト（normalize_request() 参照）ごとに、必須参加者（コミットメントレベル Primary）全員が
+勤務時間内かつ予定なしの区間を求め、グリッドに揃えた開始時刻をスコアの高い順に返す。
+
+- 必須参加者: 勤務時間（ユーザーごとのタイムゾーン・表示時間帯、平日のみ）の共通部分から予定を引いた区間だけが候補
+- 任意参加者（Secondary / Observer / Tentative）: 予定や勤務時間外と重なるとレベルに応じて減点
+- 「空き時間」ラベルの予定は空きとみなし、「仮予定」は必須参加者でも減点だけにする
+- 希望時間帯に収まる枠・前後の予定や勤務時間の端に接する枠（空きを細切れにしない）を加点し、
+  優先度が高い会議ほど早い枠を好む（anchor を指定した場合はその時刻に近い枠を好む）
+
+空き状況（Availability）は対象期間のイベントを event_index から1回だけ引いて、ユーザーごとの
+開始時刻順の配列（Timeline）に展開する。一括配置（schedule_batch）は優先度の高い順・候補の少ない順に
+貪欲に置いていき、置けなかった会議は、優先度が同じか低い配置済みの会議を1段だけ動かして席を空ける
+（優先度の高い順に置くので、実際に動くのは同じ優先度の会議。動かした会議が別の枠に置けなければ元に戻す）。
+"""
+import bisect
+from collections import defaultdict
+from datetime import timedelta
+
+import event_index
+import geometry
+import timezones
+
+COMMITMENT_WEIGHTS = {'Primary': None, 'Secondary': 3.0, 'Observer': 1.0, 'Tentative': 0.5}  # None: 必ず空いていること
+FREE_LABELS = {'空き時間'}   # 予定として扱わないラベル
+SOFT_LABELS = {'仮予定'}     # 重なっても配置はできる（減点のみ）ラベル
+PRIORITY_RANK = {'低': 0, '中': 1, '高': 2, '最高': 3}
+EARLINESS_PER_DAY = {'低': 0.05, '中': 0.1, '高': 0.3, '最高': 0.5}  # 開始が1日遅れるごとの減点
+DISPLACEMENT_PER_HOUR = 0.1  # anchor（元の開始時刻）から1時間ずれるごとの減点
+SOFT_CONFLICT_PENALTY = 2.0  # 必須参加者の仮予定と重なる場合（1人あたり）
+PREFERRED_BONUS = 2.0        # 希望時間帯に収まる場合
+EDGE_BONUS = 0.5             # 空き区間の端に接する場合
+SCHEDULE_TOP_N = 5           # 単発の検索で返す候補数
+REPAIR_TRIES = 10            # 一括配置で、他の会議を動かして試す枠の数
+
+
+class Timeline:
+    """1ユーザーの予定区間 (開始epoch, 終了epoch, タグ) を開始時刻順に持つ"""
+    __slots__ = ('starts', 'rows', 'max_len')
+
+    def __init__(self):
+        self.starts = []
+        self.rows = []
+        self.max_len = 0
+
+    def add(self, s, e, tag):
+        i = bisect.bisect_right(self.starts, s)
+        self.starts.insert(i, s)
+        self.rows.insert(i, (s, e, tag))
+        self.max_len = max(self.max_len, e - s)
+
+    def remove(self, tag):
+        for i, row in enumerate(self.rows):
+            if row[2] == tag:
+                del self.starts[i], self.rows[i]
+                return
+
+    def overlapping(self, s, e):
+        lo = bisect.bisect_left(self.starts, s - self.max_len)
+        hi = bisect.bisect_left(self.starts, e)
+        return [row for row in self.rows[lo:hi] if row[1] > s]
+
+
+def _merge(intervals):
+    out = []
+    for s, e in sorted(intervals):
+        if out and s <= out[-1][1]:
+            if e > out[-1][1]:
+                out[-1] = (out[-1][0], e)
+        else:
+            out.append((s, e))
+    return out
+
+
+def _intersect(a, b):
+    """整列済み・重なりなしの区間列どうしの共通部分"""
+    out, i, j = [], 0, 0
+    while i < len(a) and j < len(b):
+        s, e = max(a[i][0], b[j][0]), min(a[i][1], b[j][1])
+        if s < e:
+            out.append((s, e))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def _subtract(spans, busy):
+    """spans から merge 済みの busy を除いた区間列"""
+    out, j = [], 0
+    for s, e in spans:
+        while j < len(busy) and busy[j][1] <= s:
+            j += 1
+        k, cur = j, s
+        while k < len(busy) and busy[k][0] < e:
+            if busy[k][0] > cur:
+                out.append((cur, busy[k][0]))
+            cur = max(cur, busy[k][1])
+            k += 1
+        if cur < e:
+            out.append((cur, e))
+    return out
+
+
+def normalize_request(req, groups_data=None, default_tz=None):
+    """会議リクエスト → 配置用の dict
+
+    req のキー: title, attendees（ユーザーID）, group_id（メンバーを参加者に追加）, optional（任意参加者）,
+    commitments（{ユーザーID: 'Primary' | 'Secondary' | 'Observer' | 'Tentative'}）, duration（分）,
+    start / end（epoch 秒の探索範囲）, priority, preferred（(開始時, 終了時) の希望時間帯）, weekends（土日も可）,
+    anchor（epoch 秒。指定すると早さではなくこの時刻からの近さで採点する）
+    """
+    levels = {}
+    group = next((g for g in groups_data or [] if g['id'] == req.get('group_id')), None)
+    for uid in list(req.get('attendees') or []) + (group['user_ids'] if group else []):
+        levels.setdefault(uid, 'Primary')
+    for uid in req.get('optional') or []:
+        levels.setdefault(uid, 'Secondary')
+    for uid, level in (req.get('commitments') or {}).items():
+        if level not in COMMITMENT_WEIGHTS:
+            raise ValueError(f"不明なコミットメントレベルです: {level}")
+        levels[uid] = level
+    duration = int(req.get('duration') or 60)
+    if duration <= 0:
+        raise ValueError("所要時間は正の分数で指定してください")
+    if not levels:
+        raise ValueError("参加者またはグループを指定してください")
+    if req['end'] <= req['start']:
+        raise ValueError("探索範囲の終了は開始より後にしてください")
+    priority = req.get('priority') or '中'
+    if priority not in PRIORITY_RANK:
+        raise ValueError(f"不明な優先度です: {priority}")
+    return {'title': req.get('title') or '会議', 'priority': priority, 'duration': duration * 60,
+            'start': int(req['start']), 'end': int(req['end']),
+            'required': [u for u, lv in levels.items() if COMMITMENT_WEIGHTS[lv] is None],
+            'optional': {u: COMMITMENT_WEIGHTS[lv] for u, lv in levels.items() if COMMITMENT_WEIGHTS[lv] is not None},
+            'preferred': tuple(req['preferred']) if req.get('preferred') else None,
+            'weekends': bool(req.get('weekends')), 'tz': req.get('tz') or default_tz, 'anchor': req.get('anchor')}
+
+
+class Availability:
+    """[lo, hi) の参加者ごとの予定と勤務時間
+
+    events は event_index から引き、予定は Timeline（確定と仮予定に分ける）、勤務時間はユーザーごとに
+    初めて参照したときに区間列として求めてキャッシュする。reserve() で配置した会議を予定として追加できる。
+    strict=True ではラベルに関係なくすべての予定を埋まっているとみなす（check_double_booking と同じ判定）。
+    """
+
+    def __init__(self, events_data, tz, lo, hi, users_data=None, start_h=9, end_h=18, grid_min=15, key=None,
+                 strict=False):
+        self.tz = tz
+        self.lo, self.hi = lo, hi
+        self.start_h, self.end_h = start_h, end_h
+        self.grid = grid_min * 60
+        self.users = {u['id']: u for u in users_data or []}
+        self.busy = defaultdict(Timeline)
+        self.soft = defaultdict(Timeline)
+        for s, e, ev in event_index.index_for(events_data, tz, key).window(lo, hi):
+            label = None if strict else ev.get('schedule_label', '予定あり')
+            if label in FREE_LABELS:
+                continue
+            lines = self.soft if label in SOFT_LABELS else self.busy
+            for uid in ev.get('attendees') or []:
+                lines[uid].add(s, e, ev['id'])
+        self._work = {}
+        self._tables = {}
+
+    def _table(self, tz):
+        table = self._tables.get(tz.key)
+        if table is None:
+            table = self._tables[tz.key] = timezones.OffsetTable(tz, self.lo - 2 * 86400, self.hi + 2 * 86400)
+        return table
+
+    def working(self, uid, weekends=False):
+        """勤務時間（ユーザーのタイムゾーンの表示時間帯、weekends=False なら月〜金）の区間列"""
+        cache_key = (uid, weekends)
+        spans = self._work.get(cache_key)
+        if spans is None:
+            user = self.users.get(uid, {})
+            tz = timezones.get_zone(user['tz']) if user.get('tz') else self.tz
+            start_h, end_h = user.get('start_h', self.start_h), user.get('end_h', self.end_h)
+            span = geometry.span_hours(start_h, end_h) * 3600
+            table = self._table(tz)
+            d = timezones.wall_date(table.local(self.lo)) - timedelta(days=1)  # 夜勤は前日の枠から掛かる
+            last = timezones.wall_date(table.local(self.hi))
+            spans = []
+            while d <= last:
+                if weekends or d.weekday() < 5:
+                    wall = timezones.wall_day(d) + start_h * 3600
+                    s, e = max(table.utc(wall), self.lo), min(table.utc(wall + span), self.hi)
+                    if s < e:
+                        spans.append((s, e))
+                d += timedelta(days=1)
+            self._work[cache_key] = spans = _merge(spans)
+        return spans
+
+    def free(self, meeting, ignore=()):
+        """必須参加者全員が勤務時間内で予定のない区間（ignore のタグの予定はないものとみなす）"""
+        spans = [(max(meeting['start'], self.lo), min(meeting['end'], self.hi))]
+        busy = []
+        for uid in meeting['required']:
+            spans = _intersect(spans, self.working(uid, meeting['weekends']))
+            if not spans:
+                return []
+            busy.extend((s, e) for s, e, tag in self.busy[uid].overlapping(spans[0][0], spans[-1][1])
+                        if tag not in ignore)
+        return _subtract(spans, _merge(busy))
+
+    def reserve(self, users, s, e, tag):
+        for uid in users:
+            self.busy[uid].add(s, e, tag)
+
+    def release(self, users, tag):
+        for uid in users:
+            self.busy[uid].remove(tag)
+
+    # --- スコア ---
+    def score(self, meeting, s, e, gap):
+        """(スコア, {ユーザーID: 重なる予定のタグ}) 。gap は s を含む空き区間"""
+        score, conflicts = 0.0, {}
+        for uid in meeting['required']:
+            tags = [tag for _, _, tag in self.soft[uid].overlapping(s, e)]
+            if tags:
+                score -= SOFT_CONFLICT_PENALTY * len(tags)
+                conflicts[uid] = tags
+        for uid, weight in meeting['optional'].items():
+            hard = [tag for _, _, tag in self.busy[uid].overlapping(s, e)]
+            soft = [tag for _, _, tag in self.soft[uid].overlapping(s, e)]
+            if hard:
+                score -= weight
+            elif soft:
+                score -= weight / 2
+            elif not _covers(self.working(uid, meeting['weekends']), s, e):
+                score -= weight / 2
+            if hard or soft:
+                conflicts[uid] = hard + soft
+        if s == gap[0] or e == gap[1]:
+            score += EDGE_BONUS
+        if meeting['preferred']:
+            table = self._table(meeting['tz'] or self.tz)
+            m_s = table.local(s) % 86400 // 60
+            m_e = m_s + (e - s) // 60
+            p_s, p_e = meeting['preferred'][0] * 60, meeting['preferred'][1] * 60
+            if p_s <= m_s and m_e <= p_e:
+                score += PREFERRED_BONUS
+        if meeting.get('anchor') is not None:
+            score -= DISPLACEMENT_PER_HOUR * abs(s - meeting['anchor']) / 3600
+        else:
+            score -= EARLINESS_PER_DAY[meeting['priority']] * (s - meeting['start']) / 86400
+        return score, conflicts
+
+    def candidates(self, meeting, ignore=()):
+        """グリッドに揃えた開始時刻ごとの (スコア, 開始, 終了, 重なり)"""
+        table = self._table(meeting['tz'] or self.tz)
+        dur, grid = meeting['duration'], self.grid
+        out = []
+        for gap in self.free(meeting, ignore):
+            s = gap[0] + (-table.local(gap[0])) % grid
+            while s + dur <= gap[1]:
+                score, conflicts = self.score(meeting, s, s + dur, gap)
+                out.append((score, s, s + dur, conflicts))
+                s += grid
+        out.sort(key=lambda c: (-c[0], c[1]))
+        return out
+
+
+def _covers(spans, s, e):
+    i = bisect.bisect_right(spans, (s, float('inf'))) - 1
+    return i >= 0 and spans[i][0] <= s and e <= spans[i][1]
+
+
+def _slot(candidate):
+    score, s, e, conflicts = candidate
+    return {'start': s, 'end': e, 'score': round(score, 3), 'conflicts': conflicts}
+
+
+def find_slots(meeting, availability, n=SCHEDULE_TOP_N):
+    """1件の会議について、スコアの高い順に最大 n 件の枠 {'start', 'end'（epoch）, 'score', 'conflicts'}"""
+    return [_slot(c) for c in availability.candidates(meeting)[:n]]
+
+
+def schedule_batch(meetings, availability):
+    """複数の会議をまとめて配置する。戻り値は meetings と同じ順の枠（置けなければ None）
+
+    配置した会議は availability に予定として追加される（タグは ('batch', 番号)）。
+    """
+    counts = [len(availability.candidates(m)) for m in meetings]
+    order = sorted(range(len(meetings)), key=lambda i: (-PRIORITY_RANK[meetings[i]['priority']], counts[i], i))
+    placed = {}
+
+    def attendees(i):
+        return meetings[i]['required'] + list(meetings[i]['optional'])
+
+    def place(i, candidate):
+        placed[i] = candidate
+        availability.reserve(attendees(i), candidate[1], candidate[2], ('batch', i))
+
+    def unplace(i):
+        availability.release(attendees(i), ('batch', i))
+        return placed.pop(i)
+
+    for i in order:
+        cands = availability.candidates(meetings[i])
+        if cands:
+            place(i, cands[0])
+            continue
+        # 優先度が同じか低い配置済みの会議を動かせば置ける枠を探す
+        rank = PRIORITY_RANK[meetings[i]['priority']]
+        movable = {('batch', j) for j in placed if PRIORITY_RANK[meetings[j]['priority']] <= rank}
+        for cand in availability.candidates(meetings[i], ignore=movable)[:REPAIR_TRIES]:
+            blockers = {tag[1] for uid in meetings[i]['required']
+                        for _, _, tag in availability.busy[uid].overlapping(cand[1], cand[2]) if tag in movable}
+            saved = {j: unplace(j) for j in blockers}
+            place(i, cand)
+            moved = []
+            for j in sorted(blockers, key=lambda j: -PRIORITY_RANK[meetings[j]['priority']]):
+                alt = availability.candidates(meetings[j])
+                if not alt:
+                    break
+                place(j, alt[0])
+                moved.append(j)
+            else:
+                break
+            for j in moved + [i]:
+                unplace(j)
+            for j, c in saved.items():
+                place(j, c)
+    return [_slot(placed[i]) if i in placed else None for i in range(len(meetings))]
@@ -0,0 +1,51 @@
+"""本番配信プロファイル
+
+- `_dash-update-component` のJSONレスポンスと静的アセットを brotli / gzip で圧縮（flask-compress）
+- Dash が `?m=<更新時刻>` でフィンガープリントを付けた /assets/ は immutable で長期キャッシュ
+- フィンガープリントなしのアセットは毎回再検証（ETag による 304）
+"""
+from flask import request
+
+COMPRESS_MIMETYPES = [
+    'application/json',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+    'text/html',
+]
+COMPRESS_MIN_SIZE = 500      # これより小さいレスポンスは圧縮しない(bytes)
+ASSET_MAX_AGE = 31536000     # フィンガープリント付きアセットのキャッシュ期間（1年）
+
+
+def enable_compression(server):
+    """brotli優先・gzipフォールバックでレスポンスを圧縮する"""
+    from flask_compress import Compress  # 本番プロファイルでのみ必要
+
+    server.config['COMPRESS_MIMETYPES'] = COMPRESS_MIMETYPES
+    server.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    server.config['COMPRESS_ALGORITHM_STREAMING'] = ['br', 'gzip']  # /assets/ は send_file のストリーム応答
+    server.config['COMPRESS_MIN_SIZE'] = COMPRESS_MIN_SIZE
+    server.config['COMPRESS_BR_LEVEL'] = 5   # 動的レスポンス向け: 圧縮率と速度のバランス
+    server.config['COMPRESS_LEVEL'] = 6
+    Compress(server)
+
+
+def enable_asset_caching(app):
+    """/assets/ のフィンガープリント付きURLを immutable として配信する"""
+    assets_prefix = app.config.requests_pathname_prefix + app.config.assets_url_path.strip('/') + '/'
+
+    @app.server.after_request
+    def _asset_cache_headers(response):
+        if request.path.startswith(assets_prefix) and response.status_code == 200:
+            if 'm' in request.args:
+                response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+            else:
+                response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+def configure_production(app):
+    """本番用の配信設定を Dash アプリに適用する"""
+    enable_compression(app.server)
+    enable_asset_caching(app)
+    return app
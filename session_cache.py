@@ -0,0 +1,283 @@
+"""セッション単位のサーバー側キャッシュ
+
+ブラウザには session-id（トークン）と小さな履歴メタ情報だけを置き、Undo/Redo 履歴と
+描画済みビュー（表示中のウィンドウ）のキャッシュはサーバー側に持つ。
+
+- 履歴はスナップショットではなく逆パッチ {イベントID: 変更前のイベント or None} で持つ
+- 履歴は SQLite に置く。path（SESSION_DB）を指定するとファイルになり、全ワーカーで共有される
+  （gunicorn のワーカーはリクエストごとに入れ替わるので、複数ワーカーでは必須。run.py が自動で用意する）。
+  空ならプロセス内のメモリ上の DB（1プロセスの開発サーバー向け）
+- 描画済みビューはプロセスごとのキャッシュ（外れても描き直すだけ）
+- 退避: セッション数の上限（LRU）・最終アクセスからの TTL・メモリ予算（推定バイト数。履歴全体とプロセスごとのビューそれぞれ）
+- ビューの大きさは VIEW_SIZE_SAMPLE 回に1回だけシリアライズして測り、それ以外は測った値の移動平均で見積もる
+- 再起動や退避でセッションが見つからない場合は「履歴なし」として続行する（イベント自体はブラウザ側）
+"""
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from plotly.utils import PlotlyJSONEncoder
+
+SESSION_DB_TIMEOUT = 30  # 他のワーカーが履歴を書き込み中のときに待つ秒数
+VIEW_SIZE_SAMPLE = 16    # 描画済みビューの大きさを実測する間隔（回）
+
+
+def estimate_size(value):
+    """シリアライズ後のバイト数（Dash コンポーネントを含む値にも使える）"""
+    return len(json.dumps(value, cls=PlotlyJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode())
+
+
+def make_patch(events, changed_ids):
+    """changed_ids を変更する直前の状態に戻すための逆パッチ"""
+    changed = set(changed_ids)
+    before = {ev['id']: ev for ev in events if ev['id'] in changed}
+    return {eid: before.get(eid) for eid in changed}
+
+
+def apply_patch(events, patch):
+    """パッチを適用した新しいイベント一覧と、その逆パッチを返す（順序は維持、新規は末尾）"""
+    inverse = {}
+    out = []
+    for ev in events:
+        if ev['id'] in patch:
+            inverse[ev['id']] = ev
+            if patch[ev['id']] is not None:
+                out.append(patch[ev['id']])
+        else:
+            out.append(ev)
+    for eid, ev in patch.items():
+        if eid not in inverse:
+            inverse[eid] = None
+            if ev is not None:
+                out.append(ev)
+    return out, inverse
+
+
+def _dumps(patch):
+    """逆パッチ → (JSON, バイト数)。ASCII に逃がすので文字数がそのままバイト数"""
+    text = json.dumps(patch, separators=(',', ':'))
+    return text, len(text)
+
+
+class SessionCache:
+    def __init__(self, max_sessions, ttl_sec, budget_bytes, hist_max, view_max, path=''):
+        self.max_sessions = max_sessions
+        self.ttl_sec = ttl_sec
+        self.budget_bytes = budget_bytes
+        self.hist_max = hist_max
+        self.view_max = view_max
+        self.path = path
+        self.lock = threading.RLock()
+        self._memory = None          # path なしのときの DB（fork 後のプロセスで作る）
+        self._pid = None             # スキーマを用意したプロセス
+        self.views = OrderedDict()   # セッションID → [最終アクセス, OrderedDict(キー → (コンポーネント, bytes))]
+        self.view_bytes = 0
+        self._view_avg = None        # 実測したビューの大きさの移動平均
+        self._view_puts = itertools.count()
+        self.counters = {'created': 0, 'restored_empty': 0, 'view_hits': 0, 'view_misses': 0,
+                         'evicted_lru': 0, 'evicted_ttl': 0, 'evicted_budget': 0}
+
+    # --- 履歴の DB ---
+    def _connect(self):
+        if self.path:
+            db = sqlite3.connect(self.path, timeout=SESSION_DB_TIMEOUT, isolation_level=None)
+            db.execute("PRAGMA synchronous = NORMAL")  # 履歴は再起動で消えてよいので電源断の耐性はいらない
+        else:
+            if self._memory is None or self._pid != os.getpid():
+                self._memory = sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False)
+                self._pid = None
+            db = self._memory
+        if self._pid != os.getpid():
+            if self.path:
+                db.execute("PRAGMA journal_mode = WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS sessions (sid TEXT PRIMARY KEY, touched REAL, bytes INTEGER)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched)")
+            db.execute("CREATE TABLE IF NOT EXISTS history (sid TEXT, stack TEXT, pos INTEGER, patch TEXT, "
+                       "bytes INTEGER, PRIMARY KEY (sid, stack, pos))")
+            self._pid = os.getpid()
+        return db
+
+    @contextmanager
+    def _db(self):
+        """1操作を1トランザクションで（BEGIN IMMEDIATE で他のワーカーの読み書きと直列にする）"""
+        with self.lock:
+            db = self._connect()
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    yield db
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+                db.execute("COMMIT")
+            finally:
+                if db is not self._memory:
+                    db.close()
+
+    # --- セッション ---
+    def _touch(self, db, sid, create=True):
+        """セッションの最終アクセスを更新する（TTL 切れは破棄）。なければ create のとき作る。戻り値は存在するか"""
+        now = time.time()
+        row = db.execute("SELECT touched FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is not None and now - row[0] > self.ttl_sec:
+            self._drop(db, sid, 'evicted_ttl')
+            row = None
+        if row is None:
+            if not create:
+                return False
+            db.execute("INSERT INTO sessions VALUES (?, ?, 0)", (sid, now))
+            self.counters['created'] += 1
+        else:
+            db.execute("UPDATE sessions SET touched = ? WHERE sid = ?", (now, sid))
+        return True
+
+    def _drop(self, db, sid, reason):
+        db.execute("DELETE FROM history WHERE sid = ?", (sid,))
+        db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+        self._drop_views(sid)
+        self.counters[reason] += 1
+
+    def _resize(self, db, sid):
+        db.execute("UPDATE sessions SET bytes = (SELECT COALESCE(SUM(bytes), 0) FROM history WHERE sid = ?) "
+                   "WHERE sid = ?", (sid, sid))
+
+    def _trim(self, db, sid, stack, keep):
+        """stack の古い側（pos の小さい側）を keep 件まで捨てる"""
+        db.execute("DELETE FROM history WHERE sid = ? AND stack = ? AND pos NOT IN "
+                   "(SELECT pos FROM history WHERE sid = ? AND stack = ? ORDER BY pos DESC LIMIT ?)",
+                   (sid, stack, sid, stack, keep))
+
+    def _evict(self, db, keep):
+        for (sid,) in db.execute("SELECT sid FROM sessions WHERE touched < ? AND sid != ?",
+                                 (time.time() - self.ttl_sec, keep)).fetchall():
+            self._drop(db, sid, 'evicted_ttl')
+        (count,) = db.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        if count > self.max_sessions:
+            for (sid,) in db.execute("SELECT sid FROM sessions WHERE sid != ? ORDER BY touched LIMIT ?",
+                                     (keep, count - self.max_sessions)).fetchall():
+                self._drop(db, sid, 'evicted_lru')
+        total = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM sessions").fetchone()[0]
+        while total > self.budget_bytes:
+            row = db.execute("SELECT sid, bytes FROM sessions WHERE sid != ? ORDER BY touched LIMIT 1", (keep,)).fetchone()
+            if row is None:
+                break
+            self._drop(db, row[0], 'evicted_budget')
+            total -= row[1]
+        # 残りが自セッションだけでも予算を超える場合は Redo の遠い側 → 古い Undo の順に捨てる
+        while total > self.budget_bytes:
+            row = db.execute("SELECT stack, pos, bytes FROM history WHERE sid = ? ORDER BY stack = 'undo', pos LIMIT 1",
+                             (keep,)).fetchone()
+            if row is None:
+                break
+            db.execute("DELETE FROM history WHERE sid = ? AND stack = ? AND pos = ?", (keep, row[0], row[1]))
+            total -= row[2]
+        self._resize(db, keep)
+
+    def _meta(self, db, sid):
+        """ブラウザ側に置く履歴メタ情報（Undo/Redo ボタンの有効・無効に使う）"""
+        counts = dict(db.execute("SELECT stack, COUNT(*) FROM history WHERE sid = ? GROUP BY stack", (sid,)).fetchall())
+        return {'undo': counts.get('undo', 0), 'redo': counts.get('redo', 0)}
+
+    def meta(self, sid):
+        with self._db() as db:
+            return self._meta(db, sid) if self._touch(db, sid, create=False) else {'undo': 0, 'redo': 0}
+
+    # --- 履歴 ---
+    def _push(self, db, sid, stack, patch):
+        text, size = _dumps(patch)
+        top = db.execute("SELECT MAX(pos) FROM history WHERE sid = ? AND stack = ?", (sid, stack)).fetchone()[0]
+        db.execute("INSERT INTO history VALUES (?, ?, ?, ?, ?)", (sid, stack, (top or 0) + 1, text, size))
+
+    def push(self, sid, patch):
+        """変更の逆パッチを積む（Redo はクリア）。戻り値はメタ情報"""
+        with self._db() as db:
+            self._touch(db, sid)
+            db.execute("DELETE FROM history WHERE sid = ? AND stack = 'redo'", (sid,))
+            self._push(db, sid, 'undo', patch)
+            self._trim(db, sid, 'undo', self.hist_max)
+            self._resize(db, sid)
+            self._evict(db, sid)
+            return self._meta(db, sid)
+
+    def step(self, sid, events, op):
+        """Undo（op='undo'）/ Redo を適用した (イベント一覧, メタ情報, 変更したID)。履歴がなければ (None, メタ, [])"""
+        src, dst = ('undo', 'redo') if op == 'undo' else ('redo', 'undo')
+        with self._db() as db:
+            if not self._touch(db, sid, create=False):
+                self.counters['restored_empty'] += 1
+                return None, {'undo': 0, 'redo': 0}, []
+            row = db.execute("SELECT pos, patch FROM history WHERE sid = ? AND stack = ? ORDER BY pos DESC LIMIT 1",
+                             (sid, src)).fetchone()
+            if row is None:
+                return None, self._meta(db, sid), []
+            db.execute("DELETE FROM history WHERE sid = ? AND stack = ? AND pos = ?", (sid, src, row[0]))
+            patch = json.loads(row[1])
+            new_events, inverse = apply_patch(events, patch)
+            self._push(db, sid, dst, inverse)
+            self._resize(db, sid)
+            self._evict(db, sid)
+            return new_events, self._meta(db, sid), list(patch)
+
+    # --- 表示中ウィンドウの描画キャッシュ（プロセスごと） ---
+    def _drop_views(self, sid):
+        entry = self.views.pop(sid, None)
+        if entry is not None:
+            self.view_bytes -= sum(b for _, b in entry[1].values())
+
+    def get_view(self, sid, key):
+        with self.lock:
+            entry = self.views.get(sid)
+            if entry is not None and time.time() - entry[0] > self.ttl_sec:
+                self._drop_views(sid)
+                entry = None
+            hit = entry[1].get(key) if entry else None
+            if hit is None:
+                self.counters['view_misses'] += 1
+                return None
+            entry[0] = time.time()
+            entry[1].move_to_end(key)
+            self.views.move_to_end(sid)
+            self.counters['view_hits'] += 1
+            return hit[0]
+
+    def _view_size(self, value):
+        """ビューの推定バイト数（毎回シリアライズすると描画と同じくらいかかるので、間引いて実測する）"""
+        if self._view_avg is not None and next(self._view_puts) % VIEW_SIZE_SAMPLE:
+            return int(self._view_avg)
+        size = estimate_size(value)
+        self._view_avg = size if self._view_avg is None else (3 * self._view_avg + size) / 4
+        return size
+
+    def put_view(self, sid, key, value):
+        size = self._view_size(value)
+        with self.lock:
+            entry = self.views.setdefault(sid, [time.time(), OrderedDict()])
+            entry[0] = time.time()
+            self.views.move_to_end(sid)
+            views = entry[1]
+            if key in views:
+                self.view_bytes -= views.pop(key)[1]
+            views[key] = (value, size)
+            self.view_bytes += size
+            while len(views) > self.view_max:
+                self.view_bytes -= views.popitem(last=False)[1][1]
+            while len(self.views) > self.max_sessions or (self.view_bytes > self.budget_bytes and len(self.views) > 1):
+                self._drop_views(next(iter(self.views)))
+            while self.view_bytes > self.budget_bytes and views:
+                self.view_bytes -= views.popitem(last=False)[1][1]
+
+    def stats(self):
+        with self._db() as db:
+            sessions, total, largest = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0), COALESCE(MAX(bytes), 0) FROM sessions").fetchone()
+            (entries,) = db.execute("SELECT COUNT(*) FROM history").fetchone()
+            return {'sessions': sessions, 'bytes': total, 'budget_bytes': self.budget_bytes,
+                    'max_sessions': self.max_sessions, 'ttl_sec': self.ttl_sec, 'shared': bool(self.path),
+                    'largest_session_bytes': largest, 'history_entries': entries,
+                    'cached_views': sum(len(views) for _, views in self.views.values()),
+                    'view_bytes': self.view_bytes, **self.counters}
@@ -1,6 +1,15 @@
-function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
-  const GRID = GRID_CELL_MIN;
-  const TOTAL_PX = (END_H - START_H) * 60 * PX_PER_MIN;
+function initializeCalendar() {
+  // 週ビューのジオメトリ（表示時間帯・1分あたりのpx・グリッド）。描画のたびに .week-grid の data-* から読み直す
+  let PX_PER_MIN = 1, START_H = 8, GRID = 15, TOTAL_PX = 720;
+
+  function readGeometry(root) {
+    const grid = root.querySelector('.week-grid');
+    if (!grid) return;
+    PX_PER_MIN = parseFloat(grid.dataset.pxPerMin);
+    START_H = parseInt(grid.dataset.startH);
+    GRID = parseInt(grid.dataset.gridMin);
+    TOTAL_PX = parseFloat(grid.dataset.totalPx);
+  }
 
   let tooltip; 
   let ghost; 
@@ -39,6 +48,21 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
     return ghost;
   }
 
+  // サーバー側のレーン割り当て（data-lane / data-lanes）をゴーストにも再利用
+  function placeGhostLane(g, bar, host) {
+    const lanes = parseInt(bar.dataset.lanes || '1');
+    const lane = parseInt(bar.dataset.lane || '0');
+    if (host.dataset.day === bar.dataset.day && lanes > 1) {
+      g.style.left = 'calc(' + (lane * 100 / lanes) + '% + 2px)';
+      g.style.right = 'auto';
+      g.style.width = 'calc(' + (100 / lanes) + '% - 6px)';
+    } else {
+      g.style.left = '2px';
+      g.style.right = '2px';
+      g.style.width = 'auto';
+    }
+  }
+
   function removeGhost() { 
     if (ghost && ghost.parentNode) ghost.parentNode.removeChild(ghost); 
     ghost = null; 
@@ -57,9 +81,13 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
     return px / PX_PER_MIN; 
   }
 
-  function toLocalISO(d) { 
-    const p = n => String(n).padStart(2, '0'); 
-    return d.getFullYear() + "-" + p(d.getMonth() + 1) + "-" + p(d.getDate()) + "T" + p(d.getHours()) + ":" + p(d.getMinutes()); 
+  // 表示タイムゾーンの壁時計（日付 + その日0:00からの分）→ 'YYYY-MM-DDTHH:MM'
+  // ブラウザのタイムゾーン・夏時間の影響を受けないよう UTC として計算する
+  function wallISO(day, mins) {
+    const [y, m, d] = day.split('-').map(Number);
+    const t = new Date(Date.UTC(y, m - 1, d) + mins * 60000);
+    const p = n => String(n).padStart(2, '0');
+    return t.getUTCFullYear() + "-" + p(t.getUTCMonth() + 1) + "-" + p(t.getUTCDate()) + "T" + p(t.getUTCHours()) + ":" + p(t.getUTCMinutes());
   }
 
   function pickDayColByPoint(x, y) {
@@ -74,6 +102,7 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
   function setup() {
     const root = document.getElementById('calendar-output');
     if (!root) return;
+    readGeometry(root);
 
     // Escで月へ
     document.onkeydown = (e) => {
@@ -114,6 +143,39 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
       };
     }
 
+    // 複数選択（Ctrl/⌘/Shift+クリック）。選択中のIDは selection-store（JSON配列）を正とし、描画のたびに反映する
+    const selSink = document.getElementById('selection-store');
+    let selected = new Set();
+    try { 
+      selected = new Set(JSON.parse((selSink && selSink.textContent) || '[]')); 
+    } catch (err) {}
+
+    function markSelected() {
+      root.querySelectorAll('.event-bar, .month-event').forEach(el => el.classList.toggle('selected', selected.has(el.dataset.id)));
+    }
+
+    function toggleSelect(id) {
+      if (!selSink || !id) return;
+      if (selected.has(id)) selected.delete(id); else selected.add(id);
+      markSelected();
+      selSink.textContent = JSON.stringify(Array.from(selected));
+      selSink.dispatchEvent(new Event('input'));
+    }
+
+    function isMultiSelect(ev) { 
+      return ev.ctrlKey || ev.metaKey || ev.shiftKey; 
+    }
+
+    markSelected();
+    root.querySelectorAll('.month-event').forEach(el => {
+      el.onclick = (ev) => {
+        if (!isMultiSelect(ev)) return;
+        ev.preventDefault(); 
+        ev.stopPropagation();  // 日付セルのクリック（作成）にしない
+        toggleSelect(el.dataset.id);
+      };
+    });
+
     const bars = root.querySelectorAll('.event-bar');
     bars.forEach(bar => {
       bar.onmousedown = null; 
@@ -133,6 +195,11 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
       // ドラッグ移動
       bar.onmousedown = (ev) => {
         if (ev.target.classList.contains('resize-handle')) return;
+        if (isMultiSelect(ev)) { 
+          ev.preventDefault(); 
+          toggleSelect(bar.dataset.id); 
+          return; 
+        }
         ev.preventDefault(); 
         dragging = true; 
         bar.classList.add('dragging');
@@ -151,14 +218,13 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
           const host = pickDayColByPoint(mv.clientX, mv.clientY) || document.querySelector(`.day-col[data-day="${bar.dataset.day}"]`);
           const durMin = nearestGridMin(pxToMin(parseFloat(getComputedStyle(bar).height)));
           const g = ensureGhost(host);
-          g.style.top = (topMin) + 'px'; 
-          g.style.height = Math.max(durMin, GRID) + 'px';
-
-          const s = new Date(host.dataset.day + 'T00:00:00'); 
-          s.setHours(START_H, 0, 0, 0); 
-          s.setMinutes(s.getMinutes() + topMin);
-          const e = new Date(s.getTime() + Math.max(durMin, GRID) * 60000);
-          showTip(mv.clientX, mv.clientY, host.dataset.day + '  ' + s.toTimeString().slice(0, 5) + '–' + e.toTimeString().slice(0, 5));
+          placeGhostLane(g, bar, host);
+          g.style.top = (topMin * PX_PER_MIN) + 'px'; 
+          g.style.height = (Math.max(durMin, GRID) * PX_PER_MIN) + 'px';
+
+          const s = wallISO(host.dataset.day, START_H * 60 + topMin);
+          const e = wallISO(host.dataset.day, START_H * 60 + topMin + Math.max(durMin, GRID));
+          showTip(mv.clientX, mv.clientY, host.dataset.day + '  ' + s.slice(11, 16) + '–' + e.slice(11, 16));
         };
 
         document.onmouseup = (up) => {
@@ -173,15 +239,13 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
           const newTopPx = parseFloat(getComputedStyle(bar).top);
           const mins = nearestGridMin(pxToMin(newTopPx));
           const host = pickDayColByPoint(up.clientX, up.clientY) || document.querySelector(`.day-col[data-day="${bar.dataset.day}"]`);
-          const s = new Date(host.dataset.day + 'T00:00:00'); 
-          s.setHours(START_H, 0, 0, 0); 
-          s.setMinutes(s.getMinutes() + mins);
           const durMin = nearestGridMin(pxToMin(parseFloat(getComputedStyle(bar).height)));
-          const e = new Date(s.getTime() + Math.max(durMin, GRID) * 60000);
+          const s = wallISO(host.dataset.day, START_H * 60 + mins);
+          const e = wallISO(host.dataset.day, START_H * 60 + mins + Math.max(durMin, GRID));
 
           const sink = document.getElementById('drag-update-store');
           if (sink) { 
-            sink.textContent = JSON.stringify({id: bar.dataset.id, start: toLocalISO(s), end: toLocalISO(e)}); 
+            sink.textContent = JSON.stringify({id: bar.dataset.id, start: s, end: e}); 
             sink.dispatchEvent(new Event('input')); 
           }
         };
@@ -201,20 +265,19 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
             const dy = mv.clientY - startY;
             let newH = origH + dy;
             const maxH = TOTAL_PX - parseFloat(getComputedStyle(bar).top);
-            newH = Math.max(GRID, Math.min(maxH, newH)); 
+            newH = Math.max(GRID * PX_PER_MIN, Math.min(maxH, newH)); 
             bar.style.height = newH + 'px';
 
             const topMin = nearestGridMin(pxToMin(parseFloat(getComputedStyle(bar).top)));
             const host = pickDayColByPoint(mv.clientX, mv.clientY) || document.querySelector(`.day-col[data-day="${bar.dataset.day}"]`);
             const g = ensureGhost(host); 
-            g.style.top = (topMin) + 'px'; 
-            g.style.height = nearestGridMin(pxToMin(newH)) + 'px';
-
-            const s = new Date(host.dataset.day + 'T00:00:00'); 
-            s.setHours(START_H, 0, 0, 0); 
-            s.setMinutes(s.getMinutes() + topMin);
-            const e = new Date(s.getTime() + nearestGridMin(pxToMin(newH)) * 60000);
-            showTip(mv.clientX, mv.clientY, host.dataset.day + '  ' + s.toTimeString().slice(0, 5) + '–' + e.toTimeString().slice(0, 5));
+            placeGhostLane(g, bar, host);
+            g.style.top = (topMin * PX_PER_MIN) + 'px'; 
+            g.style.height = (nearestGridMin(pxToMin(newH)) * PX_PER_MIN) + 'px';
+
+            const s = wallISO(host.dataset.day, START_H * 60 + topMin);
+            const e = wallISO(host.dataset.day, START_H * 60 + topMin + nearestGridMin(pxToMin(newH)));
+            showTip(mv.clientX, mv.clientY, host.dataset.day + '  ' + s.slice(11, 16) + '–' + e.slice(11, 16));
           };
 
           document.onmouseup = (up) => {
@@ -231,14 +294,12 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
             const mins = nearestGridMin(pxToMin(topPx));
             const durMin = nearestGridMin(pxToMin(heightPx));
             const host = pickDayColByPoint(up.clientX, up.clientY) || document.querySelector(`.day-col[data-day="${bar.dataset.day}"]`);
-            const s = new Date(host.dataset.day + 'T00:00:00'); 
-            s.setHours(START_H, 0, 0, 0); 
-            s.setMinutes(s.getMinutes() + mins);
-            const e = new Date(s.getTime() + Math.max(durMin, GRID) * 60000);
+            const s = wallISO(host.dataset.day, START_H * 60 + mins);
+            const e = wallISO(host.dataset.day, START_H * 60 + mins + Math.max(durMin, GRID));
 
             const sink = document.getElementById('drag-update-store');
             if (sink) { 
-              sink.textContent = JSON.stringify({id: bar.dataset.id, start: toLocalISO(s), end: toLocalISO(e)}); 
+              sink.textContent = JSON.stringify({id: bar.dataset.id, start: s, end: e}); 
               sink.dispatchEvent(new Event('input')); 
             }
           };
@@ -251,3 +312,149 @@ function initializeCalendar(PX_PER_MIN, START_H, GRID_CELL_MIN, END_H) {
   obs.observe(document.documentElement, {childList: true, subtree: true});
   setup();
 }
+
+// 予定リスト（アジェンダ）ビュー：日付ウィンドウ単位でサーバーから取得し、可視行のみDOMに置く
+function initializeAgenda() {
+  const ROW_H = 44;          // 行の高さ(px)。見出し行・イベント行とも固定
+  const OVERSCAN = 8;        // 可視範囲の前後に余分に描画する行数
+  const MAX_WINDOWS = 26;    // 片方向に読み込むウィンドウ数の上限（14日×26 ≒ 1年）
+
+  let state = null;
+
+  function addDays(dateStr, n) {
+    const d = new Date(dateStr + 'T00:00:00');
+    d.setDate(d.getDate() + n);
+    const p = v => String(v).padStart(2, '0');
+    return d.getFullYear() + '-' + p(d.getMonth() + 1) + '-' + p(d.getDate());
+  }
+
+  function hhmm(iso) {
+    return iso.slice(11, 16);
+  }
+
+  function fetchWindow(k) {
+    if (state.windows.has(k) || state.pending.has(k)) return;
+    if (Math.abs(k) > MAX_WINDOWS) return;
+    const st = state;
+    st.pending.add(k);
+    const start = addDays(st.anchor, k * st.windowDays);
+    fetch(st.api + '?start=' + start + '&days=' + st.windowDays + '&tz=' + encodeURIComponent(st.tz)
+          + '&version=' + encodeURIComponent(st.version))
+      // 409: このワーカーは表示中の版を持っていない（別ワーカーで描画された）ので、イベント一覧を送って取り直す
+      .then(r => r.status !== 409 ? r : fetch(st.api, {
+        method: 'POST', headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({start: start, days: st.windowDays, tz: st.tz, members: st.members,
+                              events: window.plannerEvents || []})
+      }))
+      .then(r => { if (!r.ok) throw new Error(r.status); return r.json(); })
+      .then(data => {
+        if (st !== state) return;  // ビューが切り替わった
+        st.pending.delete(k);
+        const rows = data.rows.length ? data.rows
+          : [{type: 'empty', date: start, end: addDays(start, st.windowDays - 1)}];
+        st.windows.set(k, rows);
+        rebuild(k < st.minK);
+      })
+      .catch(() => st.pending.delete(k));
+  }
+
+  function rebuild(prepended) {
+    // ウィンドウ0から連続して読み込めた範囲だけを並べる
+    if (!state.windows.has(0)) return;
+    let lo = 0, hi = 0;
+    while (state.windows.has(lo - 1)) lo--;
+    while (state.windows.has(hi + 1)) hi++;
+    const addedTop = prepended ? countRows(lo, state.minK - 1) : 0;
+    state.minK = lo; state.maxK = hi;
+    state.rows = [];
+    for (let k = lo; k <= hi; k++) state.rows.push(...state.windows.get(k));
+    state.spacer.style.height = (state.rows.length * ROW_H) + 'px';
+    if (addedTop) state.viewport.scrollTop += addedTop * ROW_H;
+    render();
+  }
+
+  function countRows(from, to) {
+    let n = 0;
+    for (let k = from; k <= to; k++) n += (state.windows.get(k) || []).length;
+    return n;
+  }
+
+  function rowEl(row, i) {
+    const el = document.createElement('div');
+    el.style.top = (i * ROW_H) + 'px';
+    el.style.height = ROW_H + 'px';
+    if (row.type === 'day') {
+      el.className = 'agenda-row agenda-day';
+      el.textContent = row.date;
+    } else if (row.type === 'empty') {
+      el.className = 'agenda-row agenda-empty';
+      el.textContent = row.date + ' – ' + row.end + '  予定なし';
+    } else {
+      el.className = 'agenda-row agenda-event';
+      el.dataset.id = row.id;
+      el.title = row.title + ' (' + row.schedule_label + ', 優先度:' + row.priority + ')';
+      const time = document.createElement('span');
+      time.className = 'agenda-time';
+      time.textContent = hhmm(row.start) + '–' + hhmm(row.end);
+      const title = document.createElement('span');
+      title.className = 'agenda-title text-truncate';
+      title.textContent = row.title + (row.location ? '  @' + row.location : '');
+      const label = document.createElement('span');
+      label.className = 'badge agenda-label';
+      label.textContent = row.schedule_label;
+      el.append(time, title, label);
+      el.ondblclick = () => {
+        const sink = document.getElementById('edit-open-store');
+        if (sink) {
+          sink.textContent = row.id;
+          sink.dispatchEvent(new Event('input'));
+        }
+      };
+    }
+    return el;
+  }
+
+  function render() {
+    const vp = state.viewport;
+    const first = Math.max(0, Math.floor(vp.scrollTop / ROW_H) - OVERSCAN);
+    const last = Math.min(state.rows.length, Math.ceil((vp.scrollTop + vp.clientHeight) / ROW_H) + OVERSCAN);
+    const frag = document.createDocumentFragment();
+    for (let i = first; i < last; i++) frag.appendChild(rowEl(state.rows[i], i));
+    state.spacer.replaceChildren(frag);
+    prefetch(first, last);
+  }
+
+  function prefetch(first, last) {
+    // 端から1ウィンドウ分以内に近づいたら隣接ウィンドウを先読み
+    const edge = Math.max(OVERSCAN * 2, Math.floor(state.viewport.clientHeight / ROW_H));
+    if (last + edge >= state.rows.length) fetchWindow(state.maxK + 1);
+    if (first - edge <= 0) fetchWindow(state.minK - 1);
+  }
+
+  function setup() {
+    const vp = document.getElementById('agenda-viewport');
+    if (!vp) { state = null; return; }
+    const key = vp.dataset.anchor + '|' + vp.dataset.version + '|' + vp.dataset.tz;
+    if (state && state.viewport === vp && state.key === key) return;
+    state = {
+      viewport: vp, key: key, anchor: vp.dataset.anchor, api: vp.dataset.api, tz: vp.dataset.tz || '',
+      version: vp.dataset.version || '', members: JSON.parse(vp.dataset.members || 'null'),
+      windowDays: parseInt(vp.dataset.windowDays || '14'),
+      spacer: vp.querySelector('.agenda-spacer'),
+      windows: new Map(), pending: new Set(), rows: [], minK: 0, maxK: 0
+    };
+    vp.scrollTop = 0;
+    vp.onscroll = () => { if (state && state.viewport === vp) render(); };
+    fetchWindow(0);
+  }
+
+  const obs = new MutationObserver(() => setup());
+  obs.observe(document.documentElement, {childList: true, subtree: true, attributes: true, attributeFilter: ['data-version', 'data-anchor', 'data-tz']});
+  setup();
+}
+
+if (document.readyState === 'loading') {
+  document.addEventListener('DOMContentLoaded', initializeAgenda);
+} else {
+  initializeAgenda();
+}
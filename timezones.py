@@ -0,0 +1,125 @@
+"""タイムゾーン変換（zoneinfo）
+
+イベントの時刻は UTC（events-store では UTC の ISO 文字列、インデックス内では epoch 秒）で持ち、
+表示するときだけ利用者のタイムゾーンへ変換する。
+
+描画ウィンドウ（週・月・予定リストの取得範囲）ごとに OffsetTable を前計算しておき、
+イベントごとの変換は bisect と整数の加算で済ませる。ローカル時刻は「壁時計の時刻を UTC と
+みなした epoch 秒」（wall 秒）で表すので、日付や分の計算も整数演算になる。
+"""
+import bisect
+import functools
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+OFFSET_TABLE_CACHE_MAX = 64   # 保持するオフセット表（タイムゾーン×ウィンドウ）の最大数
+TRANSITION_SCAN_SEC = 6 * 3600  # 切り替わり（夏時間など）を探す刻み
+
+# ユーザー設定で選べるタイムゾーン
+TZ_CHOICES = [
+    'Asia/Tokyo', 'Asia/Seoul', 'Asia/Shanghai', 'Asia/Singapore', 'Asia/Kolkata',
+    'Europe/London', 'Europe/Paris', 'Europe/Berlin', 'Europe/Amsterdam', 'Europe/Helsinki',
+    'America/New_York', 'America/Chicago', 'America/Los_Angeles', 'Australia/Sydney', 'UTC',
+]
+
+UTC = timezone.utc
+WALL_EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+@functools.lru_cache(maxsize=None)
+def get_zone(name):
+    """タイムゾーン名 → ZoneInfo。不明な名前は ValueError"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"不明なタイムゾーンです: {name}")
+
+
+def localize(naive, tz):
+    """壁時計の時刻 → aware datetime。存在しない時刻（夏時間開始の空白）は後ろへずらす"""
+    return naive.replace(tzinfo=tz).astimezone(UTC).astimezone(tz)
+
+
+def to_utc_iso(dt):
+    """保存形式（UTC の ISO 文字列）"""
+    return dt.astimezone(UTC).isoformat()
+
+
+def iso_epoch(s, default_tz):
+    """ISO 文字列 → epoch 秒。オフセットなしの文字列は default_tz の時刻とみなす"""
+    dt = datetime.fromisoformat(s)
+    if dt.tzinfo is None:
+        dt = localize(dt, default_tz)
+    return int(dt.timestamp())
+
+
+def wall_day(d):
+    """日付 → その日 0:00 の wall 秒"""
+    return (d.toordinal() - EPOCH_ORDINAL) * 86400
+
+
+def wall_date(wall):
+    """wall 秒 → 日付"""
+    return date.fromordinal(EPOCH_ORDINAL + wall // 86400)
+
+
+def wall_iso(wall):
+    """wall 秒 → 'YYYY-MM-DDTHH:MM'"""
+    return (WALL_EPOCH + timedelta(seconds=wall)).strftime('%Y-%m-%dT%H:%M')
+
+
+class OffsetTable:
+    """[start_ts, end_ts) における UTC オフセットの区間表
+
+    bounds[i] 以降（次の境界まで）のオフセットが offsets[i]。ウィンドウ外の時刻は両端の区間で近似する。
+    """
+
+    def __init__(self, tz, start_ts, end_ts):
+        self.tz = tz
+        self.bounds = [start_ts]
+        self.offsets = [self._utcoffset(start_ts)]
+        t = start_ts
+        while t < end_ts:
+            nxt = min(t + TRANSITION_SCAN_SEC, end_ts)
+            off = self._utcoffset(nxt)
+            if off != self.offsets[-1]:
+                # 切り替わり時刻を二分探索（秒単位）
+                lo, hi = t, nxt
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if self._utcoffset(mid) == self.offsets[-1]:
+                        lo = mid
+                    else:
+                        hi = mid
+                self.bounds.append(hi)
+                self.offsets.append(off)
+            t = nxt
+
+    def _utcoffset(self, ts):
+        return int(datetime.fromtimestamp(ts, self.tz).utcoffset().total_seconds())
+
+    def offset(self, ts):
+        return self.offsets[max(bisect.bisect_right(self.bounds, ts) - 1, 0)]
+
+    def local(self, ts):
+        """UTC epoch 秒 → wall 秒"""
+        return ts + self.offset(ts)
+
+    def utc(self, wall):
+        """wall 秒 → UTC epoch 秒（重複する時刻は早い方、存在しない時刻は切り替わり後へ）"""
+        candidates = [wall - off for off in self.offsets]
+        valid = [ts for ts in candidates if self.local(ts) == wall]
+        return min(valid) if valid else wall - self.offsets[0]
+
+    def day_start(self, d):
+        """日付 d のローカル 0:00 の UTC epoch 秒"""
+        return self.utc(wall_day(d))
+
+
+@functools.lru_cache(maxsize=OFFSET_TABLE_CACHE_MAX)
+def offset_table(tz, start_date, days):
+    """start_date から days 日分（前後2日の余裕付き）のオフセット表"""
+    lo = wall_day(start_date) - 86400 * 2
+    hi = wall_day(start_date) + 86400 * (days + 2)
+    return OffsetTable(tz, lo - 14 * 3600, hi + 14 * 3600)
@@ -0,0 +1,126 @@
+"""ユーザー・グループのディレクトリ（ページング・前方一致検索）
+
+管理モーダルの一覧とドロップダウンの候補は、コールバックに渡された users-store / groups-store から
+引いたインデックスでその都度1ページ分だけ返す。ユーザー一覧全体をコールバックのたびに描画・返送しないので、
+数千人規模でも入力に追従できる。
+
+検索は名前・メールの正規化済みキー（名前は空白区切りの語ごと、メールは全体とローカル部）を
+ソートした配列に持ち、前方一致を bisect で引く。インデックスはユーザー・グループ一覧の
+フィンガープリント単位でキャッシュする。キャッシュはプロセスごとだが、外れても渡された一覧から
+作り直すので、どのワーカーがどのセッションのコールバックを処理しても結果は変わらない。
+"""
+import bisect
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import event_index
+
+DIRECTORY_PAGE_SIZE = 25     # 管理モーダルの一覧の1ページの行数
+TYPEAHEAD_LIMIT = 20         # ドロップダウンに返す候補の最大数（選択中の値は別に含める）
+DIRECTORY_CACHE_MAX = 8      # 保持するインデックス（ユーザー・グループ一覧）の最大数
+
+
+def normalize(text):
+    """検索キーの正規化（全角/半角・大文字/小文字を区別しない）"""
+    return unicodedata.normalize('NFKC', text or '').casefold().strip()
+
+
+def user_keys(user):
+    name = normalize(user.get('name'))
+    email = normalize(user.get('email'))
+    keys = {name, *name.split(), email, email.split('@')[0]}
+    return [k for k in keys if k]
+
+
+def group_keys(group):
+    name = normalize(group.get('name'))
+    return [k for k in {name, *name.split()} if k]
+
+
+class PrefixIndex:
+    """レコードを名前順に並べ、検索キーの前方一致で引くインデックス"""
+
+    def __init__(self, records, keys_of):
+        self.records = sorted(records or [], key=lambda r: (normalize(r.get('name')), r['id']))
+        self.by_id = {r['id']: r for r in self.records}
+        self.keys = sorted((k, pos) for pos, r in enumerate(self.records) for k in keys_of(r))
+        self.key = None  # index_for() がフィンガープリントを設定する
+
+    def __len__(self):
+        return len(self.records)
+
+    def positions(self, query):
+        """query（空白区切りの語はすべて前方一致）に一致するレコードの位置（名前順）"""
+        terms = normalize(query).split()
+        if not terms:
+            return range(len(self.records))
+        result = None
+        for term in terms:
+            hits = set()
+            i = bisect.bisect_left(self.keys, (term,))
+            while i < len(self.keys) and self.keys[i][0].startswith(term):
+                hits.add(self.keys[i][1])
+                i += 1
+            result = hits if result is None else result & hits
+            if not result:
+                return []
+        return sorted(result)
+
+    def page(self, query, page=0, per_page=DIRECTORY_PAGE_SIZE):
+        """(一致件数, 実際のページ番号, そのページのレコード)。ページ番号は範囲内に丸める"""
+        pos = self.positions(query)
+        last = max(0, (len(pos) - 1) // per_page)
+        page = min(max(0, page or 0), last)
+        return len(pos), page, [self.records[p] for p in pos[page * per_page:(page + 1) * per_page]]
+
+    def options(self, query, selected=None, limit=TYPEAHEAD_LIMIT):
+        """ドロップダウンの候補: 選択中の値（ラベルを保つため）+ 前方一致の上位 limit 件"""
+        selected = [selected] if isinstance(selected, str) else list(selected or [])
+        chosen = [self.by_id[v] for v in selected if v in self.by_id]
+        seen = {r['id'] for r in chosen}
+        matches = [self.records[p] for p in self.positions(query)[:limit + len(seen)]]
+        rows = chosen + [r for r in matches if r['id'] not in seen][:limit]
+        return [{'label': r['name'], 'value': r['id'], 'search': ' '.join([r['name'], r.get('email', '')]).strip()}
+                for r in rows]
+
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def index_for(records, keys_of):
+    key = (keys_of.__name__, event_index.fingerprint(records))
+    with _lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            return index
+    index = PrefixIndex(records, keys_of)
+    index.key = key[1]
+    with _lock:
+        _cache[key] = index
+        while len(_cache) > DIRECTORY_CACHE_MAX:
+            _cache.popitem(last=False)
+    return index
+
+
+def version(users_data, groups_data):
+    """ユーザー・グループ一覧の版を表す文字列（インデックスも作っておく。ブラウザ側の Store で変更を伝える）"""
+    # ブラウザの数値は 2^53 を超えると精度が落ちるので文字列で持つ
+    return f"{users(users_data).key}:{groups(groups_data).key}"
+
+
+def users(users_data):
+    """ユーザー一覧のインデックス"""
+    return index_for(users_data, user_keys)
+
+
+def groups(groups_data):
+    """グループ一覧のインデックス"""
+    return index_for(groups_data, group_keys)
+
+
+def cache_clear():
+    with _lock:
+        _cache.clear()